@@ -1,20 +1,31 @@
-from .raster_tools import ropen, read
-from .vector_tools import vopen
-from .classification.classification import classification, classification_r
-from .classification.error_matrix import error_matrix, object_accuracy
-from .classification.change import change
-from .classification._moving_window import moving_window
-from .classification._morph_cells import morph_cells
-from .classification.reclassify import reclassify
-from .classification.recode import recode
-from .classification.sample_raster import sample_raster
-from .raster_calc import raster_calc
-from .veg_indices import veg_indices, VegIndicesEquations
-from .vrt_builder import vrt_builder
-from .testing.test import main as test
+import sys
+import types
+import importlib
 
 from .version import __version__
 
+# The public names and the (module, attribute) that provide them. The modules, and
+#   the third-party libraries they need, are imported on first access, so that
+#   ``import mpglue`` (e.g., in short-lived worker processes) stays fast.
+_LAZY_IMPORTS = {'ropen': ('.raster_tools', 'ropen'),
+                 'read': ('.raster_tools', 'read'),
+                 'vopen': ('.vector_tools', 'vopen'),
+                 'classification': ('.classification.classification', 'classification'),
+                 'classification_r': ('.classification.classification', 'classification_r'),
+                 'error_matrix': ('.classification.error_matrix', 'error_matrix'),
+                 'object_accuracy': ('.classification.error_matrix', 'object_accuracy'),
+                 'change': ('.classification.change', 'change'),
+                 'moving_window': ('.classification._moving_window', 'moving_window'),
+                 'morph_cells': ('.classification._morph_cells', 'morph_cells'),
+                 'reclassify': ('.classification.reclassify', 'reclassify'),
+                 'recode': ('.classification.recode', 'recode'),
+                 'sample_raster': ('.classification.sample_raster', 'sample_raster'),
+                 'raster_calc': ('.raster_calc', 'raster_calc'),
+                 'veg_indices': ('.veg_indices', 'veg_indices'),
+                 'VegIndicesEquations': ('.veg_indices', 'VegIndicesEquations'),
+                 'vrt_builder': ('.vrt_builder', 'vrt_builder'),
+                 'test': ('.testing.test', 'main')}
+
 __all__ = ['ropen',
            'read',
            'vopen',
@@ -26,3 +37,51 @@ __all__ = ['ropen',
            'vrt_builder',
            'test',
            '__version__']
+
+
+def _import_lazy(name):
+
+    """Imports a public name"""
+
+    module_name, attribute = _LAZY_IMPORTS[name]
+
+    return getattr(importlib.import_module(module_name, __name__), attribute)
+
+
+class _LazyPackage(types.ModuleType):
+
+    """The mpglue package, with public names imported on first access"""
+
+    def __getattr__(self, name):
+
+        if name in _LAZY_IMPORTS:
+
+            value = _import_lazy(name)
+
+            # Cache the name for later lookups.
+            self.__dict__[name] = value
+
+            return value
+
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+    def __setattr__(self, name, value):
+
+        # Importing a subpackage sets it on the package. The public
+        #   name (e.g., the ``classification`` function) takes precedence.
+        if (name in _LAZY_IMPORTS) and isinstance(value, types.ModuleType):
+            return
+
+        super(_LazyPackage, self).__setattr__(name, value)
+
+    def __dir__(self):
+        return sorted(set(list(self.__dict__) + list(_LAZY_IMPORTS)))
+
+
+if sys.version_info >= (3, 5):
+    sys.modules[__name__].__class__ = _LazyPackage
+else:
+
+    # Modules cannot change class in Python 2.
+    for _name in _LAZY_IMPORTS:
+        globals()[_name] = _import_lazy(_name)
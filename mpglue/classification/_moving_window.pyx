@@ -19,7 +19,8 @@ from copy import copy
 # from libc.math cimport cos, atan2
 # from libc.stdlib cimport c_abs
 # from libc.math cimport fabs
-# from cython.parallel import prange, parallel
+from cython.parallel import prange, parallel
+from libc.stdlib cimport malloc, free
 
 try:
     import cv2
@@ -3219,88 +3220,49 @@ cdef DTYPE_float32_t _fill_basins(DTYPE_float32_t[:, ::1] image_block,
         return bcv
 
 
-cdef DTYPE_float32_t _get_proba_mean(DTYPE_float32_t[:, ::1] proba_block___,
-                                     DTYPE_float32_t[:, ::1] weight_sums___,
-                                     unsigned int window_size) nogil:
+cdef void _plr_row(DTYPE_float32_t[:, :, ::1] proba_array,
+                   DTYPE_float32_t[:, :, ::1] out_array,
+                   DTYPE_float32_t[:, :, ::1] weighted_sums,
+                   DTYPE_float32_t[:, ::1] dist_weights,
+                   DTYPE_float32_t[:, ::1] compatibility_matrix,
+                   DTYPE_float32_t[::1] class_norms,
+                   Py_ssize_t i,
+                   unsigned int bands,
+                   unsigned int col_dims,
+                   unsigned int window_size,
+                   unsigned int half_window) nogil:
 
-    """Calculates the weighted mean of the relaxed probability sums"""
+    """Relaxes the class probabilities of one row"""
 
     cdef:
-        Py_ssize_t ii, jj
-        DTYPE_float32_t proba_sum = 0.
-        DTYPE_float32_t weight_sum = 0.
-
-    for ii in range(0, window_size):
-
-        for jj in range(0, window_size):
-
-            proba_sum += proba_block___[ii, jj]
-            weight_sum += weight_sums___[ii, jj]
-
-    return proba_sum / weight_sum
-
-
-cdef void _block_weighted_sum(DTYPE_float32_t[:, ::1] proba_block__,
-                              DTYPE_float32_t[:, ::1] probs_layer,
-                              unsigned int window_size,
-                              DTYPE_float32_t pls,
-                              DTYPE_float32_t[:, ::1] dist_weights,
-                              DTYPE_float32_t[:, ::1] weight_sums__) nogil:
-
-    """Calculates the weighted sum of posterior probabilities"""
-
-    cdef:
-        Py_ssize_t ii, jj, iii, jjj
-        DTYPE_float32_t weight
-
-    for ii in range(0, window_size):
-
-        for jj in range(0, window_size):
-
-            weight = pls * dist_weights[ii, jj]
+        Py_ssize_t j, ii, jj, band, class_iter
+        DTYPE_float32_t proba_sum, proba_q
 
-            # posterior class probability x class uncertainty x distance weight
-            proba_block__[ii, jj] += (probs_layer[ii, jj] * weight)
+    for j in range(0, col_dims):
 
-            weight_sums__[ii, jj] += weight
+        # Distance-weighted neighborhood
+        #   sum of each class.
+        for class_iter in range(0, bands):
 
+            proba_sum = 0.
 
-cdef DTYPE_float32_t _k_prob(DTYPE_float32_t[:, :, ::1] probs,
-                             DTYPE_float32_t[:, ::1] proba_block_,
-                             Py_ssize_t current_band,
-                             unsigned int bands,
-                             unsigned int window_size,
-                             DTYPE_float32_t[:, ::1] compatibility_matrix,
-                             DTYPE_float32_t[:, ::1] dist_weights,
-                             DTYPE_float32_t[:, ::1] weight_sums_) nogil:
+            for ii in range(0, window_size):
+                for jj in range(0, window_size):
+                    proba_sum += proba_array[class_iter, i+ii, j+jj] * dist_weights[ii, jj]
 
-    cdef:
-        Py_ssize_t class_iter
-        DTYPE_float32_t[:, ::1] current_layer
+            weighted_sums[class_iter, i, j] = proba_sum
 
-    # Iterate over each class
-    for class_iter in range(0, bands):
+        # Mix the class sums with the compatibility
+        #   matrix to get the weighted mean.
+        for band in range(0, bands):
 
-        # The current class probability window
-        current_layer = probs[class_iter, :, :]
+            proba_q = 0.
 
-        # --------------------
-        # Get the weighted sum
-        # --------------------
+            for class_iter in range(0, bands):
+                proba_q += compatibility_matrix[band, class_iter] * weighted_sums[class_iter, i, j]
 
-        # Add the current class probabilities,
-        #   weighted by the uncertainty.
-        _block_weighted_sum(proba_block_,
-                            current_layer,
-                            window_size,
-                            compatibility_matrix[current_band, class_iter],
-                            dist_weights,
-                            weight_sums_)
-
-    # Get the weighted mean
-    return _get_proba_mean(proba_block_,
-                           weight_sums_,
-                           window_size)
+            out_array[band, i+half_window, j+half_window] = proba_q * class_norms[band] * \
+                                                            proba_array[band, i+half_window, j+half_window]
 
 
 cdef DTYPE_float32_t[:, ::1] _create_weights(unsigned int window_size,
@@ -3346,24 +3308,37 @@ cdef np.ndarray[DTYPE_float32_t, ndim=3] plr(DTYPE_float32_t[:, :, ::1] proba_ar
     Process:
         proba_q:
             The Q_i vector equals the sum of probabilities over all classes and neighborhoods.
+
+            Because the distance weights are shared by all classes, the neighborhood sums are
+            computed once per class and iteration and mixed with the compatibility matrix, and
+            the weight sums reduce to one constant per class.
+
+    Tiles:
+        Pixels within ``half_window`` of the array edge are not relaxed, so a tile padded by
+        ``iterations`` x ``half_window`` pixels on each side returns the same interior as the full image.
     """
 
     cdef:
-        Py_ssize_t i, j, iteration, band, bci, bcj
+        Py_ssize_t i, iteration, bci, bcj, ri, rj
         unsigned int bands = proba_array.shape[0]
         unsigned int rows = proba_array.shape[1]
         unsigned int cols = proba_array.shape[2]
         unsigned int half_window = <int>(window_size / 2.)
-        unsigned int row_dims = rows - (half_window * 2)
-        unsigned int col_dims = cols - (half_window * 2)
+        unsigned int row_dims, col_dims
         DTYPE_float32_t[:, :, ::1] out_array = proba_array.copy()
-        DTYPE_float32_t[:, ::1] block_proba = np.zeros((window_size, window_size), dtype='float32')
-        DTYPE_float32_t[:, ::1] proba_block = block_proba.copy()
-        DTYPE_float32_t[:, ::1] weight_sums = block_proba.copy()
-        DTYPE_float32_t[:, :, ::1] proba_block_3d
+        DTYPE_float32_t[:, :, ::1] weighted_sums
         DTYPE_float32_t[:, ::1] dist_weights = _create_weights(window_size, half_window)
         DTYPE_float32_t[:, ::1] compatibility_matrix = np.zeros((bands, bands), dtype='float32')
-        DTYPE_float32_t proba_q, proba_p
+        DTYPE_float32_t[::1] class_norms = np.zeros(bands, dtype='float32')
+        DTYPE_float32_t dist_weight_sum = 0.
+
+    if (rows < window_size) or (cols < window_size):
+        return np.float32(proba_array)
+
+    row_dims = rows - (half_window * 2)
+    col_dims = cols - (half_window * 2)
+
+    weighted_sums = np.zeros((bands, row_dims, col_dims), dtype='float32')
 
     # TODO
     # -------------------------------
@@ -3383,52 +3358,35 @@ cdef np.ndarray[DTYPE_float32_t, ndim=3] plr(DTYPE_float32_t[:, :, ::1] proba_ar
                 else:
                     compatibility_matrix[bci, bcj] = .5
 
-    # with nogil:
-    #
-    #     for ic from 0 <= ic < rows by 2:
-    #
-    #         for jc from 0 <= jc < cols by 2:
-    #
-    #             for bci in range(0, bands):
-    #
-    #                 for bcj in range(0, bands):
-    #
-    #                     compatibility_matrix[bci, bcj]
-
-    for iteration in range(0, iterations):
-
-        with nogil:
-
-            for i in range(0, row_dims):
-
-                for j in range(0, col_dims):
+    for ri in range(0, window_size):
+        for rj in range(0, window_size):
+            dist_weight_sum += dist_weights[ri, rj]
 
-                    # Current probabilities
-                    proba_block_3d = proba_array[:,
-                                                 i:i+window_size,
-                                                 j:j+window_size]
+    # The sum of weights for each class
+    for bci in range(0, bands):
 
-                    # Iterate over each class.
-                    for band in range(0, bands):
+        for bcj in range(0, bands):
+            class_norms[bci] += compatibility_matrix[bci, bcj]
 
-                        # Initiate the block to be filled with zeros.
-                        proba_block[...] = block_proba
-                        weight_sums[...] = block_proba
+        class_norms[bci] = 1. / (class_norms[bci] * dist_weight_sum)
 
-                        # Get the weighted mean
-                        #   of probabilities.
-                        proba_q = _k_prob(proba_block_3d,
-                                          proba_block,
-                                          band,
-                                          bands,
-                                          window_size,
-                                          compatibility_matrix,
-                                          dist_weights,
-                                          weight_sums)
+    for iteration in range(0, iterations):
 
-                        proba_p = proba_block_3d[band, half_window, half_window]
+        with nogil:
 
-                        out_array[band, i+half_window, j+half_window] = proba_q * proba_p
+            for i in prange(0, row_dims, schedule='static'):
+
+                _plr_row(proba_array,
+                         out_array,
+                         weighted_sums,
+                         dist_weights,
+                         compatibility_matrix,
+                         class_norms,
+                         i,
+                         bands,
+                         col_dims,
+                         window_size,
+                         half_window)
 
             proba_array[...] = out_array
 
@@ -4471,6 +4429,206 @@ cdef np.ndarray rgb_window(DTYPE_float32_t[:, :, :] image_array, unsigned int wi
     return np.asarray(out_array).astype(np.float32)
 
 
+cdef void _van_herk_line(DTYPE_float32_t[:] line,
+                         DTYPE_float32_t[:] out_line,
+                         DTYPE_float32_t *g,
+                         DTYPE_float32_t *h,
+                         Py_ssize_t n,
+                         Py_ssize_t window_size,
+                         bint is_max) nogil:
+
+    """
+    Computes a 1d moving minimum or maximum with the van Herk/Gil-Werman algorithm
+
+    The line is split into segments of ``window_size``. ``g`` holds the running extreme from the
+    start of each segment and ``h`` the running extreme to the end of each segment, so any window
+    is the extreme of one ``h`` and one ``g`` value.
+    """
+
+    cdef:
+        Py_ssize_t k
+
+    for k in range(0, n):
+
+        if k % window_size == 0:
+            g[k] = line[k]
+        elif is_max:
+            g[k] = _nogil_get_max(g[k-1], line[k])
+        else:
+            g[k] = _nogil_get_min(g[k-1], line[k])
+
+    for k in range(n-1, -1, -1):
+
+        if (k == n-1) or ((k+1) % window_size == 0):
+            h[k] = line[k]
+        elif is_max:
+            h[k] = _nogil_get_max(h[k+1], line[k])
+        else:
+            h[k] = _nogil_get_min(h[k+1], line[k])
+
+    for k in range(0, n-window_size+1):
+
+        if is_max:
+            out_line[k] = _nogil_get_max(h[k], g[k+window_size-1])
+        else:
+            out_line[k] = _nogil_get_min(h[k], g[k+window_size-1])
+
+
+cdef np.ndarray[DTYPE_float32_t, ndim=2] _window_min_max(DTYPE_float32_t[:, ::1] image_array,
+                                                         unsigned int window_size,
+                                                         DTYPE_float32_t ignore_value,
+                                                         bint is_max):
+
+    """Computes a focal minimum or maximum with separable van Herk/Gil-Werman passes"""
+
+    cdef:
+        Py_ssize_t i, j
+        unsigned int rows = image_array.shape[0]
+        unsigned int cols = image_array.shape[1]
+        unsigned int half_window = <int>(window_size / 2.)
+        unsigned int row_dims = rows - (half_window*2)
+        unsigned int col_dims = cols - (half_window*2)
+        DTYPE_float32_t fill_value = -999999. if is_max else 999999.
+        DTYPE_float32_t[:, ::1] in_array
+        DTYPE_float32_t[:, ::1] col_pass = np.empty((rows-window_size+1, cols), dtype='float32')
+        DTYPE_float32_t[:, ::1] row_pass = np.empty((rows-window_size+1, cols-window_size+1), dtype='float32')
+        DTYPE_float32_t *g
+        DTYPE_float32_t *h
+        np.ndarray[DTYPE_float32_t, ndim=2] out_array = np.zeros((rows, cols), dtype='float32')
+        np.ndarray[DTYPE_float32_t, ndim=2] extremes
+
+    # Ignored values, and the starting value of the
+    #   window functions, never win a comparison.
+    if ignore_value != -9999.:
+        in_array = np.where(np.asarray(image_array) == ignore_value, fill_value, image_array).astype('float32')
+    else:
+        in_array = image_array
+
+    # Columns
+    with nogil, parallel():
+
+        g = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * rows)
+        h = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * rows)
+
+        for j in prange(0, cols, schedule='static'):
+            _van_herk_line(in_array[:, j], col_pass[:, j], g, h, rows, window_size, is_max)
+
+        free(g)
+        free(h)
+
+    # Rows
+    with nogil, parallel():
+
+        g = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * cols)
+        h = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * cols)
+
+        for i in prange(0, rows-window_size+1, schedule='static'):
+            _van_herk_line(col_pass[i, :], row_pass[i, :], g, h, cols, window_size, is_max)
+
+        free(g)
+        free(h)
+
+    extremes = np.asarray(row_pass)[:row_dims, :col_dims]
+
+    if is_max:
+        out_array[half_window:half_window+row_dims, half_window:half_window+col_dims] = np.maximum(extremes, fill_value)
+    else:
+        out_array[half_window:half_window+row_dims, half_window:half_window+col_dims] = np.minimum(extremes, fill_value)
+
+    return out_array
+
+
+cdef np.ndarray[DTYPE_float64_t, ndim=2] _window_box_sums(np.ndarray[DTYPE_float64_t, ndim=2] values,
+                                                          unsigned int window_size,
+                                                          unsigned int row_dims,
+                                                          unsigned int col_dims):
+
+    """Computes moving window sums from a summed-area table"""
+
+    cdef:
+        unsigned int rows = values.shape[0]
+        unsigned int cols = values.shape[1]
+        np.ndarray[DTYPE_float64_t, ndim=2] sat = np.zeros((rows+1, cols+1), dtype='float64')
+
+    sat[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+
+    return sat[window_size:window_size+row_dims, window_size:window_size+col_dims] - \
+           sat[:row_dims, window_size:window_size+col_dims] - \
+           sat[window_size:window_size+row_dims, :col_dims] + \
+           sat[:row_dims, :col_dims]
+
+
+cdef np.ndarray[DTYPE_float32_t, ndim=2] _window_sums(DTYPE_float32_t[:, ::1] image_array,
+                                                      str statistic,
+                                                      unsigned int window_size,
+                                                      DTYPE_float32_t target_value,
+                                                      DTYPE_float32_t ignore_value,
+                                                      DTYPE_float32_t weight):
+
+    """Computes a focal mean, sum or percent in constant time per pixel with summed-area tables"""
+
+    cdef:
+        unsigned int rows = image_array.shape[0]
+        unsigned int cols = image_array.shape[1]
+        unsigned int half_window = <int>(window_size / 2.)
+        unsigned int row_dims = rows - (half_window*2)
+        unsigned int col_dims = cols - (half_window*2)
+        np.ndarray[DTYPE_float32_t, ndim=2] in_array = np.asarray(image_array)
+        np.ndarray[DTYPE_float64_t, ndim=2] window_sums, window_counts
+        np.ndarray[DTYPE_float32_t, ndim=2] out_array = np.zeros((rows, cols), dtype='float32')
+        np.ndarray[DTYPE_float32_t, ndim=2] center_values
+        np.ndarray valid_array
+
+    if ignore_value != -9999.:
+
+        valid_array = in_array != ignore_value
+
+        window_sums = _window_box_sums(np.where(valid_array, in_array, 0).astype('float64'),
+                                       window_size,
+                                       row_dims,
+                                       col_dims)
+
+        window_counts = _window_box_sums(valid_array.astype('float64'),
+                                         window_size,
+                                         row_dims,
+                                         col_dims)
+
+    else:
+
+        window_sums = _window_box_sums(in_array.astype('float64'),
+                                       window_size,
+                                       row_dims,
+                                       col_dims)
+
+        window_counts = np.zeros((row_dims, col_dims), dtype='float64') + float(window_size * window_size)
+
+    if statistic == 'sum':
+        out_array[half_window:half_window+row_dims, half_window:half_window+col_dims] = window_sums
+
+    elif statistic == 'percent':
+        out_array[half_window:half_window+row_dims, half_window:half_window+col_dims] = (window_sums / window_counts) * 100.
+
+    else:
+
+        out_array[half_window:half_window+row_dims,
+                  half_window:half_window+col_dims] = np.where(window_counts == 0,
+                                                               0.,
+                                                               (window_sums * weight) / window_counts)
+
+        # Only the target value is averaged.
+        if target_value != -9999.:
+
+            center_values = in_array[half_window:half_window+row_dims, half_window:half_window+col_dims]
+
+            out_array[half_window:half_window+row_dims,
+                      half_window:half_window+col_dims] = np.where(center_values != target_value,
+                                                                   center_values,
+                                                                   out_array[half_window:half_window+row_dims,
+                                                                             half_window:half_window+col_dims])
+
+    return out_array
+
+
 cdef np.ndarray window(DTYPE_float32_t[:, ::1] image_array,
                        str statistic,
                        unsigned int window_size,
@@ -4494,6 +4652,27 @@ cdef np.ndarray window(DTYPE_float32_t[:, ::1] image_array,
         DTYPE_float32_t[:, ::1] out_array
         metric_ptr window_function
 
+    # Constant time per pixel for large windows. Every iteration
+    #   reads the same input, so one pass is enough.
+    if (skip_block == 0) and (rows >= window_size) and (cols >= window_size):
+
+        if statistic in ['sum', 'percent'] or \
+                ((statistic == 'mean') and (np.asarray(weights) == weights[0, 0]).all()):
+
+            return _window_sums(image_array,
+                                statistic,
+                                window_size,
+                                target_value,
+                                ignore_value,
+                                weights[0, 0])
+
+        elif statistic in ['min', 'max']:
+
+            return _window_min_max(image_array,
+                                   window_size,
+                                   ignore_value,
+                                   statistic == 'max')
+
     if statistic == 'mean':
         window_function = &_get_mean
     elif statistic == 'min':
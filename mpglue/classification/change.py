@@ -27,46 +27,136 @@ except ImportError:
     raise ImportError('Pandas must be installed')
 
 
-def unique_class_func(im, unique_classes=None):
+# The largest transition code space counted with ``np.bincount``
+_MAX_BINCOUNT = 2 ** 22
 
-    unique_classes_blk = np.unique(im[0])
 
-    if len(unique_classes_blk) > 1:
+def pair_counts(class_array_1, class_array_2):
 
-        for cl in unique_classes_blk:
+    """
+    Counts the class transitions between two arrays in a single pass
+
+    Each pixel pair is encoded as a * n_values + b and counted with ``np.bincount``, or with
+    ``np.unique`` when the class values span too wide a range.
+
+    Args:
+        class_array_1 (ndarray): The classes at time 1.
+        class_array_2 (ndarray): The classes at time 2.
+
+    Returns:
+        The time 1 classes, time 2 classes, and pixel counts of each transition, as 1d arrays.
+    """
+
+    class_array_1 = class_array_1.ravel().astype('int64')
+    class_array_2 = class_array_2.ravel().astype('int64')
+
+    min_value = min(class_array_1.min(), class_array_2.min())
+    n_values = max(class_array_1.max(), class_array_2.max()) - min_value + 1
+
+    pair_codes = (class_array_1 - min_value) * n_values + (class_array_2 - min_value)
+
+    if n_values * n_values <= _MAX_BINCOUNT:
+
+        code_counts = np.bincount(pair_codes, minlength=n_values*n_values)
+
+        pair_codes = np.flatnonzero(code_counts)
+        code_counts = code_counts[pair_codes]
+
+    else:
+        pair_codes, code_counts = np.unique(pair_codes, return_counts=True)
 
-            if cl not in unique_classes:
-                unique_classes.append(cl)
+    return pair_codes // n_values + min_value, pair_codes % n_values + min_value, code_counts
 
-    return None, sorted(unique_classes)
 
+def merge_pair_counts(pair_count_list, classes=None):
 
-def change_func(im, unique_classes=None, change_combos=None):
+    """
+    Merges block transition counts into a transition matrix
+
+    Args:
+        pair_count_list (list): A list of ``pair_counts`` outputs.
+        classes (Optional[1d array]): The sorted classes of the matrix. Default is None, or every class
+            found in either time. Transitions of other classes are not counted.
+
+    Returns:
+        The classes and the (time 1 x time 2) transition matrix.
+    """
+
+    classes_1 = np.concatenate([pair_count[0] for pair_count in pair_count_list])
+    classes_2 = np.concatenate([pair_count[1] for pair_count in pair_count_list])
+    counts = np.concatenate([pair_count[2] for pair_count in pair_count_list])
+
+    if classes is None:
+        classes = np.union1d(classes_1, classes_2)
 
-    out_arr = np.zeros(im[0].shape, dtype='uint8')
+    n_classes = len(classes)
 
-    # For each class, get the total pixels that changed.
-    for cl_b in unique_classes:
+    class_index_1, valid_1 = class_indices(classes_1, classes)
+    class_index_2, valid_2 = class_indices(classes_2, classes)
 
-        for cl in unique_classes:
+    valid = valid_1 & valid_2
 
-            # Get the class Id.
-            cl_id = change_combos['{:d}->{:d}'.format(cl_b, cl)][0]
+    change_matrix = np.bincount(class_index_1[valid] * n_classes + class_index_2[valid],
+                                weights=counts[valid],
+                                minlength=n_classes*n_classes)
 
-            # Get the pixels that changed for the current class combination.
-            change_pixs = np.where((im[0] == cl_b) & (im[1] == cl), 1, 0)
+    return classes, np.int64(change_matrix).reshape(n_classes, n_classes)
+
+
+def class_indices(class_array, classes):
+
+    """
+    Gets the position of each value in a sorted class list
+
+    Returns:
+        The class positions and a mask of values found in ``classes``.
+    """
 
-            # Update the change area dictionary.
-            change_combos['{:d}->{:d}'.format(cl_b, cl)][1] += change_pixs.sum()
+    n_classes = len(classes)
 
-            # Update the output array with the change Id value.
-            out_arr[change_pixs == 1] = cl_id
+    class_index = np.searchsorted(classes, class_array)
+    class_index[class_index >= n_classes] = 0
 
-    return out_arr, change_combos
+    if n_classes == 0:
+        return class_index, np.zeros(class_array.shape, dtype='bool')
+
+    return class_index, classes[class_index] == class_array
+
+
+def unique_class_func(im):
+
+    """Gets the unique classes of both times in a block"""
+
+    return None, np.union1d(np.unique(im[0]), np.unique(im[1]))
+
+
+def change_func(im, classes=None, write_ids=True):
+
+    """
+    Gets the transition counts of a block and, optionally, the change Ids
+
+    The change Id of a time 1 class at position ``a`` and time 2 class at position ``b`` in ``classes``
+    is a * n_classes + b + 1. Pixels of other classes are 0.
+    """
+
+    block_counts = pair_counts(im[0], im[1])
+
+    if not write_ids:
+        return None, block_counts
+
+    n_classes = len(classes)
+
+    class_index_1, valid_1 = class_indices(im[0], classes)
+    class_index_2, valid_2 = class_indices(im[1], classes)
+
+    out_arr = np.where(valid_1 & valid_2, class_index_1 * n_classes + class_index_2 + 1, 0)
+
+    return out_arr, block_counts
 
 
 def change(img_1, img_2, out_img=None, out_report=None,
-           boundary_file=None, mask_file=None, be_quiet=False):
+           boundary_file=None, mask_file=None, be_quiet=False,
+           classes=None, n_jobs=1):
 
     """
     Args:
@@ -79,6 +169,10 @@ def change(img_1, img_2, out_img=None, out_report=None,
         mask_file (Optional[str]): An file to use for block masking. Default is None.
             Recode blocks to binary 1 and 0 that intersect ``mask_file``.
         be_quiet (Optional[bool]): Whether to be quiet and do not print progress status. Default is False.
+        classes (Optional[int list]): The classes to report. Default is None, or every class found in
+            either image. Without ``classes``, ``out_img`` needs an extra pass to find the classes
+            before the change Ids can be written.
+        n_jobs (Optional[int]): The number of blocks to process in parallel. Default is 1.
 
     Returns:
         None, writes to ``out_img`` or ``out_report``.
@@ -97,7 +191,6 @@ def change(img_1, img_2, out_img=None, out_report=None,
 
     # set the output image
     o_info = overlap_info.copy()
-    # o_info.update_info(left=m_info.left, right=m_info.right, top=m_info.top, bottom=m_info.bottom, rows=rows, cols=cols)
 
     __, __, x_off_1, y_off_1 = vector_tools.get_xy_offsets(image_info=i_info_1,
                                                            x=overlap_info.left,
@@ -109,60 +202,72 @@ def change(img_1, img_2, out_img=None, out_report=None,
                                                            y=overlap_info.top,
                                                            check_position=False)
 
-    # get unique classes
-    unique_classes = list()
-
-    bp = raster_tools.BlockFunc(unique_class_func, [i_info_1], None, o_info,
-                                proc_info=overlap_info,
-                                y_offset=[y_off_1],
-                                x_offset=[x_off_1],
-                                out_attributes=['unique_classes_list'],
-                                print_statement='\nGetting unique classes ...\n',
-                                write_array=False,
-                                be_quiet=be_quiet,
-                                boundary_file=boundary_file,
-                                unique_classes=unique_classes)
-
-    bp.run()
+    if classes is not None:
+        classes = np.unique(np.array(classes, dtype='int64'))
 
-    unique_classes = bp.unique_classes_list
+    elif write_array:
 
-    # get change combinations
-    change_combos = dict()
+        # The change Ids depend on the number
+        #   of classes, so get the classes first.
+        bp = raster_tools.BlockFunc(unique_class_func, [i_info_1, i_info_2], None, o_info,
+                                    proc_info=overlap_info,
+                                    y_offset=[y_off_1, y_off_2],
+                                    x_offset=[x_off_1, x_off_2],
+                                    out_attributes=['unique_classes_list'],
+                                    print_statement='\nGetting unique classes ...\n',
+                                    write_array=False,
+                                    be_quiet=be_quiet,
+                                    boundary_file=boundary_file,
+                                    mask_file=mask_file,
+                                    n_jobs=n_jobs,
+                                    close_files=False)
 
-    cl_id = 1
-    for cl_b in unique_classes:
+        bp.run()
 
-        for cl in unique_classes:
+        classes = np.unique(np.concatenate(bp.unique_classes_list)).astype('int64')
 
-            change_combos['{:d}->{:d}'.format(cl_b, cl)] = [cl_id, 0]  # class Id, count
+    if write_array:
 
-            cl_id += 1
+        n_ids = len(classes) * len(classes)
 
-    i_info_1.close()
-    i_info_1 = raster_tools.ropen(img_1)
+        if n_ids < 256:
+            o_info.storage = 'byte'
+        elif n_ids < 65536:
+            o_info.storage = 'uint16'
+        else:
+            o_info.storage = 'uint32'
 
     bp = raster_tools.BlockFunc(change_func, [i_info_1, i_info_2], out_img, o_info,
                                 proc_info=overlap_info,
                                 y_offset=[y_off_1, y_off_2],
                                 x_offset=[x_off_1, x_off_2],
-                                out_attributes=['change_combos'],
+                                out_attributes=['change_counts'],
                                 print_statement='\nGetting change ...\n',
                                 write_array=write_array,
                                 be_quiet=be_quiet,
                                 boundary_file=boundary_file,
                                 mask_file=mask_file,
-                                unique_classes=unique_classes,
-                                change_combos=change_combos)
+                                n_jobs=n_jobs,
+                                classes=classes,
+                                write_ids=write_array)
 
     bp.run()
 
+    i_info_1.close()
+    i_info_2.close()
+
     # Write the change combination report.
-    if isinstance(out_report, str):
+    if isinstance(out_report, str) and hasattr(bp, 'change_counts'):
+
+        classes, change_matrix = merge_pair_counts(bp.change_counts, classes=classes)
+
+        n_classes = len(classes)
 
-        df = pd.DataFrame(bp.change_combos).transpose()
+        df = pd.DataFrame(dict(Id=np.arange(1, n_classes*n_classes+1),
+                               Count=change_matrix.ravel()),
+                          columns=['Id', 'Count'],
+                          index=['{:d}->{:d}'.format(cl_b, cl) for cl_b in classes for cl in classes])
 
-        df.columns = ['Id', 'Count']
         df.index.name = 'Combo'
 
         df.to_csv(out_report, sep=',')
@@ -191,6 +296,8 @@ def main():
     parser.add_argument('-im2', '--input2', dest='input2', help='The second image (time 2)', default=None)
     parser.add_argument('-o', '--output', dest='output', help='The output image', default=None)
     parser.add_argument('-r', '--report', dest='report', help='The output report', default=None)
+    parser.add_argument('--classes', dest='classes', help='The classes to report', default=None, type=int, nargs='+')
+    parser.add_argument('-j', '--n_jobs', dest='n_jobs', help='The number of parallel blocks', default=1, type=int)
 
     args = parser.parse_args()
 
@@ -201,7 +308,8 @@ def main():
 
     start_time = time.time()
 
-    change(args.input1, args.input2, out_img=args.output, out_report=args.report)
+    change(args.input1, args.input2, out_img=args.output, out_report=args.report,
+           classes=args.classes, n_jobs=args.n_jobs)
 
     logger.info('\nEnd data & time -- (%s)\nTotal processing time -- (%.2gs)\n' %
                 (time.asctime(time.localtime(time.time())), (time.time()-start_time)))
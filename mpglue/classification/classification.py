@@ -18,6 +18,7 @@ import platform
 import shutil
 from copy import copy
 import itertools
+import multiprocessing as multi
 from collections import OrderedDict
 import inspect
 
@@ -29,6 +30,7 @@ from .. import vector_tools
 from ..helpers import get_path
 from ..errors import logger, ArrayShapeError
 from .ts_features import TimeSeriesFeatures
+from .sample_store import SampleStore, is_sample_store
 
 MPPATH = get_path()
 
@@ -375,7 +377,9 @@ def predict_scikit_probas_static(features,
         return predictions[ipadded:ipadded+n_rows, jpadded:jpadded+n_cols]
 
 
-def predict_scikit_probas(rw,
+def predict_scikit_probas(features,
+                          mdl,
+                          rw,
                           cw,
                           ipadded,
                           jpadded,
@@ -394,6 +398,8 @@ def predict_scikit_probas(rw,
     A function to get posterior probabilities from Scikit-learn models
 
     Args:
+        features (2d array)
+        mdl (object)
         rw (int)
         cw (int)
         ipadded (int)
@@ -504,6 +510,104 @@ def predict_scikit(pool_iter):
     return mdl.predict(features[ip_[0]:ip_[0]+ip_[1]])
 
 
+def _init_predict_worker(predictor, model, input_image):
+
+    """
+    Loads the model and opens the input image once per worker process
+
+    Args:
+        predictor (object): A picklable copy of a ``classification`` instance.
+        model (object): The model, or None to load ``predictor.input_model``.
+        input_image (str): The image to predict.
+    """
+
+    global _worker_predictor, _worker_model
+
+    if model is None:
+        _worker_model = joblib.load(predictor.input_model)[1]
+    else:
+        _worker_model = model
+
+    predictor.i_info = raster_tools.ropen(input_image)
+
+    _worker_predictor = predictor
+
+
+def _predict_block_worker(block_task):
+
+    """
+    Reads and predicts one block in a worker process
+
+    Args:
+        block_task (tuple): The block number and the block index, given by ``classification._set_n_blocks``.
+
+    Returns:
+        The block task, the predictions (None if the block was skipped)
+    """
+
+    return block_task, _worker_predictor._predict_block(_worker_model, block_task[1])
+
+
+def _init_grid_search_worker(searcher, fold_states, score_kwargs):
+
+    """
+    Loads the fold splits once per worker process
+
+    Args:
+        searcher (object): An instance of ``classification``.
+        fold_states (dict list): The sample attributes of each fold, set by ``split_samples``.
+        score_kwargs (dict): Keyword arguments passed to ``classification._score_fold``.
+    """
+
+    global _worker_searcher, _worker_fold_states, _worker_score_kwargs
+
+    _worker_searcher = searcher
+    _worker_fold_states = fold_states
+    _worker_score_kwargs = score_kwargs
+
+
+def _grid_search_worker(score_task):
+
+    """
+    Trains and scores one (fold, parameter combination) task in a worker process
+
+    Args:
+        score_task (tuple): The fold index, the combination index, and the parameter combination.
+
+    Returns:
+        The fold index, the combination index, the score
+    """
+
+    fold_index, combo_index, param_combo = score_task
+
+    return fold_index, combo_index, _worker_searcher._score_fold(_worker_fold_states[fold_index],
+                                                                 param_combo,
+                                                                 **_worker_score_kwargs)
+
+
+def _best_score_index(fold_scores, maximize=True):
+
+    """
+    Gets the best parameter combination of a grid search
+
+    Only combinations scored on every fold can be the best.
+
+    Args:
+        fold_scores (2d array): The (combination x fold) scores. Fold scores of pruned combinations are NaN.
+        maximize (Optional[bool]): Whether higher scores are better. Default is True.
+
+    Returns:
+        The row index of the best combination.
+    """
+
+    complete_scores = np.where(np.isnan(fold_scores).any(axis=1), np.nan, fold_scores.mean(axis=1))
+
+    if maximize:
+        return np.nanargmax(complete_scores)
+    else:
+        return np.nanargmin(complete_scores)
+
+
 def predict_cv(ci, cs, fn, pc, cr, ig, xy, cinfo, wc):
 
     """
@@ -822,8 +926,10 @@ class Samples(object):
         Split samples for training and testing.
         
         Args:
-            file_name (str or 2d array or DataFrame): Input text file, 2d array, or Pandas DataFrame
-                with samples and labels.
+            file_name (str or 2d array or DataFrame): Input text file, sample store (.npy) file, 2d array,
+                or Pandas DataFrame with samples and labels. A sample store (see ``sample_store.SampleStore``)
+                is memory-mapped, and its sample weights and clear observations are used if
+                ``sample_weight`` and ``clear_observations`` are not given.
             perc_samp (Optional[float]): Percent to sample from all samples. Default is .9. This parameter
                 samples from the entire set of samples, regardless of which class they are in.
 
@@ -902,8 +1008,23 @@ class Samples(object):
 
         self.sample_info_dict = dict()
 
+        sample_store = None
+
         # Open the data samples.
-        if isinstance(self.file_name, str):
+        if is_sample_store(self.file_name):
+
+            # The samples are memory-mapped, not parsed.
+            sample_store = SampleStore(self.file_name)
+
+            self.df = sample_store.to_frame()
+
+            if not isinstance(clear_observations, np.ndarray) and not isinstance(clear_observations, list):
+                clear_observations = sample_store.clear_observations
+
+            if not isinstance(self.sample_weight, np.ndarray) and not isinstance(self.sample_weight, list):
+                self.sample_weight = sample_store.sample_weight
+
+        elif isinstance(self.file_name, str):
 
             self.df = pd.read_csv(self.file_name, sep=',')
 
@@ -951,7 +1072,14 @@ class Samples(object):
             data_position = 0
 
         # Parse the x variables.
-        self.all_samps = self.df.loc[:, self.headers[data_position:]].values
+        if isinstance(sample_store, SampleStore):
+
+            # The x variables and labels are the last
+            #   columns, so slice them without a copy.
+            self.all_samps = sample_store.samples[:, self.df.columns.get_loc(self.headers[data_position]):]
+
+        else:
+            self.all_samps = self.df.loc[:, self.headers[data_position:]].values
 
         if isinstance(clear_observations, np.ndarray) or isinstance(clear_observations, list):
 
@@ -5376,7 +5504,8 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             row_block_size (Optional[int]): The row block size (pixels). Default is 1024.
             col_block_size (Optional[int]): The column block size (pixels). Default is 1024.
             n_jobs (Optional[int]): The number of processors to use for parallel mapping. Default is -1, or all
-                available processors.
+                available processors. For Scikit-learn models, blocks are read and predicted by a pool of
+                ``n_jobs`` worker processes and written, in order, by the calling process.
             n_jobs_vars (Optional[int]): The number of processors to use for parallel band loading.
                 Default is -1, or all available processors.
             gdal_cache (Optional[int]). The GDAL cache (MB). Default is 256.
@@ -5755,6 +5884,59 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                                                      block_rows,
                                                      block_cols)
 
+        if self.write2blocks:
+            out_raster_object = None
+
+        self._check_model_features()
+
+        if self._use_prediction_pool():
+
+            self._predict_parallel(mdl,
+                                   block_indices,
+                                   n_blocks,
+                                   out_raster_object,
+                                   image_top,
+                                   image_left,
+                                   iwo,
+                                   jwo)
+
+        else:
+
+            self._predict_serial(mdl,
+                                 block_indices,
+                                 n_blocks,
+                                 out_raster_object,
+                                 image_top,
+                                 image_left,
+                                 iwo,
+                                 jwo)
+
+        # Close the file.
+        if not self.write2blocks:
+
+            out_raster_object.close_all()
+            out_raster_object = None
+
+        if isinstance(self.mask_background, str) or isinstance(self.mask_background, np.ndarray):
+            self._mask_background()
+
+    def _predict_serial(self,
+                        mdl,
+                        block_indices,
+                        n_blocks,
+                        out_raster_object,
+                        image_top,
+                        image_left,
+                        iwo,
+                        jwo):
+
+        """
+        Predicts blocks one at a time in the calling process
+        """
+
+        # Global variables for parallel processing.
+        global features, predict_samps, indice_pairs
+
         n_block = 1
 
         for block_index in block_indices:
@@ -5767,8 +5949,6 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             jw = block_index[5]
             rw = block_index[6]
             cw = block_index[7]
-            ipadded = block_index[9]
-            jpadded = block_index[10]
 
             logger.info('  Block {:,d} of {:,d} ...'.format(n_block, n_blocks))
 
@@ -5785,38 +5965,16 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                     if n_block > self.block_range[1]:
                         break
 
-                self.output_image = os.path.join(self.dir_name,
-                                                 '{BASE}_{BLOCK:05d}{EXT}'.format(BASE=self.output_image_base,
-                                                                                  BLOCK=n_block,
-                                                                                  EXT=self.output_image_ext))
+                out_raster_object = self._set_block_output(n_block, i, j, n_rows, n_cols, image_top, image_left)
 
-                if os.path.isfile(self.output_image):
+                if out_raster_object is None:
 
-                    if self.overwrite:
-                        os.remove(self.output_image)
-                    else:
-
-                        n_block += 1
-                        continue
-
-                # Update the output image
-                #   information for the
-                #   current block.
-                self.o_info.update_info(top=image_top - (i*self.o_info.cellY),
-                                        left=image_left + (j*self.o_info.cellY),
-                                        rows=n_rows,
-                                        cols=n_cols)
+                    n_block += 1
+                    continue
 
                 iwo = i
                 jwo = j
 
-                out_raster_object = self._set_output_object()
-
-                if not self.predict_probs:
-
-                    out_raster_object.get_band(1)
-                    out_raster_object.fill(0)
-
             n_block += 1
 
             if self.track_blocks and not self.write2blocks:
@@ -5857,85 +6015,12 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                 self.i_info.close()
                 self.open_image = True
 
-            if 'CV' in self.classifier_info['classifier']:
-
-                if len(self.bands2open) != self.model.getVarCount():
-
-                    logger.error('  The number of predictive layers does not match the number of model estimators.')
-                    raise AssertionError
-
-            elif (self.classifier_info['classifier'] not in ['C5', 'Cubist', 'QDA', 'ChainCRF']) and \
-                    ('CV' not in self.classifier_info['classifier']):
-
-                if hasattr(self.model, 'n_features_'):
-
-                    if len(self.bands2open) != self.model.n_features_:
-
-                        logger.error('  The number of predictive layers does not match the number of model estimators.')
-                        raise AssertionError
-
-                if hasattr(self.model, 'base_estimator'):
-
-                    if hasattr(self.model.base_estimator, 'n_features_'):
-
-                        if len(self.bands2open) != self.model.base_estimator.n_features_:
-
-                            logger.error('  The number of predictive layers does not match the number of model estimators.')
-                            raise AssertionError
-
             # Get all the bands for the tile. The shape
             #   of the features is ([rows x columns] x features).
-            features = raster_tools.read(image2open=self.input_image,
-                                         bands2open=self.bands2open,
-                                         i=iw,
-                                         j=jw,
-                                         rows=rw,
-                                         cols=cw,
-                                         predictions=True,
-                                         d_type='float32',
-                                         n_jobs=self.n_jobs_vars)
+            features = self._get_block_features(iw, jw, rw, cw, self.n_jobs_vars)
 
             n_samples = rw * cw
 
-            if self.use_xy:
-
-                # Create x,y coordinates for the block.
-                x_coordinates, y_coordinates = self._create_indices(iw, jw, rw, cw)
-
-                # Append the x,y coordinates to the features.
-                features = np.hstack((features,
-                                      x_coordinates,
-                                      y_coordinates))
-
-            # Reshape the features for CRF models.
-            if self.classifier_info['classifier'] == 'ChainCRF':
-                features = self._transform4crf(p_vars2reshape=features)[0]
-            else:
-
-                # Scale the features.
-                if self.scaled:
-                    features = self.scaler.transform(features)
-
-            if self.additional_layers:
-
-                additional_layers = self._get_additional_layers(iw, jw, rw, cw)
-
-                features = np.hstack((features,
-                                      additional_layers))
-
-            # Add extra predictive
-            #   time series features.
-            if self._add_features:
-
-                if not self.ts_indices:
-
-                    if self.use_xy:
-                        self.ts_indices = np.array(range(0, features.shape[1]-2), dtype='int64')
-
-                features = self.feature_object.apply_features(X=features,
-                                                              ts_indices=self.ts_indices,
-                                                              append_features=self.append_features)
-
             if 'CV' in self.classifier_info['classifier']:
 
                 if self.classifier_info['classifier'] == 'CVMLP':
@@ -6011,185 +6096,465 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             else:
 
                 # SCIKIT-LEARN MODELS
+                self._write_block_predictions(out_raster_object,
+                                              self._predict_block_scikit(mdl, features, block_index),
+                                              i-iwo,
+                                              j-jwo)
 
-                if self.predict_probs or self.relax_probabilities:
+            features = None
 
-                    # --------------------------------------
-                    # Posterior probability label relaxation
-                    # --------------------------------------
+            # Close the block file.
+            if self.write2blocks:
 
-                    if self.predict_probs:
+                out_raster_object.close_all()
+                out_raster_object = None
 
-                        # Predict class conditional probabilities.
-                        predicted = predict_scikit_probas(rw,
-                                                          cw,
-                                                          ipadded,
-                                                          jpadded,
-                                                          n_rows,
-                                                          n_cols,
-                                                          self.morphology,
-                                                          self.do_not_morph,
-                                                          self.relax_probabilities,
-                                                          self.plr_matrix,
-                                                          self.plr_window_size,
-                                                          self.plr_iterations,
-                                                          self.predict_probs,
-                                                          self.d_type)
+            if self.track_blocks and not self.write2blocks:
+                self._record_block(n_block)
+
+    def _predict_parallel(self,
+                          mdl,
+                          block_indices,
+                          n_blocks,
+                          out_raster_object,
+                          image_top,
+                          image_left,
+                          iwo,
+                          jwo):
 
-                        for cl in range(0, self.n_classes):
+        """
+        Predicts blocks of Scikit-learn models with a pool of worker processes
 
-                            out_raster_object.get_band(cl+1)
+        Each worker loads the model once, then reads and predicts its own blocks. The predicted
+        tiles are streamed back, in block order, to the calling process, which is the only writer.
+        """
 
-                            out_raster_object.write_array(predicted[cl],
-                                                          j=j-jwo,
-                                                          i=i-iwo)
+        block_tasks = list()
 
-                            out_raster_object.close_band()
+        # Get the blocks to predict. Block numbering
+        #   follows ``_predict_serial`` so that block
+        #   records and block files can be resumed
+        #   by either method.
+        for n_block, block_index in enumerate(block_indices, start=1):
 
-                    else:
+            if self.write2blocks:
 
-                        # Write the predictions to file.
-                        out_raster_object.write_array(predict_scikit_probas(rw,
-                                                                            cw,
-                                                                            ipadded,
-                                                                            jpadded,
-                                                                            n_rows,
-                                                                            n_cols,
-                                                                            self.morphology,
-                                                                            self.do_not_morph,
-                                                                            self.relax_probabilities,
-                                                                            self.plr_matrix,
-                                                                            self.plr_window_size,
-                                                                            self.plr_iterations,
-                                                                            self.predict_probs,
-                                                                            self.d_type),
-                                                      j=j-jwo,
-                                                      i=i-iwo)
+                if isinstance(self.block_range, list) or isinstance(self.block_range, tuple):
+
+                    if n_block < self.block_range[0]:
+                        continue
+
+                    if n_block > self.block_range[1]:
+                        break
+
+                if os.path.isfile(self._get_block_name(n_block)) and not self.overwrite:
+                    continue
+
+            elif self.track_blocks:
+
+                if n_block + 1 in self.record_list:
+
+                    logger.info('  Skipping block {:,d} ...'.format(n_block))
+                    continue
+
+            block_tasks.append((n_block, block_index))
+
+        # The workers read the image themselves.
+        if not self.open_image:
+
+            self.i_info.close()
+            self.open_image = True
+
+        # Models saved to file are loaded by each worker.
+        model = None if isinstance(self.input_model, str) else self.model
+
+        pool = multi.Pool(processes=self.n_jobs,
+                          initializer=_init_predict_worker,
+                          initargs=(self._worker_copy(), model, self.input_image))
+
+        try:
+
+            for block_task, predicted in pool.imap(_predict_block_worker, block_tasks):
+
+                n_block, block_index = block_task
+
+                i = block_index[0]
+                j = block_index[1]
+                n_rows = block_index[2]
+                n_cols = block_index[3]
+
+                logger.info('  Block {:,d} of {:,d} ...'.format(n_block, n_blocks))
+
+                if self.write2blocks:
+
+                    out_raster_object = self._set_block_output(n_block, i, j, n_rows, n_cols, image_top, image_left)
+
+                    block_iwo = i
+                    block_jwo = j
 
                 else:
 
-                    # Get chunks for parallel processing.
-                    # indice_pairs = list()
-                    #
-                    # for i_ in range(0, n_samples, self.chunk_size):
-                    #
-                    #     n_rows_ = self._num_rows_cols(i_, self.chunk_size, n_samples)
-                    #     indice_pairs.append([i_, n_rows_])
-                    #
-                    # if (self.n_jobs != 0) and (self.n_jobs != 1):
-                    #
-                    #     # Make the predictions and convert to a NumPy array.
-                    #     if isinstance(self.input_model, str):
-                    #
-                    #         if platform.system() == 'Windows':
-                    #
-                    #             predicted = joblib.Parallel(n_jobs=self.n_jobs,
-                    #                                         max_nbytes=None)(joblib.delayed(predict_scikit_win)(features[ip[0]:ip[0]+ip[1]],
-                    #                                                                                             self.input_model)
-                    #                                                          for ip in indice_pairs)
-                    #
-                    #         else:
-                    #
-                    #             mdl = self.load(self.input_model)[1]
-                    #
-                    #             pool = multi.Pool(processes=self.n_jobs)
-                    #
-                    #             predicted = pool.map(predict_scikit, range(0, len(indice_pairs)))
-                    #
-                    #             pool.close()
-                    #             del pool
-                    #
-                    #     else:
-                    #
-                    #         mdl = self.model
-                    #         predicted = [predict_scikit(ip) for ip in range(0, len(indice_pairs))]
-                    #
-                    # else:
+                    block_iwo = iwo
+                    block_jwo = jwo
 
-                    # Make the predictions and convert to a NumPy array.
-                    # predicted = [predict_scikit(ip) for ip in range(0, len(indice_pairs))]
+                if predicted is not None:
 
-                    # Write the predictions to file.
-                    # out_raster_object.write_array(np.array(list(itertools.chain.from_iterable(predicted))).reshape(n_rows,
-                    #                                                                                                n_cols),
-                    #                               j=j-jwo,
-                    #                               i=i-iwo)
+                    self._write_block_predictions(out_raster_object,
+                                                  predicted,
+                                                  i-block_iwo,
+                                                  j-block_jwo)
 
-                    # Write the predictions to file.
-                    if self.morphology:
+                # Close the block file.
+                if self.write2blocks:
+
+                    out_raster_object.close_all()
+                    out_raster_object = None
 
-                        if isinstance(self.do_not_morph, list):
+                elif self.track_blocks and (predicted is not None):
+                    self._record_block(n_block + 1)
 
-                            predictions = np.uint8(mdl.predict(features).reshape(rw, cw))
+            pool.close()
 
-                            predictions_copy = predictions[ipadded:ipadded+n_rows,
-                                                           jpadded:jpadded+n_cols].copy()
+        except:
 
-                            predictions = pymorph.closerec(pymorph.closerec(predictions,
-                                                                            Bdil=pymorph.secross(r=3),
-                                                                            Bc=pymorph.secross(r=1)),
-                                                           Bdil=pymorph.secross(r=2),
-                                                           Bc=pymorph.secross(r=1))[ipadded:ipadded+n_rows,
-                                                                                    jpadded:jpadded+n_cols]
+            pool.terminate()
+            raise
 
-                            for do_not_morph_value in self.do_not_morph:
-                                predictions[predictions_copy == do_not_morph_value] = do_not_morph_value
+        finally:
+            pool.join()
 
-                            del predictions_copy
+    def _worker_copy(self):
 
-                            out_raster_object.write_array(predictions,
-                                                          j=j-jwo,
-                                                          i=i-iwo)
+        """
+        Gets a copy of the instance that can be sent to worker processes
 
-                            del predictions
+        Returns:
+            A ``classification`` copy without open datasets or the model
+        """
 
-                        else:
+        predictor = copy(self)
 
-                            out_raster_object.write_array(
-                                pymorph.closerec(pymorph.closerec(np.uint8(mdl.predict(features).reshape(rw, cw)),
-                                                                  Bdil=pymorph.secross(r=3),
-                                                                  Bc=pymorph.secross(r=1)),
-                                                 Bdil=pymorph.secross(r=2),
-                                                 Bc=pymorph.secross(r=1))[ipadded:ipadded+n_rows,
-                                                                          jpadded:jpadded+n_cols],
-                                j=j-jwo,
-                                i=i-iwo)
+        predictor.i_info = None
+        predictor.o_info = None
+        predictor.model = None
 
-                    else:
+        return predictor
 
-                        np_dtype = raster_tools.STORAGE_DICT_NUMPY[self.d_type]
+    def _use_prediction_pool(self):
 
-                        out_raster_object.write_array(np_dtype(mdl.predict(features).reshape(n_rows,
-                                                                                             n_cols)),
-                                                      j=j-jwo,
-                                                      i=i-iwo)
+        """Checks whether blocks can be predicted with a pool of worker processes"""
 
-            features = None
+        if self.n_jobs in [0, 1]:
+            return False
 
-            # Close the block file.
-            if self.write2blocks:
+        if ('CV' in self.classifier_info['classifier']) or \
+                (self.classifier_info['classifier'] in ['C5', 'Cubist', 'ChainCRF']):
 
-                out_raster_object.close_all()
-                out_raster_object = None
+            return False
 
-            if self.track_blocks and not self.write2blocks:
+        return True
 
-                self.record_list.append(n_block)
+    def _check_model_features(self):
 
-                if os.path.isfile(self.record_keeping):
-                    os.remove(self.record_keeping)
+        """Checks that the number of predictive layers matches the model"""
 
-                self.dump(self.record_list,
-                          self.record_keeping)
+        if 'CV' in self.classifier_info['classifier']:
 
-        # Close the file.
-        if not self.write2blocks:
+            if len(self.bands2open) != self.model.getVarCount():
 
-            out_raster_object.close_all()
-            out_raster_object = None
+                logger.error('  The number of predictive layers does not match the number of model estimators.')
+                raise AssertionError
 
-        if isinstance(self.mask_background, str) or isinstance(self.mask_background, np.ndarray):
-            self._mask_background()
+        elif (self.classifier_info['classifier'] not in ['C5', 'Cubist', 'QDA', 'ChainCRF']) and \
+                ('CV' not in self.classifier_info['classifier']):
+
+            if hasattr(self.model, 'n_features_'):
+
+                if len(self.bands2open) != self.model.n_features_:
+
+                    logger.error('  The number of predictive layers does not match the number of model estimators.')
+                    raise AssertionError
+
+            if hasattr(self.model, 'base_estimator'):
+
+                if hasattr(self.model.base_estimator, 'n_features_'):
+
+                    if len(self.bands2open) != self.model.base_estimator.n_features_:
+
+                        logger.error('  The number of predictive layers does not match the number of model estimators.')
+                        raise AssertionError
+
+    def _get_block_features(self, iw, jw, rw, cw, n_jobs_vars, i_info=None):
+
+        """
+        Gets the predictive features of one block
+
+        Args:
+            iw (int): The starting row position.
+            jw (int): The starting column position.
+            rw (int): The number of rows.
+            cw (int): The number of columns.
+            n_jobs_vars (int): The number of processors to use for parallel band loading.
+            i_info (Optional[object]): An open instance of ``raster_tools.ropen`` to read from. Default is None,
+                or open ``input_image``.
+
+        Returns:
+            The features, shaped as ([rows x columns] x features).
+        """
+
+        if isinstance(i_info, raster_tools.ropen):
+            read_source = dict(i_info=i_info)
+        else:
+            read_source = dict(image2open=self.input_image)
+
+        # Get all the bands for the tile. The shape
+        #   of the features is ([rows x columns] x features).
+        features = raster_tools.read(bands2open=self.bands2open,
+                                     i=iw,
+                                     j=jw,
+                                     rows=rw,
+                                     cols=cw,
+                                     predictions=True,
+                                     d_type='float32',
+                                     n_jobs=n_jobs_vars,
+                                     **read_source)
+
+        if self.use_xy:
+
+            # Create x,y coordinates for the block.
+            x_coordinates, y_coordinates = self._create_indices(iw, jw, rw, cw)
+
+            # Append the x,y coordinates to the features.
+            features = np.hstack((features,
+                                  x_coordinates,
+                                  y_coordinates))
+
+        # Reshape the features for CRF models.
+        if self.classifier_info['classifier'] == 'ChainCRF':
+            features = self._transform4crf(p_vars2reshape=features)[0]
+        else:
+
+            # Scale the features.
+            if self.scaled:
+                features = self.scaler.transform(features)
+
+        if self.additional_layers:
+
+            additional_layers = self._get_additional_layers(iw, jw, rw, cw)
+
+            features = np.hstack((features,
+                                  additional_layers))
+
+        # Add extra predictive
+        #   time series features.
+        if self._add_features:
+
+            if not self.ts_indices:
+
+                if self.use_xy:
+                    self.ts_indices = np.array(range(0, features.shape[1]-2), dtype='int64')
+
+            features = self.feature_object.apply_features(X=features,
+                                                          ts_indices=self.ts_indices,
+                                                          append_features=self.append_features)
+
+        return features
+
+    def _predict_block(self, mdl, block_index):
+
+        """
+        Reads and predicts one block of a Scikit-learn model
+
+        Args:
+            mdl (object): The model.
+            block_index (tuple): The block index, given by ``_set_n_blocks``.
+
+        Returns:
+            The predictions, or None if the block has no data in ``band_check``.
+        """
+
+        i = block_index[0]
+        j = block_index[1]
+        n_rows = block_index[2]
+        n_cols = block_index[3]
+        iw = block_index[4]
+        jw = block_index[5]
+        rw = block_index[6]
+        cw = block_index[7]
+
+        # Check for zeros in the block. The worker
+        #   opened ``i_info`` once, in ``_init_predict_worker``.
+        if self.band_check != -1:
+
+            max_check = self.i_info.read(bands2open=self.band_check,
+                                         i=i,
+                                         j=j,
+                                         rows=n_rows,
+                                         cols=n_cols).max()
+
+            if max_check == 0:
+                return None
+
+        # Bands are read serially inside
+        #   worker processes.
+        features = self._get_block_features(iw, jw, rw, cw, 1, i_info=self.i_info)
+
+        return self._predict_block_scikit(mdl, features, block_index)
+
+    def _predict_block_scikit(self, mdl, features, block_index):
+
+        """
+        Predicts one block of features with a Scikit-learn model
+
+        Args:
+            mdl (object): The model.
+            features (2d array): The features, shaped as ([rows x columns] x features).
+            block_index (tuple): The block index, given by ``_set_n_blocks``.
+
+        Returns:
+            The predictions, shaped as [rows x columns], or [classes x rows x columns] if ``predict_probs``.
+        """
+
+        n_rows = block_index[2]
+        n_cols = block_index[3]
+        rw = block_index[6]
+        cw = block_index[7]
+        ipadded = block_index[9]
+        jpadded = block_index[10]
+
+        if self.predict_probs or self.relax_probabilities:
+
+            # --------------------------------------
+            # Posterior probability label relaxation
+            # --------------------------------------
+
+            return predict_scikit_probas(features,
+                                         mdl,
+                                         rw,
+                                         cw,
+                                         ipadded,
+                                         jpadded,
+                                         n_rows,
+                                         n_cols,
+                                         self.morphology,
+                                         self.do_not_morph,
+                                         self.relax_probabilities,
+                                         self.plr_matrix,
+                                         self.plr_window_size,
+                                         self.plr_iterations,
+                                         self.predict_probs,
+                                         self.d_type)
+
+        elif self.morphology:
+
+            predictions = np.uint8(mdl.predict(features).reshape(rw, cw))
+
+            if isinstance(self.do_not_morph, list):
+                predictions_copy = predictions[ipadded:ipadded+n_rows, jpadded:jpadded+n_cols].copy()
+
+            predictions = pymorph.closerec(pymorph.closerec(predictions,
+                                                            Bdil=pymorph.secross(r=3),
+                                                            Bc=pymorph.secross(r=1)),
+                                           Bdil=pymorph.secross(r=2),
+                                           Bc=pymorph.secross(r=1))[ipadded:ipadded+n_rows,
+                                                                    jpadded:jpadded+n_cols]
+
+            if isinstance(self.do_not_morph, list):
+
+                for do_not_morph_value in self.do_not_morph:
+                    predictions[predictions_copy == do_not_morph_value] = do_not_morph_value
+
+            return predictions
+
+        else:
+
+            np_dtype = raster_tools.STORAGE_DICT_NUMPY[self.d_type]
+
+            return np_dtype(mdl.predict(features).reshape(n_rows, n_cols))
+
+    def _write_block_predictions(self, out_raster_object, predicted, i, j):
+
+        """
+        Writes the predictions of one block
+
+        Args:
+            out_raster_object (object): An instance of ``raster_tools.create_raster``.
+            predicted (ndarray): The predictions, given by ``_predict_block_scikit``.
+            i (int): The starting row position to write to.
+            j (int): The starting column position to write to.
+        """
+
+        if self.predict_probs:
+
+            for cl in range(0, self.n_classes):
+
+                out_raster_object.write_array(predicted[cl],
+                                              j=j,
+                                              i=i,
+                                              band=cl+1)
+
+        else:
+
+            out_raster_object.write_array(predicted,
+                                          j=j,
+                                          i=i)
+
+    def _get_block_name(self, n_block):
+
+        """Gets the output file name of one block for ``write2blocks``"""
+
+        return os.path.join(self.dir_name,
+                            '{BASE}_{BLOCK:05d}{EXT}'.format(BASE=self.output_image_base,
+                                                             BLOCK=n_block,
+                                                             EXT=self.output_image_ext))
+
+    def _set_block_output(self, n_block, i, j, n_rows, n_cols, image_top, image_left):
+
+        """
+        Creates the output file of one block for ``write2blocks``
+
+        Returns:
+            An instance of ``raster_tools.create_raster``, or None if the block file exists and
+            ``overwrite`` is False.
+        """
+
+        self.output_image = self._get_block_name(n_block)
+
+        if os.path.isfile(self.output_image):
+
+            if self.overwrite:
+                os.remove(self.output_image)
+            else:
+                return None
+
+        # Update the output image
+        #   information for the
+        #   current block.
+        self.o_info.update_info(top=image_top - (i*self.o_info.cellY),
+                                left=image_left + (j*self.o_info.cellY),
+                                rows=n_rows,
+                                cols=n_cols)
+
+        out_raster_object = self._set_output_object()
+
+        if not self.predict_probs:
+
+            out_raster_object.get_band(1)
+            out_raster_object.fill(0)
+
+        return out_raster_object
+
+    def _record_block(self, n_block):
+
+        """Adds a block to the record of processed blocks"""
+
+        self.record_list.append(n_block)
+
+        if os.path.isfile(self.record_keeping):
+            os.remove(self.record_keeping)
+
+        self.dump(self.record_list,
+                  self.record_keeping)
 
     def _set_indexing(self, start_i, start_j, rows, cols, iwo, jwo):
 
@@ -6284,7 +6649,13 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                       block_rows,
                       block_cols):
 
-        if self.relax_probabilities or self.morphology:
+        if self.relax_probabilities:
+
+            # Each relaxation iteration reaches
+            #   one half window further.
+            pad = int(self.plr_window_size / 2.0) * max(1, self.plr_iterations)
+
+        elif self.morphology:
             pad = int(self.plr_window_size / 2.0)
         else:
             pad = 0
@@ -7082,11 +7453,16 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
     def grid_search(self, classifier_name, classifier_parameters, file_name, k_folds=3,
                     perc_samp=.5, ignore_feas=[], use_xy=False, classes2remove=[],
                     method='overall', metric='accuracy', f1_class=0, stratified=False, spacing=1000.,
-                    output_file=None, calibrate_proba=False):
+                    output_file=None, calibrate_proba=False, n_jobs=1, halving_factor=None):
 
         """
         Classifier parameter grid search
 
+        The fold splits are built once. Each (fold, parameter combination) task is then trained and scored,
+        in a process pool if ``n_jobs`` > 1. With ``halving_factor``, the folds are used as successive halving
+        rounds: every combination is scored on the first fold, and only the best 1 / ``halving_factor`` of the
+        combinations are scored on each following fold.
+
         Args:
             classifier_name (str): The classifier to optimize.
             classifier_parameters (dict): The classifier parameters.
@@ -7104,9 +7480,13 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             stratified (Optional[bool]):
             spacing (Optional[float]):
             output_file (Optional[str]):
+            calibrate_proba (Optional[bool]): Whether to calibrate the model probabilities. Default is False.
+            n_jobs (Optional[int]): The number of parallel processes. Default is 1.
+            halving_factor (Optional[int]): The successive halving factor. Default is None, or score every
+                combination on every fold.
 
         Returns:
-            DataFrame with scores.
+            DataFrame with scores. Fold scores of pruned combinations are NaN.
         """
 
         regressors = ['Cubist', 'RFR', 'ABR', 'Bag_DTR', 'EX_RFR', 'EX_DTR', 'DTR']
@@ -7126,6 +7506,11 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             logger.error('  Overall accuracy is the only option with discrete classifiers.')
             raise NameError
 
+        if isinstance(halving_factor, int) and (halving_factor < 2):
+
+            logger.error('  The halving factor must be greater than 1.')
+            raise ValueError
+
         if classifier_name in ['C5', 'Cubist']:
 
             if 'R_installed' not in globals():
@@ -7138,73 +7523,131 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                 logger.warning('  R and rpy2 must be installed to use C5 or Cubist.')
                 return
 
+            # R models cannot be shared with worker processes.
+            n_jobs = 1
+
         if classifier_name in regressors:
             discrete = False
         else:
             discrete = True
 
+        # Higher scores are better.
+        maximize = metric in ['accuracy', 'r_squared'] or (method == 'f1')
+
         score_label = metric.upper()
 
         param_order = list(classifier_parameters)
+        param_combos = list(itertools.product(*[classifier_parameters[param_key] for param_key in param_order]))
 
         df_param_headers = '-'.join(param_order)
         df_fold_headers = ('F' + '-F'.join(list(map(str, range(1, k_folds+1))))).split('-')
 
-        # Setup the output scores table.
-        df = pd.DataFrame(columns=df_fold_headers)
-        df[df_param_headers] = list(itertools.product(*itervalues(classifier_parameters)))
-
         # Open the weights file.
         lc_weights = file_name.replace('.txt', '_w.txt')
 
-        if os.path.isfile(lc_weights):
+        if (lc_weights != file_name) and os.path.isfile(lc_weights):
             weights = self.load(lc_weights)
         else:
             weights = None
 
-        for k_fold in range(1, k_folds+1):
+        # Splitting and scoring set the sample
+        #   attributes of each fold, so the
+        #   instance is restored after the search.
+        search_state = self.__dict__.copy()
 
-            logger.info('  Fold {:d} of {:d} ...'.format(k_fold, k_folds))
+        # Build every fold split once.
+        fold_states = list()
+
+        for k_fold in range(1, k_folds+1):
 
             self.split_samples(file_name, perc_samp_each=perc_samp, ignore_feas=ignore_feas,
                                use_xy=use_xy, classes2remove=classes2remove, stratified=stratified,
                                spacing=spacing, sample_weight=weights)
 
-            if classifier_name in ['C5', 'Cubist']:
+            fold_states.append(dict([(state_key, state_value) for state_key, state_value in viewitems(self.__dict__)
+                                     if state_key not in ['df', 'all_samps']]))
 
-                predict_samps = ro.r.matrix(self.p_vars, nrow=self.n_samps, ncol=self.n_feas)
-                predict_samps.colnames = StrVector(self.headers[:-1])
+        score_kwargs = dict(classifier_name=classifier_name,
+                            param_order=param_order,
+                            method=method,
+                            metric=metric,
+                            f1_class=f1_class,
+                            discrete=discrete,
+                            calibrate_proba=calibrate_proba)
 
-            # Iterate over all possible combinations.
-            for param_combo in list(itertools.product(*itervalues(classifier_parameters))):
+        # The scores are written by (combination, fold) index.
+        fold_scores = np.empty((len(param_combos), k_folds), dtype='float64')
+        fold_scores.fill(np.nan)
 
-                # Set the current parameters.
-                current_combo = dict(zip(param_order, param_combo))
+        combo_indices = np.arange(len(param_combos))
+
+        if n_jobs == -1:
+            n_jobs = multi.cpu_count()
+
+        if n_jobs in [0, 1]:
+            _init_grid_search_worker(self, fold_states, score_kwargs)
+        else:
+
+            # Forked workers share the fold splits.
+            pool = multi.Pool(processes=n_jobs,
+                              initializer=_init_grid_search_worker,
+                              initargs=(self, fold_states, score_kwargs))
+
+        try:
 
-                # Add the classifier name to the dictionary.
-                current_combo['classifier'] = classifier_name
+            for k_fold in range(0, k_folds):
 
-                if classifier_name in ['C5', 'Cubist']:
-                    self.construct_r_model(classifier_info=current_combo)
+                logger.info('  Fold {:d} of {:d}, {:,d} parameter combinations ...'.format(k_fold+1,
+                                                                                            k_folds,
+                                                                                            len(combo_indices)))
+
+                score_tasks = [(k_fold, combo_index, param_combos[combo_index]) for combo_index in combo_indices]
+
+                if n_jobs in [0, 1]:
+                    score_results = map(_grid_search_worker, score_tasks)
                 else:
-                    self.construct_model(classifier_info=current_combo,
-                                         calibrate_proba=calibrate_proba)
+                    score_results = pool.imap_unordered(_grid_search_worker, score_tasks)
 
-                # Get the accuracy
-                self.test_accuracy(discrete=discrete)
+                for fold_index, combo_index, fold_score in score_results:
+                    fold_scores[combo_index, fold_index] = fold_score
 
-                if method == 'overall':
-                    df.loc[df[df_param_headers] == param_combo, 'F{:d}'.format(k_fold)] = getattr(self.emat, metric)
+                # Prune the worst combinations.
+                if isinstance(halving_factor, int) and (k_fold < k_folds - 1) and (len(combo_indices) > 1):
 
-                elif method == 'f1':
-                    df.loc[df[df_param_headers] == param_combo, 'F{:d}'.format(k_fold)] = self.emat.f_scores[f1_class]
+                    mean_scores = np.nanmean(fold_scores[combo_indices, :k_fold+1], axis=1)
 
-        df[score_label] = df[df_fold_headers].mean(axis=1)
+                    n_keep = max(1, int(np.ceil(len(combo_indices) / float(halving_factor))))
 
-        if metric in ['accuracy', 'r_squared']:
-            best_score_index = np.argmax(df[score_label].values)
-        else:
-            best_score_index = np.argmin(df[score_label].values)
+                    # Rank the best first, with NaNs last.
+                    rank_scores = np.where(np.isnan(mean_scores), -np.inf, mean_scores if maximize else -mean_scores)
+
+                    combo_indices = np.sort(combo_indices[np.argsort(-rank_scores, kind='mergesort')[:n_keep]])
+
+            if n_jobs not in [0, 1]:
+                pool.close()
+
+        except:
+
+            if n_jobs not in [0, 1]:
+                pool.terminate()
+
+            raise
+
+        finally:
+
+            if n_jobs not in [0, 1]:
+                pool.join()
+
+            self.__dict__.clear()
+            self.__dict__.update(search_state)
+
+        # Setup the output scores table.
+        df = pd.DataFrame(fold_scores, columns=df_fold_headers)
+        df[df_param_headers] = param_combos
+
+        df[score_label] = np.nanmean(fold_scores, axis=1)
+
+        best_score_index = _best_score_index(fold_scores, maximize=maximize)
 
         logger.info('  Best {} score: {:f}'.format(metric, df[score_label].values[best_score_index]))
 
@@ -7219,6 +7662,52 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
 
         return df
 
+    def _score_fold(self, fold_state, param_combo, classifier_name, param_order, method, metric,
+                    f1_class, discrete, calibrate_proba):
+
+        """
+        Trains and scores one parameter combination on one fold split
+
+        Args:
+            fold_state (dict): The sample attributes of the fold, set by ``split_samples``.
+            param_combo (tuple): The parameter values, in ``param_order`` order.
+            classifier_name (str): See ``grid_search``.
+            param_order (str list): The parameter names.
+            method (str): See ``grid_search``.
+            metric (str): See ``grid_search``.
+            f1_class (int): See ``grid_search``.
+            discrete (bool): Whether the labels are discrete.
+            calibrate_proba (bool): See ``grid_search``.
+
+        Returns:
+            The score, as a float.
+        """
+
+        self.__dict__.update(fold_state)
+
+        # Set the current parameters.
+        current_combo = dict(zip(param_order, param_combo))
+
+        # Add the classifier name to the dictionary.
+        current_combo['classifier'] = classifier_name
+
+        if classifier_name in ['C5', 'Cubist']:
+            self.construct_r_model(classifier_info=current_combo)
+        else:
+
+            self.construct_model(classifier_info=current_combo,
+                                 calibrate_proba=calibrate_proba,
+                                 var_imp=False,
+                                 be_quiet=True)
+
+        # Get the accuracy
+        self.test_accuracy(discrete=discrete, be_quiet=True)
+
+        if method == 'f1':
+            return float(self.emat.f_scores[f1_class])
+        else:
+            return float(getattr(self.emat, metric))
+
     def optimize_parameters(self,
                             file_name,
                             classifier_info={'classifier': 'RF'},
@@ -7247,7 +7736,9 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                             stratified=False,
                             spacing=1000.,
                             calibrate_proba=False,
-                            output_file=None):
+                            output_file=None,
+                            n_jobs=1,
+                            halving_factor=None):
 
         """
         Finds the optimal parameters for a classifier by training and testing a range of classifier parameters
@@ -7276,6 +7767,9 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
             stratified (Optional[bool]):
             spacing (Optional[float]):
             output_file (Optional[str]):
+            n_jobs (Optional[int]): The number of parallel grid search processes. Default is 1.
+            halving_factor (Optional[int]): The successive halving factor of the grid search. Default is None.
+                See ``grid_search``.
 
         Returns:
             `Pandas DataFrame` when classifier_info['classifier'] == 'C5',
@@ -7441,7 +7935,9 @@ class classification(EndMembers, ModelOptions, PickleIt, Preprocessing, Samples,
                                     stratified=stratified,
                                     spacing=spacing,
                                     output_file=output_file,
-                                    calibrate_proba=calibrate_proba)
+                                    calibrate_proba=calibrate_proba,
+                                    n_jobs=n_jobs,
+                                    halving_factor=halving_factor)
 
         elif (method == 'overall') and (classifier_info['classifier'] not in core_classifiers):
 
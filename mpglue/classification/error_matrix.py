@@ -11,12 +11,13 @@ from builtins import int
 
 import os
 import time
-import logging
 from copy import copy
 from six import string_types
 import platform
 
-from .. import raster_tools
+from .. import raster_tools, vector_tools
+from ..errors import logger
+from .change import pair_counts, merge_pair_counts, class_indices
 
 try:
     import numpy as np
@@ -37,7 +38,7 @@ except ImportError:
 
 # Scikit-image
 try:
-    from skimage.measure import label, regionprops
+    from skimage.measure import label
 except ImportError:
     raise ImportError('Scikit-image must be installed')
 
@@ -56,6 +57,115 @@ import warnings
 warnings.filterwarnings('ignore')
 
 
+def error_matrix_counts(predicted, observed, class_list):
+
+    """
+    Counts predicted and observed label pairs into an error matrix
+
+    Args:
+        predicted (1d array): The predicted labels.
+        observed (1d array): The observed labels.
+        class_list (list): The sorted classes of the matrix. Pairs of other classes are not counted.
+
+    Returns:
+        The (predicted x observed) error matrix, as an int64 array.
+    """
+
+    classes = np.array(class_list, dtype='int64')
+
+    n_classes = len(classes)
+
+    predicted_index, predicted_valid = class_indices(np.int64(predicted), classes)
+    observed_index, observed_valid = class_indices(np.int64(observed), classes)
+
+    valid = predicted_valid & observed_valid
+
+    e_matrix = np.bincount(predicted_index[valid] * n_classes + observed_index[valid],
+                           minlength=n_classes*n_classes)
+
+    return np.int64(e_matrix).reshape(n_classes, n_classes)
+
+
+def _error_matrix_block(im, ignore_values=None):
+
+    """Gets the predicted and observed label pair counts of a block"""
+
+    predicted = im[0].ravel()
+    observed = im[1].ravel()
+
+    if ignore_values:
+
+        valid = ~(np.isin(predicted, ignore_values) | np.isin(observed, ignore_values))
+
+        predicted = predicted[valid]
+        observed = observed[valid]
+
+    if predicted.shape[0] == 0:
+
+        empty = np.array([], dtype='int64')
+
+        return None, (empty, empty, empty)
+
+    return None, pair_counts(predicted, observed)
+
+
+def _kappa(obsv, weights=None, allow_off_by_one=False):
+
+    """
+    Calculates kappa from an (observed x predicted) count matrix
+
+    Args:
+        obsv (2d array): The sample counts, with observed rows and predicted columns.
+        weights (Optional[str or numpy array]): See ``error_matrix.kappa``.
+        allow_off_by_one (Optional[bool]): See ``error_matrix.kappa``.
+
+    Returns:
+        The kappa score, as a float.
+    """
+
+    num_ratings = obsv.shape[0]
+    num_scored_items = float(obsv.sum())
+
+    # Build weight array if weren't passed one
+    if isinstance(weights, string_types):
+        wt_scheme = weights
+        weights = None
+    else:
+        wt_scheme = ''
+
+    if weights is None:
+
+        diff = np.abs(np.subtract.outer(np.arange(num_ratings), np.arange(num_ratings)))
+
+        if allow_off_by_one:
+            diff = np.where(diff > 0, diff - 1, 0)
+
+        if wt_scheme == 'linear':
+            weights = np.float64(diff)
+        elif wt_scheme == 'quadratic':
+            weights = np.float64(diff ** 2)
+        elif not wt_scheme:  # unweighted
+            weights = np.float64(diff > 0)
+        else:
+            raise ValueError(('Invalid weight scheme specified for ' +
+                              'kappa: {}').format(wt_scheme))
+
+    hist_true = obsv.sum(axis=1) / num_scored_items
+    hist_pred = obsv.sum(axis=0) / num_scored_items
+    expected = np.outer(hist_true, hist_pred)
+
+    # Normalize observed array
+    obsv = obsv / num_scored_items
+
+    # If all weights are zero, that means no disagreements matter.
+    kappa_score = 1.
+
+    if np.count_nonzero(weights):
+        kappa_score -= (np.sum(weights * obsv) / np.sum(weights * expected))
+
+    return kappa_score
+
+
 class error_matrix(object):
 
     """
@@ -98,6 +208,9 @@ class error_matrix(object):
         >>> # Get an accuracy report from a text file
         >>> emat.get_stats(po_text='/test_samples.txt')
         >>>
+        >>> # Get an accuracy report from a map and a reference map, block by block
+        >>> emat.get_stats_raster('/predictions.tif', reference_image='/reference.tif')
+        >>>
         >>> # Write statistics to file
         >>> emat.write_stats('/accuracy_report.txt')
 
@@ -169,24 +282,44 @@ class error_matrix(object):
                   discrete=True,
                   e_matrix=None):
 
+        """
+        Gets accuracy statistics from predicted and observed labels, or from an error matrix
+
+        Args:
+            po_text (Optional[str]): Predicted and observed labels as a text file. Default is None.
+            po_array (Optional[ndarray]): Predicted and observed labels as an array. Default is None.
+            header (Optional[bool]): Whether ``po_text`` or ``po_array`` contains a header. Default is False.
+            class_list (Optional[list]): The classes of the error matrix. Default is None, or the classes
+                found in the labels, or 1 to n classes when ``e_matrix`` is given. Labels of other classes
+                are not counted.
+            discrete (Optional[bool]): Whether the labels are discrete classes. Default is True.
+            e_matrix (Optional[ndarray]): A (predicted x observed) error matrix. Default is None.
+        """
+
         self.discrete = discrete
 
         if isinstance(e_matrix, np.ndarray):
 
-            self.e_matrix = e_matrix
+            self.e_matrix = np.int64(e_matrix)
 
             self.n_classes = self.e_matrix.shape[0]
-            self.class_list = np.arange(1, self.n_classes+1)
-            self.n_samples = self.e_matrix.sum()
 
-            # Reverse the error matrix
-            self.X, self.y = self.error_matrix2xy()
+            if class_list is None:
+                self.class_list = list(range(1, self.n_classes+1))
+            else:
+                self.class_list = sorted(class_list)
+
+            self.n_samps = int(self.e_matrix.sum())
+
+            # Regression statistics need the samples.
+            if not self.discrete:
+                self.X, self.y = self.error_matrix2xy()
 
         else:
 
             if isinstance(po_text, str):
 
-                samples = np.genfromtxt(po_text, delimiter=',').astype(int)
+                samples = np.genfromtxt(po_text, delimiter=',')
 
             else:
 
@@ -201,69 +334,38 @@ class error_matrix(object):
                 hdr_idx = 0
 
             # observed (true)
-            self.y = np.int16(np.float32(np.asarray(samples[hdr_idx:, -1]).ravel()))
+            self.y = np.float64(np.asarray(samples[hdr_idx:, -1]).ravel())
 
             # predicted
-            self.X = np.int16(np.float32(np.asarray(samples[hdr_idx:, -2]).ravel()))
-
-            self.n_samps = len(self.y)
-
-            if not class_list:
-
-                # Get unique class values
-                class_list1 = np.unique(self.X)
-                class_list2 = np.unique(self.y)
-
-                self.merge_lists(class_list1, class_list2)
-
-            else:
-                self.class_list = class_list
+            self.X = np.float64(np.asarray(samples[hdr_idx:, -2]).ravel())
 
-            self.n_classes = len(self.class_list)
-            self.class_list = sorted(self.class_list)
-            self.n_samples = self.y.shape[0]
-
-            # Create the error matrix
-            self.e_matrix = np.zeros((self.n_classes, self.n_classes), dtype='int16')
-
-            # Add to error matrix
-            for predicted, observed in zip(self.X, self.y):
-
-                self.e_matrix[self.class_list.index(predicted),
-                              self.class_list.index(observed)] += 1
-
-        if self.discrete:
+            if self.discrete:
 
-            # Producer's and User's accuracy
-            self.producers_accuracy()
-            self.users_accuracy()
+                self.y = np.int64(self.y)
+                self.X = np.int64(self.X)
 
-            # Overall accuracy
-            self.accuracy = metrics.accuracy_score(self.y, self.X) * 100.0
+                if not class_list:
 
-            # Statistics report
-            self.report = metrics.classification_report(self.y, self.X)
+                    # Get unique class values
+                    self.class_list = np.union1d(self.X, self.y).tolist()
 
-            # Get f scores for each class
-            self.f_scores = metrics.f1_score(self.y, self.X, average=None)
+                else:
+                    self.class_list = sorted(class_list)
 
-            # get the weighted f beta score
-            try:
+                self.n_classes = len(self.class_list)
 
-                self.f_beta = metrics.fbeta_score(self.y, self.X,
-                                                  beta=0.5,
-                                                  labels=self.class_list,
-                                                  pos_label=self.class_list[1])
+                # Create the error matrix
+                self.e_matrix = error_matrix_counts(self.X, self.y, self.class_list)
 
-            except:
-                self.f_beta = None
+                self.n_samps = int(self.e_matrix.sum())
 
-            # get the hamming loss score
-            self.hamming = metrics.hamming_loss(self.y, self.X)
+            else:
+                self.n_samps = len(self.y)
 
-            # get the Kappa score
-            self.kappa(self.y, self.X)
+        self.n_samples = self.n_samps
 
+        if self.discrete:
+            self.matrix_stats()
         else:
 
             # get the mean absolute error
@@ -281,27 +383,321 @@ class error_matrix(object):
             # get the r squared
             self.r_squared = metrics.r2_score(self.y, self.X)
 
-    def error_matrix2xy(self):
+    def get_stats_raster(self,
+                         predicted_image,
+                         reference_image=None,
+                         reference_points=None,
+                         class_id='Id',
+                         class_list=None,
+                         ignore_values=None,
+                         band=1,
+                         block_size=2048,
+                         n_jobs=1,
+                         be_quiet=False):
 
         """
-        Reverses the error matrix to predictions and observations
+        Gets accuracy statistics of a classified image against a reference image or reference points
+
+        The error matrix is counted block by block, so only the (classes x classes)
+        counts are held in memory.
+
+        Args:
+            predicted_image (str): The classified (predicted) image.
+            reference_image (Optional[str]): The reference (observed) image. Default is None. Only the
+                overlapping extent of the two images is assessed.
+            reference_points (Optional[str]): A reference (observed) point file, used when
+                ``reference_image`` is not given. Default is None.
+            class_id (Optional[str]): The class field of ``reference_points``. Default is 'Id'.
+            class_list (Optional[list]): The classes of the error matrix. Default is None, or every class
+                found in either layer.
+            ignore_values (Optional[list]): Predicted or observed values to skip, such as no data.
+                Default is None.
+            band (Optional[int]): The band position to assess. Default is 1.
+            block_size (Optional[int]): The block row and column size. Default is 2048.
+            n_jobs (Optional[int]): The number of blocks to process in parallel. Default is 1.
+                Only used with ``reference_image``.
+            be_quiet (Optional[bool]): Whether to be quiet and do not print progress status. Default is False.
+
+        Examples:
+            >>> from mpglue.classification import error_matrix
+            >>>
+            >>> emat = error_matrix()
+            >>>
+            >>> # Wall-to-wall validation
+            >>> emat.get_stats_raster('/predictions.tif',
+            >>>                       reference_image='/reference.tif',
+            >>>                       ignore_values=[0])
+            >>>
+            >>> # Point validation
+            >>> emat.get_stats_raster('/predictions.tif',
+            >>>                       reference_points='/reference_points.shp',
+            >>>                       class_id='Id')
+            >>>
+            >>> emat.write_stats('/accuracy_report.txt')
+
+        Returns:
+            None
+        """
+
+        if isinstance(reference_image, str):
+
+            pair_count_list = self._raster_pair_counts(predicted_image,
+                                                       reference_image,
+                                                       ignore_values,
+                                                       band,
+                                                       block_size,
+                                                       n_jobs,
+                                                       be_quiet)
+
+        elif isinstance(reference_points, str):
+
+            pair_count_list = self._point_pair_counts(predicted_image,
+                                                      reference_points,
+                                                      class_id,
+                                                      ignore_values,
+                                                      band,
+                                                      block_size)
+
+        else:
+
+            logger.error('  A reference image or reference points must be given.')
+            raise NameError
+
+        if not pair_count_list:
+
+            logger.error('  No predicted and observed pairs were found.')
+            raise ValueError
+
+        if class_list is not None:
+            class_list = np.unique(np.array(class_list, dtype='int64'))
+
+        class_list, e_matrix = merge_pair_counts(pair_count_list, classes=class_list)
+
+        self.get_stats(e_matrix=e_matrix,
+                       class_list=class_list.tolist())
+
+    def _raster_pair_counts(self,
+                            predicted_image,
+                            reference_image,
+                            ignore_values,
+                            band,
+                            block_size,
+                            n_jobs,
+                            be_quiet):
+
+        p_info = raster_tools.ropen(predicted_image)
+        r_info = raster_tools.ropen(reference_image)
+
+        # get minimum overlapping extent
+        overlap_info = raster_tools.GetMinExtent(p_info, r_info)
+
+        __, __, x_off_p, y_off_p = vector_tools.get_xy_offsets(image_info=p_info,
+                                                               x=overlap_info.left,
+                                                               y=overlap_info.top,
+                                                               check_position=False)
+
+        __, __, x_off_r, y_off_r = vector_tools.get_xy_offsets(image_info=r_info,
+                                                               x=overlap_info.left,
+                                                               y=overlap_info.top,
+                                                               check_position=False)
+
+        bp = raster_tools.BlockFunc(_error_matrix_block, [p_info, r_info], None, overlap_info,
+                                    band_list=[band, band],
+                                    proc_info=overlap_info,
+                                    y_offset=[y_off_p, y_off_r],
+                                    x_offset=[x_off_p, x_off_r],
+                                    block_rows=block_size,
+                                    block_cols=block_size,
+                                    d_types=['int64', 'int64'],
+                                    out_attributes=['pair_counts'],
+                                    print_statement='\nCounting the error matrix ...\n',
+                                    write_array=False,
+                                    be_quiet=be_quiet,
+                                    n_jobs=n_jobs,
+                                    ignore_values=ignore_values)
+
+        bp.run()
+
+        p_info.close()
+        r_info.close()
+
+        return getattr(bp, 'pair_counts', [])
+
+    def _point_pair_counts(self,
+                           predicted_image,
+                           reference_points,
+                           class_id,
+                           ignore_values,
+                           band,
+                           block_size):
+
+        # Imported here because ``sample_raster`` imports this module.
+        from .sample_raster import _sample_blocks
+
+        v_info = vector_tools.vopen(reference_points)
+
+        x = np.empty(v_info.n_feas, dtype='float64')
+        y = np.empty(v_info.n_feas, dtype='float64')
+        observed = np.empty(v_info.n_feas, dtype='int64')
+
+        for n in range(0, v_info.n_feas):
+
+            feature = v_info.lyr.GetFeature(n)
+
+            geometry = feature.GetGeometryRef()
+
+            x[n] = geometry.GetX()
+            y[n] = geometry.GetY()
+
+            observed[n] = int(feature.GetField(class_id))
+
+            feature.Destroy()
+            feature = None
+
+        v_info.close()
+
+        p_info = raster_tools.ropen(predicted_image)
+
+        # Keep the points within the image.
+        within = (x >= p_info.left) & (x <= p_info.right) & (y >= p_info.bottom) & (y <= p_info.top)
+
+        observed = observed[within]
+
+        x_offsets = np.int64(np.abs(x[within] - p_info.left) / abs(p_info.cellX))
+        y_offsets = np.int64(np.abs(p_info.top - y[within]) / abs(p_info.cellY))
+
+        x_offsets = np.clip(x_offsets, 0, p_info.cols-1)
+        y_offsets = np.clip(y_offsets, 0, p_info.rows-1)
+
+        band_object = p_info.datasource.GetRasterBand(band)
+
+        predicted = _sample_blocks([band_object],
+                                   x_offsets,
+                                   y_offsets,
+                                   block_rows=block_size,
+                                   block_cols=block_size,
+                                   no_data=-999.)[:, 0]
+
+        band_object = None
+
+        p_info.close()
+
+        # Skip points that could not be read.
+        readable = predicted != -999.
+
+        block_counts = _error_matrix_block([np.int64(np.rint(predicted[readable])), observed[readable]],
+                                           ignore_values=ignore_values)[1]
+
+        return [block_counts]
+
+    def matrix_stats(self):
+
+        """
+        Gets the discrete accuracy statistics from the error matrix
         """
 
-        observed = list()
-        predicted = list()
+        if self.n_samps == 0:
+
+            logger.error('  The error matrix is empty.')
+            raise ValueError
 
-        for ei in range(0, self.e_matrix.shape[0]):
+        # Producer's and User's accuracy
+        self.producers_accuracy()
+        self.users_accuracy()
 
-            for ej in range(0, self.e_matrix.shape[1]):
+        n_correct = float(np.trace(self.e_matrix))
+
+        # Overall accuracy
+        self.accuracy = (n_correct / self.n_samps) * 100.0
+
+        # Get f scores for each class
+        self.f_scores = self.f_score()
+
+        # Get the f beta score of the
+        #   positive (second) class.
+        if self.n_classes == 2:
+            self.f_beta = float(self.f_score(beta=0.5)[1])
+        else:
+            self.f_beta = None
+
+        # get the hamming loss score
+        self.hamming = 1.0 - (n_correct / self.n_samps)
+
+        # get the Kappa score
+        self.kappa_score = _kappa(self.e_matrix.T)
+
+        # Statistics report
+        self.report = self.class_report()
+
+    def f_score(self, beta=1.0):
+
+        """
+        Gets the F-beta score of each class from the error matrix
+
+        Args:
+            beta (Optional[float]): The weight of recall (producer's) over precision (user's). Default is 1.
+
+        Returns:
+            The F-beta scores, as a 1d array.
+        """
 
-                n_ = self.e_matrix[ei, ej]
+        beta2 = beta ** 2
 
-                for n in range(0, n_):
+        true_positives = np.float64(np.diagonal(self.e_matrix))
 
-                    observed.append(ei+1)
-                    predicted.append(ej+1)
+        # Observed samples predicted as another class
+        false_negatives = self.e_matrix.sum(axis=0) - true_positives
 
-        return np.int16(np.array(observed)), np.int16(np.array(predicted))
+        # Predicted samples observed as another class
+        false_positives = self.e_matrix.sum(axis=1) - true_positives
+
+        denominator = (1.0 + beta2) * true_positives + beta2 * false_negatives + false_positives
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f_scores = ((1.0 + beta2) * true_positives) / denominator
+
+        f_scores[denominator == 0] = 0.0
+
+        return f_scores
+
+    def class_report(self):
+
+        """
+        Builds a text report of the precision (user's), recall (producer's),
+            F1-score, and support (observed samples) of each class
+        """
+
+        support = self.e_matrix.sum(axis=0)
+
+        precision = self.users / 100.0
+        recall = self.producers / 100.0
+
+        report = '{:>12}{:>10}{:>10}{:>10}{:>10}\n\n'.format('', 'precision', 'recall', 'f1-score', 'support')
+
+        for class_value, pr, rc, fs, sp in zip(self.class_list, precision, recall, self.f_scores, support):
+            report += '{:>12}{:>10.2f}{:>10.2f}{:>10.2f}{:>10d}\n'.format(class_value, pr, rc, fs, int(sp))
+
+        weights = support / float(support.sum())
+
+        report += '\n{:>12}{:>10.2f}{:>10.2f}{:>10.2f}{:>10d}\n'.format('avg / total',
+                                                                       (precision * weights).sum(),
+                                                                       (recall * weights).sum(),
+                                                                       (self.f_scores * weights).sum(),
+                                                                       int(support.sum()))
+
+        return report
+
+    def error_matrix2xy(self):
+
+        """
+        Reverses the error matrix to predictions and observations
+        """
+
+        n_classes = self.e_matrix.shape[0]
+
+        cell_index = np.repeat(np.arange(n_classes*n_classes), self.e_matrix.ravel())
+
+        return np.int64(cell_index // n_classes + 1), np.int64(cell_index % n_classes + 1)
 
     def sample_bias(self, class_area):
 
@@ -326,12 +722,9 @@ class error_matrix(object):
             print emat.standard_errors
         """
 
-        e_matrix_float = np.float32(self.e_matrix)
+        e_matrix_float = np.float64(self.e_matrix)
 
-        if not isinstance(class_area, np.ndarray):
-            self.class_area = np.array(class_area, dtype='float32')
-        else:
-            self.class_area = class_area
+        self.class_area = np.float64(class_area)
 
         total_area = self.class_area.sum()
 
@@ -340,9 +733,11 @@ class error_matrix(object):
 
         emat_row_sum = e_matrix_float.sum(axis=1)
 
+        # The proportion of each map (row) class in each reference (column) class
+        row_proportions = e_matrix_float / emat_row_sum[:, np.newaxis]
+
         # Estimate the class proportions.
-        e_matrix_pr = np.array([self.area_weights * (e_matrix_float[:, ci] / emat_row_sum)
-                                for ci in range(e_matrix_float.shape[1])], dtype='float32')
+        e_matrix_pr = (self.area_weights[:, np.newaxis] * row_proportions).T
 
         # User and producer weights
         # Equation 9
@@ -354,15 +749,10 @@ class error_matrix(object):
 
         self.area_difference = self.stratified_estimate - self.class_area
 
-        self.standard_errors = list()
-
-        for ci in range(e_matrix_float.shape[0]):
+        a = np.power(self.area_weights, 2)[:, np.newaxis]
 
-            a = np.power(self.area_weights, 2)
-            b = e_matrix_float[:, ci] / emat_row_sum
-            c = 1.0 - (e_matrix_float[:, ci] / emat_row_sum)
-
-            self.standard_errors.append(((a * ((b * c) / (emat_row_sum - 1.0))).sum() ** 0.5) * total_area)
+        self.standard_errors = np.sqrt((a * ((row_proportions * (1.0 - row_proportions)) /
+                                             (emat_row_sum[:, np.newaxis] - 1.0))).sum(axis=0)) * total_area
 
         # Equation 14
         self.stratified_users = np.diagonal(e_matrix_pr) / prd_weights
@@ -379,12 +769,10 @@ class error_matrix(object):
         Producer's accuracy
         """
 
-        self.producers = np.zeros(self.n_classes, dtype='float32')
-
         producer_sums = self.e_matrix.sum(axis=0)
 
-        for pr_j in range(0, self.n_classes):
-            self.producers[pr_j] = (self.e_matrix[pr_j, pr_j] / float(producer_sums[pr_j])) * 100.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.producers = np.float32((np.diagonal(self.e_matrix) / np.float64(producer_sums)) * 100.0)
 
         self.producers[np.isnan(self.producers) | np.isinf(self.producers)] = 0.0
 
@@ -394,12 +782,10 @@ class error_matrix(object):
         User's accuracy
         """
 
-        self.users = np.zeros(self.n_classes, dtype='float32')
-
         user_sums = self.e_matrix.sum(axis=1)
 
-        for pr_i in range(0, self.n_classes):
-            self.users[pr_i] = (self.e_matrix[pr_i, pr_i] / float(user_sums[pr_i])) * 100.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.users = np.float32((np.diagonal(self.e_matrix) / np.float64(user_sums)) * 100.0)
 
         self.users[np.isnan(self.users) | np.isinf(self.users)] = 0.0
 
@@ -446,8 +832,6 @@ class error_matrix(object):
             https://skll.readthedocs.org/en/latest/_modules/skll/metrics.html
         """
 
-        logger = logging.getLogger(__name__)
-
         # Ensure that the lists are both the same length
         assert(len(y_true) == len(y_pred))
 
@@ -477,47 +861,13 @@ class error_matrix(object):
 
         # Build the observed/confusion matrix
         num_ratings = max_rating - min_rating + 1
-        obsv = metrics.confusion_matrix(y_true, y_pred, labels=list(range(num_ratings)))
-        num_scored_items = float(len(y_true))
-
-        # Build weight array if weren't passed one
-        if isinstance(weights, string_types):
-            wt_scheme = weights
-            weights = None
-        else:
-            wt_scheme = ''
-        if weights is None:
-            weights = np.empty((num_ratings, num_ratings))
-
-            for i in range(num_ratings):
-                for j in range(num_ratings):
-                    diff = np.abs(i - j)
-                    if allow_off_by_one and diff:
-                        diff -= 1
-                    if wt_scheme == 'linear':
-                        weights[i, j] = diff
-                    elif wt_scheme == 'quadratic':
-                        weights[i, j] = diff ** 2
-                    elif not wt_scheme:  # unweighted
-                        weights[i, j] = bool(diff)
-                    else:
-                        raise ValueError(('Invalid weight scheme specified for ' +
-                                          'kappa: {}').format(wt_scheme))
 
-        hist_true = np.bincount(y_true, minlength=num_ratings)
-        hist_true = hist_true[: num_ratings] / num_scored_items
-        hist_pred = np.bincount(y_pred, minlength=num_ratings)
-        hist_pred = hist_pred[: num_ratings] / num_scored_items
-        expected = np.outer(hist_true, hist_pred)
+        obsv = np.bincount(np.array(y_true, dtype='int64') * num_ratings + np.array(y_pred, dtype='int64'),
+                           minlength=num_ratings*num_ratings).reshape(num_ratings, num_ratings)
 
-        # Normalize observed array
-        obsv = obsv / num_scored_items
-
-        # If all weights are zero, that means no disagreements matter.
-        self.kappa_score = 1.
-
-        if np.count_nonzero(weights):
-            self.kappa_score -= (np.sum(np.sum(weights * obsv)) / np.sum(np.sum(weights * expected)))
+        self.kappa_score = _kappa(obsv,
+                                  weights=weights,
+                                  allow_off_by_one=allow_off_by_one)
 
     def write_stats(self, out_report):
 
@@ -683,6 +1033,50 @@ class error_matrix(object):
                 write_txt.write('R squared: {:.4f}\n'.format(self.r_squared))
 
 
+def _label_moments(label_index, n_labels, row_coords, col_coords):
+
+    """
+    Gets the area, centroid, and eccentricity of labeled objects from label-indexed sums
+
+    Args:
+        label_index (1d array): The label position of each pixel.
+        n_labels (int): The number of labels.
+        row_coords (1d array): The row coordinate of each pixel.
+        col_coords (1d array): The column coordinate of each pixel.
+
+    Returns:
+        The pixel count of each label, the (row, column) centroid of each label as a
+            [labels x 2] array, and the eccentricity of each label (as in ``regionprops``).
+    """
+
+    area = np.bincount(label_index, minlength=n_labels)
+
+    label_sizes = np.float64(np.maximum(area, 1))
+
+    def label_mean(values):
+        return np.bincount(label_index, weights=values, minlength=n_labels) / label_sizes
+
+    row_mean = label_mean(row_coords)
+    col_mean = label_mean(col_coords)
+
+    # Second order central moments
+    row_var = label_mean(row_coords * row_coords) - row_mean * row_mean
+    col_var = label_mean(col_coords * col_coords) - col_mean * col_mean
+    row_col_cov = label_mean(row_coords * col_coords) - row_mean * col_mean
+
+    # Eigenvalues of the inertia tensor
+    half_trace = (row_var + col_var) / 2.
+    half_range = np.sqrt(((row_var - col_var) / 2.) ** 2. + row_col_cov ** 2.)
+
+    major = np.maximum(half_trace + half_range, 0.)
+    minor = np.maximum(half_trace - half_range, 0.)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eccentricity = np.where(major > 0, np.sqrt(1. - np.clip(minor / major, 0., 1.)), 0.)
+
+    return area, np.c_[row_mean, col_mean], eccentricity
+
+
 class object_accuracy(object):
 
     """
@@ -773,153 +1167,113 @@ class object_accuracy(object):
     def iterate_ids(self):
 
         """
-        Iterate over objects, where each object has a unique id
-        """
+        Gets the accuracy of each reference object, where each object has a unique id
 
-        self.ids = list()
-        self.over = list()
-        self.under = list()
-        self.frag = list()
-        self.shape = list()
-        self.dist = list()
-        self.area_reference = list()
-        self.area_predicted = list()
-        self.relative = list()
+        Object areas, centroids, and shapes come from sums indexed by the reference and predicted
+        labels, and the overlaps from one count of the (reference, predicted) label pairs. The
+        object statistics are then gathered back to the pixels of ``error_array``.
+        """
 
-        # iterate over each object
-        for uoi in self.unique_object_ids:
+        reference_ids, reference_index = np.unique(self.reference_array, return_inverse=True)
+        predicted_ids, predicted_index = np.unique(self.predicted_objects, return_inverse=True)
 
-            # get the current object (binary)
-            if uoi == 0:
-                continue
+        reference_index = reference_index.ravel()
+        predicted_index = predicted_index.ravel()
 
-            self.reference_sub = np.where(self.reference_array == uoi, 1, 0)
+        n_reference = len(reference_ids)
+        n_predicted = len(predicted_ids)
 
-            # This is the reference object sum, which is
-            #   O_i in Persello et al. (2010)
-            self.reference_object_area = self.reference_sub.sum()
-
-            # Get the object properties of the current object.
-            self.props = regionprops(self.reference_sub)
+        row_coords = np.repeat(np.arange(self.rows, dtype='float64'), self.cols)
+        col_coords = np.tile(np.arange(self.cols, dtype='float64'), self.rows)
 
-            # Bounding box of the current object (min row, min col, max row, max col)
-            object_properties = [(prop.bbox, prop.eccentricity, prop.area) for prop in self.props][0]
+        # Get the area, centroid, and eccentricity of every object.
+        reference_area, reference_centroid, reference_eccentricity = _label_moments(reference_index,
+                                                                                    n_reference,
+                                                                                    row_coords,
+                                                                                    col_coords)
 
-            bbox = object_properties[0]
-            self.reference_eccentricity = object_properties[1]
-            self.reference_area = object_properties[2]
+        predicted_area, predicted_centroid, predicted_eccentricity = _label_moments(predicted_index,
+                                                                                    n_predicted,
+                                                                                    row_coords,
+                                                                                    col_coords)
 
-            # subset the object (50 is for padding)
-            self.get_padding(bbox, 50)
+        # Count the overlapping pixels of each
+        #   (reference, predicted) object pair.
+        overlap = (reference_ids[reference_index] != 0) & (predicted_ids[predicted_index] != 0)
 
-            self.reference_sub = self.reference_sub[bbox[0]-self.row_min:bbox[2]+50, bbox[1]-self.col_min:bbox[3]+50]
-            self.predicted_sub = self.predicted_objects[bbox[0]-self.row_min:bbox[2]+50, bbox[1]-self.col_min:bbox[3]+50]
+        pair_codes, overlap_sums = np.unique(reference_index[overlap] * n_predicted + predicted_index[overlap],
+                                             return_counts=True)
 
-            # Get the object properties of the current object
-            self.props_ = regionprops(self.reference_sub)
+        pair_reference = pair_codes // n_predicted
+        pair_predicted = pair_codes % n_predicted
 
-            # bounding box of the current object (min row, min col, max row, max col)
-            self.reference_centroid = [prop_.centroid for prop_ in self.props_][0]
+        # The number of predicted objects (fragments)
+        #   that overlap each reference object.
+        n_fragments = np.bincount(pair_reference, minlength=n_reference)
 
-            # Get predicted object with the maximum number
-            #   of overlapping points in the reference object.
-            unique_labels = np.unique(self.predicted_sub)
+        # Take the predicted object with the highest number of
+        #   overlapping pixels, or the lowest label on ties.
+        pair_order = np.lexsort((pair_predicted, -overlap_sums, pair_reference))
 
-            self.fragments = np.where(self.reference_sub == 1, self.predicted_sub, 0)
+        if pair_codes.size == 0:
 
-            self.max_sum = 0
+            # No reference object overlaps
+            #   a predicted object.
+            first_pairs = np.array([], dtype='int64')
 
-            # Iterate over each fragment in the predicted array. Here
-            #   we iterate over each fragment rather than just doing
-            #   an intersection because we are interested in the full
-            #   fragment that touches the reference object.
-            for unique_label in unique_labels:
+        else:
+            first_pairs = pair_order[np.r_[True, pair_reference[pair_order][1:] != pair_reference[pair_order][:-1]]]
 
-                if unique_label == 0:
-                    continue
+        # Reference objects without an overlapping
+        #   predicted object are not assessed.
+        matched = pair_reference[first_pairs]
+        max_labels = pair_predicted[first_pairs]
 
-                # Get the pixel count where predicted and
-                #   the reference object overlap.
-                self.overlap_sum = np.where((self.predicted_sub == unique_label) &
-                                            (self.reference_sub == 1), 1, 0).sum()
+        # This is the union of O_i and M_i in Persello et al. (2010).
+        max_sums = np.float64(overlap_sums[first_pairs])
 
-                # Take the object with the highest
-                #   number of overlapping pixels.
-                if self.overlap_sum > self.max_sum:
+        # O_i and M_i in Persello et al. (2010)
+        reference_object_area = np.float64(reference_area[matched])
+        predicted_object_area = np.float64(predicted_area[max_labels])
 
-                    # This is the predicted object sum, which is
-                    #   M_i in Persello et al. (2010).
-                    self.predicted_sub_ = np.where(self.predicted_sub == unique_label, 1, 0)
-                    self.predicted_object_area = self.predicted_sub_.sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
 
-                    # Get the object properties of the current predicted object
-                    pprops = regionprops(self.predicted_sub_)
+            stat_over = 1. - (max_sums / reference_object_area)
+            stat_under = 1. - (max_sums / predicted_object_area)
+            stat_frag = (n_fragments[matched] - 1.) / (reference_object_area - 1.)
 
-                    predicted_object_properties = [(pprop.eccentricity,
-                                                    pprop.centroid,
-                                                    pprop.area) for pprop in pprops][0]
+        stat_shape = np.abs(reference_eccentricity[matched] - predicted_eccentricity[max_labels])
 
-                    # Get the eccentricity of the predicted object.
-                    self.predicted_eccentricity = predicted_object_properties[0]
+        stat_off = np.sqrt(((predicted_centroid[max_labels] - reference_centroid[matched]) ** 2.).sum(axis=1))
 
-                    # Get the centroid of the predicted object.
-                    self.predicted_centroid = predicted_object_properties[1]
+        stat_rel = ((predicted_object_area - reference_object_area) / reference_object_area) * 100.
 
-                    # Get the area of the predicted object.
-                    self.predicted_area = predicted_object_properties[2]
+        object_stats = np.zeros((6, n_reference), dtype='float32')
 
-                    # The object label of the highest overlapping object.
-                    self.max_label = copy(unique_label)
+        object_stats[:, matched] = np.vstack((stat_over,
+                                              stat_under,
+                                              stat_frag,
+                                              stat_shape,
+                                              stat_off,
+                                              stat_rel))
 
-                    # This is the union of O_i and M_i in Persello et al. (2010).
-                    self.max_sum = copy(self.overlap_sum)
-
-            if self.max_sum == 0:
-                continue
-
-            # now, <max_label> has the most overlapping pixels with
-            # the reference object, so we can get statistics for it.
-            stat_over = self.over_segmentation()
-            stat_under = self.under_segmentation()
-            stat_frag = self.fragmentation()
-            stat_shape = self.shape_error()
-            stat_off = self.offset_error()
-            stat_rel = self.relative_error()
-
-            # print
-            # print self.reference_eccentricity, self.predicted_eccentricity
-            # print self.reference_centroid, self.predicted_centroid
-            # print self.reference_area, self.predicted_object_area
-            # print self.max_label
-            # print self.max_sum
-            # print stat_rel
-            # plt.subplot(121)
-            # plt.imshow(self.reference_sub)
-            # plt.axis('off')
-            # plt.subplot(122)
-            # plt.imshow(self.predicted_sub_+self.reference_sub)
-            # plt.axis('off')
-            # plt.show()
-            # sys.exit()
-
-            self.error_array[0][self.reference_array == uoi] = stat_over
-            self.error_array[1][self.reference_array == uoi] = stat_under
-            self.error_array[2][self.reference_array == uoi] = stat_frag
-            self.error_array[3][self.reference_array == uoi] = stat_shape
-            self.error_array[4][self.reference_array == uoi] = stat_off
-            self.error_array[5][self.reference_array == uoi] = stat_rel
-
-            self.ids.append(uoi)
-            self.over.append(stat_over)
-            self.under.append(stat_under)
-            self.frag.append(stat_frag)
-            self.shape.append(stat_shape)
-            self.dist.append(stat_off)
-            self.area_reference.append(self.reference_area)
-            self.area_predicted.append(self.predicted_area)
-            self.relative.append(stat_rel)
-
-        self.error_array[self.error_array == 999] = 0
+        # over_segmentation = band 1
+        # under_segmentation = band 2
+        # fragmentation = band 3
+        # shape error = band 4
+        # offset error = band 5
+        # relative error = band 6
+        self.error_array = object_stats[:, reference_index].reshape(6, self.rows, self.cols)
+
+        self.ids = reference_ids[matched].tolist()
+        self.over = stat_over.tolist()
+        self.under = stat_under.tolist()
+        self.frag = stat_frag.tolist()
+        self.shape = stat_shape.tolist()
+        self.dist = stat_off.tolist()
+        self.area_reference = reference_area[matched].tolist()
+        self.area_predicted = predicted_area[max_labels].tolist()
+        self.relative = stat_rel.tolist()
 
     def iterate_objects(self):
 
@@ -12,54 +12,107 @@ from builtins import int
 import sys
 import time
 import argparse
-import itertools
-from joblib import Parallel, delayed
+import multiprocessing as multi
 
 from ..errors import logger
 from .. import raster_tools
-from ..helpers import overwrite_file, get_block_chunks
+from ..helpers import overwrite_file, get_halo_chunks
 from ._moving_window import moving_window
 
-try:
-    import numpy as np
-except ImportError:
-    raise ImportError('NumPy must be installed')
 
+# Set in each worker by ``_init_focal_worker``.
+_worker_image = None
+_worker_band = 1
+_worker_kwargs = dict()
 
-def do_stat(chunk_array, block_chunk, window_size, chunk_size, statistic, ignore_value):
 
-    ip = block_chunk[3]
-    jp = block_chunk[7]
+def _init_focal_worker(in_image, band, window_kwargs):
 
-    return moving_window(chunk_array,
-                         statistic=statistic,
-                         window_size=window_size,
-                         ignore_value=ignore_value)[ip:chunk_size, jp:chunk_size]
+    """Opens the input image once per worker"""
 
+    global _worker_image, _worker_band, _worker_kwargs
 
-def piece(stat_chunks, block_chunks, fill_array):
+    _worker_image = raster_tools.ropen(in_image)
+    _worker_band = band
+    _worker_kwargs = window_kwargs
 
-    # Put it back together.
-    for filled_image, block_chunk in itertools.izip(stat_chunks, block_chunks):
 
-        fis = block_chunk[0]
-        fjs = block_chunk[4]
+def _focal_chunk(halo_chunk):
 
-        fi = filled_image.shape[0]
-        fj = filled_image.shape[1]
+    """
+    Computes focal statistics for one chunk
+
+    Args:
+        halo_chunk (tuple): A chunk, given by ``helpers.get_halo_chunks``.
+
+    Returns:
+        The chunk and its focal statistics, without the halo.
+    """
+
+    i, iw, ip, n_rows, rw, j, jw, jp, n_cols, cw = halo_chunk
+
+    chunk_array = _worker_image.read(bands2open=_worker_band,
+                                     i=iw,
+                                     j=jw,
+                                     rows=rw,
+                                     cols=cw,
+                                     d_type='float32')
+
+    out_array = moving_window(chunk_array, **_worker_kwargs)
+
+    return halo_chunk, out_array[ip:ip+n_rows, jp:jp+n_cols]
+
+
+def _iter_chunks(in_image, band, window_kwargs, halo_chunks, n_jobs):
+
+    """Yields focal statistics chunks, from a pool of workers if ``n_jobs`` is not 0 or 1"""
+
+    if n_jobs in [0, 1]:
+
+        _init_focal_worker(in_image, band, window_kwargs)
+
+        try:
+
+            for halo_chunk in halo_chunks:
+                yield _focal_chunk(halo_chunk)
+
+        finally:
+            _worker_image.close()
+
+    else:
+
+        if n_jobs == -1:
+            n_jobs = multi.cpu_count()
+
+        pool = multi.Pool(processes=n_jobs,
+                          initializer=_init_focal_worker,
+                          initargs=(in_image, band, window_kwargs))
+
+        try:
 
-        if (fi == 0) or (fj == 0):
-            continue
+            # Chunks are written at their own offsets, so they
+            #   can be consumed in any order.
+            for chunk_result in pool.imap_unordered(_focal_chunk, halo_chunks):
+                yield chunk_result
 
-        fill_array[fis:fis+fi, fjs:fjs+fj] = filled_image
+            pool.close()
 
-    return fill_array
+        except:
+
+            pool.terminate()
+            raise
+
+        finally:
+            pool.join()
 
 
 class Parameters(object):
 
     def __init__(self):
+
         self.window_size = 3
+        self.statistic = 'mean'
+        self.iterations = 1
 
 
 def focal_statistics(in_image, out_image, band=1, overwrite=False, chunk_size=512, n_jobs=0, **kwargs):
@@ -72,13 +125,18 @@ def focal_statistics(in_image, out_image, band=1, overwrite=False, chunk_size=51
         out_image (str): The output image.
         band (int or int list). The band to process. Default is 1.
         overwrite (Optional[bool]): Whether to overwrite an existing file. Default is False.
-        chunk_size (Optional[int]): The block chunk size for joblib. Default is 512.
-        n_jobs (Optional[int]): The number of parallel jobs. If -1 or greater than 1, the entire image will be
-            processed in memory. Otherwise, chunks are written in tiles. Default is 0.
+        chunk_size (Optional[int]): The chunk size, in pixels, of each tile. Default is 512.
+        n_jobs (Optional[int]): The number of parallel jobs. If -1 or greater than 1, tiles are
+            processed by a pool of workers. Otherwise, tiles are processed serially. Default is 0.
+        kwargs (Optional): Keyword arguments passed to ``moving_window``.
 
     Returns:
         None, writes to ``out_image``.
 
+    Memory:
+        Each tile is read with a halo of ``window_size`` / 2 x ``iterations`` pixels and only the
+        tile, without the halo, is written. Memory is limited to ``n_jobs`` padded tiles for any image size.
+
     Examples:
         >>> from mappy.classifiers.post import focal_statistics
         >>>
@@ -99,6 +157,13 @@ def focal_statistics(in_image, out_image, band=1, overwrite=False, chunk_size=51
     for k, v in viewitems(kwargs):
         setattr(parameters, k, v)
 
+    # Options that are not passed to ``moving_window``
+    window_kwargs = dict([(k, v) for k, v in viewitems(kwargs)
+                          if (k != 'resample') and (v is not None)])
+
+    window_kwargs['statistic'] = parameters.statistic
+    window_kwargs['window_size'] = parameters.window_size
+
     i_info = raster_tools.ropen(in_image)
 
     o_info = i_info.copy()
@@ -115,69 +180,33 @@ def focal_statistics(in_image, out_image, band=1, overwrite=False, chunk_size=51
 
     out_rst = raster_tools.create_raster(out_image, o_info)
 
-    if (n_jobs == -1) or (n_jobs > 1):
-
-        block_chunks = get_block_chunks(i_info.rows, i_info.cols, chunk_size, window_size)
-
-        logger.info('  Processing tiles ...')
-
-        chunk_stats = Parallel(n_jobs=n_jobs,
-                               max_nbytes=None)(delayed(do_stat)(i_info.read(bands2open=band,
-                                                                             i=block_chunk[1],
-                                                                             j=block_chunk[5],
-                                                                             rows=block_chunk[8],
-                                                                             cols=block_chunk[9],
-                                                                             d_type='float32'),
-                                                                 block_chunk, parameters.window_size, chunk_size,
-                                                                 parameters.statistic, parameters.ignore_value)
-                                                for block_chunk in block_chunks)
-
-        # Put it back together.
-        fill_array = piece(chunk_stats, block_chunks, i_info.read(bands2open=band, d_type='float32'))
-
-        out_rst.write_array(fill_array, band=band)
+    out_rst.get_band(1)
 
-    else:
-
-        out_rst.get_band(1)
-
-        half_window = parameters.window_size / 2
-
-        block_rows, block_cols = raster_tools.block_dimensions(i_info.rows, i_info.cols,
-                                                               row_block_size=parameters.window_size*256,
-                                                               col_block_size=parameters.window_size*256)
-
-        ttl_blks = int((np.ceil(float(i_info.rows) / float(block_rows))) *
-                       (np.ceil(float(i_info.cols) / float(block_cols))))
-
-        ttl_blks_ct = 0
+    halo = int(parameters.window_size / 2) * max(1, parameters.iterations)
 
-        for i in range(0, i_info.rows, block_rows-half_window-1):
+    halo_chunks = get_halo_chunks(i_info.rows, i_info.cols, chunk_size, halo)
 
-            n_rows = raster_tools.n_rows_cols(i, block_rows+half_window+1, i_info.rows)
+    n_chunks = len(halo_chunks)
 
-            for j in range(0, i_info.cols, block_cols-half_window-1):
-
-                n_cols = raster_tools.n_rows_cols(j, block_cols+half_window+1, i_info.cols)
-
-                if ttl_blks_ct % 20 == 0:
-
-                    tile_count = ttl_blks_ct + 19
+    i_info.close()
 
-                    if tile_count > ttl_blks:
-                        tile_count = ttl_blks
+    logger.info('  Processing {:,d} tiles ...'.format(n_chunks))
 
-                    logger.info('  Processing tiles {:d} -- {:d} of {:d} ...'.format(ttl_blks_ct, tile_count, ttl_blks))
+    for chunk_counter, (halo_chunk, out_array) in enumerate(_iter_chunks(in_image,
+                                                                         band,
+                                                                         window_kwargs,
+                                                                         halo_chunks,
+                                                                         n_jobs)):
 
-                out_array = moving_window(i_info.read(bands2open=band, i=i, j=j, rows=n_rows, cols=n_cols,
-                                                      d_type='float32'), **kwargs)
+        if chunk_counter % 20 == 0:
 
-                out_rst.write_array(out_array[half_window:-half_window, half_window:-half_window],
-                                    i=i+half_window, j=j+half_window)
+            tile_count = min(chunk_counter + 19, n_chunks)
 
-                ttl_blks_ct += 1
+            logger.info('  Processing tiles {:d} -- {:d} of {:d} ...'.format(chunk_counter, tile_count, n_chunks))
 
-    i_info.close()
+        out_rst.write_array(out_array,
+                            i=halo_chunk[0],
+                            j=halo_chunk[5])
 
     out_rst.close_all()
 
@@ -5,8 +5,6 @@
 Date Created: 11/14/2011
 """ 
 
-from future.utils import viewitems
-
 import sys
 import time
 import ast
@@ -21,15 +19,16 @@ def reclassify_func(im, recode_dict=None):
 
     """
     The image block reclassification function
-    """
 
-    out_img = im[0].copy()
+    Args:
+        im (list of ndarrays)
+        recode_dict (dict or RecodeTable)
+    """
 
-    # reclassify image
-    for key, value in sorted(viewitems(recode_dict)):
-        out_img[(im[0] == key)] = value
+    if not isinstance(recode_dict, raster_tools.RecodeTable):
+        recode_dict = raster_tools.RecodeTable(recode_dict)
 
-    return out_img
+    return recode_dict.apply(im[0])
 
 
 def reclassify(input_image, output_image, recode_dict):
@@ -66,7 +65,7 @@ def reclassify(input_image, output_image, recode_dict):
                                     output_image,
                                     o_info,
                                     print_statement='\nReclassifying {} ...\n'.format(input_image),
-                                    recode_dict=recode_dict)
+                                    recode_dict=raster_tools.RecodeTable(recode_dict))
 
         bp.run()
 
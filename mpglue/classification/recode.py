@@ -5,8 +5,6 @@
 Date Created: 7/31/2013
 """
 
-from future.utils import viewitems
-
 import os
 import sys
 import time
@@ -36,21 +34,15 @@ def recode_func(im, recode_dict=None):
     The image block recode function
 
     Args:
-        im (list of ndarrays)
-        recode_dict (dict)
+        im (list of ndarrays): The image and the rasterized polygon ids.
+        recode_dict (dict or RecodeTable): The recode rules of each polygon id.
     """
 
-    out_img = im[0]
-
-    # Iterate over each polygon.
-    for poly_id, reclass_dict in viewitems(recode_dict):
-
-        # Iterate over the recode rules and
-        #   update the image.
-        for from_key, to_key in viewitems(reclass_dict):
-            out_img[(im[1] == poly_id) & (out_img == from_key)] = to_key
+    if not isinstance(recode_dict, raster_tools.RecodeTable):
+        recode_dict = raster_tools.RecodeTable(recode_dict)
 
-    return out_img
+    # Polygon ids and classes index a (polygon x class) table.
+    return recode_dict.apply(im[0], zones=im[1])
 
 
 def recode(input_poly, input_image, output_image, recode_dict, class_id='Id'):
@@ -110,7 +102,7 @@ def recode(input_poly, input_image, output_image, recode_dict, class_id='Id'):
             bp = raster_tools.BlockFunc(recode_func, [i_info, v_info], output_image, o_info,
                                         y_offset=[0, 0], x_offset=[0, 0],
                                         print_statement='\nRecoding {} ...\n'.format(input_image),
-                                        recode_dict=recode_dict)
+                                        recode_dict=raster_tools.RecodeTable(recode_dict))
 
             bp.run()
 
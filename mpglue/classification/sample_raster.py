@@ -19,10 +19,10 @@ from joblib import Parallel, delayed
 
 from .. import raster_tools
 from .. import vector_tools
-from ..helpers import _iteration_parameters_values
 from ..errors import ArrayOffsetError, logger
 from .poly2points import poly2points
 from .error_matrix import error_matrix
+from .sample_store import SampleStore
 
 # NumPy
 try:
@@ -44,11 +44,86 @@ except ImportError:
     raise ImportError('GDAL is not installed')
 
 
+def _sample_blocks(band_objects,
+                   x_offsets,
+                   y_offsets,
+                   block_rows=256,
+                   block_cols=256,
+                   no_data=-999.):
+
+    """
+    Samples pixel values at point offsets, reading each block that holds points only once
+
+    Args:
+        band_objects (list): A list of GDAL band objects to sample.
+        x_offsets (1d array): The column offsets of each point. The offsets must be within the image.
+        y_offsets (1d array): The row offsets of each point. The offsets must be within the image.
+        block_rows (Optional[int]): The block row size used to group points. Default is 256.
+        block_cols (Optional[int]): The block column size used to group points. Default is 256.
+        no_data (Optional[float]): The value given to points that could not be read. Default is -999.
+
+    Returns:
+        Sampled values as a 2d array, shaped [samples x bands], in the same order as the input points.
+    """
+
+    n_samples = x_offsets.shape[0]
+
+    value_arr = np.empty((n_samples, len(band_objects)), dtype='float32')
+    value_arr.fill(no_data)
+
+    if n_samples == 0:
+        return value_arr
+
+    x_offsets = np.int64(x_offsets)
+    y_offsets = np.int64(y_offsets)
+
+    # Get the block that each point falls in.
+    block_j = x_offsets // block_cols
+    block_keys = (y_offsets // block_rows) * (block_j.max() + 1) + block_j
+
+    # Sort the points by block so that each block is read once.
+    key_order = np.argsort(block_keys, kind='mergesort')
+    sorted_keys = block_keys[key_order]
+
+    block_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    block_ends = np.r_[block_starts[1:], n_samples]
+
+    for block_start, block_end in zip(block_starts, block_ends):
+
+        block_idx = key_order[block_start:block_end]
+
+        row_idx = y_offsets[block_idx]
+        col_idx = x_offsets[block_idx]
+
+        # Only read the window that holds the block points.
+        i = int(row_idx.min())
+        j = int(col_idx.min())
+
+        n_rows = int(row_idx.max()) - i + 1
+        n_cols = int(col_idx.max()) - j + 1
+
+        for bi, band_object in enumerate(band_objects):
+
+            try:
+                block_array = band_object.ReadAsArray(j, i, n_cols, n_rows)
+            except RuntimeError as read_error:
+
+                logger.warning('  Could not read the block at row {:d}, column {:d}: {}'.format(i, j, read_error))
+                continue
+
+            if not isinstance(block_array, np.ndarray):
+                continue
+
+            value_arr[block_idx, bi] = block_array[row_idx-i, col_idx-j]
+
+    return value_arr
+
+
 def _sample_parallel(band_position,
                      image_name,
-                     c_list,
-                     accuracy,
-                     feature_length):
+                     x_offsets,
+                     y_offsets,
+                     block_size):
 
     datasource = gdal.Open(image_name,
                            GA_ReadOnly)
@@ -57,37 +132,16 @@ def _sample_parallel(band_position,
 
     logger.info('Band {:d} of {:d} ...'.format(band_position, datasource.RasterCount))
 
-    # 1d array to store image values.
-    value_list = np.zeros(feature_length, dtype='float32')
-
-    # Sort by feature index position.
-    for vi, values in enumerate(sorted(c_list)):
-
-        # values[1] = [x, y, x offset, y offset, label]
-        # values[1][2] = x offset position
-        # values[1][3] = y offset position
-        # pixel_value = image_info.read(i=values[1][3],
-        #                                  j=values[1][2],
-        #                                  rows=1,
-        #                                  cols=1,
-        #                                  d_type='float32')[0, 0]
-        try:
-            pixel_value = band_object.ReadAsArray(values[1][2], values[1][3], 1, 1)[0, 0]
-        except:
-            pixel_value = -999.0
-
-        if not accuracy:
-            pixel_value = round(float(pixel_value), 4)
-        else:
-            pixel_value = int(pixel_value)
-
-        # Update the list with raster values.
-        value_list[vi] = pixel_value
+    value_arr = _sample_blocks([band_object],
+                               x_offsets,
+                               y_offsets,
+                               block_rows=block_size,
+                               block_cols=block_size)
 
     band_object = None
     datasource = None
 
-    return value_list
+    return value_arr[:, 0]
 
 
 class SampleImage(object):
@@ -109,6 +163,9 @@ class SampleImage(object):
         use_extent (Optional[bool])
         append_name (Optional[str]): A base name to append to the samples file name.
         check_corrupted_bands (Optional[bool]): Whether to perform a corrupted band check. Default is True.
+        block_size (Optional[int]): The block size used to group points for reading. Default is 256.
+        sample_format (Optional[str]): The samples file format. Default is 'txt'. Choices are ['txt', 'npy'],
+            where 'npy' writes a binary sample store (see ``sample_store.SampleStore``).
         verbose (Optional[int]): The level of verbosity for print statements. Default is 1.
     """
 
@@ -127,6 +184,8 @@ class SampleImage(object):
                  sql_expression_attr=None,
                  sql_expression_field='Id',
                  check_corrupted_bands=True,
+                 block_size=256,
+                 sample_format='txt',
                  verbose=1):
 
         self.points_file = points_file
@@ -143,8 +202,13 @@ class SampleImage(object):
         self.sql_expression_attr = sql_expression_attr
         self.sql_expression_field = sql_expression_field
         self.check_corrupted_bands = check_corrupted_bands
+        self.block_size = block_size
+        self.sample_format = sample_format
         self.verbose = verbose
 
+        if self.sample_format not in ['txt', 'npy']:
+            raise NameError('\nThe sample format should be txt or npy.')
+
         self.count_dict = None
         self.class_list = None
         self.n_classes = None
@@ -157,11 +221,6 @@ class SampleImage(object):
         if not os.path.isfile(self.image_file):
             raise IOError('\n{} does not exist. It should be a raster image.'.format(self.image_file))
 
-        if self.neighbors and (self.n_jobs != 0):
-
-            logger.info('Cannot sample neighbors in parallel, so setting ``n_jobs`` to 0.')
-            self.n_jobs = 0
-
         self.d_name_points, f_name_points = os.path.split(self.points_file)
         self.f_base_points = os.path.splitext(f_name_points)[0]
 
@@ -245,9 +304,10 @@ class SampleImage(object):
         if isinstance(self.append_name, str):
 
             self.data_file = os.path.join(self.out_dir,
-                                          '{POINTS}__{RASTER}_{BASE}_SAMPLES.txt'.format(POINTS=self.f_base_points,
-                                                                                         RASTER=self.f_base_rst,
-                                                                                         BASE=self.append_name))
+                                          '{POINTS}__{RASTER}_{BASE}_SAMPLES.{EXT}'.format(POINTS=self.f_base_points,
+                                                                                           RASTER=self.f_base_rst,
+                                                                                           BASE=self.append_name,
+                                                                                           EXT=self.sample_format))
 
             # information samples file
             self.n_samps = os.path.join(self.out_dir,
@@ -258,8 +318,9 @@ class SampleImage(object):
         else:
 
             self.data_file = os.path.join(self.out_dir,
-                                          '{POINTS}__{RASTER}_SAMPLES.txt'.format(POINTS=self.f_base_points,
-                                                                                  RASTER=self.f_base_rst))
+                                          '{POINTS}__{RASTER}_SAMPLES.{EXT}'.format(POINTS=self.f_base_points,
+                                                                                    RASTER=self.f_base_rst,
+                                                                                    EXT=self.sample_format))
 
             # information samples file
             self.n_samps = os.path.join(self.out_dir,
@@ -387,8 +448,12 @@ class SampleImage(object):
         Writes samples to file
         """
 
-        df = pd.DataFrame(value_array, columns=headers)
-        df.to_csv(self.data_file, sep=',', index=False)
+        if self.sample_format == 'npy':
+            SampleStore.write(self.data_file, value_array, headers)
+        else:
+
+            df = pd.DataFrame(value_array, columns=headers)
+            df.to_csv(self.data_file, sep=',', index=False)
 
     def fill_dictionary(self):
 
@@ -418,6 +483,10 @@ class SampleImage(object):
             # Get X,Y coordinates.
             return geometry.GetX(), geometry.GetY()
 
+        x_coords = np.empty(self.n_feas, dtype='float64')
+        y_coords = np.empty(self.n_feas, dtype='float64')
+        pt_ids = list()
+
         # Iterate over each point feature
         #   in the vector file.
         for n in range(0, self.n_feas):
@@ -426,32 +495,39 @@ class SampleImage(object):
             feature = self.shp_info.lyr.GetFeature(n)
 
             # Get the current point.
-            x, y = get_xy(feature)
+            x_coords[n], y_coords[n] = get_xy(feature)
 
             # Get the class label.
-            pt_id = feature.GetField(self.class_id)
+            pt_ids.append(feature.GetField(self.class_id))
+
+            feature.Destroy()
+            feature = None
 
-            # Check if the sample points fall
-            #   within the [current] raster boundary.
-            if vector_tools.xy_within_image(x, y, self.m_info):
+        # Check if the sample points fall
+        #   within the [current] raster boundary.
+        within_image = np.where((x_coords > self.m_info.left) &
+                                (x_coords < self.m_info.right) &
+                                (y_coords > self.m_info.bottom) &
+                                (y_coords < self.m_info.top))[0]
 
-                # Get x, y coordinates and offsets.
-                x, y, x_off, y_off = vector_tools.get_xy_offsets(image_info=self.m_info,
-                                                                 x=x,
-                                                                 y=y)
+        # Get x, y coordinates and offsets of all points at once.
+        __, __, x_offsets, y_offsets = vector_tools.get_xy_offsets_array(image_info=self.m_info,
+                                                                         x=x_coords[within_image],
+                                                                         y=y_coords[within_image])
 
-                # Update the counter array with the current label.
-                self.count_dict[int(pt_id)] += self.updater
+        for n, x_off, y_off in zip(within_image.tolist(), x_offsets.tolist(), y_offsets.tolist()):
 
-                x = float('{:.6f}'.format(x))
-                y = float('{:.6f}'.format(y))
+            pt_id = pt_ids[n]
 
-                # Add x, y coordinates, image offset indices,
-                #   and class value to the dictionary.
-                self.coords_offsets[n] = [x, y, x_off, y_off, pt_id]
+            # Update the counter array with the current label.
+            self.count_dict[int(pt_id)] += self.updater
 
-            feature.Destroy()
-            feature = None
+            x = float('{:.6f}'.format(x_coords[n]))
+            y = float('{:.6f}'.format(y_coords[n]))
+
+            # Add x, y coordinates, image offset indices,
+            #   and class value to the dictionary.
+            self.coords_offsets[n] = [x, y, x_off, y_off, pt_id]
 
     def sample_image(self):
 
@@ -459,194 +535,128 @@ class SampleImage(object):
         The main image sampler
         """
 
-        # Convert position items to a list.
-        c_list = list(iteritems(self.coords_offsets))
+        # Sort by feature index position.
+        #   values = [x, y, x_off, y_off, pt_id]
+        c_list = [values for __, values in sorted(iteritems(self.coords_offsets))]
 
         # Get the number of sample points.
-        feature_length = len(self.coords_offsets)
-
-        if self.n_jobs != 0:
+        feature_length = len(c_list)
 
-            # Sample the image
-            value_arr = Parallel(n_jobs=self.n_jobs)(delayed(_sample_parallel)(f_bd,
-                                                                               self.image_file,
-                                                                               c_list,
-                                                                               self.accuracy,
-                                                                               feature_length)
-                                                     for f_bd in range(1, self.m_info.bands+1))
+        c_array = np.array(c_list, dtype='float64').reshape(feature_length, 5)
 
-            # Transpose the data to [samples x image layers].
-            value_arr = np.array(value_arr, dtype='float32').T
+        point_index = np.arange(0, feature_length)
 
-            # Check for coordinates with no data.
-            idx = np.where(value_arr.mean(axis=1) != -999)[0]
+        x_coords = c_array[:, 0]
+        y_coords = c_array[:, 1]
+        x_offsets = np.int64(c_array[:, 2])
+        y_offsets = np.int64(c_array[:, 3])
+        labels = c_array[:, 4]
 
-            # The order is the same as the point labels
-            #   because we iterate over the sorted (by
-            #   feature position) dictionary items
-            #   in both cases.
+        if (feature_length > 0) and ((x_offsets.max()-1 > self.m_info.cols) or (y_offsets.max()-1 > self.m_info.rows)):
+            raise ArrayOffsetError('Check the projections and extents of the datasets.')
 
-            # nx2 coordinate array
-            xy_coordinates = np.zeros((feature_length, 3), dtype='float32')
+        if self.neighbors:
 
-            # 1d of n length labels array
-            labels = np.zeros(feature_length, dtype='float32')
+            """
+            | |1| |
+            |4|x|2|
+            | |3| |
+                                   x         1        2       3       4
+            neighbor_offsets = [[0, 0], [0, -1], [1, 0], [0, 1], [-1, 0]]
+            """
 
-            # Sort by feature index position and
-            #   get the x, y coordinates.
-            for vi, values in enumerate(sorted(c_list)):
+            neighbor_offsets = np.array([[0, 0], [0, -1], [1, 0], [0, 1], [-1, 0]], dtype='int64')
 
-                # values[0] = feature index position
-                # values[1] = list of coordinate data
+            x_shifts = np.tile(neighbor_offsets[:, 0], feature_length)
+            y_shifts = np.tile(neighbor_offsets[:, 1], feature_length)
 
-                x = values[1][0]
-                y = values[1][1]
+            point_index = np.repeat(point_index, self.updater)
 
-                # Transform the x,y coordinates.
-                if isinstance(self.transform_xy_proj, int) or isinstance(self.transform_xy_proj, str):
+            x_offsets = x_offsets[point_index] + x_shifts
+            y_offsets = y_offsets[point_index] + y_shifts
 
-                    grid_envelope = dict(left=x,
-                                         right=x,
-                                         top=y,
-                                         bottom=y)
+            x_coords = x_coords[point_index] + (x_shifts * self.m_info.cellY)
+            y_coords = y_coords[point_index] + (y_shifts * -self.m_info.cellY)
 
-                    ptr = vector_tools.TransformExtent(grid_envelope,
-                                                       self.m_info.projection,
-                                                       to_epsg=self.transform_xy_proj)
+            labels = labels[point_index]
 
-                    x = ptr.left
-                    y = ptr.top
+            # Remove neighbors that fall outside of the image.
+            in_bounds = (x_offsets >= 0) & (x_offsets < self.m_info.cols) & \
+                        (y_offsets >= 0) & (y_offsets < self.m_info.rows)
 
-                # Fill index + x & y coordinates
-                xy_coordinates[vi] = [vi, x, y]
+            if not in_bounds.all():
 
-                # Fill labels
-                labels[vi] = values[1][4]
+                for out_label in labels[~in_bounds]:
+                    self.count_dict[int(out_label)] -= 1
 
-            if np.any(idx):
+                point_index = point_index[in_bounds]
+                x_offsets = x_offsets[in_bounds]
+                y_offsets = y_offsets[in_bounds]
+                x_coords = x_coords[in_bounds]
+                y_coords = y_coords[in_bounds]
+                labels = labels[in_bounds]
 
-                # Remove coordinates with no data.
-                value_arr = value_arr[idx]
-                xy_coordinates = xy_coordinates[idx]
-                labels = labels[idx]
+        logger.info('\nSampling {:,d} samples from {:d} image layers ...\n'.format(point_index.shape[0],
+                                                                                 self.m_info.bands))
 
-            try:
+        if self.n_jobs != 0:
 
-                # Combine all the x,y coordinates,
-                #   data, and sample value.
-                value_arr = np.c_[xy_coordinates,
-                                  value_arr,
-                                  labels]
+            # Sample the image
+            value_arr = Parallel(n_jobs=self.n_jobs)(delayed(_sample_parallel)(f_bd,
+                                                                               self.image_file,
+                                                                               x_offsets,
+                                                                               y_offsets,
+                                                                               self.block_size)
+                                                     for f_bd in range(1, self.m_info.bands+1))
 
-            except ArrayOffsetError:
-                raise ArrayOffsetError('Check the projections and extents of the datasets.')
+            # Transpose the data to [samples x image layers].
+            value_arr = np.array(value_arr, dtype='float32').T
 
         else:
 
-            # Create the array to write values to and
-            #   add three to columns -- one for the class
-            #   label, two for the x, y coordinates.
-            neighbor_offsets = [[0, -1], [1, 0], [0, 1], [-1, 0]]
-
-            value_arr = np.zeros((feature_length*self.updater, self.m_info.bands+4), dtype='float32')
-
-            logger.info('\nSampling {:,d} samples from {:d} image layers ...\n'.format(feature_length, self.m_info.bands))
-
-            ctr, pbar = _iteration_parameters_values(self.m_info.bands, feature_length)
-
-            to_delete = []
+            band_objects = [self.m_info.datasource.GetRasterBand(f_bd) for f_bd in range(1, self.m_info.bands+1)]
 
-            # Iterate over each band.
-            for f_bd in range(1, self.m_info.bands+1):
+            value_arr = _sample_blocks(band_objects,
+                                       x_offsets,
+                                       y_offsets,
+                                       block_rows=self.block_size,
+                                       block_cols=self.block_size)
 
-                band = self.m_info.datasource.GetRasterBand(f_bd)
+            band_objects = None
 
-                point_iter = 0      # necessary because of neighbors
-
-                # Iterate over each point.
-                #   values = [x, y, x_off, y_off, pt_id]
-
-                # Sort by feature index position.
-                for vi, values in enumerate(sorted(c_list)):
-
-                    # Get the image offset indices.
-                    x_off = values[1][2]
-                    y_off = values[1][3]
-
-                    if (x_off-1 > self.m_info.cols) or (y_off-1 > self.m_info.rows):
-                        raise ArrayOffsetError('Check the projections and extents of the datasets.')
-
-                    # Get the image value.
-                    value = band.ReadAsArray(x_off, y_off, 1, 1)
-
-                    if isinstance(value, np.ndarray):
-                        value = np.float32(value[0, 0])
-                    else:
-                        continue
-
-                    if not self.accuracy:
-                        value = float(('{:.4f}'.format(value)))
-                    else:
-                        value = int(value)
-
-                    # Update value the list.
-                    value_arr[point_iter, 0] = vi               # Index id
-                    value_arr[point_iter, 1:3] = values[1][:2]  # x,y coordinates
-                    value_arr[point_iter, f_bd+2] = value       # raster values
-                    value_arr[point_iter, -1] = values[1][4]    # class label
-
-                    if self.neighbors:
-
-                        """
-                        | |1| |
-                        |4|x|2|
-                        | |3| |
-                                            1         2       3       4
-                        neighbor_offsets = [[0, -1], [1, 0], [0, 1], [-1, 0]]
-                        """
-
-                        for noff in range(1, self.updater):
-
-                            if (x_off + neighbor_offsets[noff-1][0] >= self.m_info.cols) or \
-                                    (y_off + neighbor_offsets[noff-1][1] >= self.m_info.rows):
-
-                                to_delete.append(point_iter + noff)
-                                self.count_arr[self.n_classes.index(values[1][4])] -= 1
-
-                                continue
-
-                            else:
-
-                                value = band.ReadAsArray(x_off+neighbor_offsets[noff-1][0],
-                                                         y_off+neighbor_offsets[noff-1][1], 1, 1).astype(np.float32)[0, 0]
-
-                            if not self.accuracy:
-                                value = float(('{:.4f}'.format(value)))
-                            else:
-                                value = int(value)
-
-                            # Write to array.
-                            value_arr[point_iter+noff, 0] = \
-                                values[1][0] + (neighbor_offsets[noff-1][0] * self.m_info.cellY)
-
-                            value_arr[point_iter+noff, 1] = \
-                                values[1][1] + (neighbor_offsets[noff-1][1] * -self.m_info.cellY)
+        if not self.accuracy:
+            value_arr = np.round(np.float64(value_arr), 4)
+        else:
+            value_arr = np.float32(np.trunc(value_arr))
 
-                            value_arr[point_iter+noff, f_bd+1] = value
-                            value_arr[point_iter+noff, -1] = values[1][4]
+        # Transform the x,y coordinates.
+        if isinstance(self.transform_xy_proj, int) or isinstance(self.transform_xy_proj, str):
 
-                    point_iter += self.updater
+            x_coords, y_coords = vector_tools.transform_points(x_coords,
+                                                               y_coords,
+                                                               self.m_info.projection,
+                                                               self.transform_xy_proj)
 
-                    pbar.update(ctr)
-                    ctr += 1
+        # Check for coordinates with no data.
+        idx = np.where(value_arr.mean(axis=1) != -999)[0]
 
-                band.FlushCache()
-                band = None
+        if idx.shape[0] < value_arr.shape[0]:
 
-            pbar.finish()
+            # Remove coordinates with no data.
+            value_arr = value_arr[idx]
+            point_index = point_index[idx]
+            x_coords = x_coords[idx]
+            y_coords = y_coords[idx]
+            labels = labels[idx]
 
-            if to_delete:
-                value_arr = np.delete(value_arr, np.array(to_delete), axis=0)
+        # Combine the index, the x,y coordinates,
+        #   the data, and the sample value. Float64
+        #   keeps the ids and coordinates exact.
+        value_arr = np.float64(np.c_[point_index,
+                                     x_coords,
+                                     y_coords,
+                                     value_arr,
+                                     labels])
 
         value_arr[np.isnan(value_arr) | np.isinf(value_arr)] = 0.
 
@@ -703,7 +713,12 @@ class SampleImage(object):
                                                                                  RASTER=self.f_base_rst))
 
                 emat = error_matrix()
-                emat.get_stats(po_text=self.data_file, header=True)
+
+                if self.sample_format == 'npy':
+                    emat.get_stats(po_array=SampleStore(self.data_file).samples)
+                else:
+                    emat.get_stats(po_text=self.data_file, header=True)
+
                 emat.write_stats(error_file)
 
 
@@ -719,7 +734,9 @@ def sample_raster(points,
                   sql_expression_attr=None,
                   neighbors=False,
                   search_ext=None,
-                  n_jobs=0):
+                  n_jobs=0,
+                  block_size=256,
+                  sample_format='txt'):
     
     """
     Samples an image, or imagery, using a point, or points, shapefile.
@@ -743,6 +760,9 @@ def sample_raster(points,
         neighbors (Optional[bool]): Whether to sample neighboring pixels. Default is False.
         search_ext (Optional[str list]): A list of file extensions to search. Default is ['tif'].
         n_jobs (Optional[int]): The number of parallel jobs. Default is 0.
+        block_size (Optional[int]): The block size used to group points for reading. Default is 256.
+        sample_format (Optional[str]): The samples file format. Default is 'txt'. Choices are ['txt', 'npy'],
+            where 'npy' writes a binary sample store that ``classification.split_samples`` memory-maps.
 
     Returns:
         None, writes results to ``out_dir``.
@@ -767,7 +787,9 @@ def sample_raster(points,
                          use_extent=use_extent,
                          neighbors=neighbors,
                          sql_expression_attr=sql_expression_attr,
-                         sql_expression_field=sql_expression_field)
+                         sql_expression_field=sql_expression_field,
+                         block_size=block_size,
+                         sample_format=sample_format)
 
         si.sample()
 
@@ -794,7 +816,9 @@ def sample_raster(points,
                              use_extent=use_extent,
                              neighbors=neighbors,
                              sql_expression_attr=sql_expression_attr,
-                             sql_expression_field=sql_expression_field)
+                             sql_expression_field=sql_expression_field,
+                             block_size=block_size,
+                             sample_format=sample_format)
 
             si.sample()
 
@@ -817,7 +841,9 @@ def sample_raster(points,
                              use_extent=use_extent,
                              neighbors=neighbors,
                              sql_expression_attr=sql_expression_attr,
-                             sql_expression_field=sql_expression_field)
+                             sql_expression_field=sql_expression_field,
+                             block_size=block_size,
+                             sample_format=sample_format)
 
             si.sample()
 
@@ -873,6 +899,10 @@ def main():
                         action='store_true')
     parser.add_argument('-a', '--accuracy', dest='accuracy', help='Whether to compute accuracy', action='store_true')
     parser.add_argument('-j', '--n_jobs', dest='n_jobs', help='Number of parallel jobs', default=0, type=int)
+    parser.add_argument('--block_size', dest='block_size', help='The block size used to group points for reading',
+                        default=256, type=int)
+    parser.add_argument('--sample_format', dest='sample_format', help='The samples file format', default='txt',
+                        choices=['txt', 'npy'])
     parser.add_argument('--sql_attr', dest='sql_attr', help='The SQL field attributes', default=[], nargs='+')
     parser.add_argument('--sql_field', dest='sql_field', help='The SQL class field', default='Id')
     parser.add_argument('--options', dest='options', help='Whether to show sampling options', action='store_true')
@@ -891,7 +921,8 @@ def main():
 
     sample_raster(args.shapefile, args.input, out_dir=args.output, option=args.option, class_id=args.classid,
                   accuracy=args.accuracy, field_type=args.fieldtype, neighbors=args.neighbors,
-                  n_jobs=args.n_jobs, sql_expression_attr=args.sql_attr, sql_expression_field=args.sql_field)
+                  n_jobs=args.n_jobs, sql_expression_attr=args.sql_attr, sql_expression_field=args.sql_field,
+                  block_size=args.block_size, sample_format=args.sample_format)
 
     logger.info('\nEnd data & time -- (%s)\nTotal processing time -- (%.2gs)\n' %
                 (time.asctime(time.localtime(time.time())), (time.time()-start_time)))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import os
+import json
+
+from ..errors import logger
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('NumPy must be installed.')
+
+# Pandas
+try:
+    import pandas as pd
+except ImportError:
+    raise ImportError('Pandas must be installed.')
+
+
+STORE_EXT = '.npy'
+
+
+def _store_names(file_name):
+
+    """
+    Gets the file names of a sample store
+
+    Args:
+        file_name (str): The sample store (.npy) file.
+
+    Returns:
+        The header, sample weight, and clear observation file names.
+    """
+
+    f_base = os.path.splitext(file_name)[0]
+
+    return '{}.json'.format(f_base), '{}_weights.npy'.format(f_base), '{}_clear.npy'.format(f_base)
+
+
+def is_sample_store(file_name):
+
+    """
+    Checks whether a file is a sample store
+
+    Args:
+        file_name (str)
+
+    Returns:
+        True if ``file_name`` is a sample store, otherwise False.
+    """
+
+    return isinstance(file_name, str) and \
+        file_name.lower().endswith(STORE_EXT) and \
+        os.path.isfile(_store_names(file_name)[0])
+
+
+class SampleStore(object):
+
+    """
+    A binary, memory-mapped store of samples
+
+    The samples are kept in the column order of the samples text file (e.g., Id, X, Y, features, response)
+    as one [samples x columns] float64 .npy file, so opening the store does not parse or copy the samples.
+    Float64 keeps large sample ids and projected coordinates exact.
+    The column headers are kept in a .json file of the same base name, and optional sample weights and clear
+    observation counts in <base>_weights.npy and <base>_clear.npy.
+
+    Args:
+        file_name (str): The sample store (.npy) file.
+        mmap_mode (Optional[str]): The memory-map mode passed to ``np.load``. Default is 'c', or copy-on-write,
+            so in-place changes to the samples are never written to the store.
+
+    Attributes:
+        samples (2d array): The samples, as a memory-mapped array.
+        headers (str list): The column headers.
+        sample_weight (1d array): The sample weights, or None.
+        clear_observations (1d array): The clear observation counts, or None.
+
+    Examples:
+        >>> from mpglue.classification.sample_store import SampleStore
+        >>>
+        >>> SampleStore.write('/samples.npy', samples, headers, clear_observations=n_clear)
+        >>>
+        >>> store = SampleStore('/samples.npy')
+        >>> df = store.to_frame()
+    """
+
+    def __init__(self, file_name, mmap_mode='c'):
+
+        self.file_name = file_name
+
+        header_file, weights_file, clear_file = _store_names(self.file_name)
+
+        if not os.path.isfile(self.file_name) or not os.path.isfile(header_file):
+
+            logger.error('  {} is not a sample store.'.format(self.file_name))
+            raise IOError
+
+        with open(header_file, 'r') as header_reader:
+            self.headers = json.load(header_reader)['headers']
+
+        self.samples = np.load(self.file_name, mmap_mode=mmap_mode)
+
+        if self.samples.shape[1] != len(self.headers):
+
+            logger.error('  The sample store columns and headers do not match.')
+            raise AssertionError
+
+        self.sample_weight = np.load(weights_file, mmap_mode=mmap_mode) if os.path.isfile(weights_file) else None
+        self.clear_observations = np.load(clear_file, mmap_mode=mmap_mode) if os.path.isfile(clear_file) else None
+
+    def to_frame(self):
+
+        """
+        Returns the samples as a DataFrame that shares memory with the store
+        """
+
+        return pd.DataFrame(self.samples, columns=self.headers, copy=False)
+
+    @staticmethod
+    def write(file_name, samples, headers, sample_weight=None, clear_observations=None):
+
+        """
+        Writes a sample store
+
+        Args:
+            file_name (str): The sample store (.npy) file.
+            samples (2d array): The samples, as [samples x columns].
+            headers (str list): The column headers.
+            sample_weight (Optional[1d array]): Sample weights. Default is None.
+            clear_observations (Optional[1d array]): Clear observation counts. Default is None.
+        """
+
+        if not file_name.lower().endswith(STORE_EXT):
+
+            logger.error('  The sample store must be a {} file.'.format(STORE_EXT))
+            raise NameError
+
+        if samples.shape[1] != len(headers):
+
+            logger.error('  The sample columns and headers do not match.')
+            raise AssertionError
+
+        header_file, weights_file, clear_file = _store_names(file_name)
+
+        np.save(file_name, np.ascontiguousarray(samples, dtype='float64'))
+
+        for optional_array, optional_file, optional_type in [(sample_weight, weights_file, 'float32'),
+                                                             (clear_observations, clear_file, 'uint64')]:
+
+            if isinstance(optional_array, np.ndarray) or isinstance(optional_array, list):
+
+                optional_array = np.array(optional_array, dtype=optional_type).ravel()
+
+                if optional_array.shape[0] != samples.shape[0]:
+
+                    logger.error('  The sample and {} lengths do not match.'.format(os.path.basename(optional_file)))
+                    raise AssertionError
+
+                np.save(optional_file, optional_array)
+
+            elif os.path.isfile(optional_file):
+                os.remove(optional_file)
+
+        with open(header_file, 'w') as header_writer:
+            json.dump(dict(headers=list(map(str, headers))), header_writer)
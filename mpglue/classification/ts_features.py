@@ -1,217 +1,155 @@
+from multiprocessing.pool import ThreadPool
+
 from ..errors import logger
 from ..stats._rolling_stats import rolling_stats
 
 import numpy as np
 
 
-def _nan_reshape(Xd, no_data):
-
-    Xd[np.isnan(Xd) | np.isinf(Xd)] = no_data
-
-    return Xd[:, np.newaxis]
-
-
-def _mean(X, axis=1, no_data=0):
-
-    """
-    Computes the mean
-    """
-
-    X_ = X.mean(axis=axis)
+# Features computed from the sorted time series
+_PERCENTILE_FEATURES = dict(five=5,
+                            twenty_five=25,
+                            fifty=50,
+                            seventy_five=75,
+                            ninety_five=95)
 
-    return _nan_reshape(X_, no_data)
+# Features computed from the cumulative sum of the time series
+_CUMULATIVE_FEATURES = dict(five_cumulative=5,
+                            twenty_five_cumulative=25,
+                            fifty_cumulative=50,
+                            seventy_five_cumulative=75,
+                            ninety_five_cumulative=95)
 
+# All of the available features
+_FEATURE_NAMES = ('mean', 'cv') + tuple(_PERCENTILE_FEATURES) + tuple(_CUMULATIVE_FEATURES) + ('slopes', 'max_diff')
 
-def _cv(X, axis=1, no_data=0):
-
-    """
-    Computes the coefficient of variation
-    """
-
-    X_ = X.std(axis=axis) / X.mean(axis=axis)
-
-    return _nan_reshape(X_, no_data)
-
-
-def _five_cumulative(X, axis=1, no_data=0):
-
-    """
-    Computes the value at the cumulative 5th percentile
-    """
-
-    x_range = range(0, X.shape[1]+1)
 
-    # Cumulative sum
-    X_ = X.cumsum(axis=axis)
-
-    # Position at the nth percentile
-    pct_idx = int(np.ceil(np.percentile(x_range, 5)))
-
-    # Values at the nth percentile
-    X_ = X_[:, pct_idx]
-
-    return _nan_reshape(X_, no_data)
-
-
-def _twenty_five_cumulative(X, axis=1, no_data=0):
-
-    """
-    Computes the value at the cumulative 25th percentile
-    """
-
-    x_range = range(0, X.shape[1]+1)
-
-    # Cumulative sum
-    X_ = X.cumsum(axis=axis)
-
-    # Position at the nth percentile
-    pct_idx = int(np.ceil(np.percentile(x_range, 25)))
+def _nan_reshape(Xd, no_data):
 
-    # Values at the nth percentile
-    X_ = X_[:, pct_idx]
+    Xd[np.isnan(Xd) | np.isinf(Xd)] = no_data
 
-    return _nan_reshape(X_, no_data)
+    return Xd[:, np.newaxis]
 
 
-def _fifty_cumulative(X, axis=1, no_data=0):
+def _slopes(X, axis=None, no_data=0):
 
     """
-    Computes the value at the cumulative 50th percentile
+    Computes min. and max. moving slope
     """
 
-    x_range = range(0, X.shape[1]+1)
-
-    # Cumulative sum
-    X_ = X.cumsum(axis=axis)
+    # Reshape to [dims x samples].
+    X_min, X_max = rolling_stats(X.T,
+                                 stat='slope',
+                                 window_size=15)
 
-    # Position at the nth percentile
-    pct_idx = int(np.ceil(np.percentile(x_range, 50)))
+    return np.hstack((_nan_reshape(X_min, no_data),
+                      _nan_reshape(X_min, no_data)))
 
-    # Values at the nth percentile
-    X_ = X_[:, pct_idx]
 
-    return _nan_reshape(X_, no_data)
+def _feature_width(feature_name):
+    return 2 if feature_name == 'slopes' else 1
 
 
-def _seventy_five_cumulative(X, axis=1, no_data=0):
+def _sorted_percentile(X_sorted, q):
 
     """
-    Computes the value at the cumulative 75th percentile
-    """
-
-    x_range = range(0, X.shape[1]+1)
-
-    # Cumulative sum
-    X_ = X.cumsum(axis=axis)
-
-    # Position at the nth percentile
-    pct_idx = int(np.ceil(np.percentile(x_range, 75)))
-
-    # Values at the nth percentile
-    X_ = X_[:, pct_idx]
-
-    return _nan_reshape(X_, no_data)
-
-
-def _ninety_five_cumulative(X, axis=1, no_data=0):
+    Computes a percentile from time series sorted along the second axis
 
-    """
-    Computes the value at the cumulative 95th percentile
+    The linear interpolation matches ``np.percentile``.
     """
 
-    x_range = range(0, X.shape[1]+1)
+    position = (q / 100.0) * (X_sorted.shape[1] - 1)
 
-    # Cumulative sum
-    X_ = X.cumsum(axis=axis)
+    lower_idx = int(np.floor(position))
+    upper_idx = min(lower_idx + 1, X_sorted.shape[1] - 1)
 
-    # Position at the nth percentile
-    pct_idx = int(np.ceil(np.percentile(x_range, 95)))
+    weight = position - lower_idx
 
-    # Values at the nth percentile
-    X_ = X_[:, pct_idx]
+    X_lower = X_sorted[:, lower_idx]
+    X_diff = X_sorted[:, upper_idx] - X_lower
 
-    return _nan_reshape(X_, no_data)
+    if weight >= 0.5:
+        return X_sorted[:, upper_idx] - X_diff * (1.0 - weight)
+    else:
+        return X_lower + X_diff * weight
 
 
-def _five(X, axis=1, no_data=0):
+def _fused_features(X, feature_names, out_array, no_data=0):
 
     """
-    Computes the 5th percentile
-    """
-
-    X_ = np.percentile(X, 5, axis=axis)
+    Computes time series features in one pass over a block of samples
 
-    return _nan_reshape(X_, no_data)
+    Each time series is sorted once for all of the percentiles, and the cumulative
+    sum and mean are computed once and shared across features. The NumPy routines
+    used here release the GIL, so blocks can be processed in threads.
 
-
-def _twenty_five(X, axis=1, no_data=0):
-
-    """
-    Computes the 25th percentile
+    Args:
+        X (2d array): The time series, as [samples x time steps].
+        feature_names (str list): The features to compute.
+        out_array (2d array): The output array, as [samples x feature columns].
+        no_data (Optional[int or float]): The value given to undefined features. Default is 0.
     """
 
-    X_ = np.percentile(X, 25, axis=axis)
+    n_steps = X.shape[1]
 
-    return _nan_reshape(X_, no_data)
+    X_sorted = None
+    X_cumsum = None
+    X_mean = None
 
+    if any([feature_name in _PERCENTILE_FEATURES for feature_name in feature_names]):
 
-def _fifty(X, axis=1, no_data=0):
+        X_sorted = np.sort(X, axis=1)
 
-    """
-    Computes the 50th percentile (median)
-    """
+        # NaNs are sorted to the end of each time series,
+        #   and np.percentile returns NaN for those samples.
+        nan_samples = np.isnan(X_sorted[:, -1]) if X_sorted.dtype.kind == 'f' else None
 
-    X_ = np.percentile(X, 50, axis=axis)
+    if any([feature_name in _CUMULATIVE_FEATURES for feature_name in feature_names]):
+        X_cumsum = X.cumsum(axis=1)
 
-    return _nan_reshape(X_, no_data)
+    if ('mean' in feature_names) or ('cv' in feature_names):
+        X_mean = X.mean(axis=1)
 
+    column = 0
 
-def _seventy_five(X, axis=1, no_data=0):
+    for feature_name in feature_names:
 
-    """
-    Computes the 75th percentile
-    """
+        if feature_name in _PERCENTILE_FEATURES:
 
-    X_ = np.percentile(X, 75, axis=axis)
+            X_ = _sorted_percentile(X_sorted, _PERCENTILE_FEATURES[feature_name])
 
-    return _nan_reshape(X_, no_data)
+            if isinstance(nan_samples, np.ndarray):
+                X_[nan_samples] = np.nan
 
+        elif feature_name in _CUMULATIVE_FEATURES:
 
-def _ninety_five(X, axis=1, no_data=0):
+            # Position at the nth percentile
+            pct_idx = int(np.ceil(np.percentile(range(0, n_steps+1), _CUMULATIVE_FEATURES[feature_name])))
 
-    """
-    Computes the 95th percentile
-    """
+            X_ = X_cumsum[:, min(pct_idx, n_steps-1)]
 
-    X_ = np.percentile(X, 95, axis=axis)
+        elif feature_name == 'mean':
+            X_ = X_mean
 
-    return _nan_reshape(X_, no_data)
+        elif feature_name == 'cv':
+            X_ = np.sqrt(np.square(X - X_mean[:, np.newaxis]).mean(axis=1)) / X_mean
 
+        elif feature_name == 'max_diff':
+            X_ = np.abs(np.diff(X, n=2, axis=1)).max(axis=1)
 
-def _slopes(X, axis=None, no_data=0):
+        elif feature_name == 'slopes':
 
-    """
-    Computes min. and max. moving slope
-    """
+            out_array[:, column:column+2] = _slopes(X, no_data=no_data)
 
-    # Reshape to [dims x samples].
-    X_min, X_max = rolling_stats(X.T,
-                                 stat='slope',
-                                 window_size=15)
-
-    return np.hstack((_nan_reshape(X_min, no_data),
-                      _nan_reshape(X_min, no_data)))
+            column += 2
 
+            continue
 
-def _max_diff(X, axis=1, no_data=0):
-
-    """
-    Computes the maximum difference
-    """
+        out_array[:, column] = X_
 
-    X_ = np.abs(np.diff(X, n=2, axis=axis)).max(axis=axis)
+        column += 1
 
-    return _nan_reshape(X_, no_data)
+    out_array[~np.isfinite(out_array)] = no_data
 
 
 class TimeSeriesFeatures(object):
@@ -220,20 +158,6 @@ class TimeSeriesFeatures(object):
 
         self.ts_funcs = None
 
-        self._func_dict = dict(mean=_mean,
-                               cv=_cv,
-                               five=_five,
-                               twenty_five=_twenty_five,
-                               fifty=_fifty,
-                               seventy_five=_seventy_five,
-                               ninety_five=_ninety_five,
-                               five_cumulative=_five_cumulative,
-                               twenty_five_cumulative=_twenty_five_cumulative,
-                               fifty_cumulative=_fifty_cumulative,
-                               seventy_five_cumulative=_seventy_five_cumulative,
-                               ninety_five_cumulative=_ninety_five_cumulative,
-                               slopes=_slopes)
-
     def add_features(self, feature_list):
 
         """
@@ -256,12 +180,12 @@ class TimeSeriesFeatures(object):
                     'seventy_five_cumulative'
                     'ninety_five_cumulative'
                     'slopes'
+                    'max_diff'
         """
 
-        self.ts_funcs = [(feature_name, self._func_dict[feature_name]) for feature_name in feature_list
-                         if feature_name in self._func_dict]
+        self.ts_funcs = [feature_name for feature_name in feature_list if feature_name in _FEATURE_NAMES]
 
-    def apply_features(self, X=None, ts_indices=None, append_features=True, **kwargs):
+    def apply_features(self, X=None, ts_indices=None, append_features=True, n_jobs=1, chunk_size=100000, **kwargs):
 
         """
         Applies features to an array
@@ -270,59 +194,75 @@ class TimeSeriesFeatures(object):
             X (Optional[2d array]): The array to add features to.
             ts_indices (Optional[1-d array like]): A list of indices to index the time series. Default is None.
             append_features (Optional[bool]): Whether to append features to `X`. Default is True.
+            n_jobs (Optional[int]): The number of threads to process sample blocks with. Default is 1.
+            chunk_size (Optional[int]): The number of samples in each block. Default is 100000.
+            kwargs (Optional): Keyword arguments passed to the features (e.g., no_data).
+
+        Returns:
+            The features, appended to `X` if ``append_features=True``, as a 2d array.
         """
 
         if not isinstance(self.ts_funcs, list):
+
             logger.error('  The features must be added with `add_features`.')
+            raise AttributeError
 
-        if not append_features:
-            Xnew = None
+        feature_names = self.ts_funcs
+        n_features = sum([_feature_width(feature_name) for feature_name in feature_names])
 
-        for ts_func in self.ts_funcs:
+        if isinstance(ts_indices, np.ndarray) or isinstance(ts_indices, list):
+            X_ts = X[:, ts_indices]
+        else:
+            X_ts = X
 
-            if isinstance(ts_indices, np.ndarray) or isinstance(ts_indices, list):
+        # The slopes are returned in double precision.
+        if (X.dtype.kind == 'f') and ('slopes' not in feature_names):
+            out_type = X.dtype
+        else:
+            out_type = 'float64'
 
-                if append_features:
+        if append_features:
 
-                    X = np.hstack((X,
-                                   ts_func[1](X[:, ts_indices],
-                                              **kwargs)))
+            # Preallocate the output and copy `X` in once.
+            Xnew = np.empty((X.shape[0], X.shape[1] + n_features), dtype=out_type)
+            Xnew[:, :X.shape[1]] = X
 
-                else:
+            feature_array = Xnew[:, X.shape[1]:]
 
-                    if isinstance(Xnew, np.ndarray):
+        else:
 
-                        Xnew = np.hstack((Xnew,
-                                          ts_func[1](X[:, ts_indices],
-                                                     **kwargs)))
+            Xnew = np.empty((X.shape[0], n_features), dtype=out_type)
+            feature_array = Xnew
 
-                    else:
+        no_data = kwargs.get('no_data', 0)
 
-                        Xnew = ts_func[1](X[:, ts_indices],
-                                          **kwargs)
+        chunk_starts = list(range(0, X.shape[0], chunk_size))
 
-            else:
+        def _apply_chunk(chunk_start):
 
-                if append_features:
+            chunk_end = min(chunk_start + chunk_size, X.shape[0])
 
-                    X = np.hstack((X,
-                                   ts_func[1](X,
-                                              **kwargs)))
+            _fused_features(X_ts[chunk_start:chunk_end],
+                            feature_names,
+                            feature_array[chunk_start:chunk_end],
+                            no_data=no_data)
 
-                else:
+        if (n_jobs > 1) and (len(chunk_starts) > 1):
 
-                    if isinstance(Xnew, np.ndarray):
+            pool = ThreadPool(processes=n_jobs)
 
-                        Xnew = np.hstack((Xnew,
-                                          ts_func[1](X,
-                                                     **kwargs)))
+            try:
+                pool.map(_apply_chunk, chunk_starts)
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.close()
+                pool.join()
 
-                    else:
+        else:
 
-                        Xnew = ts_func[1](X,
-                                          **kwargs)
+            for chunk_start in chunk_starts:
+                _apply_chunk(chunk_start)
 
-        if append_features:
-            return X
-        else:
-            return Xnew
+        return Xnew
@@ -12,6 +12,7 @@ from builtins import int
 import os
 import shutil
 import fnmatch
+import importlib
 import random
 import datetime
 from collections import OrderedDict
@@ -376,6 +377,55 @@ def get_block_chunks(im_rows, im_cols, chunk_size, kernel_size):
     return block_chunks
 
 
+def get_halo_chunks(im_rows, im_cols, chunk_size, halo):
+
+    """
+    Gets non-overlapping block chunks with padded (halo) read windows
+
+    Args:
+        im_rows (int): The number of rows.
+        im_cols (int): The number of columns.
+        chunk_size (int): The block chunk size.
+        halo (int): The number of pixels to pad each side of a chunk with, clipped at the image edges.
+
+    Returns:
+
+        Indexes:
+            0: i :: chunk row index
+            1: iw :: padded row starting position
+            2: ip :: row start position of the chunk within the padded window
+            3: n_rows :: chunk row size
+            4: rw :: padded row size for GDAL
+            5: j :: chunk column index
+            6: jw :: padded column starting position
+            7: jp :: column start position of the chunk within the padded window
+            8: n_cols :: chunk column size
+            9: cw :: padded column size for GDAL
+    """
+
+    halo_chunks = []
+
+    for i in range(0, im_rows, chunk_size):
+
+        n_rows = n_rows_cols(i, chunk_size, im_rows)
+
+        iw = max(0, i - halo)
+        ip = i - iw
+        rw = min(im_rows, i + n_rows + halo) - iw
+
+        for j in range(0, im_cols, chunk_size):
+
+            n_cols = n_rows_cols(j, chunk_size, im_cols)
+
+            jw = max(0, j - halo)
+            jp = j - jw
+            cw = min(im_cols, j + n_cols + halo) - jw
+
+            halo_chunks.append((i, iw, ip, n_rows, rw, j, jw, jp, n_cols, cw))
+
+    return halo_chunks
+
+
 def move_files2back(image_list, list2move):
 
     """
@@ -477,3 +527,72 @@ class PickleIt(object):
             data_object = cp.load(ddp)
 
         return data_object
+
+
+class LazyModule(object):
+
+    """
+    A module that is imported on first attribute access
+
+    Heavy third-party libraries are wrapped so that importing mpglue (e.g., in short-lived
+    worker processes) does not pay their import cost until they are used.
+
+    Args:
+        module_name (str): The module to import.
+        error_message (Optional[str]): A message to log if the module cannot be imported. Default is None.
+        before_import (Optional[function]): A function to call before the module is imported. Default is None.
+
+    Examples:
+        >>> from mpglue.helpers import LazyModule
+        >>>
+        >>> pd = LazyModule('pandas', error_message='Pandas must be installed')
+        >>>
+        >>> # Pandas is imported here.
+        >>> df = pd.DataFrame()
+    """
+
+    def __init__(self, module_name, error_message=None, before_import=None):
+
+        self._module_name = module_name
+        self._error_message = error_message
+        self._before_import = before_import
+        self._module = None
+
+    def _load(self):
+
+        if self._module is None:
+
+            if self._before_import is not None:
+                self._before_import()
+
+            try:
+                self._module = importlib.import_module(self._module_name)
+            except ImportError:
+
+                if self._error_message is not None:
+                    logger.error('  {}'.format(self._error_message))
+
+                raise
+
+        return self._module
+
+    def is_available(self):
+
+        """
+        Checks whether the module can be imported, importing it if so
+        """
+
+        try:
+            self._load()
+        except ImportError:
+            return False
+
+        return True
+
+    def __getattr__(self, name):
+
+        # Only reached for attributes of the module.
+        if name.startswith('_module') or name in ['_error_message', '_before_import']:
+            raise AttributeError(name)
+
+        return getattr(self._load(), name)
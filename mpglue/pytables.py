@@ -340,72 +340,191 @@ class BaseHandler(SetFilter):
         # names = [x['Id'] for x in table.where("""(attribute == "ndvi") & (path == 228) & (row == 83)""")]
         # names = [x['Id'] for x in table.where("""(path == 228) & (row == 83)""")]
 
+        try:
+            h5_node = self.h5_file.get_node(array_name)
+        except NameError:
+            raise NameError('\nThe array does not exist.\n')
+
+        # Slice the node directly so that only
+        #   the chunks within the window are decompressed.
         if maximum:
+            return h5_node[i:i+rows, j:j+cols].max()
 
-            try:
-                return self.h5_file.get_node(array_name).read()[i:i+rows, j:j+cols].max()
-            except NameError:
-                raise NameError('\nThe array does not exist.\n')
+        if time_formatted:
 
-        else:
+            if isinstance(self.i, int) and not isinstance(rows, int):
 
-            try:
+                return h5_node[self.i,
+                               self.index_positions[0]:self.index_positions[-1]]
 
-                if time_formatted:
+            elif (isinstance(self.y, float) and not isinstance(rows, int)) or \
+                    (isinstance(self.y, list) and isinstance(self.y[0], float) and not isinstance(rows, int)):
 
-                    h5_node = self.h5_file.get_node(array_name).read()
+                if isinstance(self.x, list):
 
-                    if isinstance(self.i, int) and not isinstance(rows, int):
+                    self.i_ = [(i_ * self.info_dict['columns_r']) + j_ for i_, j_ in zip(self.i_, self.j_)]
 
-                        return self.h5_file.get_node(array_name).read()[self.i,
-                               self.index_positions[0]:self.index_positions[-1]]
+                    n_times = self.index_positions[-1] - self.index_positions[0] + 1
 
-                    elif (isinstance(self.y, float) and not isinstance(rows, int)) or \
-                            (isinstance(self.y, list) and isinstance(self.y[0], float) and not isinstance(rows, int)):
+                    time_windows = self.get_windows(array_name,
+                                                    [(i_, self.index_positions[0], 1, n_times) for i_ in self.i_])
 
-                        if isinstance(self.x, list):
-                            self.i_ = [(i_ * self.info_dict['columns_r']) + j_ for i_, j_ in zip(self.i_, self.j_)]
-                            return np.array([h5_node[i, self.index_positions[0]:self.index_positions[-1]+1]
-                                             for i in self.i_], dtype='float32')
-                        else:
-                            self.i_ = (self.i_ * self.info_dict['columns_r']) + self.j_
-                            return h5_node[self.i_, self.index_positions[0]:self.index_positions[-1]+1]
+                    return np.array(time_windows, dtype='float32').reshape(len(self.i_), n_times)
+
+                else:
+
+                    self.i_ = (self.i_ * self.info_dict['columns_r']) + self.j_
 
-                    elif isinstance(self.i, int) and isinstance(rows, int):
+                    return h5_node[self.i_, self.index_positions[0]:self.index_positions[-1]+1]
 
-                        return self.h5_file.get_node(array_name).read()[self.i:self.i+rows,
+            elif isinstance(self.i, int) and isinstance(rows, int):
+
+                return h5_node[self.i:self.i+rows,
                                self.index_positions[0]:self.index_positions[-1]]
 
-                    elif isinstance(self.y, float) and isinstance(rows, int):
+            elif isinstance(self.y, float) and isinstance(rows, int):
 
-                        self.i_ = (self.i_ * self.info_dict['columns_r']) + self.j_
+                self.i_ = (self.i_ * self.info_dict['columns_r']) + self.j_
 
-                        return self.h5_file.get_node(array_name).read()[self.i_:self.i_+rows,
+                return h5_node[self.i_:self.i_+rows,
                                self.index_positions[0]:self.index_positions[-1]]
 
+        else:
+
+            if isinstance(self.z, int) or isinstance(self.z, list):
+
+                if self.z == -1:
+
+                    return h5_node[:,
+                                   self.i:self.i+rows,
+                                   self.j:self.j+cols]
+
                 else:
 
-                    if isinstance(self.z, int) or isinstance(self.z, list):
+                    return h5_node[self.z,
+                                   self.i:self.i+rows,
+                                   self.j:self.j+cols]
 
-                        if self.z == -1:
+            else:
 
-                            return self.h5_file.get_node(array_name).read()[:,
-                                                                            self.i:self.i+rows,
-                                                                            self.j:self.j+cols]
+                return h5_node[self.i:self.i+rows,
+                               self.j:self.j+cols]
 
-                        else:
+    def get_windows(self, array_name, windows, z=None):
 
-                            return self.h5_file.get_node(array_name).read()[self.z,
-                                                                            self.i:self.i+rows,
-                                                                            self.j:self.j+cols]
+        """
+        Gets many small windows from an array in one pass over chunk order
 
-                    else:
+        Args:
+            array_name (str): The node name of the array to get.
+            windows (list): A list of (i, j, rows, cols) windows, where ``i`` and ``j`` are the
+                starting row and column positions.
+            z (Optional[int or list]): The band position(s) to get for 3d arrays. Default is None,
+                or all bands.
+
+        Returns:
+            A list of ndarrays, in the same order as ``windows``.
+
+        Examples:
+            >>> from mpglue.pytables import manage_pytables
+            >>>
+            >>> pt = manage_pytables()
+            >>> pt.open_hdf_file('/2000_p228.h5', mode='r')
+            >>>
+            >>> # open three 10 x 10 arrays
+            >>> pt.get_windows('/2000/p228r83/ETM/p228r83_etm_2000_0124_tcap_wetness',
+            >>>                [(0, 0, 10, 10), (500, 20, 10, 10), (30, 900, 10, 10)])
+        """
+
+        try:
+            h5_node = self.h5_file.get_node(array_name)
+        except NameError:
+            raise NameError('\nThe array does not exist.\n')
+
+        n_windows = len(windows)
 
-                        return self.h5_file.get_node(array_name).read()[self.i:self.i+rows,
-                                                                        self.j:self.j+cols]
+        if n_windows == 0:
+            return list()
 
-            except NameError:
-                raise NameError('\nThe array does not exist.\n')
+        window_arr = np.array(windows, dtype='int64').reshape(n_windows, 4)
+
+        window_list = [None] * n_windows
+
+        # Zero-size windows are not read.
+        empty_windows = (window_arr[:, 2] <= 0) | (window_arr[:, 3] <= 0)
+
+        if empty_windows.any():
+
+            if len(h5_node.shape) == 3:
+
+                if (z is None) or (z == -1):
+                    band_shape = (h5_node.shape[0],)
+                elif isinstance(z, int):
+                    band_shape = ()
+                else:
+                    band_shape = (len(z),)
+
+            else:
+                band_shape = ()
+
+            for wi in np.flatnonzero(empty_windows):
+
+                window_list[wi] = np.empty(band_shape + (max(window_arr[wi, 2], 0), max(window_arr[wi, 3], 0)),
+                                           dtype=h5_node.dtype)
+
+            window_idx = np.flatnonzero(~empty_windows)
+
+            if window_idx.shape[0] == 0:
+                return window_list
+
+        else:
+            window_idx = np.arange(0, n_windows)
+
+        # Contiguous arrays have no chunks,
+        #   so use the full array shape.
+        chunk_shape = h5_node.chunkshape if h5_node.chunkshape else h5_node.shape
+
+        chunk_rows, chunk_cols = chunk_shape[-2:]
+
+        # Get the chunk that each window starts in.
+        chunk_j = window_arr[window_idx, 1] // chunk_cols
+        chunk_keys = (window_arr[window_idx, 0] // chunk_rows) * (chunk_j.max() + 1) + chunk_j
+
+        # Sort the windows in chunk order.
+        key_order = window_idx[np.argsort(chunk_keys, kind='mergesort')]
+        sorted_keys = np.sort(chunk_keys, kind='mergesort')
+
+        chunk_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        chunk_ends = np.r_[chunk_starts[1:], window_idx.shape[0]]
+
+        for chunk_start, chunk_end in zip(chunk_starts, chunk_ends):
+
+            chunk_idx = key_order[chunk_start:chunk_end]
+
+            # Read the bounding window of all
+            #   windows that start in the chunk.
+            i = int(window_arr[chunk_idx, 0].min())
+            j = int(window_arr[chunk_idx, 1].min())
+            i_end = int((window_arr[chunk_idx, 0] + window_arr[chunk_idx, 2]).max())
+            j_end = int((window_arr[chunk_idx, 1] + window_arr[chunk_idx, 3]).max())
+
+            if len(h5_node.shape) == 3:
+
+                if (z is None) or (z == -1):
+                    chunk_array = h5_node[:, i:i_end, j:j_end]
+                else:
+                    chunk_array = h5_node[z, i:i_end, j:j_end]
+
+            else:
+                chunk_array = h5_node[i:i_end, j:j_end]
+
+            for wi in chunk_idx:
+
+                wi_, wj_, w_rows, w_cols = window_arr[wi]
+
+                window_list[wi] = chunk_array[..., wi_-i:wi_-i+w_rows, wj_-j:wj_-j+w_cols].copy()
+
+        return window_list
 
     def _get_offsets(self):
 
@@ -415,18 +534,14 @@ class BaseHandler(SetFilter):
 
         if isinstance(self.x, list):
 
-            self.i_ = []
-            self.j_ = []
-
-            for xs, ys in zip(self.x, self.y):
-
-                __, __, j_, i_ = vector_tools.get_xy_offsets(image_list=image_list,
-                                                             x=xs,
-                                                             y=ys,
-                                                             check_position=False)
+            # Get all of the offsets at once.
+            __, __, j_, i_ = vector_tools.get_xy_offsets_array(image_list=image_list,
+                                                               x=self.x,
+                                                               y=self.y,
+                                                               check_position=False)
 
-                self.i_.append(i_)
-                self.j_.append(j_)
+            self.i_ = i_.tolist()
+            self.j_ = j_.tolist()
 
         else:
 
@@ -17,6 +17,7 @@ import calendar
 
 # MapPy
 from . import raster_tools
+from .veg_indices import MultiVegIndices, _compute_block_indices, _get_out_type
 
 # NumPy
 try:
@@ -367,6 +368,35 @@ def scaled_jd2jd(scaled_jds, return_jd=True):
                                   l.split('-')[0]) for l in xd_smooth_labels]
 
 
+def _calibrate_block(dn_array, calibration, coefficients):
+
+    """
+    Calibrates every band of a block at once
+
+    Args:
+        dn_array (3d array): The DN block, shaped [bands x rows x columns].
+        calibration (str): The calibration. Choices are ['radiance', 'toar', 'dos', 'temperature'].
+        coefficients (dict): The per-band coefficients, each shaped [bands x 1 x 1]. See
+            ``CalibrateSensor.get_band_coefficients``.
+
+    Returns:
+        The calibrated block, as a 3d float32 array.
+    """
+
+    if calibration == 'temperature':
+
+        k1 = coefficients['k1']
+        k2 = coefficients['k2']
+
+        return ne.evaluate('where(dn_array <= 0, 0, k2 / log((k1 / dn_array) + 1))')
+
+    gain = coefficients['gain']
+    bias = coefficients['bias']
+    threshold = coefficients['threshold']
+
+    return ne.evaluate('where(dn_array <= threshold, 0, (dn_array * gain) + bias)')
+
+
 class Conversions(object):
 
     """
@@ -421,6 +451,42 @@ class Conversions(object):
             Radiance as ndarray.
         """
 
+        gain, bias = self.radiance_coefficients(band,
+                                                aster_gain_setting=aster_gain_setting,
+                                                cbers_series=cbers_series,
+                                                cbers_sensor=cbers_sensor,
+                                                landsat_gain=landsat_gain,
+                                                landsat_bias=landsat_bias,
+                                                wv2_abs_calibration_factor=wv2_abs_calibration_factor,
+                                                wv2_effective_bandwidth=wv2_effective_bandwidth)
+
+        radiance = np.float32(np.add(np.multiply(dn_array, gain), bias))
+
+        radiance[dn_array <= 0] = 0
+
+        return radiance
+
+    def radiance_coefficients(self, band, aster_gain_setting='high',
+                              cbers_series='CBERS2B', cbers_sensor='HRCCD', landsat_gain=None, landsat_bias=None,
+                              wv2_abs_calibration_factor=None, wv2_effective_bandwidth=None):
+
+        """
+        Gets the linear coefficients that convert digital numbers (DN) of one band to radiance
+
+        Args:
+            band (int): The band to calibrate.
+            aster_gain_setting (Optional[str]): See ``dn2radiance``.
+            cbers_series (Optional[str]): See ``dn2radiance``.
+            cbers_sensor (Optional[str]): See ``dn2radiance``.
+            landsat_gain (Optional[float]): See ``dn2radiance``.
+            landsat_bias (Optional[float]): See ``dn2radiance``.
+            wv2_abs_calibration_factor (Optional[float]): See ``dn2radiance``.
+            wv2_effective_bandwidth (Optional[float]): See ``dn2radiance``.
+
+        Returns:
+            The gain and bias, where L = (gain * DN) + bias.
+        """
+
         if self.sensor == 'ASTER':
 
             gain_setting_dict = {'high': 0, 'normal': 1, 'low1': 2, 'low2': 3}
@@ -435,8 +501,9 @@ class Conversions(object):
                             [.0209, .0417, .0556, .2450], 
                             [.0159, .0318, .0424, .2650]], dtype='float32')
 
-            radiance = np.float32(np.subtract(dn_array, 1.))
-            radiance = np.float32(np.multiply(radiance, ucc[int(band)-1][gain_setting_dict[aster_gain_setting]]))
+            band_ucc = float(ucc[int(band)-1][gain_setting_dict[aster_gain_setting]])
+
+            return band_ucc, -band_ucc
 
         elif self.sensor == 'CBERS':
 
@@ -447,26 +514,24 @@ class Conversions(object):
             else:
                 raise NameError('\nSeries not recoginized.\n')
 
-            radiance = np.float32(np.divide(dn_array, ucc[str(band)]))
+            return 1. / ucc[str(band)], 0.
 
         elif self.sensor.lower() in ['tm', 'etm', 'oli_tirs']:
 
             if not isinstance(landsat_gain, float) or not isinstance(landsat_bias, float):
                 raise ValueError('\nCalibration coefficients not set.\n')
 
-            radiance = ne.evaluate('(landsat_gain * dn_array) + landsat_bias')
+            return landsat_gain, landsat_bias
 
         elif self.sensor == 'WorldView2':
 
             if not wv2_abs_calibration_factor or not wv2_effective_bandwidth:
                 raise ValueError('\nCalibration coefficients not set.\n')
 
-            radiance = np.float32(np.divide(np.multiply(wv2_abs_calibration_factor[band-1], dn_array),
-                                            wv2_effective_bandwidth[band-1]))
-
-        radiance[dn_array <= 0] = 0
+            return wv2_abs_calibration_factor[band-1] / wv2_effective_bandwidth[band-1], 0.
 
-        return radiance
+        else:
+            raise NameError('\n{} is not a supported sensor.'.format(self.sensor))
 
     def radiance2reflectance(self, radiance_array, band, solar_angle=None, julian_day=None, bd_esun=None,
                              landsat_gain=None, landsat_bias=None, aster_solar_scheme='Smith',
@@ -492,9 +557,50 @@ class Conversions(object):
             Reflectance as ndarray.
         """
 
+        scale, offset = self.reflectance_coefficients(band,
+                                                      solar_angle=solar_angle,
+                                                      julian_day=julian_day,
+                                                      bd_esun=bd_esun,
+                                                      landsat_gain=landsat_gain,
+                                                      landsat_bias=landsat_bias,
+                                                      aster_solar_scheme=aster_solar_scheme,
+                                                      cbers_series=cbers_series,
+                                                      cbers_sensor=cbers_sensor)
+
+        reflectance = ne.evaluate('(radiance_array * scale) + offset')
+
+        reflectance[radiance_array <= 0] = 0.
+
+        return reflectance
+
+    def reflectance_coefficients(self, band, solar_angle=None, julian_day=None, bd_esun=None,
+                                 landsat_gain=None, landsat_bias=None, aster_solar_scheme='Smith',
+                                 cbers_series='CBERS2', cbers_sensor='HRCCD'):
+
+        """
+        Gets the linear coefficients that convert the radiance of one band to top of atmosphere reflectance
+
+        Args:
+            band (int): The band to calibrate.
+            solar_angle (float)
+            julian_day (int)
+            bd_esun (float): The band ESUN, required for Landsat TM and ETM+.
+            landsat_gain (float)
+            landsat_bias (float)
+            aster_solar_scheme (Optional[str]): See ``radiance2reflectance``.
+            cbers_series (Optional[str]): See ``radiance2reflectance``.
+            cbers_sensor (Optional[str]): See ``radiance2reflectance``.
+
+        Returns:
+            The scale and offset, where reflectance = (radiance * scale) + offset.
+        """
+
         d_sq = earth_sun_distance(julian_day)
-        pi = math.pi
-        cos0 = np.cos(np.radians(90. - solar_angle))
+        cos0 = math.cos(math.radians(90. - solar_angle))
+
+        # Landsat 8 reflectance is scaled directly from DN.
+        if self.sensor.lower() == 'oli_tirs':
+            return landsat_gain / cos0, landsat_bias / cos0
 
         if self.sensor == 'ASTER':
 
@@ -538,19 +644,10 @@ class Conversions(object):
 
             bd_esun = esun[band_positions[band]]
 
-        else:
+        elif bd_esun is None:
             raise NameError('\n{} is not a supported sensor.'.format(self.sensor))
 
-        if self.sensor.lower() == 'oli_tirs':
-            reflectance_equation = '((radiance_array * landsat_gain) + landsat_bias) / cos0'
-        else:
-            reflectance_equation = '(radiance_array * pi * d_sq) / (bd_esun * cos0)'
-
-        reflectance = ne.evaluate(reflectance_equation)
-
-        reflectance[radiance_array <= 0] = 0.
-
-        return reflectance
+        return (math.pi * d_sq) / (bd_esun * cos0), 0.
 
     def get_gain_bias(self, series, sensor, band_position, l_max, l_min, coeff_check):
 
@@ -694,25 +791,46 @@ class Conversions(object):
         self.path_radiance = self.get_path_rad(gain, bias, dn_dark, bd_esun, self.cos0,
                                                self.tz, self.tv, self.edown, self.d_sq)
 
-    def radiance2reflectance_dos(self, radiance_array, band_position, bd_esun, gain, bias,
-                                 sensor_angle=90., dn_dark=-999, min_dark=1000):
+    def dos_coefficients(self, band_position, bd_esun, gain, bias, sensor_angle=90., dn_dark=-999,
+                         dn_array=None, min_dark=1000):
+
+        """
+        Gets the linear coefficients that convert the radiance of one band to dark object subtracted reflectance
+
+        Args:
+            band_position (int): The band to calibrate.
+            bd_esun (float): The band ESUN.
+            gain (float): The band radiance gain.
+            bias (float): The band radiance bias.
+            sensor_angle (Optional[float]): The sensor viewing angle. Default is 90.
+            dn_dark (Optional[int]): The dark object DN. Default is -999, or search ``dn_array``.
+            dn_array (Optional[ndarray]): The array to search for the dark object DN. Default is None.
+            min_dark (Optional[int]): The minimum number of pixels of the dark object DN. Default is 1000.
+
+        Returns:
+            The scale and offset, where reflectance = (radiance * scale) + offset.
+        """
+
+        self.prepare_dark(dn_array, band_position, bd_esun, gain, bias, sensor_angle, dn_dark, min_dark)
+
+        denominator = self.tv * (bd_esun * self.cos0 * self.tz * self.edown)
 
-        self.prepare_dark(radiance_array, band_position, bd_esun, gain, bias, sensor_angle, dn_dark, min_dark)
+        # First to top of atmosphere reflectance ...
+        scale = (math.pi * self.d_sq) / (bd_esun * self.cos0)
 
-        pi = math.pi
-        d_sq = self.d_sq
-        path_radiance = self.path_radiance
-        tv = self.tv
-        tz = self.tz
-        cos0 = self.cos0
-        edown = self.edown
+        # ... then subtract the path radiance.
+        return (math.pi * scale) / denominator, -(math.pi * self.path_radiance) / denominator
 
-        reflectance_equation = '(radiance_array * pi * d_sq) / (bd_esun * cos0)'
+    def radiance2reflectance_dos(self, radiance_array, band_position, bd_esun, gain, bias,
+                                 sensor_angle=90., dn_dark=-999, min_dark=1000):
 
-        dos_equation = '(pi * (reflectance - path_radiance)) / (tv * (bd_esun * cos0 * tz * edown))'
+        scale, offset = self.dos_coefficients(band_position, bd_esun, gain, bias,
+                                              sensor_angle=sensor_angle,
+                                              dn_dark=dn_dark,
+                                              dn_array=radiance_array,
+                                              min_dark=min_dark)
 
-        reflectance = ne.evaluate(reflectance_equation)
-        reflectance = ne.evaluate(dos_equation)
+        reflectance = ne.evaluate('(radiance_array * scale) + offset')
 
         reflectance[radiance_array <= 0] = 0.
 
@@ -750,6 +868,12 @@ class CalibrateSensor(Conversions):
         >>> # Convert Landsat to top of atmosphere reflectance.
         >>> cal = rad_calibration.CalibrateSensor('/in_image.tif', 'TM')
         >>> cal.process('/out_image.tif', calibration='toar', metadata='/metadata.MTL')
+        >>>
+        >>> # Write NDVI and EVI from top of atmosphere reflectance,
+        >>> #   calibrating blocks in 4 threads.
+        >>> cal = rad_calibration.CalibrateSensor('/in_image.tif', 'TM')
+        >>> cal.process('/out_indices.tif', calibration='toar', metadata='/metadata.MTL',
+        >>>             index_list=['NDVI', 'EVI'], index_sensor='Landsat', n_jobs=4)
     """
 
     def __init__(self, input_image, sensor, bands2process=-1):
@@ -765,12 +889,18 @@ class CalibrateSensor(Conversions):
     def process(self, output_image, image_date=None, solar_angle=None, calibration='radiance', d_type='float32',
                 bd_esun_list=[], aster_gain_setting='high', aster_solar_scheme='Smith', cbers_series='CBERS2B',
                 cbers_sensor='HRCCD', landsat_gain_list=[], landsat_bias_list=[], k1=None, k2=None,
-                wv2_abs_calibration_factor=[], wv2_effective_bandwidth=[], metadata=None):
+                wv2_abs_calibration_factor=[], wv2_effective_bandwidth=[], metadata=None,
+                index_list=None, index_sensor=None, no_data=0, scale_factor=1., sensor_angle=90., min_dark=1000,
+                chunk_size=1024, n_jobs=1):
 
         """
         Args:
             output_image (str): The output image.
-            calibration (Optional[str]): Choices are ['radiance', 'toar', 'cost', 'dos2', 'dos3', 'dos4', 'temp'].
+            image_date (Optional[str]): The image date, as yyyy/mm/dd. Default is None, or get the date
+                from ``metadata``.
+            solar_angle (Optional[float]): The solar elevation angle. Default is None, or get the angle
+                from ``metadata``.
+            calibration (Optional[str]): Choices are ['radiance', 'toar', 'dos', 'temperature'].
             d_type (Optional[str]): The output storage type. Default is 'float32'.
                 Choices are ['float32', 'byte', 'uint16'].
             bd_esun_list (Optional[float list]): A list of ESUN coefficients (for each band to process)
@@ -785,6 +915,18 @@ class CalibrateSensor(Conversions):
             wv2_abs_calibration_factor (Optional[str]):
             wv2_effective_bandwidth (Optional[str]):
             metadata (Optional[object or str): A metadata file or object instance. Default is None.
+            index_list (Optional[str list]): A list of vegetation indices to compute from the calibrated
+                reflectance. Default is None, or write the calibrated bands. If given, only the indices are
+                written, one band per index, and ``d_type`` is the index storage type.
+            index_sensor (Optional[str]): The ``veg_indices`` sensor that gives the band order of
+                ``bands2process``, required with ``index_list``. E.g., 'Landsat' or 'Landsat8'.
+            no_data (Optional[int]): The output index 'no data' value. Default is 0.
+            scale_factor (Optional[float]): The index scale factor. Default is 1.
+            sensor_angle (Optional[float]): The sensor viewing angle for ``calibration`` = 'dos'. Default is 90.
+            min_dark (Optional[int]): The minimum number of pixels of the dark object DN for
+                ``calibration`` = 'dos'. Default is 1000.
+            chunk_size (Optional[int]): The block size, in rows and columns. Default is 1024.
+            n_jobs (Optional[int]): The number of blocks to calibrate in parallel threads. Default is 1.
 
         References:
             Chavez (1988)
@@ -810,7 +952,7 @@ class CalibrateSensor(Conversions):
         """
 
         self.output_image = output_image
-        self.calibration = calibration
+        self.calibration = calibration.lower()
         self.image_date = image_date
         self.solar_angle = solar_angle
         self.d_type = d_type
@@ -823,6 +965,9 @@ class CalibrateSensor(Conversions):
 
         self.landsat_sensors = ['tm', 'etm', 'oli_tirs']
 
+        if self.calibration not in ['radiance', 'toar', 'dos', 'temperature']:
+            raise NameError('\n{} is not a supported calibration.\n'.format(calibration))
+
         # Search for metadata.
         self.get_metadata()
 
@@ -839,9 +984,22 @@ class CalibrateSensor(Conversions):
 
         self.temp_settings = dict(k1=self.k1, k2=self.k2)
 
-        self.create_output()
+        self.get_bands2process()
+
+        if index_list:
+            self.setup_indices(index_list, index_sensor)
+        else:
+            self.index_list = None
+
+        if chunk_size == -1:
+            row_block_size, col_block_size = self.i_info.rows, self.i_info.cols
+        else:
 
-        row_block_size, col_block_size = raster_tools.block_dimensions(self.i_info.rows, self.i_info.cols)
+            row_block_size, col_block_size = raster_tools.block_dimensions(self.i_info.rows, self.i_info.cols,
+                                                                           row_block_size=chunk_size,
+                                                                           col_block_size=chunk_size)
+
+        block_list = list()
 
         for i in range(0, self.i_info.rows, row_block_size):
 
@@ -851,54 +1009,55 @@ class CalibrateSensor(Conversions):
 
                 n_cols = raster_tools.n_rows_cols(j, col_block_size, self.i_info.cols)
 
-                # Read the array block.
-                dn_array = self.i_info.read(bands2open=self.bands2process,
-                                               i=i, j=j,
-                                               rows=n_rows, cols=n_cols,
-                                               d_type='float32')
+                block_list.append((i, j, n_rows, n_cols))
+
+        # Get the coefficients of
+        #   every band once.
+        self.get_band_coefficients(block_list, sensor_angle=sensor_angle, min_dark=min_dark)
 
-                for out_band, band_position, dn_array in zip(self.band_range, self.bands2process, dn_array):
+        if self.index_list:
+            out_type = _get_out_type(self.d_type, no_data)
 
-                    # Update radiance settings.
-                    self.update_rad_settings(band_position)
+        self.create_output()
 
-                    # Convert DN to radiance.
-                    if self.sensor.lower() != 'oli_tirs':
-                        cal_array = self.dn2radiance(dn_array, band_position, **self.rad_settings)
-                    elif (self.sensor.lower() == 'oli_tirs') and (self.calibration.lower() == 'radiance'):
-                        cal_array = self.dn2radiance(dn_array, band_position, **self.rad_settings)
+        def _calc_block(block_infos, block):
 
-                    if self.calibration.lower() != 'radiance':
-                        self.update_toar_settings(band_position)
+            bi, bj, block_n_rows, block_n_cols = block
 
-                    if self.calibration.lower() == 'toar':
+            dn_array = self.read_block(block_infos['image'], bi, bj, block_n_rows, block_n_cols)
 
-                        # Convert radiance to top of atmosphere reflectance.
-                        if self.sensor.lower() == 'oli_tirs':
-                            cal_array = self.radiance2reflectance(dn_array, band_position, **self.refl_settings)
-                        else:
-                            cal_array = self.radiance2reflectance(cal_array, band_position, **self.refl_settings)
+            # All bands are calibrated at once.
+            cal_array = _calibrate_block(dn_array, self.calibration, self.coefficients)
 
-                    elif self.calibration.lower() == 'dos':
+            if self.index_list:
 
-                        cal_array = self.radiance2reflectance_dos(cal_array, band_position,
-                                                                  self.refl_settings['bd_esun'],
-                                                                  self.refl_settings['landsat_gain'],
-                                                                  self.refl_settings['landsat_bias'],
-                                                                  sensor_angle=90.,
-                                                                  dn_dark=-999, min_dark=1000)
+                # The reflectance is never written.
+                index_arrays, __ = _compute_block_indices(cal_array[self.index_bands],
+                                                          self.index_list,
+                                                          self.index_positions,
+                                                          out_type=out_type,
+                                                          scale_factor=scale_factor,
+                                                          chunk_size=chunk_size,
+                                                          no_data=no_data,
+                                                          in_no_data=0)
 
-                    elif self.calibration.lower() == 'temperature':
+                return block, index_arrays
 
-                        cal_array = self.radiance2kelvin(dn_array, **self.temp_settings)
+            # Scale the data to byte or uint16 storage.
+            if self.d_type != 'float32':
+                cal_array = self.scale_data(cal_array)
 
-                    # Scale the data to byte or uint16 storage.
-                    if self.d_type != 'float32':
-                        cal_array = self.scale_data(cal_array)
+            return block, cal_array
 
-                    self.out_rst.write_array(cal_array, i=i, j=j, band=out_band)
+        for block, out_arrays in raster_tools.imap_blocks(dict(image=self.input_image),
+                                                          _calc_block,
+                                                          block_list,
+                                                          n_jobs=n_jobs):
 
-                    self.out_rst.close_band()
+            i, j = block[:2]
+
+            for out_band, out_array in enumerate(out_arrays):
+                self.out_rst.write_array(out_array, i=i, j=j, band=out_band+1)
 
         # Close the input image.
         self.i_info.close()
@@ -908,6 +1067,178 @@ class CalibrateSensor(Conversions):
 
         self.out_rst = None
 
+    def read_block(self, block_info, i, j, n_rows, n_cols):
+
+        """
+        Reads the bands to process of one block
+
+        Returns:
+            The DN block as a 3d float32 array, shaped [bands x rows x columns].
+        """
+
+        dn_array = block_info.read(bands2open=self.bands2process,
+                                   i=i, j=j,
+                                   rows=n_rows, cols=n_cols,
+                                   sort_bands2open=False,
+                                   d_type='float32')
+
+        if len(dn_array.shape) == 2:
+            dn_array = dn_array[np.newaxis]
+
+        return dn_array
+
+    def get_band_coefficients(self, block_list, sensor_angle=90., min_dark=1000):
+
+        """
+        Gets the per-band calibration coefficients, as [bands x 1 x 1] vectors that broadcast over a block
+
+        Every calibration except 'temperature' is linear in DN, so radiance, reflectance and dark object
+        subtracted reflectance are all computed as (DN * gain) + bias, and set to 0 where DN <= threshold.
+
+        Args:
+            block_list (list): The image blocks, as (i, j, rows, columns), used to find the dark object DN.
+            sensor_angle (Optional[float]): See ``process``.
+            min_dark (Optional[int]): See ``process``.
+        """
+
+        n_bands = len(self.bands2process)
+
+        gains = np.ones(n_bands, dtype='float64')
+        biases = np.zeros(n_bands, dtype='float64')
+        thresholds = np.zeros(n_bands, dtype='float64')
+        k1s = np.zeros(n_bands, dtype='float64')
+        k2s = np.zeros(n_bands, dtype='float64')
+
+        if self.calibration == 'dos':
+            dn_darks = self.get_dark_values(block_list, min_dark=min_dark)
+
+        for bi, band_position in enumerate(self.bands2process):
+
+            # Update radiance settings.
+            self.update_rad_settings(band_position)
+
+            if self.calibration != 'radiance':
+                self.update_toar_settings(band_position)
+
+            if self.calibration == 'temperature':
+
+                k1s[bi] = self.temp_settings['k1']
+                k2s[bi] = self.temp_settings['k2']
+
+                continue
+
+            # Landsat 8 reflectance is
+            #   scaled directly from DN.
+            if (self.sensor.lower() == 'oli_tirs') and (self.calibration == 'toar'):
+                rad_gain, rad_bias = 1., 0.
+            else:
+                rad_gain, rad_bias = self.radiance_coefficients(band_position, **self.rad_settings)
+
+            if self.calibration == 'radiance':
+                scale, offset = 1., 0.
+            elif self.calibration == 'toar':
+                scale, offset = self.reflectance_coefficients(band_position, **self.refl_settings)
+            else:
+
+                scale, offset = self.dos_coefficients(band_position,
+                                                      self.refl_settings['bd_esun'],
+                                                      self.refl_settings['landsat_gain'],
+                                                      self.refl_settings['landsat_bias'],
+                                                      sensor_angle=sensor_angle,
+                                                      dn_dark=dn_darks[bi])
+
+            gains[bi] = rad_gain * scale
+            biases[bi] = (rad_bias * scale) + offset
+
+            # Reflectance is 0 where radiance <= 0.
+            if (self.calibration != 'radiance') and (rad_gain > 0):
+                thresholds[bi] = max(0., -rad_bias / rad_gain)
+
+        self.coefficients = dict(gain=gains,
+                                 bias=biases,
+                                 threshold=thresholds,
+                                 k1=k1s,
+                                 k2=k2s)
+
+        for coeff_key, coeff_vector in viewitems(self.coefficients):
+            self.coefficients[coeff_key] = np.float32(coeff_vector).reshape(n_bands, 1, 1)
+
+    def get_dark_values(self, block_list, min_dark=1000):
+
+        """
+        Gets the dark object DN of each band from the histogram of the full image
+
+        Args:
+            block_list (list): The image blocks, as (i, j, rows, columns).
+            min_dark (Optional[int]): The minimum number of pixels of the dark object DN. Default is 1000.
+
+        Returns:
+            The dark object DN of each band to process, as a list.
+        """
+
+        dn_counts = [np.zeros(1, dtype='int64') for bi in range(0, len(self.bands2process))]
+
+        for i, j, n_rows, n_cols in block_list:
+
+            dn_array = self.read_block(self.i_info, i, j, n_rows, n_cols)
+
+            for bi, band_array in enumerate(dn_array):
+
+                band_counts = np.bincount(np.int64(band_array[band_array >= 1]))
+
+                if band_counts.shape[0] > dn_counts[bi].shape[0]:
+                    band_counts[:dn_counts[bi].shape[0]] += dn_counts[bi]
+                    dn_counts[bi] = band_counts
+                else:
+                    dn_counts[bi][:band_counts.shape[0]] += band_counts
+
+        dn_darks = list()
+
+        for band_position, band_counts in zip(self.bands2process, dn_counts):
+
+            dark_idx = np.where(band_counts[1:] >= min_dark)[0]
+
+            if dark_idx.shape[0] == 0:
+                raise ValueError('\nNo dark object DN was found for band {:d}.\n'.format(band_position))
+
+            dn_darks.append(int(dark_idx[0]) + 1)
+
+        return dn_darks
+
+    def setup_indices(self, index_list, index_sensor):
+
+        """
+        Gets the bands of the calibrated block used by each vegetation index
+
+        Args:
+            index_list (str list): See ``process``.
+            index_sensor (str): See ``process``.
+        """
+
+        if self.calibration not in ['toar', 'dos']:
+            raise ValueError('\nVegetation indices require reflectance calibration.\n')
+
+        if not isinstance(index_sensor, str):
+            raise ValueError('\nThe index sensor must be given with the index list.\n')
+
+        vio = MultiVegIndices(self.input_image, index_list, index_sensor)
+
+        vio.meta_info.close()
+
+        if 'VCI' in vio.index_list:
+            raise ValueError('\nThe VCI cannot be computed from calibrated blocks.\n')
+
+        bands2process = list(self.bands2process)
+
+        if not set(vio.band_positions).issubset(bands2process):
+            raise ValueError('\nThe bands to process must include every index band.\n')
+
+        self.index_list = vio.index_list
+        self.index_positions = vio.index_positions
+
+        # The position of each index band in the calibrated block.
+        self.index_bands = [bands2process.index(band_position) for band_position in vio.band_positions]
+
     def update_toar_settings(self, band_position):
 
         # Landsat settings
@@ -923,9 +1254,12 @@ class CalibrateSensor(Conversions):
 
                 else:
 
-                    self.refl_settings['bd_esun'] = self.get_esun(self.pr.series,
-                                                                  raster_tools.SENSOR_DICT[self.pr.sensor.lower()],
-                                                                  band_position)
+                    # The thermal band has no ESUN.
+                    if self.calibration != 'temperature':
+
+                        self.refl_settings['bd_esun'] = self.get_esun(self.pr.series,
+                                                                      raster_tools.SENSOR_DICT[self.pr.sensor.lower()],
+                                                                      band_position)
 
                     k1, k2 = self.get_kelvin_coefficients(self.pr.series,
                                                           raster_tools.SENSOR_DICT[self.pr.sensor.lower()],
@@ -936,7 +1270,7 @@ class CalibrateSensor(Conversions):
 
             else:
 
-                bi = self.bands2process[self.bands2process.index(band_position)]
+                bi = self.bands2process.index(band_position)
 
                 self.refl_settings['bd_esun'] = self.bd_esun_list[bi]
 
@@ -978,7 +1312,7 @@ class CalibrateSensor(Conversions):
 
             else:
 
-                bi = self.bands2process[self.bands2process.index(band_position)]
+                bi = self.bands2process.index(band_position)
 
                 self.rad_settings['landsat_gain'] = self.landsat_gain_list[bi]
                 self.rad_settings['landsat_bias'] = self.landsat_bias_list[bi]
@@ -997,16 +1331,16 @@ class CalibrateSensor(Conversions):
                                      in_range=(0., 1.),
                                      out_range=(0, 10000)).astype(np.uint16)
 
-    def create_output(self):
+    def get_bands2process(self):
 
         if isinstance(self.bands2process, int) and self.bands2process == -1:
-            self.bands2process = range(1, self.i_info.bands+1)
+            self.bands2process = list(range(1, self.i_info.bands+1))
         elif isinstance(self.bands2process, int) and self.bands2process > 0:
             self.bands2process = [self.bands2process]
         elif isinstance(self.bands2process, int) and self.bands2process == 0:
             raise ValueError('\nThe bands to process must be -1, int > 0, or a list of bands.\n')
 
-        self.band_range = range(1, len(self.bands2process)+1)
+    def create_output(self):
 
         # Copy the input information.
         self.o_info = self.i_info.copy()
@@ -1014,6 +1348,11 @@ class CalibrateSensor(Conversions):
         # Change parameters if necessary.
         self.o_info.storage = self.d_type
 
+        if self.index_list:
+            self.o_info.bands = len(self.index_list)
+        else:
+            self.o_info.bands = len(self.bands2process)
+
         # Create the output.
         self.out_rst = raster_tools.create_raster(self.output_image, self.o_info)
 
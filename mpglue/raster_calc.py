@@ -40,6 +40,83 @@ except ImportError:
     raise ImportError('Numexpr must be installed')
 
 
+class _EquationPlan(object):
+
+    """
+    Compiles a raster calculator equation once
+
+    Args:
+        equation (str): The equation. Multiple outputs are separated by '&&'.
+        image_keys (list): The image names used in ``equation``.
+    """
+
+    def __init__(self, equation, image_keys):
+
+        self.expressions = list()
+
+        for sub_equation in equation.split('&&'):
+
+            sub_equation = sub_equation.strip()
+
+            if 'nan_to_num' in sub_equation:
+
+                # NumPy expressions
+                if not sub_equation.startswith('np.'):
+                    sub_equation = 'np.' + sub_equation
+
+                self.expressions.append(('numpy',
+                                         compile(sub_equation, '<raster_calc>', 'eval'),
+                                         list(image_keys)))
+
+            else:
+
+                var_names = ne.necompiler.getExprNames(sub_equation, {})[0]
+
+                missing_names = [var_name for var_name in var_names if var_name not in image_keys]
+
+                if missing_names:
+
+                    logger.error('  The equation variables {} were not given as images.'.format(', '.join(missing_names)))
+                    raise NameError
+
+                # Float32 arrays are the numexpr 'float' kind.
+                self.expressions.append(('numexpr',
+                                         ne.NumExpr(sub_equation,
+                                                    signature=[(var_name, float) for var_name in var_names]),
+                                         var_names))
+
+    @property
+    def n_outputs(self):
+        return len(self.expressions)
+
+    def evaluate(self, arrays):
+
+        """
+        Evaluates the equation
+
+        Args:
+            arrays (dict): The image arrays, keyed by image name.
+
+        Returns:
+            A list of arrays, one for each equation output.
+        """
+
+        outputs = list()
+
+        for expression_type, expression, var_names in self.expressions:
+
+            if expression_type == 'numexpr':
+                outputs.append(expression(*[arrays[var_name] for var_name in var_names]))
+            else:
+
+                expression_vars = dict(arrays)
+                expression_vars['np'] = np
+
+                outputs.append(eval(expression, expression_vars))
+
+        return outputs
+
+
 def raster_calc(output,
                 equation=None,
                 out_type='byte',
@@ -50,6 +127,7 @@ def raster_calc(output,
                 row_block_size=2000,
                 col_block_size=2000,
                 apply_all_bands=False,
+                n_jobs=1,
                 **kwargs):
 
     """
@@ -66,6 +144,8 @@ def raster_calc(output,
         row_block_size (Optional[int]): The row block chunk size. Default is 2000.
         col_block_size (Optional[int]): The column block chunk size. Default is 2000.
         apply_all_bands (Optional[bool]): Whether to apply the equation to all bands. Default is False.
+        n_jobs (Optional[int]): The number of threads to read and evaluate blocks with. Each thread opens
+            its own image handles. Default is 1.
         **kwargs (str): The rasters to compute. E.g., A='/some_raster1.tif', F='/some_raster2.tif'.
             Band positions default to 1 unless given as [A]_band.
 
@@ -96,6 +176,14 @@ def raster_calc(output,
         >>>             n_band=4,
         >>>             r='/some_raster.tif',
         >>>             r_band=3)
+        >>>
+        >>> # Write two output bands, evaluating blocks with 4 threads
+        >>> raster_calc('/output.tif',
+        >>>             equation='A * 2 && A + B',
+        >>>             out_type='float32',
+        >>>             n_jobs=4,
+        >>>             A='/some_raster1.tif',
+        >>>             B='some_raster2.tif')
 
     Returns:
         None, writes to ``output``.
@@ -146,31 +234,24 @@ def raster_calc(output,
         if isinstance(vw, str):
 
             image_dict[kw] = vw
-
-            exec('i_info_{} = raster_tools.ropen(r"{}")'.format(kw, vw))
-            exec('info_dict["{}"] = i_info_{}'.format(kw, kw))
-            exec('info_list.append(i_info_{})'.format(kw))
+            info_dict[kw] = raster_tools.ropen(vw)
+            info_list.append(info_dict[kw])
 
         if isinstance(vw, int):
             band_dict[kw] = vw
 
-    for key, value in viewitems(image_dict):
-        equation = equation.replace(key, 'marrvar_{}'.format(key))
-
-    # Check for NumPy functions.
-    # for np_func in dir(np):
-    #
-    #     if 'np.' + np_func in equation:
-    #
-    #         equation = 'np.{}'.format(equation)
-    #         break
+    # Parse the equation once.
+    equation_plan = _EquationPlan(equation, list(image_dict))
 
     for kw, vw in viewitems(info_dict):
 
         o_info = copy(vw)
         break
 
-    n_bands = 1 if not apply_all_bands else o_info.bands
+    if equation_plan.n_outputs > 1:
+        n_bands = equation_plan.n_outputs
+    else:
+        n_bands = 1 if not apply_all_bands else o_info.bands
 
     if isinstance(extent, raster_tools.ropen):
 
@@ -202,6 +283,16 @@ def raster_calc(output,
                        storage=out_type,
                        bands=n_bands)
 
+    # Get the image offsets once.
+    offset_dict = dict()
+
+    for key, value in viewitems(info_dict):
+
+        offset_dict[key] = vector_tools.get_xy_offsets(image_info=value,
+                                                       x=overlap_info.left,
+                                                       y=overlap_info.top,
+                                                       check_position=False)[2:]
+
     if overwrite:
         overwrite_file(output)
 
@@ -214,10 +305,8 @@ def raster_calc(output,
                                                            row_block_size=row_block_size,
                                                            col_block_size=col_block_size)
 
-    if not be_quiet:
-        ctr, pbar = _iteration_parameters(o_info.rows, o_info.cols, block_rows, block_cols)
+    block_list = list()
 
-    # Iterate over the minimum overlapping extent.
     for i in range(0, o_info.rows, block_rows):
 
         n_rows = raster_tools.n_rows_cols(i, block_rows, o_info.rows)
@@ -226,67 +315,67 @@ def raster_calc(output,
 
             n_cols = raster_tools.n_rows_cols(j, block_cols, o_info.cols)
 
-            # For each image, get the offset and
-            # convert bands in the equation to ndarrays.
-            for key, value in viewitems(image_dict):
+            block_list.append((i, j, n_rows, n_cols))
 
-                # exec 'x_off, y_off = vector_tools.get_xy_offsets3(overlap_info, i_info_{})'.format(key)
-                x_off, y_off = vector_tools.get_xy_offsets(image_info=info_dict[key],
-                                                           x=overlap_info.left,
-                                                           y=overlap_info.top,
-                                                           check_position=False)[2:]
+    # With ``apply_all_bands``, the equation is
+    #   applied to each band of every image.
+    apply_bands = (equation_plan.n_outputs == 1) and (n_bands > 1)
 
-                exec('marrvar_{KEY} = i_info_{KEY}.read(bands2open=band_dict["{KEY}_band"], i=i+y_off, j=j+x_off, rows=n_rows, cols=n_cols, d_type="float32")'.format(KEY=key))
+    def _calc_block(block_infos, block):
 
-            if '&&' in equation:
+        bi, bj, block_n_rows, block_n_cols = block
 
-                out_array = np.empty((n_bands, n_rows, n_cols), dtype='float32')
+        out_array = np.empty((n_bands, block_n_rows, block_n_cols), dtype='float32')
 
-                for eqidx, equation_ in enumerate(equation.split('&&')):
+        for band_idx in range(0, n_bands if apply_bands else 1):
 
-                    if 'nan_to_num' in equation_:
+            block_arrays = dict()
 
-                        if not equation_.startswith('np.'):
-                            equation_ = 'np.' + equation_
+            for key in image_dict:
 
-                        equation_ = 'out_array[eqidx] = {}'.format(equation_)
-                        exec(equation_)
+                x_off, y_off = offset_dict[key]
 
-                    else:
-                        out_array[eqidx] = ne.evaluate(equation_)
+                block_arrays[key] = block_infos[key].read(bands2open=band_idx+1 if apply_bands else band_dict['{}_band'.format(key)],
+                                                          i=bi+y_off,
+                                                          j=bj+x_off,
+                                                          rows=block_n_rows,
+                                                          cols=block_n_cols,
+                                                          d_type='float32')
 
-            else:
+            for eqidx, equation_output in enumerate(equation_plan.evaluate(block_arrays)):
+                out_array[band_idx+eqidx] = equation_output
 
-                if 'nan_to_num' in equation_:
+        # Set the output no data values.
+        out_array[np.isnan(out_array) | np.isinf(out_array)] = out_no_data
 
-                    equation_ = 'out_array = {}'.format(equation_)
-                    exec(equation_)
+        return block, out_array
 
-                else:
-                    out_array = ne.evaluate(equation)
+    if not be_quiet:
+        ctr, pbar = _iteration_parameters(o_info.rows, o_info.cols, block_rows, block_cols)
 
-            # Set the output no data values.
-            out_array[np.isnan(out_array) | np.isinf(out_array)] = out_no_data
+    for block, out_array in raster_tools.imap_blocks(image_dict, _calc_block, block_list, n_jobs=n_jobs):
 
-            if n_bands == 1:
+        i, j = block[:2]
 
-                out_rst.write_array(out_array,
-                                    i=i,
-                                    j=j)
+        if n_bands == 1:
 
-            else:
+            out_rst.write_array(out_array[0],
+                                i=i,
+                                j=j)
+
+        else:
 
-                for lidx in range(0, n_bands):
+            for lidx in range(0, n_bands):
 
-                    out_rst.write_array(out_array[lidx],
-                                        i=i,
-                                        j=j,
-                                        band=lidx+1)
+                out_rst.write_array(out_array[lidx],
+                                    i=i,
+                                    j=j,
+                                    band=lidx+1)
 
-            if not be_quiet:
+        if not be_quiet:
 
-                pbar.update(ctr)
-                ctr += 1
+            pbar.update(ctr)
+            ctr += 1
 
     if not be_quiet:
         pbar.finish()
@@ -351,6 +440,7 @@ def main():
                         help='Whether to apply the equation to all bands', action='store_true')
     parser.add_argument('--overwrite', dest='overwrite',
                         help='Whether to overwrite an existing image', action='store_true')
+    parser.add_argument('-j', '--n_jobs', dest='n_jobs', help='The number of threads', default=1, type=int)
     parser.add_argument('--be-quiet', dest='be_quiet',
                         help='Whether to be quiet and do not print to screen', action='store_true')
 
@@ -370,6 +460,7 @@ def main():
                 apply_all_bands=args.apply_all_bands,
                 overwrite=args.overwrite,
                 be_quiet=args.be_quiet,
+                n_jobs=args.n_jobs,
                 A=args.A,
                 B=args.B,
                 C=args.C,
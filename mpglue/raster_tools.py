@@ -17,12 +17,15 @@ import time
 import argparse
 import inspect
 import atexit
-from joblib import Parallel, delayed
 import shutil
 import itertools
 import platform
 import subprocess
+import multiprocessing as multi
+import threading
 from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from six.moves import queue
 
 # if platform.system() == 'Darwin':
 #
@@ -34,9 +37,13 @@ from collections import OrderedDict
 #     # ctypes.cdll.LoadLibrary(find_library('c'))
 
 from . import vector_tools
-from .helpers import random_float, overwrite_file, check_and_create_dir, _iteration_parameters
+from .helpers import random_float, overwrite_file, check_and_create_dir, _iteration_parameters, LazyModule
 from .errors import EmptyImage, LenError, MissingRequirement, ropenError, ArrayShapeError, ArrayOffsetError, logger
-from .veg_indices import veg_indices, VegIndicesEquations
+
+try:
+    from .stats import _lin_interp
+except ImportError:
+    _lin_interp = None
 
 try:
     import deprecation
@@ -62,60 +69,51 @@ except:
     logger.error('  NumPy must be installed')
     raise ImportError
 
-# Matplotlib
-try:
-    import matplotlib as mpl
+def _set_matplotlib_backend():
+
+    """Uses a non-interactive backend without a display, before pyplot is imported"""
 
     if (os.environ.get('DISPLAY', '') == '') or (platform.system() == 'Darwin'):
 
-        mpl.use('Agg')
+        import matplotlib
 
-        try:
-            mpl.pyplot.switch_backend('agg')
-        except:
-            pass
+        matplotlib.use('Agg')
 
-    import matplotlib.pyplot as plt
-    import matplotlib.gridspec as gridspec
-    from matplotlib import ticker, colors, colorbar
-    import matplotlib.cm as cm
-    from mpl_toolkits.axes_grid1 import make_axes_locatable
-except:
-    logger.warning('  Matplotlib must be installed for plotting')
+
+# Third-party libraries that are only needed by some
+#   functions are imported on first use, so importing
+#   ``raster_tools`` (e.g., in worker processes) stays fast.
+
+# Matplotlib
+MPL_MESSAGE = 'Matplotlib must be installed for plotting'
+
+mpl = LazyModule('matplotlib', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+plt = LazyModule('matplotlib.pyplot', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+gridspec = LazyModule('matplotlib.gridspec', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+ticker = LazyModule('matplotlib.ticker', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+colors = LazyModule('matplotlib.colors', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+colorbar = LazyModule('matplotlib.colorbar', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+cm = LazyModule('matplotlib.cm', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
+axes_grid1 = LazyModule('mpl_toolkits.axes_grid1', error_message=MPL_MESSAGE, before_import=_set_matplotlib_backend)
 
 # Scikit-image
-try:
-    from skimage import exposure
-except:
-    logger.warning('  Scikit-image must be installed for image color balancing.')
+exposure = LazyModule('skimage.exposure', error_message='Scikit-image must be installed for image color balancing.')
 
 # SciPy
-try:
-    from scipy.stats import mode as sci_mode
-    from scipy.ndimage.measurements import label as lab_img
-except:
-
-    logger.error('  SciPy must be installed')
-    raise ImportError
+scipy_stats = LazyModule('scipy.stats', error_message='SciPy must be installed')
+ndimage = LazyModule('scipy.ndimage', error_message='SciPy must be installed')
 
 # Pandas
-try:
-    import pandas as pd
-except:
-    logger.warning('  Pandas must be installed to parse metadata')
+pd = LazyModule('pandas', error_message='Pandas must be installed to parse metadata')
 
 # OpenCV
-try:
-    import cv2
-except:
-    logger.warning('  OpenCV must be installed to use stat functions.')
+cv2 = LazyModule('cv2', error_message='OpenCV must be installed to use stat functions.')
 
 # BeautifulSoup4
-try:
-    from bs4 import BeautifulSoup
-except:
-    logger.warning('  BeautifulSoup4 must be installed to parse metadata')
+bs4 = LazyModule('bs4', error_message='BeautifulSoup4 must be installed to parse metadata')
 
+# Joblib
+joblib = LazyModule('joblib', error_message='Joblib must be installed')
 
 gdal.UseExceptions()
 gdal.PushErrorHandler('CPLQuietErrorHandler')
@@ -307,6 +305,140 @@ def columns_to_nd(array2reshape, layers, rows, columns):
         return array2reshape.T.reshape(layers, rows, columns)
 
 
+class RecodeTable(object):
+
+    """
+    A compiled lookup table for recoding (reclassifying) arrays
+
+    The recode rules are compiled once. Integer keys within ``max_dense_size`` values of each other
+    are looked up with a dense index table; other keys are looked up with ``np.searchsorted`` on the
+    sorted keys. Values without a rule are kept.
+
+    Args:
+        recode_dict (dict): The recode rules, given as {from: to}, or as {zone: {from: to}} to
+            apply different rules in each zone (e.g., a rasterized polygon id).
+        max_dense_size (Optional[int]): The maximum key range of a dense table. Default is 65536.
+
+    Examples:
+        >>> from mpglue.raster_tools import RecodeTable
+        >>>
+        >>> # Recode 1 and 2 to 3
+        >>> recode_table = RecodeTable({1: 3, 2: 3})
+        >>> out_array = recode_table.apply(in_array)
+        >>>
+        >>> # Recode 6 to 5 in zone 1, and 2 to 5 in zone 2
+        >>> recode_table = RecodeTable({1: {6: 5}, 2: {2: 5}})
+        >>> out_array = recode_table.apply(in_array, zones=zone_array)
+    """
+
+    def __init__(self, recode_dict, max_dense_size=65536):
+
+        self.is_zonal = any([isinstance(rules, dict) for rules in recode_dict.values()])
+
+        if self.is_zonal:
+
+            self.zone_keys = np.array(sorted(recode_dict))
+
+            self.keys = np.array(sorted(set([from_key
+                                             for rules in recode_dict.values()
+                                             for from_key in rules])))
+
+            # (zone x key) table. Keys without a
+            #   rule in a zone map to themselves.
+            self.values = np.tile(self.keys, (len(self.zone_keys), 1))
+
+            for zone_index, zone_key in enumerate(self.zone_keys):
+
+                for from_key, to_key in viewitems(recode_dict[zone_key]):
+                    self.values[zone_index, np.searchsorted(self.keys, from_key)] = to_key
+
+        else:
+
+            self.zone_keys = None
+            self.keys = np.array(sorted(recode_dict))
+            self.values = np.array([recode_dict[from_key] for from_key in self.keys])
+
+        self.key_min = None
+        self.index_table = None
+
+        if (len(self.keys) > 0) and (self.keys.dtype.kind in 'iu'):
+
+            key_range = int(self.keys.max()) - int(self.keys.min()) + 1
+
+            if key_range <= max_dense_size:
+
+                self.key_min = int(self.keys.min())
+                self.index_table = np.zeros(key_range, dtype='int64') - 1
+                self.index_table[self.keys - self.key_min] = np.arange(0, len(self.keys))
+
+    def _key_positions(self, array):
+
+        """Gets the key position of each array value and a mask of values with a key"""
+
+        if len(self.keys) == 0:
+            return np.zeros(array.shape, dtype='int64'), np.zeros(array.shape, dtype='bool')
+
+        if (self.index_table is not None) and (array.dtype.kind in 'iu'):
+
+            key_positions = np.zeros(array.shape, dtype='int64') - 1
+
+            in_range = (array >= self.key_min) & (array < self.key_min + len(self.index_table))
+
+            key_positions[in_range] = self.index_table[array[in_range].astype('int64') - self.key_min]
+
+            return key_positions, key_positions >= 0
+
+        key_positions = np.searchsorted(self.keys, array)
+        key_positions[key_positions >= len(self.keys)] = 0
+
+        return key_positions, self.keys[key_positions] == array
+
+    def apply(self, array, zones=None):
+
+        """
+        Recodes an array
+
+        Args:
+            array (ndarray): The array to recode.
+            zones (Optional[ndarray]): The zone of each pixel, required if the rules are given by zone.
+
+        Returns:
+            The recoded array, with the data type of ``array``.
+        """
+
+        if self.is_zonal and not isinstance(zones, np.ndarray):
+
+            logger.error('  The zones must be given for zonal recode rules.')
+            raise ValueError
+
+        out_array = array.copy()
+
+        # One gather for byte arrays
+        if (not self.is_zonal) and (array.dtype == 'uint8') and (self.index_table is not None):
+
+            byte_table = np.arange(0, 256, dtype='uint8')
+            byte_keys = (self.keys >= 0) & (self.keys < 256)
+            byte_table[self.keys[byte_keys]] = self.values[byte_keys]
+
+            return byte_table[array]
+
+        key_positions, has_key = self._key_positions(array)
+
+        if self.is_zonal:
+
+            zone_positions = np.searchsorted(self.zone_keys, zones)
+            zone_positions[zone_positions >= len(self.zone_keys)] = 0
+
+            has_key &= self.zone_keys[zone_positions] == zones
+
+            out_array[has_key] = self.values[zone_positions[has_key], key_positions[has_key]]
+
+        else:
+            out_array[has_key] = self.values[key_positions[has_key]]
+
+        return out_array
+
+
 class ReadWrite(object):
 
     def read(self,
@@ -327,6 +459,7 @@ class ReadWrite(object):
              as_xarray=False,
              xarray_dims=None,
              xarray_coords=None,
+             recode=None,
              **viargs):
 
         """
@@ -366,6 +499,8 @@ class ReadWrite(object):
                 Default is False.
             xarray_dims (Optional[list]): Dimension names for xarray. Default is None.
             xarray_coords (Optional[list]): Coordinates for xarray. Default is None.
+            recode (Optional[dict or RecodeTable]): Recode rules, given as {from: to}, to apply to the
+                array as it is read. Default is None.
             viargs (Optional[dict]): Keyword arguments passed to `veg_indices`. Default is None.
 
         Attributes:
@@ -396,6 +531,9 @@ class ReadWrite(object):
             >>>
             >>> # Index an image by map coordinates.
             >>> array = i_info.read(y=1200000., x=4230000., rows=500, cols=500)
+            >>>
+            >>> # Recode classes 1 and 2 to 3 while reading.
+            >>> array = i_info.read(recode={1: 3, 2: 3})
         """
 
         self.i = i
@@ -428,7 +566,11 @@ class ReadWrite(object):
 
         if compute_index != 'none':
 
-            bh = veg_indices.BandHandler(sensor)
+            # veg_indices imports raster_tools, so
+            #   it is imported when it is needed.
+            from .veg_indices import BandHandler, VegIndicesEquations
+
+            bh = BandHandler(sensor)
 
             bh.get_band_order()
 
@@ -537,6 +679,12 @@ class ReadWrite(object):
 
         self.array[np.isnan(self.array) | np.isinf(self.array)] = 0
 
+        if isinstance(recode, dict):
+            recode = RecodeTable(recode)
+
+        if isinstance(recode, RecodeTable):
+            self.array = recode.apply(self.array)
+
         if self.as_xarray:
             self._as_xarray()
 
@@ -1258,6 +1406,108 @@ class DatasourceInfo(object):
             self.block_y = 'none'
 
 
+class BandStatistics(object):
+
+    """
+    Accumulates the statistics of a band as blocks are written
+
+    Block statistics are merged with the pairwise update of Chan et al. (1979), so the band never
+    needs to be read back. Every pixel is assumed to be written once. Non-finite values are skipped.
+
+    Args:
+        histogram_range (Optional[tuple]): The (min, max) range of an optional histogram.
+            Default is None, or do not accumulate a histogram.
+        histogram_bins (Optional[int]): The number of histogram bins. Default is 256.
+
+    Examples:
+        >>> from mpglue.raster_tools import BandStatistics
+        >>>
+        >>> band_stats = BandStatistics()
+        >>>
+        >>> for block_array in block_arrays:
+        >>>     band_stats.update(block_array)
+        >>>
+        >>> band_stats.minimum, band_stats.maximum, band_stats.mean, band_stats.std
+    """
+
+    def __init__(self, histogram_range=None, histogram_bins=256):
+
+        self.histogram_range = histogram_range
+        self.histogram_bins = histogram_bins
+
+        self.count = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.mean = 0.
+        self.m2 = 0.
+
+        if histogram_range:
+            self.histogram = np.zeros(histogram_bins, dtype='int64')
+        else:
+            self.histogram = None
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count > 0 else 0.
+
+    def update(self, block_array):
+
+        """
+        Merges the statistics of one block
+
+        Args:
+            block_array (ndarray): The block values.
+        """
+
+        if block_array.dtype.kind == 'f':
+            block_array = block_array[np.isfinite(block_array)]
+
+        block_count = block_array.size
+
+        if block_count == 0:
+            return
+
+        block_mean = block_array.mean(dtype='float64')
+        block_m2 = np.square(block_array - block_mean, dtype='float64').sum()
+
+        total_count = self.count + block_count
+
+        delta = block_mean - self.mean
+
+        self.mean += delta * block_count / total_count
+        self.m2 += block_m2 + delta ** 2 * self.count * block_count / total_count
+        self.count = total_count
+
+        self.minimum = min(self.minimum, float(block_array.min()))
+        self.maximum = max(self.maximum, float(block_array.max()))
+
+        if self.histogram_range:
+
+            self.histogram += np.histogram(block_array,
+                                           bins=self.histogram_bins,
+                                           range=self.histogram_range)[0]
+
+    def set_band(self, band):
+
+        """
+        Writes the statistics (and histogram) to a band as metadata
+
+        Args:
+            band (GDAL object): The band to write to.
+        """
+
+        if self.count == 0:
+            return
+
+        band.SetStatistics(self.minimum, self.maximum, self.mean, self.std)
+
+        if self.histogram_range:
+
+            band.SetDefaultHistogram(float(self.histogram_range[0]),
+                                     float(self.histogram_range[1]),
+                                     self.histogram.tolist())
+
+
 class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
 
     """
@@ -1283,6 +1533,9 @@ class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
         get_chunk_size
         remove_overviews
 
+    Band statistics are accumulated by ``write_array`` if ``track_stats`` is True (the default for
+    ``create_raster``) and written once, as band metadata, by ``close_file``.
+
     Returns:
         None
     """
@@ -1472,6 +1725,7 @@ class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
 
             self.band = self.datasource.GetRasterBand(band_position)
             self.band_open = True
+            self.band_position = band_position
 
         except:
 
@@ -1579,9 +1833,62 @@ class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
                 else:
                     logger.error('\nFailed to write the array to file (issue not apparent).')
 
-    def close_band(self):
+        else:
+
+            if getattr(self, 'track_stats', False):
+                self.update_band_stats(array2write)
+
+    def update_band_stats(self, array2write):
+
+        """
+        Merges a written array into the statistics of the loaded band
+
+        Args:
+            array2write (ndarray): The array written to ``self.band``.
+        """
+
+        band_position = getattr(self, 'band_position', None)
+
+        if band_position is None:
+            return
+
+        if not hasattr(self, 'band_stats'):
+            self.band_stats = dict()
+
+        if band_position not in self.band_stats:
+
+            self.band_stats[band_position] = BandStatistics(histogram_range=getattr(self, 'histogram_range', None),
+                                                            histogram_bins=getattr(self, 'histogram_bins', 256))
+
+        self.band_stats[band_position].update(array2write)
+
+    def write_band_stats(self):
+
+        """Writes the statistics accumulated by ``write_array`` as band metadata"""
+
+        if not hasattr(self, 'band_stats'):
+            return
+
+        for band_position, band_stats in viewitems(self.band_stats):
+
+            try:
+                band_stats.set_band(self.datasource.GetRasterBand(band_position))
+            except:
+
+                logger.warning('The band statistics could not be set.')
+                logger.warning(gdal.GetLastErrorMsg())
+
+        self.band_stats = dict()
 
-        """Closes a band object"""
+    def close_band(self, full_stats=False):
+
+        """
+        Closes a band object
+
+        Args:
+            full_stats (Optional[bool]): Whether to compute the band statistics by reading the full band.
+                Default is False. Statistics of written arrays are accumulated by ``write_array``.
+        """
 
         if hasattr(self, 'band') and self.band_open:
 
@@ -1593,12 +1900,14 @@ class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
             #     logger.error(gdal.GetLastErrorMsg())
             #     pass
 
-            try:
-                self.band.GetStatistics(0, 1)
-            except:
+            if full_stats:
 
-                logger.warning('The band statistics could not be calculated.')
-                logger.warning(gdal.GetLastErrorMsg())
+                try:
+                    self.band.GetStatistics(0, 1)
+                except:
+
+                    logger.warning('The band statistics could not be calculated.')
+                    logger.warning(gdal.GetLastErrorMsg())
 
             try:
                 self.band.FlushCache()
@@ -1639,6 +1948,9 @@ class FileManager(DataChecks, RegisterDriver, DatasourceInfo):
                             #     pass
                             # hdfd = None
 
+            if self.datasource is not None:
+                self.write_band_stats()
+
             if hasattr(self.datasource, 'FlushCache'):
 
                 try:
@@ -1902,7 +2214,7 @@ class LandsatParser(object):
 
             meta = mo.read()
 
-            soup = BeautifulSoup(meta)
+            soup = bs4.BeautifulSoup(meta)
 
             wrs = soup.find('wrs')
 
@@ -2930,83 +3242,73 @@ def gdal_get_band(datasource_b, band_position):
     return datasource_b.GetRasterBand(band_position)
 
 
-def _parallel_blocks(out_image,
-                     band_list,
-                     ii,
-                     jj,
-                     y_offset,
-                     x_offset,
-                     nn_rows,
-                     nn_cols,
-                     left,
-                     top,
-                     cellY,
-                     cellX,
-                     projection,
-                     **kwargs):
+def _init_block_worker(block_func, image_names):
 
     """
+    Opens the input images once per worker process
+
     Args:
-        out_image:
-        band_list:
-        ii:
-        jj:
-        y_offset:
-        x_offset:
-        n_rows:
-        n_cols:
-        **kwargs:
+        block_func (object): A picklable copy of a ``BlockFunc`` instance.
+        image_names (str list): The input images to open.
+    """
 
-    Returns:
+    global _worker_block_func
+
+    block_func.image_infos = [ropen(image_name) for image_name in image_names]
+
+    for imi in range(0, len(block_func.image_infos)):
+
+        if isinstance(block_func.band_list[imi], int):
+            block_func.image_infos[imi].get_band(block_func.band_list[imi])
+
+    _worker_block_func = block_func
 
+
+def _process_block_worker(block_window):
+
+    """
+    Reads, masks, and processes one block in a worker process
+
+    Args:
+        block_window (tuple): The block window, given by ``BlockFunc._get_block_windows``.
+
+    Returns:
+        The block window, the function output (None if the block was skipped)
     """
 
-    # out_info_tile = out_info.copy()
-    # out_info_tile.update_info(rows=nn_rows, cols=nn_cols,
-    #                           left=out_info.left+(jj*out_info.cellY),
-    #                           top=out_info.top-(ii*out_info.cellY))
+    return block_window, _worker_block_func._compute_block(block_window)
 
-    d_name_, f_name_ = os.path.split(out_image)
-    f_base_, f_ext_ = os.path.splitext(f_name_)
 
-    d_name_ = os.path.join(d_name_, 'temp')
+# Marks the end of a pipelined block queue
+_PIPELINE_END = object()
 
-    rsn = '{:f}'.format(abs(np.random.randn(1)[0]))[-4:]
 
-    out_image_tile = os.path.join(d_name_, '{}_{}{}'.format(f_base_, rsn, f_ext_))
+def _put_until_stopped(item_queue, item, stop_event, timeout=0.1):
 
-    datasource = gdal_create(out_image_tile,
-                             driver_pp,
-                             nn_rows,
-                             nn_cols,
-                             1,
-                             STORAGE_DICT_GDAL['float32'],
-                             left,
-                             top,
-                             cellY,
-                             cellX,
-                             projection)
+    """
+    Puts an item in a bounded queue, giving up if the consumer stops
 
-    band_object = gdal_get_band(datasource, 1)
+    Args:
+        item_queue (object): The queue.
+        item (object): The item to put in ``item_queue``.
+        stop_event (object): A ``threading.Event`` that is set when the consumer stops.
+        timeout (Optional[float]): The seconds to wait on a full queue between checks of ``stop_event``.
 
-    # out_raster = create_raster(out_image_tile, out_info_tile)
-    # out_raster.get_band(1)
+    Returns:
+        True if the item was put in the queue, or False if the consumer stopped.
+    """
 
-    image_arrays = [gdal_read(image_infos_list[imi],
-                              band_list[imi],
-                              ii+y_offset[imi],
-                              jj+x_offset[imi],
-                              nn_rows,
-                              nn_cols) for imi in range(0, len(image_infos_list))]
+    while not stop_event.is_set():
 
-    output = block_func(image_arrays, **kwargs)
+        try:
 
-    gdal_write(band_object, output)
+            item_queue.put(item, timeout=timeout)
+            return True
 
-    band_object = gdal_close_band(band_object)
-    datasource = gdal_close_datasource(datasource)
+        except queue.Full:
+            pass
 
-    return out_image_tile
+    return False
 
 
 class BlockFunc(object):
@@ -3036,10 +3338,26 @@ class BlockFunc(object):
             Skip blocks that do not intersect ``boundary_file``.
         mask_file (Optional[str]): A file to use for block masking. Default is None.
             Recode blocks to binary 1 and 0 that intersect ``mask_file``.
-        n_jobs (Optional[int]): The number of blocks to process in parallel. Default is 1.
+
+            The blocks are classified against ``boundary_file`` and ``mask_file`` once, before
+            processing (see ``vector_tools.BlockVectorIndex``), so only blocks partially covered
+            by ``mask_file`` are rasterized.
+        mask_cache_size (Optional[int]): The maximum number of ``mask_file`` block masks to cache.
+            Default is 64.
+        n_jobs (Optional[int]): The number of blocks to process in parallel. Default is 1. If greater than 1,
+            each worker process reads its own windows and the outputs are written, in block order, by
+            the calling process. ``func`` and ``kwargs`` must be picklable.
         no_data_values (Optional[list]): A list of no data values for each image. Default is None.
+        pipeline (Optional[bool]): Whether to overlap block reads, processing, and writes in separate threads.
+            Default is False. Only used when ``n_jobs`` is 0 or 1.
+        queue_depth (Optional[int]): The maximum number of blocks held in the read and write queues of the
+            pipeline. Default is 2.
         kwargs (Optional[dict]): Function specific parameters.
 
+    Attributes:
+        stage_times (dict): The time (in seconds) spent reading, processing, and writing blocks. With
+            ``n_jobs`` > 1, reads and processing happen in the workers and only writes are timed.
+
     Returns:
         None, writes to ``out_image``.
     """
@@ -3064,10 +3382,13 @@ class BlockFunc(object):
                  write_array=True,
                  boundary_file=None,
                  mask_file=None,
+                 mask_cache_size=64,
                  n_jobs=1,
                  close_files=True,
                  no_data_values=None,
                  overwrite=False,
+                 pipeline=False,
+                 queue_depth=2,
                  **kwargs):
 
         self.func = func
@@ -3089,12 +3410,19 @@ class BlockFunc(object):
         self.write_array = write_array
         self.boundary_file = boundary_file
         self.mask_file = mask_file
+        self.mask_cache_size = mask_cache_size
         self.n_jobs = n_jobs
         self.close_files = close_files
         self.no_data_values = no_data_values
+        self.pipeline = pipeline
+        self.queue_depth = queue_depth
         self.kwargs = kwargs
 
         self.out_attributes_dict = dict()
+        self.stage_times = dict(read=0., compute=0., write=0.)
+
+        self.boundary_index = None
+        self.mask_index = None
 
         if not isinstance(self.d_types, list):
             self.d_types = ['byte'] * len(self.image_infos)
@@ -3115,10 +3443,14 @@ class BlockFunc(object):
             if os.path.isfile(self.out_image):
                 os.remove(self.out_image)
 
-        if self.n_jobs in [0, 1]:
+        if not self.proc_info:
+            self.proc_info = self.image_infos[0]
 
-            if not self.proc_info:
-                self.proc_info = self.image_infos[0]
+        # Parallel jobs can be given file names.
+        if isinstance(self.proc_info, str):
+            self.proc_info = ropen(self.proc_info)
+
+        if self.n_jobs in [0, 1]:
 
             for imi in range(0, len(self.image_infos)):
 
@@ -3166,81 +3498,47 @@ class BlockFunc(object):
 
     def run(self):
 
-        global block_func, image_infos_list, driver_pp
-
         if self.n_jobs in [0, 1]:
 
             for imi in range(0, len(self.image_infos)):
                 if isinstance(self.band_list[imi], int):
                     self.image_infos[imi].get_band(self.band_list[imi])
 
-            self._process_blocks()
-
-        else:
-
-            block_func = self.func
-            image_infos_list = self.image_infos
-
-            self._get_pairs()
-
-            dn, fn = os.path.split(self.out_image)
-
-            if not dn and not os.path.isabs(fn):
-                dn = os.path.join(os.path.abspath('.'), 'temp')
-            else:
-                check_and_create_dir(os.path.join(dn, 'temp'))
-
-            driver_pp = gdal_register(self.out_image)
-
-            tile_list = Parallel(n_jobs=self.n_jobs,
-                                 max_nbytes=None)(delayed(_parallel_blocks)(self.out_image,
-                                                                            self.band_list,
-                                                                            pair[0], pair[1],
-                                                                            self.y_offset,
-                                                                            self.x_offset,
-                                                                            pair[2], pair[3],
-                                                                            self.out_info.left+(pair[1]*self.out_info.cellY),
-                                                                            self.out_info.top-(pair[0]*self.out_info.cellY),
-                                                                            self.out_info.cellY,
-                                                                            self.out_info.cellX,
-                                                                            self.out_info.projection,
-                                                                            **self.kwargs) for pair in self.pairs)
+        self._process_blocks()
 
-    def _get_pairs(self):
+    def _setup_block_indices(self):
 
-        self.pairs = []
+        """Classifies the blocks against ``boundary_file`` and ``mask_file``"""
 
-        for i in range(0, self.proc_info.rows, self.block_rows):
-
-            n_rows = n_rows_cols(i, self.block_rows, self.proc_info.rows)
+        if isinstance(self.boundary_file, str):
 
-            for j in range(0, self.proc_info.cols, self.block_cols):
+            self.boundary_index = vector_tools.BlockVectorIndex(self.boundary_file,
+                                                                self.proc_info,
+                                                                self.block_rows,
+                                                                self.block_cols)
 
-                n_cols = n_rows_cols(j, self.block_cols, self.proc_info.cols)
+        if isinstance(self.mask_file, str):
 
-                self.pairs.append((i, j, n_rows, n_cols))
+            if self.mask_file == self.boundary_file:
+                self.mask_index = self.boundary_index
+            else:
 
-    def _process_blocks(self):
+                self.mask_index = vector_tools.BlockVectorIndex(self.mask_file,
+                                                                self.proc_info,
+                                                                self.block_rows,
+                                                                self.block_cols)
 
-        if self.write_array:
-            out_raster = create_raster(self.out_image, self.out_info)
+            self.mask_index.cache_size = self.mask_cache_size
 
-        # n_blocks = 0
-        # for i in range(0, self.proc_info.rows, self.block_rows):
-        #     for j in range(0, self.proc_info.cols, self.block_cols):
-        #         n_blocks += 1
-        #
-        # n_block = 1
+    def _get_block_windows(self):
 
-        if isinstance(self.print_statement, str):
-            logger.info(self.print_statement)
+        """
+        Yields the block windows to process, skipping blocks outside of ``boundary_file``
 
-        # set widget and pbar
-        if not self.be_quiet:
-            ctr, pbar = _iteration_parameters(self.proc_info.rows, self.proc_info.cols,
-                                              self.block_rows, self.block_cols)
+        Yields:
+            (i, j, n_rows, n_cols, y_pad_minus, y_pad_plus, x_pad_minus, x_pad_plus)
+        """
 
-        # iterate over the images and get change pixels
         for i in range(0, self.proc_info.rows, self.block_rows):
 
             n_rows = n_rows_cols(i, self.block_rows, self.proc_info.rows)
@@ -3263,159 +3561,475 @@ class BlockFunc(object):
                     x_pad_minus = 0
                     x_pad_plus = 0
 
-                if isinstance(self.boundary_file, str):
-
-                    # Get the extent of the current block.
-                    self.get_block_extent(i, j, n_rows, n_cols)
+                if self.boundary_index is not None:
 
                     # Check if the block intersects the boundary file.
-                    if not vector_tools.intersects_boundary(self.extent_dict, self.boundary_file):
+                    if self.boundary_index.block_class(i, j) == vector_tools.BLOCK_OUTSIDE:
                         continue
 
-                # if not self.be_quiet:
-                #
-                #     if n_block == 1:
-                #         print 'Blocks 1--19 of {:,d} ...'.format(n_blocks)
-                #     elif n_block % 20 == 0:
-                #         n_block_ = n_block + 19 if n_blocks - n_block > 20 else n_blocks
-                #         print 'Block {:,d}--{:,d} of {:,d} ...'.format(n_block, n_block_, n_blocks)
-                #
-                #     n_block += 1
-                image_arrays = [self.image_infos[imi].read(bands2open=self.band_list[imi],
-                                                           i=i+self.y_offset[imi]-y_pad_minus,
-                                                           j=j+self.x_offset[imi]-x_pad_minus,
-                                                           rows=n_rows+y_pad_plus,
-                                                           cols=n_cols+x_pad_plus,
-                                                           d_type=self.d_types[imi])
-                                for imi in range(0, len(self.image_infos))]
+                yield i, j, n_rows, n_cols, y_pad_minus, y_pad_plus, x_pad_minus, x_pad_plus
 
-                skip_block = False
+    def _compute_block(self, block_window):
 
-                # Check for no data values.
-                if isinstance(self.no_data_values, list):
+        """
+        Reads, masks, and processes one block
 
-                    for no_data, im_block in zip(self.no_data_values, image_arrays):
+        Args:
+            block_window (tuple): The block window, given by ``_get_block_windows``.
 
-                        if isinstance(no_data, int) or isinstance(no_data, float):
+        Returns:
+            The function output, or None if the block was skipped.
+        """
 
-                            if im_block.max() == no_data:
+        image_arrays = self._read_block(block_window)
 
-                                skip_block = True
-                                break
+        if image_arrays is None:
+            return None
 
-                if skip_block:
-                    continue
+        return self.func(image_arrays,
+                         **self.kwargs)
 
-                if isinstance(self.mask_file, str):
+    def _read_block(self, block_window):
 
-                    self.get_block_extent(i, j, n_rows, n_cols)
+        """
+        Reads and masks one block
 
-                    orw = create_raster('none',
-                                        None,
-                                        in_memory=True,
-                                        rows=n_rows,
-                                        cols=n_cols,
-                                        bands=1,
-                                        projection=self.proc_info.projection,
-                                        cellY=self.proc_info.cellY,
-                                        cellX=self.proc_info.cellX,
-                                        left=self.extent_dict['UL'][0],
-                                        top=self.extent_dict['UL'][1],
-                                        storage='byte')
+        Args:
+            block_window (tuple): The block window, given by ``_get_block_windows``.
 
-                    # Rasterize the vector at the current block.
-                    with vector_tools.vopen(self.mask_file) as v_info:
+        Returns:
+            A list of image arrays, or None if the block was skipped.
+        """
 
-                        gdal.RasterizeLayer(orw.datasource, [1], v_info.lyr, burn_values=[1])
-                        block_array = orw.datasource.GetRasterBand(1).ReadAsArray(0, 0, n_cols, n_rows)
+        i, j, n_rows, n_cols, y_pad_minus, y_pad_plus, x_pad_minus, x_pad_plus = block_window
 
-                        for imib, image_array in enumerate(image_arrays):
+        image_arrays = [self.image_infos[imi].read(bands2open=self.band_list[imi],
+                                                   i=i+self.y_offset[imi]-y_pad_minus,
+                                                   j=j+self.x_offset[imi]-x_pad_minus,
+                                                   rows=n_rows+y_pad_plus,
+                                                   cols=n_cols+x_pad_plus,
+                                                   d_type=self.d_types[imi])
+                        for imi in range(0, len(self.image_infos))]
 
-                            image_array[block_array == 0] = 0
-                            image_arrays[imib] = image_array
+        # Check for no data values.
+        if isinstance(self.no_data_values, list):
 
-                    v_info = None
+            for no_data, im_block in zip(self.no_data_values, image_arrays):
 
-                    gdal.Unlink('none')
+                if isinstance(no_data, int) or isinstance(no_data, float):
 
-                output = self.func(image_arrays,
-                                   **self.kwargs)
+                    if im_block.max() == no_data:
+                        return None
 
-                if isinstance(output, tuple):
+        if self.mask_index is not None:
 
-                    if self.write_array:
+            block_class = self.mask_index.block_class(i, j)
 
-                        if output[0].shape[0] > 1:
+            if block_class == vector_tools.BLOCK_OUTSIDE:
 
-                            for obi, obb in enumerate(output[0]):
+                for image_array in image_arrays:
+                    image_array[...] = 0
 
-                                out_raster.write_array(obb,
-                                                       i=i,
-                                                       j=j,
-                                                       band=obi + 1)
+            elif block_class == vector_tools.BLOCK_PARTIAL:
 
-                        else:
+                # Only partial blocks are rasterized.
+                block_array = self.mask_index.get_mask(i, j, n_rows, n_cols)
 
-                            out_raster.write_array(output[0],
-                                                   i=i,
-                                                   j=j,
-                                                   band=1)
+                for image_array in image_arrays:
+                    image_array[..., block_array == 0] = 0
 
-                    # Get the other results.
-                    for ri in range(1, len(output)):
+        return image_arrays
 
-                        # self.kwargs[self.out_attributes[ri-1]] = output[ri]
+    def _write_output(self, out_raster, output, i, j):
 
-                        if self.out_attributes[ri-1] not in self.out_attributes_dict:
-                            self.out_attributes_dict[self.out_attributes[ri-1]] = [output[ri]]
-                        else:
-                            self.out_attributes_dict[self.out_attributes[ri-1]].append(output[ri])
+        """
+        Writes a block output to file and stores any output attributes
 
-                else:
+        Args:
+            out_raster (object): An instance of ``create_raster``, or None if ``write_array`` is False.
+            output (ndarray or tuple): The output of ``func``.
+            i (int): The starting row position.
+            j (int): The starting column position.
+        """
 
-                    if self.write_array:
+        if isinstance(output, tuple):
 
-                        if len(output.shape) > 2:
+            if self.write_array:
 
-                            for obi, obb in enumerate(output):
+                if len(output[0].shape) > 2:
 
-                                out_raster.write_array(obb,
-                                                       i=i,
-                                                       j=j,
-                                                       band=obi+1)
+                    for obi, obb in enumerate(output[0]):
 
-                        else:
+                        out_raster.write_array(obb,
+                                               i=i,
+                                               j=j,
+                                               band=obi + 1)
 
-                            out_raster.write_array(output,
-                                                   i=i,
-                                                   j=j,
-                                                   band=1)
+                else:
 
-                if not self.be_quiet:
+                    out_raster.write_array(output[0],
+                                           i=i,
+                                           j=j,
+                                           band=1)
 
-                    pbar.update(ctr)
-                    ctr += 1
+            # Get the other results.
+            for ri in range(1, len(output)):
+
+                if self.out_attributes[ri-1] not in self.out_attributes_dict:
+                    self.out_attributes_dict[self.out_attributes[ri-1]] = [output[ri]]
+                else:
+                    self.out_attributes_dict[self.out_attributes[ri-1]].append(output[ri])
+
+        else:
+
+            if self.write_array:
+
+                if len(output.shape) > 2:
+
+                    for obi, obb in enumerate(output):
+
+                        out_raster.write_array(obb,
+                                               i=i,
+                                               j=j,
+                                               band=obi+1)
+
+                else:
+
+                    out_raster.write_array(output,
+                                           i=i,
+                                           j=j,
+                                           band=1)
+
+    def _worker_copy(self):
+
+        """
+        Gets a copy of the instance that can be sent to worker processes
+
+        Returns:
+            A ``BlockFunc`` copy without open datasets
+        """
+
+        block_func = copy.copy(self)
+
+        block_func.image_infos = None
+        block_func.out_info = None
+        block_func.out_attributes_dict = dict()
+
+        block_func.proc_info = ImageInfo()
+
+        block_func.proc_info.update_info(rows=self.proc_info.rows,
+                                         cols=self.proc_info.cols,
+                                         left=self.proc_info.left,
+                                         top=self.proc_info.top,
+                                         cellY=self.proc_info.cellY,
+                                         cellX=self.proc_info.cellX,
+                                         projection=self.proc_info.projection)
+
+        return block_func
+
+    def _iter_blocks_parallel(self):
+
+        """
+        Processes blocks in a pool of worker processes
+
+        Each worker opens the input images once and reads its own windows. The outputs are
+        sent back through a pipe, in block order, so that only the calling process writes.
+
+        Yields:
+            The block window, the function output (None if the block was skipped)
+        """
+
+        image_names = [image_info if isinstance(image_info, str) else image_info.file_name
+                       for image_info in self.image_infos]
+
+        n_jobs = multi.cpu_count() if self.n_jobs == -1 else self.n_jobs
+
+        pool = multi.Pool(processes=n_jobs,
+                          initializer=_init_block_worker,
+                          initargs=(self._worker_copy(), image_names))
+
+        try:
+
+            for block_window, output in pool.imap(_process_block_worker,
+                                                  self._get_block_windows(),
+                                                  chunksize=1):
+
+                yield block_window, output
+
+            pool.close()
+
+        except:
+
+            pool.terminate()
+            raise
+
+        finally:
+            pool.join()
+
+    def _iter_blocks(self):
+
+        """
+        Processes blocks in the calling process
+
+        Yields:
+            The block window, the function output (None if the block was skipped)
+        """
+
+        for block_window in self._get_block_windows():
+
+            stage_start = time.time()
+
+            image_arrays = self._read_block(block_window)
+
+            self.stage_times['read'] += time.time() - stage_start
+
+            if image_arrays is None:
+
+                yield block_window, None
+                continue
+
+            stage_start = time.time()
+
+            output = self.func(image_arrays,
+                               **self.kwargs)
+
+            self.stage_times['compute'] += time.time() - stage_start
+
+            yield block_window, output
+
+    def _read_blocks_threaded(self, read_queue, stop_reading):
+
+        """
+        Reads blocks into a bounded queue (run in a background thread)
+
+        Args:
+            read_queue (object): The queue to put (block window, image arrays) pairs in.
+            stop_reading (object): A ``threading.Event`` that is set when the consumer stops early.
+        """
+
+        try:
+
+            for block_window in self._get_block_windows():
+
+                if stop_reading.is_set():
+                    return
+
+                stage_start = time.time()
+
+                image_arrays = self._read_block(block_window)
+
+                self.stage_times['read'] += time.time() - stage_start
+
+                if not _put_until_stopped(read_queue, (block_window, image_arrays), stop_reading):
+                    return
+
+        except Exception as read_error:
+
+            if not _put_until_stopped(read_queue, (None, read_error), stop_reading):
+                return
+
+        _put_until_stopped(read_queue, _PIPELINE_END, stop_reading)
+
+    def _write_blocks_threaded(self, out_raster, write_queue):
+
+        """
+        Writes blocks from a bounded queue (run in a background thread)
+
+        Args:
+            out_raster (object): An instance of ``create_raster``, or None if ``write_array`` is False.
+            write_queue (object): The queue to get (block window, output) pairs from.
+        """
+
+        while True:
+
+            write_item = write_queue.get()
+
+            if write_item is _PIPELINE_END:
+                break
+
+            # Keep draining the queue after an
+            #   error so the producer never blocks.
+            if self.write_error is not None:
+                continue
+
+            block_window, output = write_item
+
+            stage_start = time.time()
+
+            try:
+                self._write_output(out_raster, output, block_window[0], block_window[1])
+            except Exception as write_error:
+                self.write_error = write_error
+
+            self.stage_times['write'] += time.time() - stage_start
+
+    def _iter_blocks_pipelined(self):
+
+        """
+        Processes blocks in the calling process while the next blocks are read in a background thread
+
+        Yields:
+            The block window, the function output (None if the block was skipped)
+        """
+
+        read_queue = queue.Queue(maxsize=self.queue_depth)
+        stop_reading = threading.Event()
+
+        reader = threading.Thread(target=self._read_blocks_threaded,
+                                  args=(read_queue, stop_reading))
+
+        reader.daemon = True
+        reader.start()
+
+        try:
+
+            while True:
+
+                read_item = read_queue.get()
+
+                if read_item is _PIPELINE_END:
+                    break
+
+                block_window, image_arrays = read_item
+
+                if isinstance(image_arrays, Exception):
+                    raise image_arrays
+
+                if image_arrays is None:
+
+                    yield block_window, None
+                    continue
+
+                stage_start = time.time()
+
+                output = self.func(image_arrays,
+                                   **self.kwargs)
+
+                self.stage_times['compute'] += time.time() - stage_start
+
+                yield block_window, output
+
+        finally:
+
+            # Release the reader if the consumer stopped early
+            #   (e.g., ``func`` or the writer raised an error).
+            stop_reading.set()
+            reader.join()
+
+    def _process_blocks(self):
+
+        self._setup_block_indices()
+
+        if self.write_array:
+            out_raster = create_raster(self.out_image, self.out_info)
+        else:
+            out_raster = None
+
+        if isinstance(self.print_statement, str):
+            logger.info(self.print_statement)
+
+        # set widget and pbar
+        if not self.be_quiet:
+            ctr, pbar = _iteration_parameters(self.proc_info.rows, self.proc_info.cols,
+                                              self.block_rows, self.block_cols)
+
+        self.stage_times = dict(read=0., compute=0., write=0.)
+
+        use_pipeline = self.pipeline and (self.n_jobs in [0, 1])
+
+        if use_pipeline:
+
+            block_iter = self._iter_blocks_pipelined()
+
+            # Write blocks in a separate thread.
+            self.write_error = None
+
+            write_queue = queue.Queue(maxsize=self.queue_depth)
+
+            writer = threading.Thread(target=self._write_blocks_threaded,
+                                      args=(out_raster, write_queue))
+
+            writer.daemon = True
+            writer.start()
+
+        elif self.n_jobs in [0, 1]:
+            block_iter = self._iter_blocks()
+        else:
+            block_iter = self._iter_blocks_parallel()
+
+        try:
+
+            # iterate over the images and get change pixels
+            for block_window, output in block_iter:
+
+                if output is None:
+                    continue
+
+                if use_pipeline:
+
+                    if self.write_error is not None:
+                        raise self.write_error
+
+                    write_queue.put((block_window, output))
+
+                else:
+
+                    stage_start = time.time()
+
+                    self._write_output(out_raster, output, block_window[0], block_window[1])
+
+                    self.stage_times['write'] += time.time() - stage_start
+
+                if not self.be_quiet:
+
+                    pbar.update(ctr)
+                    ctr += 1
+
+        finally:
+
+            # Stop the block iterator (and any reader thread
+            #   or worker pool) if the loop exited early.
+            block_iter.close()
+
+            if use_pipeline:
+
+                write_queue.put(_PIPELINE_END)
+                writer.join()
+
+        if use_pipeline and (self.write_error is not None):
+            raise self.write_error
 
         if self.out_attributes_dict:
 
-            for ri in range(1, len(output)):
-                setattr(self, self.out_attributes[ri-1], self.out_attributes_dict[self.out_attributes[ri-1]])
+            for out_attribute in self.out_attributes:
+
+                if out_attribute in self.out_attributes_dict:
+                    setattr(self, out_attribute, self.out_attributes_dict[out_attribute])
 
         if not self.be_quiet:
+
             pbar.finish()
 
+            logger.info('  Block stage times -- read: {:.2f}s, compute: {:.2f}s, write: {:.2f}s'.format(
+                self.stage_times['read'], self.stage_times['compute'], self.stage_times['write']))
+
         if isinstance(self.out_image, str):
 
             if self.close_files:
 
                 for imi in range(0, len(self.image_infos)):
-                    self.image_infos[imi].close()
+
+                    if hasattr(self.image_infos[imi], 'close'):
+                        self.image_infos[imi].close()
 
                 self.out_info.close()
 
             if self.write_array:
                 out_raster.close_all()
 
+        if self.mask_index is not None:
+            self.mask_index.close()
+
     def get_block_extent(self, ii, jj, nn_rows, nn_cols):
 
         adj_left = self.proc_info.left + (jj * self.proc_info.cellY)
@@ -3428,6 +4042,8 @@ class BlockFunc(object):
                             'LL': [adj_left, adj_bottom],
                             'LR': [adj_right, adj_bottom]}
 
+        return self.extent_dict
+
 
 def _read_parallel(image, image_info, bands2open, y, x, rows2open, columns2open, n_jobs, d_type, predictions):
 
@@ -3468,13 +4084,13 @@ def _read_parallel(image, image_info, bands2open, y, x, rows2open, columns2open,
 
     image_info.close()
 
-    band_arrays = Parallel(n_jobs=n_jobs)(delayed(gdal_read)(image,
-                                                             band2open,
-                                                             y,
-                                                             x,
-                                                             rows2open,
-                                                             columns2open)
-                                          for band2open in bands2open)
+    band_arrays = joblib.Parallel(n_jobs=n_jobs)(joblib.delayed(gdal_read)(image,
+                                                                           band2open,
+                                                                           y,
+                                                                           x,
+                                                                           rows2open,
+                                                                           columns2open)
+                                                 for band2open in bands2open)
 
     if predictions:
 
@@ -3627,11 +4243,15 @@ def read(image2open=None,
         bands2open = sorted(bands2open)
 
     # Index the image by x, y coordinates (in map units).
-    if abs(y) > 0:
-        __, __, __, i = vector_tools.get_xy_offsets(i_info, x=x, y=y)
+    if (abs(y) > 0) or (abs(x) > 0):
+
+        __, __, x_offset, y_offset = vector_tools.get_xy_offsets(i_info, x=x, y=y)
 
-    if abs(x) > 0:
-        __, __, j, __ = vector_tools.get_xy_offsets(i_info, x=x, y=y)
+        if abs(y) > 0:
+            i = y_offset
+
+        if abs(x) > 0:
+            j = x_offset
 
     if (n_jobs in [0, 1]) and not predictions:
 
@@ -4017,6 +4637,11 @@ class create_raster(CreateDriver, FileManager, UpdateInfo):
         create_tiles (Optional[str]): If positive, image is created in separate file tiles. Default is 0.
         overwrite (Optional[str]): Whether to overwrite an existing file. Default is False.
         in_memory (Optional[str]): Whether to create the raster dataset in memory. Default is False.
+        track_stats (Optional[bool]): Whether to accumulate band statistics as arrays are written and
+            set them as band metadata when the file is closed. Default is True.
+        histogram_range (Optional[tuple]): The (min, max) range of a band histogram to accumulate with
+            ``track_stats``. Default is None, or do not accumulate a histogram.
+        histogram_bins (Optional[int]): The number of histogram bins. Default is 256.
 
     Attributes:
         filename (str)
@@ -4039,8 +4664,16 @@ class create_raster(CreateDriver, FileManager, UpdateInfo):
                  create_tiles=0,
                  overwrite=False,
                  in_memory=False,
+                 track_stats=True,
+                 histogram_range=None,
+                 histogram_bins=256,
                  **kwargs):
 
+        self.track_stats = track_stats
+        self.histogram_range = histogram_range
+        self.histogram_bins = histogram_bins
+        self.band_stats = dict()
+
         if not in_memory:
 
             d_name, f_name = os.path.split(out_name)
@@ -4708,6 +5341,78 @@ def block_dimensions(image_rows, image_cols, row_block_size=1024, col_block_size
     return row_blocks, col_blocks
 
 
+def imap_blocks(image_paths, calc_block, block_list, n_jobs=1):
+
+    """
+    Applies a function to image blocks, in a pool of threads if ``n_jobs`` is not 0 or 1
+
+    Args:
+        image_paths (dict): The images to read from, keyed by name.
+        calc_block (function): The block function, called as ``calc_block(image_infos, block)``, where
+            ``image_infos`` is a dictionary of ``ropen`` instances, keyed as ``image_paths``.
+        block_list (list): The blocks.
+        n_jobs (Optional[int]): The number of threads. Default is 1.
+
+    Yields:
+        The result of each block. With threads, results are in the order blocks finish.
+    """
+
+    # GDAL datasets cannot be shared
+    #   between threads, so each thread
+    #   opens its own instances.
+    thread_data = threading.local()
+    thread_infos = list()
+    thread_lock = threading.Lock()
+
+    def _calc_block(block):
+
+        if not hasattr(thread_data, 'image_infos'):
+
+            thread_data.image_infos = dict([(key, ropen(value)) for key, value in viewitems(image_paths)])
+
+            with thread_lock:
+                thread_infos.append(thread_data.image_infos)
+
+        return calc_block(thread_data.image_infos, block)
+
+    if n_jobs == -1:
+        n_jobs = multi.cpu_count()
+
+    pool = None if n_jobs in [0, 1] else ThreadPool(processes=n_jobs)
+
+    try:
+
+        if pool is None:
+
+            for block in block_list:
+                yield _calc_block(block)
+
+        else:
+
+            # Results are consumed by the calling thread.
+            for block_result in pool.imap_unordered(_calc_block, block_list):
+                yield block_result
+
+            pool.close()
+
+    except:
+
+        if pool is not None:
+            pool.terminate()
+
+        raise
+
+    finally:
+
+        if pool is not None:
+            pool.join()
+
+        for image_infos in thread_infos:
+
+            for image_info in image_infos.values():
+                image_info.close()
+
+
 def stats_func(im,
                ignore_value=None,
                stat=None,
@@ -4733,7 +5438,7 @@ def stats_func(im,
         out_array /= stats_functions['nanmean'](im, axis=0)
 
     elif stat == 'nanmode':
-        out_array = sci_mode(im, axis=0, nan_policy='omit')
+        out_array = scipy_stats.mode(im, axis=0, nan_policy='omit')
     elif stat == 'cv':
 
         out_array = im.std(axis=0)
@@ -4752,6 +5457,18 @@ def stats_func(im,
     elif stat == 'sum':
         out_array = im.sum(axis=0)
 
+    return _set_stat_thresholds(out_array,
+                                im[0],
+                                set_below,
+                                set_above,
+                                set_common,
+                                no_data_value)
+
+
+def _set_stat_thresholds(out_array, first_band, set_below, set_above, set_common, no_data_value):
+
+    """Filters pixel statistics by thresholds and resets no data pixels"""
+
     # Filter values.
     if isinstance(set_below, int):
         out_array[out_array < set_below] = no_data_value
@@ -4767,7 +5484,7 @@ def stats_func(im,
             __, out_array = cv2.threshold(np.uint8(out_array), 0, 1, cv2.THRESH_BINARY_INV)
 
             # Add the common value among all bands.
-            out_array *= np.uint8(im[0])
+            out_array *= np.uint8(first_band)
 
         else:
             out_array[out_array > set_above] = no_data_value
@@ -4778,6 +5495,266 @@ def stats_func(im,
     return out_array
 
 
+# Set in each worker by ``_init_stats_worker``.
+_worker_stats_info = None
+
+
+def _init_stats_worker(input_image):
+
+    """Opens the input image once per worker"""
+
+    global _worker_stats_info
+
+    _worker_stats_info = ropen(input_image)
+
+
+def _stats_block_worker(stats_task):
+
+    """Computes the statistics of one block in a worker"""
+
+    block_window, stats_params = stats_task
+
+    return block_window, _pixel_stats_block(_worker_stats_info,
+                                            block_window,
+                                            **stats_params)
+
+
+def _pixel_stats_block(i_info,
+                       block_window,
+                       stats=None,
+                       bands=None,
+                       band_chunk_size=32,
+                       ignore_value=None,
+                       set_below=None,
+                       set_above=None,
+                       set_common=False,
+                       no_data_value=0):
+
+    """
+    Computes several statistics of one block in a single pass over the bands
+
+    The bands are read in chunks of ``band_chunk_size`` and merged into streaming accumulators
+    (count, mean, and the sum of squared differences, merged with Chan et al.'s form of Welford's
+    update), so the memory held per block does not depend on the number of bands.
+
+    Args:
+        i_info (object): An instance of ``ropen``.
+        block_window (tuple): The block (i, j, n_rows, n_cols).
+        stats (list): The statistics to compute.
+        bands (list): The band positions to include in the statistics.
+        band_chunk_size (Optional[int]): The number of bands to read at once. Default is 32.
+        ignore_value, set_below, set_above, set_common, no_data_value: See ``pixel_stats``.
+
+    Returns:
+        The statistics, shaped as [len(stats) x rows x columns].
+    """
+
+    i, j, n_rows, n_cols = block_window
+
+    n_obs = np.zeros((n_rows, n_cols), dtype='float64')
+    stat_mean = np.zeros((n_rows, n_cols), dtype='float64')
+    stat_m2 = np.zeros((n_rows, n_cols), dtype='float64')
+    stat_min = np.zeros((n_rows, n_cols), dtype='float64') + np.inf
+    stat_max = np.zeros((n_rows, n_cols), dtype='float64') - np.inf
+
+    first_band = None
+    full_stack = list()
+
+    # The median and mode need all observations.
+    keep_stack = ('median' in stats) or ('mode' in stats)
+
+    for band_start in range(0, len(bands), band_chunk_size):
+
+        band_chunk = bands[band_start:band_start+band_chunk_size]
+
+        chunk_array = i_info.read(bands2open=band_chunk,
+                                  i=i,
+                                  j=j,
+                                  rows=n_rows,
+                                  cols=n_cols,
+                                  d_type='float32')
+
+        if len(chunk_array.shape) == 2:
+            chunk_array = chunk_array[np.newaxis]
+
+        if first_band is None:
+            first_band = chunk_array[0].copy()
+
+        if isinstance(ignore_value, int):
+            chunk_array[chunk_array == ignore_value] = np.nan
+
+        if keep_stack:
+            full_stack.append(chunk_array)
+
+        chunk_n = np.float64((~np.isnan(chunk_array)).sum(axis=0))
+        chunk_mean = np.nansum(chunk_array, axis=0, dtype='float64') / np.where(chunk_n == 0, 1, chunk_n)
+        chunk_m2 = np.nansum((chunk_array - chunk_mean) ** 2, axis=0, dtype='float64')
+
+        # Merge the chunk into the accumulators.
+        n_total = n_obs + chunk_n
+        delta = chunk_mean - stat_mean
+        n_ratio = chunk_n / np.where(n_total == 0, 1, n_total)
+
+        stat_mean += delta * n_ratio
+        stat_m2 += chunk_m2 + delta ** 2 * n_obs * n_ratio
+        n_obs = n_total
+
+        stat_min = np.fmin(stat_min, np.fmin.reduce(chunk_array, axis=0))
+        stat_max = np.fmax(stat_max, np.fmax.reduce(chunk_array, axis=0))
+
+    no_obs = n_obs == 0
+
+    stat_mean[no_obs] = np.nan
+    stat_var = stat_m2 / np.where(no_obs, np.nan, n_obs)
+
+    if keep_stack:
+        full_stack = np.concatenate(full_stack, axis=0)
+
+    out_array = np.empty((len(stats), n_rows, n_cols), dtype='float32')
+
+    for stat_idx, stat in enumerate(stats):
+
+        if stat == 'mean':
+            stat_array = stat_mean
+        elif stat == 'var':
+            stat_array = stat_var
+        elif stat == 'std':
+            stat_array = np.sqrt(stat_var)
+        elif stat == 'cv':
+            stat_array = np.sqrt(stat_var) / stat_mean
+        elif stat == 'sum':
+            stat_array = np.where(no_obs, 0., stat_mean * n_obs)
+        elif stat == 'min':
+            stat_array = np.where(no_obs, np.nan, stat_min)
+        elif stat == 'max':
+            stat_array = np.where(no_obs, np.nan, stat_max)
+        elif stat == 'median':
+            stat_array = np.nanmedian(full_stack, axis=0)
+        else:
+            stat_array = scipy_stats.mode(full_stack, axis=0, nan_policy='omit')[0].squeeze()
+
+        out_array[stat_idx] = _set_stat_thresholds(np.float32(stat_array),
+                                                   first_band,
+                                                   set_below,
+                                                   set_above,
+                                                   set_common,
+                                                   no_data_value)
+
+    return out_array
+
+
+def _pixel_stats_multi(input_image,
+                       output_image,
+                       stats,
+                       bands2process,
+                       stats_params,
+                       be_quiet,
+                       block_rows,
+                       block_cols,
+                       out_storage,
+                       overwrite,
+                       n_jobs,
+                       band_chunk_size):
+
+    """Computes a list of pixel statistics in a single read pass. See ``pixel_stats``."""
+
+    if overwrite:
+        overwrite_file(output_image)
+
+    with ropen(input_image) as i_info:
+
+        if i_info.bands <= 1:
+
+            logger.error('The input image only has {:d} band. It should have at least 2.'.format(i_info.bands))
+            raise ValueError
+
+        if isinstance(bands2process, int):
+
+            if bands2process == -1:
+                bands2process = list(range(1, i_info.bands+1))
+            else:
+                bands2process = [bands2process]
+
+        stats_params = dict(stats_params,
+                            stats=stats,
+                            bands=bands2process,
+                            band_chunk_size=band_chunk_size)
+
+        # Copy the input information.
+        o_info = i_info.copy()
+
+        o_info.update_info(bands=len(stats),
+                           storage=out_storage)
+
+        block_windows = [(i, j, n_rows_cols(i, block_rows, i_info.rows), n_rows_cols(j, block_cols, i_info.cols))
+                         for i in range(0, i_info.rows, block_rows)
+                         for j in range(0, i_info.cols, block_cols)]
+
+        out_raster = create_raster(output_image, o_info)
+
+        if not be_quiet:
+
+            logger.info('\nGetting pixel stats for {} ...\n'.format(input_image))
+
+            ctr, pbar = _iteration_parameters(i_info.rows, i_info.cols, block_rows, block_cols)
+
+        if n_jobs in [0, 1]:
+            block_results = ((block_window, _pixel_stats_block(i_info, block_window, **stats_params))
+                             for block_window in block_windows)
+        else:
+
+            if n_jobs == -1:
+                n_jobs = multi.cpu_count()
+
+            pool = multi.Pool(processes=n_jobs,
+                              initializer=_init_stats_worker,
+                              initargs=(input_image,))
+
+            # Blocks are written at their own
+            #   offsets, in any order.
+            block_results = pool.imap_unordered(_stats_block_worker,
+                                                [(block_window, stats_params) for block_window in block_windows])
+
+        try:
+
+            for block_window, out_array in block_results:
+
+                for stat_idx in range(0, len(stats)):
+
+                    out_raster.write_array(out_array[stat_idx],
+                                           i=block_window[0],
+                                           j=block_window[1],
+                                           band=stat_idx+1)
+
+                if not be_quiet:
+
+                    pbar.update(ctr)
+                    ctr += 1
+
+            if n_jobs not in [0, 1]:
+                pool.close()
+
+        except:
+
+            if n_jobs not in [0, 1]:
+                pool.terminate()
+
+            raise
+
+        finally:
+
+            if n_jobs not in [0, 1]:
+                pool.join()
+
+        if not be_quiet:
+            pbar.finish()
+
+        out_raster.close_all()
+
+    out_raster = None
+    i_info = None
+
+
 def pixel_stats(input_image,
                 output_image,
                 stat='mean',
@@ -4792,7 +5769,8 @@ def pixel_stats(input_image,
                 block_cols=1000,
                 out_storage='float32',
                 overwrite=False,
-                n_jobs=1):
+                n_jobs=1,
+                band_chunk_size=32):
 
     """
     Computes statistics on n-dimensions
@@ -4800,8 +5778,10 @@ def pixel_stats(input_image,
     Args:
         input_image (str): The (bands x rows x columns) input image to process.
         output_image (str): The output image.
-        stat (Optional[str]): The statistic to calculate. Default is 'mean'.
+        stat (Optional[str or str list]): The statistic to calculate. Default is 'mean'.
             Choices are ['min', 'max', 'mean', 'median', 'mode', 'var', 'std', 'cv', 'sum'].
+            If a list, each statistic is written to its own band of ``output_image``, in list order,
+            from a single read of the bands.
         bands2process (Optional[int or int list]): The bands to include in the statistics. Default is -1, or
             include all bands.
         ignore_value (Optional[int]): A value to ignore in the calculations. Default is None.
@@ -4816,6 +5796,8 @@ def pixel_stats(input_image,
         out_storage (Optional[str]): The output raster storage. Default is 'float32'.
         overwrite (Optional[bool]): Whether to overwrite the output image. Default is False.
         n_jobs (Optional[int]): The number of blocks to process in parallel. Default is 1.
+        band_chunk_size (Optional[int]): The number of bands to read at once with a list of statistics.
+            Default is 32. The median and mode need all bands of a block in memory.
 
     Examples:
         >>> from mpglue.raster_tools import pixel_stats
@@ -4831,15 +5813,46 @@ def pixel_stats(input_image,
         >>>             bands2process=[1, 2, 3],
         >>>             ignore_value=0,
         >>>             no_data_value=-999)
+        >>>
+        >>> # Write the mean, standard deviation, minimum,
+        >>> #   and maximum to bands 1-4 in one pass.
+        >>> pixel_stats('/image.tif',
+        >>>             '/output.tif',
+        >>>             stat=['mean', 'std', 'min', 'max'])
 
     Returns:
         None, writes to ``output_image``.
     """
 
-    if stat not in ['min', 'max', 'mean', 'median', 'mode', 'var', 'std', 'cv', 'sum']:
+    stat_list = stat if isinstance(stat, list) else [stat]
 
-        logger.error('{} is not an option.'.format(stat))
-        raise NameError
+    for stat_ in stat_list:
+
+        if stat_ not in ['min', 'max', 'mean', 'median', 'mode', 'var', 'std', 'cv', 'sum']:
+
+            logger.error('{} is not an option.'.format(stat_))
+            raise NameError
+
+    if isinstance(stat, list):
+
+        _pixel_stats_multi(input_image,
+                           output_image,
+                           stat_list,
+                           bands2process,
+                           dict(ignore_value=ignore_value,
+                                set_below=set_below,
+                                set_above=set_above,
+                                set_common=set_common,
+                                no_data_value=no_data_value),
+                           be_quiet,
+                           block_rows,
+                           block_cols,
+                           out_storage,
+                           overwrite,
+                           n_jobs,
+                           band_chunk_size)
+
+        return
 
     stats_functions = dict(nanmean=np.nanmean,
                            nanmedian=np.nanmedian,
@@ -4849,7 +5862,7 @@ def pixel_stats(input_image,
                            nanmax=np.nanmax,
                            nansum=np.nansum,
                            median=np.median,
-                           mode=sci_mode)
+                           mode=scipy_stats.mode)
 
     params = dict(ignore_value=ignore_value,
                   stat=stat,
@@ -4903,6 +5916,183 @@ def pixel_stats(input_image,
     i_info = None
 
 
+def _date_positions(x_values):
+
+    """Converts dates to days so they can be used as interpolation positions"""
+
+    x_values = np.asarray(x_values)
+
+    if x_values.dtype.kind in ['M', 'O', 'U', 'S']:
+        x_values = x_values.astype('datetime64[D]').astype('int64')
+
+    return np.float64(x_values)
+
+
+def fill_gaps(input_image,
+              output_image,
+              bands2process=-1,
+              method='linear',
+              x_values=None,
+              no_data=0,
+              be_quiet=False,
+              block_rows=512,
+              block_cols=512,
+              out_storage='float32',
+              overwrite=False):
+
+    """
+    Fills 'no data' gaps (e.g., clouds) along the bands of a time stack
+
+    The stack is read and written block by block, so only one block of all bands is held in memory.
+    Each block is reshaped into one reused [pixels x bands] buffer and filled in place, with pixels
+    filled in parallel by the compiled ``stats._lin_interp`` kernel.
+
+    Args:
+        input_image (str): The (bands x rows x columns) time stack to fill.
+        output_image (str): The output image.
+        bands2process (Optional[int list]): The bands, in time order, to fill. Default is -1, or all bands.
+        method (Optional[str]): The fill method. Default is 'linear'.
+            Choices are ['linear', 'nearest', 'time'].
+
+                'linear': Linear interpolation between evenly spaced bands.
+                'nearest': The nearest valid value, in ``x_values`` if given.
+                'time': Linear interpolation at ``x_values``, for irregular dates.
+
+        x_values (Optional[1d array-like]): The date or position (e.g., day of year) of each band, used by
+            'nearest' and 'time'. Dates may be datetime objects or 'yyyy-mm-dd' strings. Default is None.
+        no_data (Optional[int or float]): The gap value to fill. NaNs are always filled. Default is 0.
+        be_quiet (Optional[bool]): Whether to be quiet and do not report progress status. Default is False.
+        block_rows (Optional[int]): The number of rows in the block. Default is 512.
+        block_cols (Optional[int]): The number of columns in the block. Default is 512.
+        out_storage (Optional[str]): The output raster storage. Default is 'float32'.
+        overwrite (Optional[bool]): Whether to overwrite the output image. Default is False.
+
+    Examples:
+        >>> from mpglue.raster_tools import fill_gaps
+        >>>
+        >>> # Fill zeros along all bands.
+        >>> fill_gaps('/stack.tif', '/stack_filled.tif')
+        >>>
+        >>> # Interpolate at the image dates.
+        >>> fill_gaps('/stack.tif',
+        >>>           '/stack_filled.tif',
+        >>>           method='time',
+        >>>           x_values=['2015-01-03', '2015-01-19', '2015-03-08'])
+
+    Returns:
+        None, writes to ``output_image``.
+    """
+
+    if _lin_interp is None:
+
+        logger.error('The mpglue stats extensions must be built to fill gaps.')
+        raise MissingRequirement
+
+    if method not in ['linear', 'nearest', 'time']:
+
+        logger.error('{} is not an option.'.format(method))
+        raise NameError
+
+    if (method == 'time') and (x_values is None):
+
+        logger.error('The band dates (x_values) are required with the time method.')
+        raise ValueError
+
+    if overwrite:
+        overwrite_file(output_image)
+
+    with ropen(input_image) as i_info:
+
+        if isinstance(bands2process, int):
+
+            if bands2process == -1:
+                bands2process = list(range(1, i_info.bands+1))
+            else:
+                bands2process = [bands2process]
+
+        n_bands = len(bands2process)
+
+        if n_bands <= 1:
+
+            logger.error('The time stack should have at least 2 bands.')
+            raise ValueError
+
+        if x_values is not None:
+
+            x_values = _date_positions(x_values)
+
+            if len(x_values) != n_bands:
+
+                logger.error('The number of x values and bands do not match.')
+                raise LenError
+
+        # Copy the input information.
+        o_info = i_info.copy()
+
+        o_info.update_info(bands=n_bands,
+                           storage=out_storage)
+
+        out_raster = create_raster(output_image, o_info)
+
+        # One [pixels x bands] buffer is reused by all blocks.
+        fill_buffer = np.empty((min(block_rows, i_info.rows) * min(block_cols, i_info.cols), n_bands),
+                               dtype='float32')
+
+        if not be_quiet:
+
+            logger.info('\nFilling gaps in {} ...\n'.format(input_image))
+
+            ctr, pbar = _iteration_parameters(i_info.rows, i_info.cols, block_rows, block_cols)
+
+        for i in range(0, i_info.rows, block_rows):
+
+            n_rows = n_rows_cols(i, block_rows, i_info.rows)
+
+            for j in range(0, i_info.cols, block_cols):
+
+                n_cols = n_rows_cols(j, block_cols, i_info.cols)
+
+                block_array = i_info.read(bands2open=bands2process,
+                                          i=i,
+                                          j=j,
+                                          rows=n_rows,
+                                          cols=n_cols,
+                                          d_type='float32')
+
+                block_buffer = fill_buffer[:n_rows*n_cols]
+
+                # [bands x rows x columns] --> [pixels x bands]
+                block_buffer[:] = block_array.reshape(n_bands, n_rows*n_cols).T
+
+                _lin_interp.fill_gaps(block_buffer,
+                                      value2fill=no_data,
+                                      x_values=x_values,
+                                      method=method,
+                                      in_place=True)
+
+                block_array = block_buffer.T.reshape(n_bands, n_rows, n_cols)
+
+                for band_idx in range(0, n_bands):
+
+                    out_raster.write_array(block_array[band_idx],
+                                           i=i,
+                                           j=j,
+                                           band=band_idx+1)
+
+                if not be_quiet:
+
+                    pbar.update(ctr)
+                    ctr += 1
+
+        if not be_quiet:
+            pbar.finish()
+
+        out_raster.close_all()
+
+    out_raster = None
+    i_info = None
+
+
 # def hist_equalization(img, n_bins=256):
 #
 #     """
@@ -5050,7 +6240,7 @@ def _add_unique_values(segmented_objects):
     segmented_objects[segmented_objects > 0] = 1
 
     # Label the objects, in sequential order.
-    objects, n_objects = lab_img(segmented_objects)
+    objects, n_objects = ndimage.label(segmented_objects)
 
     index = np.unique(objects)
 
@@ -5231,7 +6421,7 @@ def quick_plot(image_arrays, titles=['Field estimates'], colorbar_labels=['ha'],
         ip.axes.get_xaxis().set_visible(False)
         ip.axes.get_yaxis().set_visible(False)
 
-        divider = make_axes_locatable(ax)
+        divider = axes_grid1.make_axes_locatable(ax)
         cax = divider.append_axes('bottom', size='3%', pad=.05)
 
         cbar = plt.colorbar(ip, orientation='horizontal', cax=cax)
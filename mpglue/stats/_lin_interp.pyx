@@ -12,8 +12,7 @@ from __future__ import division
 import cython
 cimport cython
 
-# from libc.math cimport isnan
-# from cython.parallel import prange, parallel
+from cython.parallel import prange
 
 import numpy as np
 cimport numpy as np
@@ -21,242 +20,191 @@ cimport numpy as np
 DTYPE_float32 = np.float32
 ctypedef np.float32_t DTYPE_float32_t
 
+DTYPE_float64 = np.float64
+ctypedef np.float64_t DTYPE_float64_t
+
 DTYPE_long = np.uint64
 ctypedef np.uint64_t DTYPE_long_t
 
-# cdef extern from 'numpy/npy_math.h':
-#     bint npy_isnan(DTYPE_float32_t x)
-
-
-cdef inline DTYPE_float32_t _interp(int x1, int x2, int x3, DTYPE_float32_t y1, DTYPE_float32_t y3) nogil:
-    return ((float((x2 - x1)) * (y3 - y1)) / float((x3 - x1))) + y1
+cdef extern from 'numpy/npy_math.h':
+    bint npy_isnan(DTYPE_float32_t x) nogil
 
 
-cdef DTYPE_float32_t _get_max(DTYPE_float32_t[:] in_row, int cols) nogil:
-
-    cdef:
-        Py_ssize_t a
-        DTYPE_float32_t m = in_row[0]
-
-    for a in range(1, cols):
+cdef inline bint _is_gap(DTYPE_float32_t value, DTYPE_float32_t value2fill) noexcept nogil:
+    return (value == value2fill) or npy_isnan(value)
 
-        if in_row[a] > m:
 
-            m = in_row[a]
-
-    return m
+cdef void _fill_row(DTYPE_float32_t[:, ::1] in_block,
+                    Py_ssize_t i,
+                    Py_ssize_t dims,
+                    DTYPE_float64_t[::1] x_values,
+                    DTYPE_float32_t value2fill,
+                    bint nearest) noexcept nogil:
 
+    """
+    Fills the gaps of one row in a single pass
 
-cdef int _get_x1(int x2, DTYPE_float32_t[:] in_row, DTYPE_float32_t value2fill) nogil:
+    Each run of gaps is filled from the valid values on either side of it, either by
+    interpolating at ``x_values`` or by taking the value nearest in ``x_values``. Gaps
+    before the first and after the last valid value take that value. Rows without
+    valid values are left as is.
+    """
 
     cdef:
-        Py_ssize_t x1_iter
-        int x1 = -9999
+        Py_ssize_t d, k
+        Py_ssize_t x1 = -1
+        Py_ssize_t first_valid = -1
+        DTYPE_float32_t y1, y3
 
-    for x1_iter in range(1, x2+1):
+    for d in range(0, dims):
 
-        if in_row[x2-x1_iter] != value2fill:
+        if _is_gap(in_block[i, d], value2fill):
+            continue
 
-            x1 = x2 - x1_iter
+        if x1 == -1:
+            first_valid = d
 
-            break
+        elif d - x1 > 1:
 
-    return x1
+            y1 = in_block[i, x1]
+            y3 = in_block[i, d]
 
+            for k in range(x1+1, d):
 
-cdef int _get_x3(int x2, DTYPE_float32_t[:] in_row, int dims, DTYPE_float32_t value2fill) nogil:
+                if nearest:
 
-    cdef:
-        Py_ssize_t x3_iter
-        int x3 = -9999
-        int x3_range = dims - x2
+                    if (x_values[k] - x_values[x1]) <= (x_values[d] - x_values[k]):
+                        in_block[i, k] = y1
+                    else:
+                        in_block[i, k] = y3
 
-    for x3_iter in range(1, x3_range):
+                else:
+                    in_block[i, k] = (((x_values[k] - x_values[x1]) * (y3 - y1)) / (x_values[d] - x_values[x1])) + y1
 
-        if in_row[x2+x3_iter] != value2fill:
+        x1 = d
 
-            x3 = x2 + x3_iter
+    if x1 == -1:
+        return
 
-            break
+    # Fill the ends with the nearest valid value.
+    for k in range(0, first_valid):
+        in_block[i, k] = in_block[i, first_valid]
 
-    return x3
+    for k in range(x1+1, dims):
+        in_block[i, k] = in_block[i, x1]
 
 
-cdef tuple _find_indices(DTYPE_float32_t[:] in_row, int dims, DTYPE_float32_t value2fill):
+cdef void _fill_block(DTYPE_float32_t[:, ::1] in_block,
+                      DTYPE_float64_t[::1] x_values,
+                      DTYPE_float32_t value2fill,
+                      bint nearest):
 
     cdef:
-        Py_ssize_t fi
-        Py_ssize_t counter = 0
-        DTYPE_float32_t[:] index_positions = in_row.copy()
+        Py_ssize_t i
+        Py_ssize_t rows = in_block.shape[0]
+        Py_ssize_t dims = in_block.shape[1]
 
     with nogil:
 
-        for fi in range(0, dims):
-
-            if in_row[fi] == value2fill:
+        for i in prange(0, rows, schedule='static'):
+            _fill_row(in_block, i, dims, x_values, value2fill, nearest)
 
-                index_positions[counter] = fi
 
-                counter += 1
+def fill_gaps(np.ndarray input_array,
+              float value2fill=0.,
+              x_values=None,
+              str method='linear',
+              bint in_place=False):
 
-    return index_positions, counter
-
-
-cdef void _fill_ends(DTYPE_float32_t[:] in_block,
-                     int dims,
-                     DTYPE_float32_t value2fill) nogil:
-
-    cdef:
-        Py_ssize_t ib, ic
-        DTYPE_float32_t valid_data
-
-    if in_block[0] == value2fill:
-
-        # Find the first valid data point
-        for ib in range(1, dims):
-
-            if in_block[ib] != value2fill:
-                valid_data = in_block[ib]
-                break
-
-        # Fill the ends up to the valid data point.
-        for ic in range(0, ib):
-            in_block[ic] = valid_data
-
-    if in_block[dims-1] == value2fill:
+    """
+    Fills 'no data' gaps along the dimensions of each sample
 
-        # Find the first non-zero data
-        for ib in range(dims-2, 0, -1):
+    The rows are filled in parallel with OpenMP (set the number of threads with OMP_NUM_THREADS).
 
-            if in_block[ib] != value2fill:
-                valid_data = in_block[ib]
-                break
+    Args:
+        input_array (ndarray): The 2d array to fill. The expected dimensions are
+            [(rows x columns) x dimensions].
+        value2fill (Optional[float]): The 'no data' value. NaNs are always filled. Default is 0.
+        x_values (Optional[1d array-like]): The position of each dimension (e.g., the day of each
+            image date). Default is None, or evenly spaced positions.
+        method (Optional[str]): The fill method. Default is 'linear'.
+            Choices are ['linear', 'nearest', 'time'].
 
-        # Fill the ends up to the valid data point.
-        for ic in range(ib+1, dims):
-            in_block[ic] = valid_data
+                'linear': Linear interpolation between evenly spaced dimensions.
+                'nearest': The nearest valid value, in ``x_values`` if given.
+                'time': Linear interpolation at ``x_values``, for irregular dates.
 
+        in_place (Optional[bool]): Whether to fill ``input_array`` in place. It must be a C-contiguous
+            float32 array. Default is False, or fill a float32 copy.
 
-cdef void _interp_loop_1d(DTYPE_float32_t[:] in_row,
-                          int dims,
-                          DTYPE_float32_t value2fill):
+    Returns:
+        The filled array, as [(rows x columns) x dimensions].
+    """
 
     cdef:
-        Py_ssize_t x2_idx
-        Py_ssize_t len_idx
-        DTYPE_float32_t[:] idx
-        int x1, x2, x3
-
-    idx, len_idx = _find_indices(in_row, dims, value2fill)
-
-    if len_idx != 0:
-
-        with nogil:
-
-            # check for data
-            if _get_max(in_row, dims) > 0:
-
-                for x2_idx in range(0, len_idx):
-
-                    x2 = <int>(idx[x2_idx])
-
-                    # get x1
-                    x1 = _get_x1(x2, in_row, value2fill)
-
-                    # get x3
-                    x3 = _get_x3(x2, in_row, dims, value2fill)
-
-                    if (x1 != -9999) and (x3 != -9999):
-                        in_row[x2] = _interp(x1, x2, x3, in_row[x1], in_row[x3])
+        int dims = input_array.shape[1]
+        DTYPE_float32_t[:, ::1] in_block
+        DTYPE_float64_t[::1] x_positions
 
-        _fill_ends(in_row, dims, value2fill)
+    if method not in ['linear', 'nearest', 'time']:
+        raise NameError('The method should be one of linear, nearest, or time.')
 
+    if (method == 'time') and (x_values is None):
+        raise ValueError('The x values are required with the time method.')
 
-cdef np.ndarray[DTYPE_float32_t, ndim=2, mode='c'] _interp_loop(DTYPE_float32_t[:, :] in_block,
-                                                                int rows, 
-                                                                int dims,
-                                                                DTYPE_float32_t value2fill):
+    if (method == 'linear') or (x_values is None):
+        x_positions = np.arange(0, dims, dtype='float64')
+    else:
 
-    cdef:
-        Py_ssize_t i    #, x2_idx
-        #Py_ssize_t len_idx
-        DTYPE_float32_t[:] in_row
-        #DTYPE_float32_t[:] idx
-        #int x1, x2, x3
+        x_positions = np.ascontiguousarray(x_values, dtype='float64')
 
-    for i in range(0, rows):
+        if x_positions.shape[0] != dims:
+            raise ValueError('The x values and the array dimensions do not match.')
 
-        # get the current row
-        in_row = in_block[i, :]
+    if in_place:
 
-        # idx, len_idx = _find_indices(in_row, dims, value2fill)
-        #
-        # if len_idx == 0:
-        #     continue
+        if (input_array.dtype != np.float32) or not input_array.flags['C_CONTIGUOUS']:
+            raise TypeError('The array must be C-contiguous float32 to be filled in place.')
 
-        _interp_loop_1d(in_row,
-                        dims,
-                        value2fill)
+    else:
+        input_array = np.array(input_array, dtype='float32', order='C', copy=True)
 
-        # check for data
-        # if _get_max(in_row, dims) > 0:
+    in_block = input_array
 
-            # for x2_idx in range(0, len_idx):
-            # 
-            #     x2 = int(idx[x2_idx])
-            # 
-            #     # get x1
-            #     x1 = _get_x1(x2, in_row, value2fill)
-            # 
-            #     # get x3
-            #     x3 = _get_x3(x2, in_row, dims, value2fill)
-            # 
-            #     if (x1 != -9999) and (x3 != -9999):
-            #         in_row[x2] = _interp(x1, x2, x3, in_row[x1], in_row[x3])
+    _fill_block(in_block, x_positions, value2fill, method == 'nearest')
 
-        # in_block[i] = _fill_ends(in_row, dims, value2fill)
-        in_block[i] = in_row
+    return input_array
 
-    return np.asarray(in_block)
 
-
-def lin_interp(np.ndarray input_array, DTYPE_float32_t value2fill):
+def lin_interp(np.ndarray input_array, float value2fill=0.):
 
     """
     Linearly interpolates between 'no data' points
 
     Args:
-        nd_array (ndarray): The 2d array to interpolate. The expected dimensions are
-            [(rows x columns) x dimensions]. Zeros are considered 'no data'.
+        input_array (ndarray): The 2d array to interpolate. The expected dimensions are
+            [(rows x columns) x dimensions].
+        value2fill (Optional[float]): The 'no data' value. Default is 0.
 
     Returns:
-        Interpolated version of ``nd_array``.
+        Interpolated version of ``input_array``.
     """
 
-    cdef:
-        int rows = input_array.shape[0]
-        int dims = input_array.shape[1]
-
-    return _interp_loop(np.float32(np.ascontiguousarray(input_array)), rows, dims, value2fill)
+    return fill_gaps(input_array, value2fill=value2fill)
 
 
-def lin_interp_1d(np.ndarray input_array, float value2fill):
+def lin_interp_1d(np.ndarray input_array, float value2fill=0.):
 
     """
     Linearly interpolates between 'no data' points
 
     Args:
-        arr (ndarray): The 1d array to interpolate. The expected dimensions are
-            (row x dimensions). Zeros are considered 'no data'.
+        input_array (ndarray): The 1d array to interpolate. The expected dimensions are
+            (row x dimensions).
+        value2fill (Optional[float]): The 'no data' value. Default is 0.
 
     Returns:
-        Interpolated version of ``arr``.
+        Interpolated version of ``input_array``.
     """
 
-    cdef:
-        int dims = int(len(input_array))
-        DTYPE_float32_t[:] in1d = np.float32(input_array)
-
-    _interp_loop_1d(in1d, dims, value2fill)
-
-    return np.float32(in1d)
+    return fill_gaps(input_array.reshape(1, len(input_array)), value2fill=value2fill).ravel()
@@ -13,8 +13,8 @@ cimport cython
 import numpy as np
 cimport numpy as np
 
-from cython.parallel import prange
-from libc.math cimport pow
+from cython.parallel import prange, parallel
+from libc.stdlib cimport malloc, free
 
 DTYPE_uint64 = np.uint64
 ctypedef np.uint64_t DTYPE_uint64_t
@@ -85,7 +85,7 @@ cdef DTYPE_float32_t _get_weighted_mean(DTYPE_float32_t[:] array_1d,
                                         int array_length,
                                         DTYPE_float32_t[:] weights,
                                         DTYPE_float32_t weights_sum,
-                                        DTYPE_float32_t ignore_value) nogil:
+                                        DTYPE_float32_t ignore_value) noexcept nogil:
 
     cdef:
         Py_ssize_t jj
@@ -102,24 +102,27 @@ cdef DTYPE_float32_t _get_weighted_mean(DTYPE_float32_t[:] array_1d,
 
 
 cdef DTYPE_float32_t _get_mean(DTYPE_float32_t[:] array_1d,
-                               DTYPE_float32_t ignore_value) nogil:
+                               DTYPE_float32_t ignore_value) noexcept nogil:
 
     cdef:
         Py_ssize_t jj
         int array_length = 0
-        DTYPE_float32_t array_sum = array_1d[0]
+        DTYPE_float32_t array_sum = 0.
 
-    for jj in range(1, array_length):
+    for jj in range(0, array_1d.shape[0]):
 
         if array_1d[jj] != ignore_value:
 
             array_sum += array_1d[jj]
             array_length += 1
 
+    if array_length == 0:
+        return ignore_value
+
     return array_sum / array_length
 
 
-cdef DTYPE_float32_t _get_sum(DTYPE_float32_t[:] array_1d, int array_length) nogil:
+cdef DTYPE_float32_t _get_sum(DTYPE_float32_t[:] array_1d, int array_length) noexcept nogil:
 
     cdef:
         Py_ssize_t jj
@@ -131,7 +134,7 @@ cdef DTYPE_float32_t _get_sum(DTYPE_float32_t[:] array_1d, int array_length) nog
     return array_sum
 
 
-cdef void _get_min(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) nogil:
+cdef void _get_min(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) noexcept nogil:
 
     cdef:
         Py_ssize_t c
@@ -142,7 +145,7 @@ cdef void _get_min(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) n
             val1[c] = val2[c]
 
 
-cdef DTYPE_float32_t _get_max_value(DTYPE_float32_t[:] array1d, int cols) nogil:
+cdef DTYPE_float32_t _get_max_value(DTYPE_float32_t[:] array1d, int cols) noexcept nogil:
 
     cdef:
         Py_ssize_t c
@@ -156,7 +159,7 @@ cdef DTYPE_float32_t _get_max_value(DTYPE_float32_t[:] array1d, int cols) nogil:
     return max_value
 
 
-cdef void _get_max(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) nogil:
+cdef void _get_max(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) noexcept nogil:
 
     cdef:
         Py_ssize_t c
@@ -167,45 +170,48 @@ cdef void _get_max(DTYPE_float32_t[:] val1, DTYPE_float32_t[:] val2, int cols) n
             val1[c] = val2[c]
 
 
-cdef void _least_squares(DTYPE_float32_t[:] x,
-                         DTYPE_float32_t[:, :] y,
-                         int n,
-                         int cols,
-                         DTYPE_float32_t[:] y_avg,
-                         DTYPE_float32_t[:] cov_xy_) nogil:
+cdef void _least_squares_line(DTYPE_float32_t[:, :] image_array,
+                              DTYPE_float32_t[:] slopes_min,
+                              DTYPE_float32_t[:] slopes_max,
+                              Py_ssize_t j,
+                              Py_ssize_t rows,
+                              Py_ssize_t window_size) noexcept nogil:
+
+    """
+    Computes the min. and max. least squares slope of the moving windows down one column
+
+    With x = 0, 1, ..., window_size-1, the slope of a window is sum((x - x_avg) * y) / sum((x - x_avg)^2),
+    so the x terms are computed once for all windows.
+    """
 
     cdef:
-        DTYPE_float32_t temp
-        Py_ssize_t ii, jj
-        DTYPE_float32_t x_avg = 0.
+        Py_ssize_t w, k
+        DTYPE_float32_t x_avg = (window_size - 1) / 2.
         DTYPE_float32_t var_x = 0.
+        DTYPE_float32_t slope
+        DTYPE_float32_t slope_min = 100000.
+        DTYPE_float32_t slope_max = -100000.
 
-    for ii in range(0, n):
+    for k in range(0, window_size):
+        var_x += (k - x_avg) * (k - x_avg)
 
-        x_avg += x[ii]
+    for w in range(0, rows-window_size+1):
 
-        # for jj in prange(0, cols, nogil=True, num_threads=cols, schedule='static'):
-        for jj in range(0, cols):
-            y_avg[jj] += y[ii, jj]
+        slope = 0.
 
-    x_avg /= n
+        for k in range(0, window_size):
+            slope += (k - x_avg) * image_array[w+k, j]
 
-    # for jj in prange(0, cols, nogil=True, num_threads=cols, schedule='static'):
-    for jj in range(0, cols):
-        y_avg[jj] /= n
+        slope /= var_x
 
-    for ii in range(0, n):
+        if slope < slope_min:
+            slope_min = slope
 
-        temp = x[ii] - x_avg
-        var_x += pow(temp, 2.)
+        if slope > slope_max:
+            slope_max = slope
 
-        # for jj in prange(0, cols, nogil=True, num_threads=cols, schedule='static'):
-        for jj in range(0, cols):
-            cov_xy_[jj] += temp * (y[ii, jj] - y_avg[jj])
-
-    # for jj in prange(0, cols, nogil=True, num_threads=cols, schedule='static'):
-    for jj in range(0, cols):
-        cov_xy_[jj] /= var_x
+    slopes_min[j] = slope_min
+    slopes_max[j] = slope_max
 
 
 # cdef class Vector(object):
@@ -222,7 +228,7 @@ cdef void _least_squares(DTYPE_float32_t[:] x,
 #         free(self.data)
 
 
-cdef void _replace_nans(DTYPE_float32_t[:] nan_array, int replace_value, int cols) nogil:
+cdef void _replace_nans(DTYPE_float32_t[:] nan_array, int replace_value, int cols) noexcept nogil:
 
     cdef:
         Py_ssize_t j
@@ -240,43 +246,23 @@ cdef void _replace_nans(DTYPE_float32_t[:] nan_array, int replace_value, int col
 cdef tuple _rolling_least_squares(DTYPE_float32_t[:, :] image_array, int window_size):
 
     cdef:
-        Py_ssize_t w
+        Py_ssize_t j
         unsigned int rows = image_array.shape[0]
         unsigned int cols = image_array.shape[1]
-        # np.ndarray[DTYPE_float32_t, ndim=1, mode='c'] X = np.arange(window_size, 'float32')
-        # np.ndarray[DTYPE_float32_t, ndim=1, mode='c'] slopes_max = np.zeros(cols, dtype='float32')
-        # np.ndarray[DTYPE_float32_t, ndim=1, mode='c'] slopes_min = np.multiply(np.ones(cols, dtype='float32'), 1000)
-        # np.ndarray[DTYPE_float32_t, ndim=1, mode='c'] slopes
-
-        # DTYPE_float32_t[:] X = cython.view.array(shape=(10, 2), itemsize=sizeof(int), format="i")
-        # cdef Vector X = Vector(cols)
-
-        DTYPE_float32_t[:] X = np.arange(window_size, dtype='float32')
-        DTYPE_float32_t[:] slopes_max = np.ones(cols, dtype='float32') * -100000.
-        DTYPE_float32_t[:] slopes_min = np.ones(cols, dtype='float32') * 100000.
-        DTYPE_float32_t[:] slopes
-        DTYPE_float32_t[:] y_avg = np.zeros(cols, dtype='float32')
-        DTYPE_float32_t[:] y_avgc
-        DTYPE_float32_t[:] cov_xy = np.zeros(cols, dtype='float32')
-
-    with nogil:
-
-        for w in range(0, rows-window_size):
+        DTYPE_float32_t[:] slopes_max = np.zeros(cols, dtype='float32')
+        DTYPE_float32_t[:] slopes_min = np.zeros(cols, dtype='float32')
 
-            slopes = cov_xy[:]
-            y_avgc = y_avg[:]
+    if rows < window_size:
+        return np.float32(slopes_min), np.float32(slopes_max)
 
-            _least_squares(X, image_array[w:w+window_size, :], window_size, cols, y_avgc, slopes)
+    with nogil:
 
-            _get_min(slopes_min, slopes, cols)
-            _get_max(slopes_max, slopes, cols)
+        for j in prange(0, cols, schedule='static'):
+            _least_squares_line(image_array, slopes_min, slopes_max, j, rows, window_size)
 
     _replace_nans(slopes_min, 0, cols)
     _replace_nans(slopes_max, 0, cols)
 
-    # slopes_min[np.isnan(slopes_min) | np.isinf(slopes_min)] = 0
-    # slopes_max[np.isnan(slopes_max) | np.isinf(slopes_max)] = 0
-
     return np.float32(slopes_min), np.float32(slopes_max)
 
 
@@ -299,27 +285,206 @@ cdef tuple _rolling_least_squares(DTYPE_float32_t[:, :] image_array, int window_
 #     return med_val
 
 
-cdef DTYPE_float32_t[:, :] _rolling_median(DTYPE_float32_t[:, :] arr, int window_size):
+cdef inline void _heap_swap(int *heap, int *heap_pos, Py_ssize_t a, Py_ssize_t b) noexcept nogil:
+
+    cdef:
+        int slot_a = heap[a]
+
+    heap[a] = heap[b]
+    heap[b] = slot_a
+
+    heap_pos[heap[a]] = a
+    heap_pos[heap[b]] = b
+
+
+cdef inline void _heap_sift_up(DTYPE_float32_t *values,
+                               int *heap,
+                               int *heap_pos,
+                               Py_ssize_t k,
+                               DTYPE_float32_t sign) noexcept nogil:
 
     cdef:
-        Py_ssize_t i, j
+        Py_ssize_t parent
+
+    while k > 0:
+
+        parent = (k - 1) / 2
+
+        if sign * values[heap[k]] < sign * values[heap[parent]]:
+
+            _heap_swap(heap, heap_pos, k, parent)
+            k = parent
+
+        else:
+            break
+
+
+cdef inline void _heap_sift_down(DTYPE_float32_t *values,
+                                 int *heap,
+                                 int *heap_pos,
+                                 Py_ssize_t k,
+                                 Py_ssize_t n,
+                                 DTYPE_float32_t sign) noexcept nogil:
+
+    cdef:
+        Py_ssize_t child
+
+    while True:
+
+        child = 2 * k + 1
+
+        if child >= n:
+            break
+
+        if (child + 1 < n) and (sign * values[heap[child+1]] < sign * values[heap[child]]):
+            child += 1
+
+        if sign * values[heap[child]] < sign * values[heap[k]]:
+
+            _heap_swap(heap, heap_pos, k, child)
+            k = child
+
+        else:
+            break
+
+
+cdef void _rolling_median_line(DTYPE_float32_t[:, :] arr,
+                               DTYPE_float32_t[:, :] results,
+                               Py_ssize_t i,
+                               Py_ssize_t cols,
+                               Py_ssize_t window_size,
+                               DTYPE_float32_t *values,
+                               int *heaps,
+                               int *heap_pos,
+                               int *heap_of) noexcept nogil:
+
+    """
+    Computes a moving median along one row with two heaps
+
+    The window values are kept in a ring of ``window_size`` slots. The max-heap holds the
+    ``window_size / 2`` smallest slots and the min-heap the rest, so the median is the root of
+    the min-heap. Each step overwrites the oldest slot with the incoming value, restores its heap,
+    and swaps the two roots if they are out of order, which is O(log w).
+
+    The median of the window starting at column j is written to column j + (window_size - 1) / 2.
+    Columns without a full window keep their input values.
+    """
+
+    cdef:
+        Py_ssize_t j, k, m, slot
+        Py_ssize_t n_low = window_size / 2
+        Py_ssize_t n_high = window_size - n_low
+        Py_ssize_t offset = (window_size - 1) / 2
+        int *low_heap = heaps
+        int *high_heap = heaps + window_size
+        int low_root, high_root
+        DTYPE_float32_t sign
+
+    for j in range(0, cols):
+        results[i, j] = arr[i, j]
+
+    if cols < window_size:
+        return
+
+    # Sort the slots of the first window.
+    for k in range(0, window_size):
+
+        values[k] = arr[i, k]
+
+        m = k
+
+        while (m > 0) and (values[high_heap[m-1]] > values[k]):
+
+            high_heap[m] = high_heap[m-1]
+            m -= 1
+
+        high_heap[m] = k
+
+    # A descending array is a max-heap and
+    #   an ascending array is a min-heap.
+    for k in range(0, n_low):
+        low_heap[k] = high_heap[n_low-1-k]
+
+    for k in range(0, n_high):
+        high_heap[k] = high_heap[k+n_low]
+
+    for k in range(0, n_low):
+
+        heap_of[low_heap[k]] = 0
+        heap_pos[low_heap[k]] = k
+
+    for k in range(0, n_high):
+
+        heap_of[high_heap[k]] = 1
+        heap_pos[high_heap[k]] = k
+
+    results[i, offset] = values[high_heap[0]]
+
+    for j in range(1, cols-window_size+1):
+
+        # The outgoing and incoming columns share a slot.
+        slot = (j - 1) % window_size
+
+        values[slot] = arr[i, j+window_size-1]
+
+        if heap_of[slot] == 0:
+
+            sign = -1.
+
+            _heap_sift_up(values, low_heap, heap_pos, heap_pos[slot], sign)
+            _heap_sift_down(values, low_heap, heap_pos, heap_pos[slot], n_low, sign)
+
+        else:
+
+            sign = 1.
+
+            _heap_sift_up(values, high_heap, heap_pos, heap_pos[slot], sign)
+            _heap_sift_down(values, high_heap, heap_pos, heap_pos[slot], n_high, sign)
+
+        if (n_low > 0) and (values[low_heap[0]] > values[high_heap[0]]):
+
+            low_root = low_heap[0]
+            high_root = high_heap[0]
+
+            low_heap[0] = high_root
+            high_heap[0] = low_root
+
+            heap_of[high_root] = 0
+            heap_of[low_root] = 1
+
+            _heap_sift_down(values, low_heap, heap_pos, 0, n_low, -1.)
+            _heap_sift_down(values, high_heap, heap_pos, 0, n_high, 1.)
+
+        results[i, j+offset] = values[high_heap[0]]
+
+
+cdef np.ndarray[DTYPE_float32_t, ndim=2] _rolling_median(DTYPE_float32_t[:, :] arr, int window_size):
+
+    cdef:
+        Py_ssize_t i
         unsigned int rows = arr.shape[0]
         unsigned int cols = arr.shape[1]
-        unsigned int window_half1 = window_size / 2
-        unsigned int window_half2 = (window_size / 2) + 1
-        DTYPE_float32_t[:] the_row
-        DTYPE_float32_t[:, :] results = np.zeros((rows, cols), dtype='float32')
-
-    ## iterate over the array by rows
-    for i in range(0, rows):
+        DTYPE_float32_t *values
+        int *heaps
+        int *heap_pos
+        int *heap_of
+        np.ndarray[DTYPE_float32_t, ndim=2] results = np.empty((rows, cols), dtype='float32')
+        DTYPE_float32_t[:, :] results_view = results
 
-        the_row = arr[i]
+    with nogil, parallel():
 
-        for j in range(0, cols-window_half1):
+        values = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * window_size)
+        heaps = <int *>malloc(sizeof(int) * window_size * 2)
+        heap_pos = <int *>malloc(sizeof(int) * window_size)
+        heap_of = <int *>malloc(sizeof(int) * window_size)
 
-            the_row[j+window_size-window_half2] = sorted(the_row[j:j+window_size])[window_half1]
+        for i in prange(0, rows, schedule='static'):
+            _rolling_median_line(arr, results_view, i, cols, window_size, values, heaps, heap_pos, heap_of)
 
-        results[i] = the_row
+        free(values)
+        free(heaps)
+        free(heap_pos)
+        free(heap_of)
 
     return results
 
@@ -364,9 +529,9 @@ cdef void _convolve1d(DTYPE_float32_t[:] array2process,
                       int cols,
                       int window_size,
                       int window_half,
-                      DTYPE_float32_t[:] weights,
+                      DTYPE_float32_t *weights,
                       bint update_weights,
-                      int iterations) nogil:
+                      int iterations) noexcept nogil:
 
     cdef:
         Py_ssize_t j, n_iter, ws
@@ -397,7 +562,7 @@ cdef void _rolling_mean1d(DTYPE_float32_t[:] array2process,
                           DTYPE_float32_t apply_under_value,
                           bint apply_over,
                           DTYPE_float32_t apply_over_value,
-                          int iterations) nogil:
+                          int iterations) noexcept nogil:
 
     cdef:
         Py_ssize_t j, n_iter
@@ -437,57 +602,67 @@ cdef void _rolling_mean1d(DTYPE_float32_t[:] array2process,
                                                          ignore_value)
 
 
-cdef DTYPE_float32_t[:, :] _rolling_stats(DTYPE_float32_t[:, :] arr,
-                                          int window_size,
-                                          int window_half,
-                                          DTYPE_float32_t[:] weights,
-                                          bint do_weights,
-                                          bint update_weights,
-                                          DTYPE_float32_t weights_sum,
-                                          DTYPE_float32_t ignore_value,
-                                          bint apply_under,
-                                          DTYPE_float32_t apply_under_value,
-                                          bint apply_over,
-                                          DTYPE_float32_t apply_over_value,
-                                          int iterations,
-                                          str stat):
+cdef np.ndarray[DTYPE_float32_t, ndim=2] _rolling_stats(DTYPE_float32_t[:, :] arr,
+                                                        int window_size,
+                                                        int window_half,
+                                                        DTYPE_float32_t[:] weights,
+                                                        bint do_weights,
+                                                        bint update_weights,
+                                                        DTYPE_float32_t weights_sum,
+                                                        DTYPE_float32_t ignore_value,
+                                                        bint apply_under,
+                                                        DTYPE_float32_t apply_under_value,
+                                                        bint apply_over,
+                                                        DTYPE_float32_t apply_over_value,
+                                                        int iterations,
+                                                        str stat):
 
     cdef:
-        Py_ssize_t i
+        Py_ssize_t i, ws
         unsigned int rows = arr.shape[0]
         unsigned int cols = arr.shape[1]
-        DTYPE_float32_t[:] the_row, out_row
-        DTYPE_float32_t[:, :] results = np.zeros((rows, cols), dtype='float32')
-        DTYPE_float32_t[:] zzzzeros = np.zeros(cols, dtype='float32')
+        unsigned int n_weights = weights.shape[0]
+        bint do_convolve = stat == 'convolve'
+        DTYPE_float32_t *row_weights
+        np.ndarray[DTYPE_float32_t, ndim=2] results
+        DTYPE_float32_t[:, :] results_view
+
+    if do_convolve:
+
+        # The convolution accumulates into zeros.
+        results = np.zeros((rows, cols), dtype='float32')
+
+    else:
 
-    # Iterate over the array by rows.
-    for i in range(0, rows):
+        # The rolling mean is updated in place.
+        results = np.array(arr, dtype='float32', copy=True)
 
-        # Get the current row
-        the_row = arr[i, :]
+    results_view = results
 
-        if stat == 'convolve':
+    with nogil, parallel():
 
-            out_row = zzzzeros.copy()
+        # Updated weights are local to each row.
+        row_weights = <DTYPE_float32_t *>malloc(sizeof(DTYPE_float32_t) * (n_weights + 4))
 
-            with nogil:
+        for i in prange(0, rows, schedule='static'):
 
-                _convolve1d(the_row,
-                            out_row,
+            if do_convolve:
+
+                for ws in range(0, n_weights):
+                    row_weights[ws] = weights[ws]
+
+                _convolve1d(arr[i, :],
+                            results_view[i, :],
                             cols,
                             window_size,
                             window_half,
-                            weights,
+                            row_weights,
                             update_weights,
                             iterations)
 
-            results[i, :] = out_row[:]
-
-        elif stat == 'mean':
-
-            with nogil:
+            else:
 
-                _rolling_mean1d(the_row,
+                _rolling_mean1d(results_view[i, :],
                                 cols,
                                 window_size,
                                 window_half,
@@ -501,7 +676,7 @@ cdef DTYPE_float32_t[:, :] _rolling_stats(DTYPE_float32_t[:, :] arr,
                                 apply_over_value,
                                 iterations)
 
-            results[i, :] = the_row[:]
+        free(row_weights)
 
     return results
 
@@ -530,8 +705,16 @@ def rolling_stats(np.ndarray image_array,
                 image.reshape(dimensions, rows*columns)
                 image.T.reshape(rows*columns, dimensions) -->
                     image.reshape(columns, rows, dimensions).T.reshape(dimensions, rows*columns)
-        stat (Optional[str]): The statistic to compute. Default is 'median'.
+        stat (Optional[str]): The statistic to compute. Default is 'mean'.
             Choices are ['mean', 'median', 'slope', 'convolve'].
+
+            Rows are processed in parallel with OpenMP (set the number of threads with OMP_NUM_THREADS).
+            'mean', 'median', and 'convolve' move along the columns of each row. 'median' returns the
+            median of each full window at the window center, and columns without a full window keep
+            their input values. For an even ``window_size``, the median is the upper of the two middle
+            values (not their average, as in ``np.median``), and the window starting at column j is
+            written to column j + (window_size - 1) / 2, rounded down. 'slope' moves down the rows of
+            each column and returns the min. and max. least squares slopes.
         window_size (Optional[int]): The window size. Default is 3.
         window_weights (Optiona[1d array])
         update_weights (Optional[bool])
@@ -589,25 +772,25 @@ def rolling_stats(np.ndarray image_array,
 
         if stat in ['convolve', 'mean']:
 
-            return np.float32(_rolling_stats(np.float32(image_array),
-                                             window_size,
-                                             window_half,
-                                             weights,
-                                             do_weights,
-                                             update_weights,
-                                             weights_sum,
-                                             ignore_value,
-                                             apply_under,
-                                             apply_under_value,
-                                             apply_over,
-                                             apply_over_value,
-                                             iterations,
-                                             stat))
+            return _rolling_stats(np.ascontiguousarray(image_array, dtype='float32'),
+                                  window_size,
+                                  window_half,
+                                  weights,
+                                  do_weights,
+                                  update_weights,
+                                  weights_sum,
+                                  ignore_value,
+                                  apply_under,
+                                  apply_under_value,
+                                  apply_over,
+                                  apply_over_value,
+                                  iterations,
+                                  stat)
 
         elif stat == 'median':
 
-            return _rolling_median(np.float32(image_array), window_size)
+            return _rolling_median(np.ascontiguousarray(image_array, dtype='float32'), window_size)
 
         elif stat == 'slope':
 
-            return _rolling_least_squares(np.float32(image_array), window_size)
+            return _rolling_least_squares(np.ascontiguousarray(image_array, dtype='float32'), window_size)
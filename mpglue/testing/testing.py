@@ -1,36 +1,1057 @@
 #!/usr/bin/env python
 
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+import threading
 import unittest
+import subprocess
 
+from mpglue import raster_tools, vector_tools
+from mpglue.raster_calc import raster_calc, _EquationPlan
+from mpglue.veg_indices import MultiVegIndices, VegIndicesEquations
+from mpglue.rad_calibration import CalibrateSensor, _calibrate_block, earth_sun_distance
+from mpglue.utils import SENSOR_BAND_DICT, VI_WAVELENGTHS
+from mpglue.pytables import manage_pytables
+from mpglue.classification.sample_raster import _sample_blocks
+from mpglue.classification.sample_store import SampleStore
+from mpglue.classification.ts_features import TimeSeriesFeatures
+from mpglue.stats._rolling_stats import rolling_stats
+from mpglue.stats._lin_interp import fill_gaps
+from mpglue.classification.error_matrix import error_matrix, object_accuracy
+from mpglue.classification.change import change_func, merge_pair_counts, unique_class_func
+from mpglue.data import landsat_gtiff, landsat_vrt
+
+import numpy as np
+from sklearn import metrics
+
+
+def _test_array(image, dtype='float64'):
+
+    with raster_tools.ropen(image) as l_info:
+
+        image_array = l_info.read(bands2open=-1,
+                                  d_type=dtype)
+
+    l_info = None
+
+    return image_array
+
+
+def _test_object(image):
+
+    with raster_tools.ropen(image) as l_info:
+
+        bands = l_info.bands
+        rows = l_info.rows
+        cols = l_info.cols
+
+    l_info = None
+
+    return bands, rows, cols
+
+
+def _test_sample_blocks(image, n_samples=500, block_size=32):
+
+    rng = np.random.RandomState(0)
+
+    with raster_tools.ropen(image) as l_info:
+
+        image_array = l_info.read(bands2open=-1,
+                                  d_type='float32')
+
+        y_offsets = rng.randint(0, l_info.rows, size=n_samples)
+        x_offsets = rng.randint(0, l_info.cols, size=n_samples)
+
+        band_objects = [l_info.datasource.GetRasterBand(band) for band in range(1, l_info.bands+1)]
+
+        value_arr = _sample_blocks(band_objects,
+                                   x_offsets,
+                                   y_offsets,
+                                   block_rows=block_size,
+                                   block_cols=block_size)
+
+        band_objects = None
+
+    l_info = None
+
+    return value_arr, image_array[:, y_offsets, x_offsets].T
+
+
+def _test_get_windows(chunked=True, n_bands=None, z=None):
+
+    rng = np.random.RandomState(0)
+
+    array_shape = (50, 60) if n_bands is None else (n_bands, 50, 60)
+
+    test_array = rng.randint(0, 255, size=array_shape).astype('int16')
+
+    # The last two windows are zero-size.
+    windows = [(0, 0, 10, 10), (5, 7, 3, 4), (40, 50, 10, 10), (33, 11, 17, 49), (12, 30, 0, 5), (20, 20, 4, 0)]
+
+    h5_dir = tempfile.mkdtemp()
+
+    try:
+
+        pt = manage_pytables()
+        pt.open_hdf_file(os.path.join(h5_dir, 'windows.h5'), mode='w')
+
+        if chunked:
+
+            pt.h5_file.create_carray('/',
+                                     'test_array',
+                                     obj=test_array,
+                                     chunkshape=array_shape[:-2] + (16, 16))
+
+        else:
+            pt.h5_file.create_array('/', 'test_array', obj=test_array)
+
+        window_list = pt.get_windows('/test_array', windows, z=z)
+
+        pt.close_hdf()
+
+    finally:
+        shutil.rmtree(h5_dir)
+
+    if z is None:
+        test_list = [test_array[..., i:i+rows, j:j+cols] for i, j, rows, cols in windows]
+    else:
+        test_list = [test_array[z, i:i+rows, j:j+cols] for i, j, rows, cols in windows]
+
+    return window_list, test_list
+
+
+def _block_sum(image_arrays):
+    return np.float32(image_arrays[0]) + np.float32(image_arrays[1])
+
+
+def _block_error(image_arrays):
+    raise ValueError('Block error')
+
+
+def _test_block_func(image, func=_block_sum, block_size=64, y_offset=3, x_offset=5, n_jobs=1, pipeline=False):
+
+    """Sums band 1 of an image with an offset copy of itself, block by block"""
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        out_image = os.path.join(out_dir, 'block_sum.tif')
+
+        i_info_1 = raster_tools.ropen(image)
+        i_info_2 = raster_tools.ropen(image)
+
+        proc_info = i_info_1.copy()
+        proc_info.update_info(rows=i_info_1.rows-y_offset,
+                              cols=i_info_1.cols-x_offset)
+
+        o_info = proc_info.copy()
+        o_info.update_info(bands=1,
+                           storage='float32')
+
+        bp = raster_tools.BlockFunc(func,
+                                    [i_info_1, i_info_2],
+                                    out_image,
+                                    o_info,
+                                    band_list=[1, 1],
+                                    proc_info=proc_info,
+                                    y_offset=[0, y_offset],
+                                    x_offset=[0, x_offset],
+                                    block_rows=block_size,
+                                    block_cols=block_size,
+                                    be_quiet=True,
+                                    n_jobs=n_jobs,
+                                    pipeline=pipeline)
+
+        bp.run()
+
+        i_info_1.close()
+        i_info_2.close()
+
+        with raster_tools.ropen(out_image) as out_info:
+            out_array = out_info.read(bands2open=1, d_type='float32')
+
+        out_info = None
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    return out_array
+
+
+def _block_sum_reference(image, y_offset=3, x_offset=5):
+
+    """Sums band 1 of an image with an offset copy of itself in one pass"""
+
+    band_array = _test_array(image, dtype='float32')[0]
+
+    rows = band_array.shape[0] - y_offset
+    cols = band_array.shape[1] - x_offset
+
+    return band_array[:rows, :cols] + band_array[y_offset:y_offset+rows, x_offset:x_offset+cols]
+
+
+def _test_focal_statistics(image, statistic='mean', window_size=5, chunk_size=64, n_jobs=1):
+
+    """Computes focal statistics of band 1 in tiles and over the full array"""
+
+    from mpglue.classification.focal_statistics import focal_statistics
+    from mpglue.classification._moving_window import moving_window
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        out_image = os.path.join(out_dir, 'focal.tif')
+
+        focal_statistics(image,
+                         out_image,
+                         band=1,
+                         chunk_size=chunk_size,
+                         n_jobs=n_jobs,
+                         statistic=statistic,
+                         window_size=window_size)
+
+        with raster_tools.ropen(out_image) as out_info:
+            out_array = out_info.read(bands2open=1, d_type='float32')
+
+        out_info = None
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    with raster_tools.ropen(image) as i_info:
+        band_array = i_info.read(bands2open=1, d_type='float32')
+
+    i_info = None
+
+    return out_array, moving_window(band_array, statistic=statistic, window_size=window_size)
+
+
+def _test_equation_plan(equation, image_keys=['A', 'B']):
+
+    rng = np.random.RandomState(0)
+
+    arrays = dict(A=rng.rand(4, 5).astype('float32'),
+                  B=rng.rand(4, 5).astype('float32'))
+
+    arrays['B'][0, 0] = np.nan
+
+    equation_plan = _EquationPlan(equation, image_keys)
+
+    return equation_plan, equation_plan.evaluate(arrays), arrays
+
+
+def _test_raster_calc(image, n_jobs=1, block_size=64):
+
+    """Computes two outputs from bands 1 and 2 of an image, block by block"""
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        out_image = os.path.join(out_dir, 'calc.tif')
+
+        raster_calc(out_image,
+                    equation='A * 2 && A + B',
+                    out_type='float32',
+                    be_quiet=True,
+                    row_block_size=block_size,
+                    col_block_size=block_size,
+                    n_jobs=n_jobs,
+                    A=image,
+                    B=image,
+                    B_band=2)
+
+        out_array = _test_array(out_image, dtype='float32')
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    return out_array
+
+
+def _test_change(class_values, classes=None, block_rows=5):
+
+    """Counts class transitions and change Ids block by block"""
+
+    rng = np.random.RandomState(0)
+
+    class_array = rng.choice(class_values, size=(2, 12, 9))
+
+    if classes is None:
+        classes = unique_class_func(class_array)[1]
+
+    block_ids = list()
+    block_counts = list()
+
+    for i in range(0, class_array.shape[1], block_rows):
+
+        change_ids, pair_counts = change_func(class_array[:, i:i+block_rows], classes=classes)
+
+        block_ids.append(change_ids)
+        block_counts.append(pair_counts)
+
+    classes, change_matrix = merge_pair_counts(block_counts, classes=classes)
+
+    return class_array, classes, change_matrix, np.vstack(block_ids)
+
+
+def _change_reference(class_array, classes):
+
+    """Counts class transitions and change Ids one class pair at a time"""
+
+    n_classes = len(classes)
+
+    change_matrix = np.zeros((n_classes, n_classes), dtype='int64')
+    change_ids = np.zeros(class_array.shape[1:], dtype='int64')
+
+    for a, class_1 in enumerate(classes):
+        for b, class_2 in enumerate(classes):
+
+            pair_mask = (class_array[0] == class_1) & (class_array[1] == class_2)
+
+            change_matrix[a, b] = pair_mask.sum()
+            change_ids[pair_mask] = a * n_classes + b + 1
+
+    return change_matrix, change_ids
+
+
+def _recode_reference(array, recode_dict, zones=None):
+
+    """Recodes an array one key at a time"""
+
+    out_array = array.copy()
+
+    if zones is None:
+
+        for from_key, to_key in recode_dict.items():
+            out_array[array == from_key] = to_key
+
+    else:
+
+        for zone, rules in recode_dict.items():
+
+            for from_key, to_key in rules.items():
+                out_array[(zones == zone) & (array == from_key)] = to_key
+
+    return out_array
+
+
+def _test_recode_table(recode_dict, low, high, dtype, zonal=False):
+
+    rng = np.random.RandomState(0)
+
+    array = rng.randint(low, high, size=(20, 30)).astype(dtype)
+
+    # Every key is in the array.
+    array.flat[:len(recode_dict)] = list(recode_dict)
+
+    zones = rng.randint(1, 4, size=array.shape) if zonal else None
+
+    recode_table = raster_tools.RecodeTable(recode_dict)
+
+    return recode_table, recode_table.apply(array, zones=zones), _recode_reference(array, recode_dict, zones=zones)
+
+
+def _test_multi_veg_indices(image, index_list, sensor='Quickbird', chunk_size=64, separate_files=False, n_jobs=1):
+
+    """Computes vegetation indices block by block"""
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        vio = MultiVegIndices(image, index_list, sensor)
+
+        output_images = vio.run(os.path.join(out_dir, 'indices.tif'),
+                                chunk_size=chunk_size,
+                                be_quiet=True,
+                                separate_files=separate_files,
+                                n_jobs=n_jobs)
+
+        index_array = np.vstack([_test_array(output_image, dtype='float32') for output_image in output_images])
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    return index_array
+
+
+def _veg_indices_reference(image, index_list, sensor='Quickbird', chunk_size=64):
+
+    """Computes vegetation indices one at a time over the full image"""
+
+    image_array = _test_array(image, dtype='float32')
+
+    index_arrays = list()
+
+    for input_indice in index_list:
+
+        band_positions = [SENSOR_BAND_DICT[sensor][wavelength]-1 for wavelength in VI_WAVELENGTHS[input_indice]]
+
+        vie = VegIndicesEquations(image_array[band_positions], chunk_size=chunk_size)
+
+        index_arrays.append(vie.compute(input_indice))
+
+    return np.array(index_arrays, dtype='float32')
+
+
+class _ArrayImage(object):
+
+    """An in-memory image that reads blocks as ``ropen`` does"""
+
+    def __init__(self, image_array):
+        self.image_array = image_array
+
+    def read(self, bands2open=1, i=0, j=0, rows=-1, cols=-1, d_type='float32', **kwargs):
+        return self.image_array[[band-1 for band in bands2open], i:i+rows, j:j+cols].astype(d_type)
+
+
+class _LandsatMetadata(object):
+
+    """The Landsat metadata used for dark object subtraction"""
+
+    series = 'Landsat5'
+    sensor = 'TM'
+
+
+# Landsat 5 TM bands 1-3
+_TM_GAINS = [.7657, 1.448, 1.044]
+_TM_BIASES = [-2.29, -4.29, -2.21]
+_TM_ESUNS = [1983., 1796., 1536.]
+_TM_WAVELENGTHS = [.485, .569, .666]
+
+
+def _test_calibrate_block(calibration, solar_angle=45., julian_day=115, min_dark=20, block_size=16):
+
+    """Calibrates a synthetic Landsat 5 TM block with the per-band coefficients"""
+
+    rng = np.random.RandomState(0)
+
+    dn_array = rng.randint(0, 60, size=(3, 40, 50)).astype('float32')
+
+    cal = CalibrateSensor.__new__(CalibrateSensor)
+
+    cal.sensor = 'TM'
+    cal.i_info = _ArrayImage(dn_array)
+    cal.bands2process = [1, 2, 3]
+    cal.calibration = calibration
+    cal.metadata = None
+    cal.pr = _LandsatMetadata()
+    cal.solar_angle = solar_angle
+    cal.julian_day = julian_day
+    cal.landsat_sensors = ['tm', 'etm', 'oli_tirs']
+    cal.landsat_gain_list = _TM_GAINS
+    cal.landsat_bias_list = _TM_BIASES
+    cal.bd_esun_list = _TM_ESUNS
+    cal.k1 = None
+    cal.k2 = None
+
+    cal.rad_settings = dict(landsat_gain=None, landsat_bias=None)
+
+    cal.refl_settings = dict(solar_angle=solar_angle, julian_day=julian_day,
+                             bd_esun=None, landsat_gain=None, landsat_bias=None)
+
+    cal.temp_settings = dict(k1=None, k2=None)
+
+    block_list = [(i, j, min(block_size, 40-i), min(block_size, 50-j))
+                  for i in range(0, 40, block_size)
+                  for j in range(0, 50, block_size)]
+
+    cal.get_band_coefficients(block_list, min_dark=min_dark)
+
+    return dn_array, _calibrate_block(dn_array, calibration, cal.coefficients)
+
+
+def _calibrate_reference(dn_array, calibration, solar_angle=45., julian_day=115, min_dark=20):
+
+    """Calibrates each band in steps, as radiance, then reflectance, then dark object subtraction"""
+
+    d_sq = earth_sun_distance(julian_day)
+    cos0 = np.cos(np.radians(90. - solar_angle))
+
+    cal_array = np.zeros(dn_array.shape, dtype='float64')
+
+    for bi, band_array in enumerate(np.float64(dn_array)):
+
+        radiance = (_TM_GAINS[bi] * band_array) + _TM_BIASES[bi]
+        radiance[band_array <= 0] = 0
+
+        if calibration == 'radiance':
+
+            cal_array[bi] = radiance
+
+            continue
+
+        reflectance = (radiance * np.pi * d_sq) / (_TM_ESUNS[bi] * cos0)
+
+        if calibration == 'dos':
+
+            # The first DN with at least ``min_dark`` pixels
+            dn_values, dn_counts = np.unique(band_array[band_array >= 1], return_counts=True)
+            dn_dark = dn_values[dn_counts >= min_dark][0]
+
+            tri = _TM_WAVELENGTHS[bi]
+            tr = .008569 * tri**-4 * (1. + .0113 * tri**-2 + .00013 * tri**-4)
+
+            # Nadir view
+            tv = np.exp(-tr)
+            tz = np.exp(-tr / cos0)
+            edown = .01
+
+            path_radiance = (_TM_GAINS[bi] * dn_dark) + _TM_BIASES[bi] - \
+                            .01 * (_TM_ESUNS[bi] * cos0 * tz + edown) * tv / np.pi
+
+            reflectance = (np.pi * (reflectance - path_radiance)) / (tv * (_TM_ESUNS[bi] * cos0 * tz * edown))
+
+        reflectance[radiance <= 0] = 0
+
+        cal_array[bi] = reflectance
+
+    return cal_array
+
+
+def _test_grid_search(n_jobs=1, halving_factor=2, n_samples=300):
+
+    """Searches six random forest parameter combinations over three folds"""
+
+    from mpglue.classification.classification import classification
+
+    rng = np.random.RandomState(0)
+
+    features = rng.rand(n_samples, 4)
+    response = np.where(features[:, 0] + features[:, 1] * rng.rand(n_samples) > .8, 1, 2)
+
+    samples_dir = tempfile.mkdtemp()
+
+    try:
+
+        samples_file = os.path.join(samples_dir, 'samples.txt')
+
+        np.savetxt(samples_file,
+                   np.c_[rng.uniform(0., 1000., size=(n_samples, 2)), features, response],
+                   fmt=['%.6f'] * 6 + ['%d'],
+                   delimiter=',',
+                   header='X,Y,1,2,3,4,response',
+                   comments='')
+
+        cl = classification()
+
+        state_keys = sorted(cl.__dict__)
+
+        # The same fold splits for each search
+        np.random.seed(0)
+
+        df = cl.grid_search('RF',
+                            dict([('n_estimators', [5, 10]),
+                                  ('max_depth', [1, 2, 4]),
+                                  ('random_state', [0]),
+                                  ('n_jobs', [1])]),
+                            samples_file,
+                            k_folds=3,
+                            n_jobs=n_jobs,
+                            halving_factor=halving_factor)
+
+    finally:
+        shutil.rmtree(samples_dir)
+
+    return df[['F1', 'F2', 'F3']].values, state_keys, sorted(cl.__dict__)
+
+
+# Every time series feature except the slopes
+_TS_FEATURES = ['mean', 'cv',
+                'five', 'twenty_five', 'fifty', 'seventy_five', 'ninety_five',
+                'five_cumulative', 'twenty_five_cumulative', 'fifty_cumulative',
+                'seventy_five_cumulative', 'ninety_five_cumulative',
+                'max_diff']
+
+
+def _test_ts_features(dtype, n_samples=250, n_steps=23, chunk_size=100, n_jobs=2, no_data=-999):
+
+    """Computes time series features in sample blocks"""
+
+    rng = np.random.RandomState(0)
+
+    X = (rng.rand(n_samples, n_steps) * 100. + 1.).astype(dtype)
+
+    if X.dtype.kind == 'f':
+        X[3, 0] = np.nan
+
+    tsf = TimeSeriesFeatures()
+
+    tsf.add_features(_TS_FEATURES)
+
+    return X, tsf.apply_features(X=X,
+                                 append_features=False,
+                                 n_jobs=n_jobs,
+                                 chunk_size=chunk_size,
+                                 no_data=no_data)
+
+
+def _ts_features_reference(X, no_data=-999):
+
+    """Computes time series features one at a time"""
+
+    percentiles = dict(five=5, twenty_five=25, fifty=50, seventy_five=75, ninety_five=95)
+
+    feature_arrays = list()
+
+    for feature_name in _TS_FEATURES:
+
+        if feature_name == 'mean':
+            X_ = X.mean(axis=1)
+        elif feature_name == 'cv':
+            X_ = X.std(axis=1) / X.mean(axis=1)
+        elif feature_name == 'max_diff':
+            X_ = np.abs(np.diff(X, n=2, axis=1)).max(axis=1)
+        elif feature_name.endswith('_cumulative'):
+
+            pct_idx = int(np.ceil(np.percentile(range(0, X.shape[1]+1), percentiles[feature_name[:-11]])))
+
+            X_ = X.cumsum(axis=1)[:, pct_idx]
+
+        else:
+            X_ = np.percentile(X, percentiles[feature_name], axis=1)
+
+        feature_arrays.append(np.where(np.isfinite(X_), X_, no_data))
+
+    return np.array(feature_arrays, dtype='float64').T
+
+
+def _rolling_median_reference(image_array, window_size):
+
+    """Computes the moving median of each row by sorting every window"""
+
+    out_array = image_array.copy()
+
+    offset = int((window_size - 1) / 2)
+
+    for j in range(0, image_array.shape[1]-window_size+1):
+
+        # The upper median of even windows
+        out_array[:, j+offset] = np.sort(image_array[:, j:j+window_size], axis=1)[:, int(window_size / 2)]
+
+    return out_array
+
+
+def _rolling_slopes_reference(image_array, window_size):
+
+    """Computes the min. and max. moving slope down each column with ``np.polyfit``"""
+
+    x = np.arange(0, window_size)
+
+    slopes = np.array([np.polyfit(x, image_array[w:w+window_size], 1)[0]
+                       for w in range(0, image_array.shape[0]-window_size+1)])
+
+    return slopes.min(axis=0), slopes.max(axis=0)
+
+
+_GAP_X_VALUES = [1, 3, 4, 8, 13, 14, 20, 21, 25, 30]
+
+
+def _test_gap_array():
+
+    """Creates samples with zero and NaN gaps, including gaps at both ends and a row of gaps"""
+
+    rng = np.random.RandomState(0)
+
+    image_array = rng.rand(6, 10).astype('float32') + 1.
+
+    image_array[rng.rand(6, 10) < .3] = 0.
+    image_array[rng.rand(6, 10) < .1] = np.nan
+
+    image_array[0, :2] = 0.
+    image_array[1, -3:] = np.nan
+    image_array[2, 4] = 0.
+    image_array[3] = 0.
+    image_array[3, ::3] = np.nan
+
+    return image_array
+
+
+def _fill_gaps_reference(image_array, x_values, method, no_data=0):
+
+    """Fills the gaps of each row with ``np.interp`` or the nearest valid value"""
+
+    out_array = np.float64(image_array)
+
+    x = np.arange(0, image_array.shape[1], dtype='float64') if method == 'linear' else np.float64(x_values)
+
+    for row in out_array:
+
+        valid = ~np.isnan(row) & (row != no_data)
+
+        if not valid.any():
+            continue
+
+        if method == 'nearest':
+
+            # The earlier date wins ties.
+            row[:] = row[valid][np.abs(x[:, np.newaxis] - x[valid][np.newaxis]).argmin(axis=1)]
+
+        else:
+            row[:] = np.interp(x, x[valid], row[valid])
+
+    return out_array
+
+
+def _test_fill_gaps_raster(image, method='time', block_size=64):
+
+    """Fills gaps in an image, block by block, and in the whole stack at once"""
+
+    image_array = _test_array(image, dtype='float32')
+
+    # One date per band
+    x_values = _GAP_X_VALUES[:image_array.shape[0]]
+
+    image_array[np.random.RandomState(0).rand(*image_array.shape) < .3] = 0.
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        gap_image = os.path.join(out_dir, 'gaps.tif')
+        filled_image = os.path.join(out_dir, 'filled.tif')
+
+        with raster_tools.ropen(image) as i_info:
+            o_info = i_info.copy()
+
+        i_info = None
+
+        o_info.update_info(storage='float32')
+
+        raster_tools.write2raster(image_array, gap_image, o_info=o_info)
+
+        raster_tools.fill_gaps(gap_image,
+                               filled_image,
+                               method=method,
+                               x_values=x_values,
+                               be_quiet=True,
+                               block_rows=block_size,
+                               block_cols=block_size)
+
+        filled_array = _test_array(filled_image, dtype='float32')
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    n_bands, n_rows, n_cols = image_array.shape
+
+    # [bands x rows x columns] --> [pixels x bands]
+    reference_array = fill_gaps(image_array.reshape(n_bands, n_rows*n_cols).T,
+                                x_values=x_values,
+                                method=method).T.reshape(n_bands, n_rows, n_cols)
+
+    return filled_array, reference_array
+
+
+def _test_block_vector_index(image, block_size=32, first_pixel=30, last_pixel=130, cache_size=2):
+
+    """Indexes the blocks of an image with a square polygon, given in pixels"""
+
+    out_dir = tempfile.mkdtemp()
+
+    try:
+
+        out_vector = os.path.join(out_dir, 'square.shp')
+
+        with raster_tools.ropen(image) as i_info:
+
+            left = i_info.left + (first_pixel * i_info.cellY)
+            right = i_info.left + (last_pixel * i_info.cellY)
+            top = i_info.top - (first_pixel * abs(i_info.cellX))
+            bottom = i_info.top - (last_pixel * abs(i_info.cellX))
+
+            v_info = vector_tools.create_vector(out_vector,
+                                                epsg=None,
+                                                projection=i_info.projection,
+                                                geom_type='polygon')
+
+            vector_tools.add_polygon(v_info,
+                                     xy_pairs=[(left, top), (right, top), (right, bottom), (left, bottom), (left, top)])
+
+            v_info.close()
+            v_info = None
+
+            block_index = vector_tools.BlockVectorIndex(out_vector,
+                                                        i_info,
+                                                        block_size,
+                                                        block_size,
+                                                        cache_size=cache_size)
+
+            # Every block mask, read while the vector exists
+            block_masks = dict()
+
+            for i in range(0, i_info.rows, block_size):
+
+                n_rows = raster_tools.n_rows_cols(i, block_size, i_info.rows)
+
+                for j in range(0, i_info.cols, block_size):
+
+                    n_cols = raster_tools.n_rows_cols(j, block_size, i_info.cols)
+
+                    block_masks[(i, j)] = block_index.get_mask(i, j, n_rows, n_cols)
+
+            polygon_mask = np.zeros((i_info.rows, i_info.cols), dtype='uint8')
+
+        i_info = None
+
+        polygon_mask[first_pixel:last_pixel, first_pixel:last_pixel] = 1
+
+        # Partial blocks (0, 0), (0, 32) and (32, 0),
+        #   where (0, 0) is used again before (32, 0) is added.
+        mask_00 = block_index.get_mask(0, 0, block_size, block_size)
+        mask_01 = block_index.get_mask(0, block_size, block_size, block_size)
+        mask_00_hit = block_index.get_mask(0, 0, block_size, block_size)
+        block_index.get_mask(block_size, 0, block_size, block_size)
+
+        reused_masks = [mask_00 is mask_00_hit,
+                        block_index.get_mask(0, 0, block_size, block_size) is mask_00,
+                        block_index.get_mask(0, block_size, block_size, block_size) is mask_01]
+
+        unpickled_index = pickle.loads(pickle.dumps(block_index))
+
+        block_index.close()
+
+        unpickled_mask = unpickled_index.get_mask(0, 0, block_size, block_size)
+
+        unpickled_index.close()
+
+    finally:
+        shutil.rmtree(out_dir)
+
+    return block_index, block_masks, polygon_mask, reused_masks, unpickled_index, unpickled_mask
+
+
+# [left, top, right, bottom, cellx, celly], with the origin away from 0, 0
+_XY_IMAGE_LIST = [-1000., 500., 5000., -2500., -30., 30.]
+
+
+def _test_xy_offsets(round_offset=False, n_points=200):
+
+    """Gets the offsets of points in and around an image, all at once and one by one"""
+
+    rng = np.random.RandomState(0)
+
+    left, top, right, bottom = _XY_IMAGE_LIST[:4]
+
+    # Points within a margin of 10 pixels around the image, on pixel edges,
+    #   and on either side of 0, 0
+    x = np.concatenate((rng.uniform(left-300., right+300., size=n_points),
+                        [left, right, left+30., left+45., -15., 15., left-45., right+45.]))
+
+    y = np.concatenate((rng.uniform(bottom-300., top+300., size=n_points),
+                        [top, bottom, top-30., top-45., 15., -15., top+45., bottom-45.]))
+
+    x_array, y_array, x_offsets, y_offsets = vector_tools.get_xy_offsets_array(image_list=_XY_IMAGE_LIST,
+                                                                               x=x,
+                                                                               y=y,
+                                                                               round_offset=round_offset,
+                                                                               check_position=False)
+
+    xy_offsets = np.array([vector_tools.get_xy_offsets(image_list=_XY_IMAGE_LIST,
+                                                       x=float(x_),
+                                                       y=float(y_),
+                                                       round_offset=round_offset,
+                                                       check_position=False)[2:]
+                           for x_, y_ in zip(x, y)], dtype='int64')
+
+    return x, y, x_array, y_array, x_offsets, y_offsets, xy_offsets
+
+
+def _test_error_matrix(n_samples=5000, n_classes=5):
+
+    rng = np.random.RandomState(0)
+
+    observed = rng.randint(1, n_classes+1, size=n_samples)
+    predicted = np.where(rng.rand(n_samples) < 0.7, observed, rng.randint(1, n_classes+1, size=n_samples))
+
+    emat = error_matrix()
+
+    emat.get_stats(po_array=np.c_[predicted, observed])
+
+    return emat, predicted, observed
+
+
+def _test_object_accuracy_disjoint():
+
+    reference_array = np.zeros((10, 10), dtype='int64')
+    predicted_array = np.zeros((10, 10), dtype='int64')
+
+    # A reference square that no predicted object overlaps
+    reference_array[1:4, 1:4] = 1
+    predicted_array[6:9, 6:9] = 1
+
+    oa = object_accuracy(reference_array, predicted_array)
+    oa.label_objects()
+    oa.iterate_ids()
+
+    return oa
+
+
+def _test_sample_store(n_samples=100):
+
+    rng = np.random.RandomState(0)
+
+    # Ids above float32 precision and projected (UTM) coordinates
+    samples = np.c_[np.arange(16777217, 16777217+n_samples, dtype='float64'),
+                    rng.uniform(400000., 800000., size=n_samples).round(2),
+                    rng.uniform(4000000., 5000000., size=n_samples).round(2),
+                    rng.rand(n_samples, 3),
+                    rng.randint(1, 5, size=n_samples)]
+
+    headers = ['Id', 'X', 'Y', 'f1', 'f2', 'f3', 'response']
+
+    store_dir = tempfile.mkdtemp()
+
+    try:
+
+        store_file = os.path.join(store_dir, 'samples.npy')
+
+        SampleStore.write(store_file, samples, headers)
+
+        store = SampleStore(store_file)
+
+        stored_samples = np.array(store.samples)
+        stored_headers = store.headers
+
+        store = None
+
+    finally:
+        shutil.rmtree(store_dir)
+
+    return samples, stored_samples, headers, stored_headers
+
+
+def _test_band_statistics(image, block_size=32):
+
+    with raster_tools.ropen(image) as i_info:
+        image_array = i_info.read(bands2open=1, d_type='float64')
+
+    i_info = None
+
+    band_stats = raster_tools.BandStatistics(histogram_range=(0, 256), histogram_bins=16)
+
+    for i in range(0, image_array.shape[0], block_size):
+        for j in range(0, image_array.shape[1], block_size):
+            band_stats.update(image_array[i:i+block_size, j:j+block_size])
+
+    return band_stats, image_array
+
+
+def _plr_reference(proba_array, window_size=3, iterations=1):
+
+    """Probabilistic label relaxation, computed one pixel at a time as the previous kernel did"""
+
+    bands, rows, cols = proba_array.shape
+
+    half_window = int(window_size / 2.)
+
+    # Inverse distance weights, scaled to the window corners
+    yy, xx = np.mgrid[0:window_size, 0:window_size]
+    dist_weights = np.sqrt((xx - half_window)**2. + (yy - half_window)**2.)
+    dist_weights = np.where(dist_weights == 0, 1., 1. - dist_weights / dist_weights[0, 0])
+
+    # The default class compatibility matrix
+    compatibility_matrix = np.where(np.eye(bands) == 1, 1., .5)
+
+    proba_array = np.float64(proba_array)
+
+    for iteration in range(0, iterations):
+
+        out_array = proba_array.copy()
+
+        for i in range(0, rows-half_window*2):
+            for j in range(0, cols-half_window*2):
+
+                window_array = proba_array[:, i:i+window_size, j:j+window_size]
+
+                for band in range(0, bands):
+
+                    proba_sum = (compatibility_matrix[band][:, np.newaxis, np.newaxis] *
+                                 dist_weights * window_array).sum()
+
+                    weight_sum = compatibility_matrix[band].sum() * dist_weights.sum()
+
+                    out_array[band, i+half_window, j+half_window] = (proba_sum / weight_sum) * \
+                                                                    window_array[band, half_window, half_window]
+
+        proba_array = out_array
+
+    return proba_array
+
+
+def _test_plr(window_size=3, iterations=1):
+
+    from mpglue.classification._moving_window import moving_window
+
+    rng = np.random.RandomState(0)
+
+    proba_array = rng.rand(3, 12, 15).astype('float32')
+    proba_array /= proba_array.sum(axis=0)
+
+    plr_array = moving_window(proba_array.copy(),
+                              statistic='plr',
+                              window_size=window_size,
+                              iterations=iterations)
+
+    return plr_array, _plr_reference(proba_array, window_size=window_size, iterations=iterations)
+
+
+# Modules that should only be imported when they are used
+_HEAVY_MODULES = ['matplotlib', 'sklearn', 'skimage', 'cv2', 'bs4', 'pandas', 'scipy.stats']
+
+_IMPORT_SCRIPT = """
+import sys
+import time
+import resource
+
+start = time.time()
+
+import mpglue
 from mpglue import raster_tools
-from mpglue.data import landsat_gtiff, landsat_vrt
 
-import numpy as np
+elapsed = time.time() - start
 
+# Peak resident memory, in KB on Linux and in bytes on macOS.
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
-def _test_array(image, dtype='float64'):
+if sys.platform == 'darwin':
+    peak_memory /= 1024.
 
-    with raster_tools.ropen(image) as l_info:
+print(elapsed)
+print(peak_memory / 1024.)
+print(','.join([module for module in {} if module in sys.modules]))
+""".format(_HEAVY_MODULES)
 
-        image_array = l_info.read(bands2open=-1,
-                                  d_type=dtype)
 
-    l_info = None
+def _test_import_budget():
 
-    return image_array
+    """Imports mpglue in a fresh interpreter"""
 
+    out = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT])
 
-def _test_object(image):
+    # The last line is empty when no heavy module is loaded.
+    elapsed, peak_memory, heavy_modules = out.decode().splitlines()[-3:]
 
-    with raster_tools.ropen(image) as l_info:
+    return float(elapsed), float(peak_memory), [module for module in heavy_modules.split(',') if module]
 
-        bands = l_info.bands
-        rows = l_info.rows
-        cols = l_info.cols
 
-    l_info = None
+def _test_lazy_import(name):
 
-    return bands, rows, cols
+    """Resolves a public mpglue name in a fresh interpreter"""
+
+    import_process = subprocess.Popen([sys.executable, '-c', 'import mpglue; mpglue.{}'.format(name)],
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+
+    __, err = import_process.communicate()
+
+    return import_process.returncode, err.decode()
 
 
 class TestUM(unittest.TestCase):
@@ -110,6 +1131,415 @@ class TestUM(unittest.TestCase):
         """Test the object column size"""
         self.assertEqual(_test_object(landsat_vrt)[2], 235)
 
+    def test_sample_blocks_gtiff(self):
+        """Test the block point sampler"""
+        value_arr, test_arr = _test_sample_blocks(landsat_gtiff)
+        self.assertTrue(np.allclose(value_arr, test_arr))
+
+    def test_get_windows(self):
+        """Test the PyTables window reader against direct slicing"""
+
+        for chunked in [True, False]:
+
+            for n_bands, z in [(None, None), (3, None), (3, 1), (3, [0, 2])]:
+
+                window_list, test_list = _test_get_windows(chunked=chunked, n_bands=n_bands, z=z)
+
+                self.assertEqual(len(window_list), len(test_list))
+
+                for window_array, test_window in zip(window_list, test_list):
+                    self.assertTrue(np.array_equal(window_array, test_window))
+
+    def test_block_func_serial_gtiff(self):
+        """Test serial block processing, with edge blocks and offsets, against one pass"""
+
+        test_array = _block_sum_reference(landsat_gtiff)
+
+        # 221 x 230 pixels, so the last blocks are partial.
+        for block_size in [64, 100, 512]:
+            self.assertTrue(np.array_equal(_test_block_func(landsat_gtiff, block_size=block_size), test_array))
+
+    def test_block_func_modes_gtiff(self):
+        """Test that the serial, worker pool, and pipelined block outputs are identical"""
+
+        test_array = _test_block_func(landsat_gtiff, n_jobs=1)
+
+        self.assertTrue(np.array_equal(_test_block_func(landsat_gtiff, n_jobs=2), test_array))
+        self.assertTrue(np.array_equal(_test_block_func(landsat_gtiff, pipeline=True), test_array))
+
+    def test_block_func_error_gtiff(self):
+        """Test that a block error surfaces and stops the workers and queues"""
+
+        n_threads = threading.active_count()
+
+        for n_jobs, pipeline in [(1, False), (2, False), (1, True)]:
+
+            with self.assertRaises(ValueError):
+                _test_block_func(landsat_gtiff, func=_block_error, n_jobs=n_jobs, pipeline=pipeline)
+
+        # The reader and writer threads have stopped.
+        self.assertEqual(threading.active_count(), n_threads)
+
+    def test_focal_statistics_gtiff(self):
+        """Test tiled focal statistics against the full array"""
+
+        for n_jobs in [1, 2]:
+
+            out_array, reference_array = _test_focal_statistics(landsat_gtiff, n_jobs=n_jobs)
+
+            self.assertEqual(out_array.shape, reference_array.shape)
+            self.assertTrue(np.allclose(out_array, reference_array))
+
+    def test_equation_plan(self):
+        """Test the compiled raster calculator equations"""
+
+        equation_plan, outputs, arrays = _test_equation_plan('A * 2 && A + B')
+
+        self.assertEqual(equation_plan.n_outputs, 2)
+        self.assertTrue(np.allclose(outputs[0], arrays['A'] * 2))
+        self.assertTrue(np.allclose(outputs[1], arrays['A'] + arrays['B'], equal_nan=True))
+
+        equation_plan, outputs, arrays = _test_equation_plan('nan_to_num(B)')
+
+        self.assertEqual(equation_plan.n_outputs, 1)
+        self.assertTrue(np.array_equal(outputs[0], np.nan_to_num(arrays['B'])))
+
+        with self.assertRaises(NameError):
+            _test_equation_plan('A * C')
+
+    def test_raster_calc_gtiff(self):
+        """Test serial and threaded raster calculator blocks"""
+
+        image_array = _test_array(landsat_gtiff, dtype='float32')
+
+        for n_jobs in [1, 2]:
+
+            out_array = _test_raster_calc(landsat_gtiff, n_jobs=n_jobs)
+
+            self.assertTrue(np.allclose(out_array[0], image_array[0] * 2))
+            self.assertTrue(np.allclose(out_array[1], image_array[0] + image_array[1]))
+
+    def test_change_counts(self):
+        """Test class transition counts and change Ids"""
+
+        for class_values, classes in [([-3, -1, 0, 2, 4], None),
+                                      ([-5, 0, 7, 2 ** 23], None),
+                                      ([-3, -1, 0, 2, 4], np.array([-3, 0, 2]))]:
+
+            class_array, classes, change_matrix, change_ids = _test_change(class_values, classes=classes)
+
+            reference_matrix, reference_ids = _change_reference(class_array, classes)
+
+            self.assertTrue(np.array_equal(change_matrix, reference_matrix))
+            self.assertTrue(np.array_equal(change_ids, reference_ids))
+
+    def test_recode_table_dense(self):
+        """Test recoding with a dense index table"""
+
+        recode_table, out_array, reference_array = _test_recode_table({-2: 9, 3: -1, 7: 3}, -5, 10, 'int16')
+
+        self.assertIsNotNone(recode_table.index_table)
+        self.assertEqual(out_array.dtype, reference_array.dtype)
+        self.assertTrue(np.array_equal(out_array, reference_array))
+
+    def test_recode_table_byte(self):
+        """Test recoding byte arrays with one lookup"""
+
+        recode_table, out_array, reference_array = _test_recode_table({1: 3, 2: 3, 200: 0}, 0, 256, 'uint8')
+
+        self.assertIsNotNone(recode_table.index_table)
+        self.assertEqual(out_array.dtype, reference_array.dtype)
+        self.assertTrue(np.array_equal(out_array, reference_array))
+
+    def test_recode_table_sparse(self):
+        """Test recoding keys that span too wide a range for a dense table"""
+
+        recode_table, out_array, reference_array = _test_recode_table({-70000: 1, 0: 2, 100000: 3},
+                                                                      -100000, 100001, 'int32')
+
+        self.assertIsNone(recode_table.index_table)
+        self.assertEqual(out_array.dtype, reference_array.dtype)
+        self.assertTrue(np.array_equal(out_array, reference_array))
+
+    def test_recode_table_zonal(self):
+        """Test recoding with rules given by zone"""
+
+        # Zone 3 has no rules, and key 6 has no rule in zone 2.
+        recode_table, out_array, reference_array = _test_recode_table({1: {6: 5, 2: 4}, 2: {2: 5}},
+                                                                      0, 8, 'uint8', zonal=True)
+
+        self.assertTrue(recode_table.is_zonal)
+        self.assertEqual(out_array.dtype, reference_array.dtype)
+        self.assertTrue(np.array_equal(out_array, reference_array))
+
+    def test_multi_veg_indices_gtiff(self):
+        """Test block-wise vegetation indices against each index computed alone"""
+
+        index_list = ['NDVI', 'EVI', 'GNDVI']
+
+        reference_array = _veg_indices_reference(landsat_gtiff, index_list)
+
+        for separate_files, n_jobs in [(False, 1), (False, 2), (True, 1)]:
+
+            index_array = _test_multi_veg_indices(landsat_gtiff,
+                                                  index_list,
+                                                  separate_files=separate_files,
+                                                  n_jobs=n_jobs)
+
+            self.assertEqual(index_array.shape, reference_array.shape)
+            self.assertTrue(np.allclose(index_array, reference_array))
+
+    def test_calibrate_block(self):
+        """Test block calibration against per-band radiance, reflectance and dark object subtraction"""
+
+        for calibration in ['radiance', 'toar', 'dos']:
+
+            dn_array, cal_array = _test_calibrate_block(calibration)
+
+            reference_array = _calibrate_reference(dn_array, calibration)
+
+            self.assertTrue(np.allclose(cal_array, reference_array, rtol=1e-4, atol=1e-5))
+
+    def test_grid_search(self):
+        """Test serial and parallel successive halving grid searches"""
+
+        fold_scores, state_keys, search_keys = _test_grid_search(n_jobs=1)
+
+        self.assertTrue(np.array_equal(_test_grid_search(n_jobs=2)[0], fold_scores, equal_nan=True))
+
+        # Six combinations, then three, then two
+        self.assertEqual(np.isnan(fold_scores).sum(axis=0).tolist(), [0, 3, 4])
+
+        # The fold attributes are not left on the instance.
+        self.assertEqual(search_keys, state_keys)
+
+    def test_best_score_index(self):
+        """Test that the best combination is scored on every fold"""
+
+        from mpglue.classification.classification import _best_score_index
+
+        fold_scores = np.array([[.9, np.nan, np.nan],
+                                [.7, .7, .7],
+                                [.8, .75, .72],
+                                [.1, .2, np.nan]], dtype='float64')
+
+        self.assertEqual(_best_score_index(fold_scores, maximize=True), 2)
+        self.assertEqual(_best_score_index(fold_scores, maximize=False), 1)
+
+    def test_ts_features(self):
+        """Test the fused time series features against each feature computed alone"""
+
+        for dtype in ['float32', 'float64', 'int64']:
+
+            X, features = _test_ts_features(dtype)
+
+            reference_features = _ts_features_reference(X)
+
+            self.assertEqual(features.dtype, X.dtype if X.dtype.kind == 'f' else np.float64)
+            self.assertTrue(np.allclose(features, reference_features, rtol=1e-5))
+
+            if X.dtype.kind == 'f':
+                self.assertTrue((features[3] == -999).all())
+
+    def test_rolling_median(self):
+        """Test the moving median of odd and even windows"""
+
+        image_array = np.random.RandomState(0).rand(7, 40).astype('float32')
+
+        for window_size in [3, 4, 5, 8]:
+
+            self.assertTrue(np.array_equal(rolling_stats(image_array, stat='median', window_size=window_size),
+                                           _rolling_median_reference(image_array, window_size)))
+
+        # Rows shorter than the window are not changed.
+        self.assertTrue(np.array_equal(rolling_stats(image_array[:, :4], stat='median', window_size=5),
+                                       image_array[:, :4]))
+
+    def test_rolling_slopes(self):
+        """Test the min. and max. moving slopes"""
+
+        image_array = np.random.RandomState(0).rand(30, 12).astype('float32')
+
+        for window_size in [3, 15]:
+
+            slopes_min, slopes_max = rolling_stats(image_array, stat='slope', window_size=window_size)
+            reference_min, reference_max = _rolling_slopes_reference(np.float64(image_array), window_size)
+
+            self.assertTrue(np.allclose(slopes_min, reference_min, atol=1e-5))
+            self.assertTrue(np.allclose(slopes_max, reference_max, atol=1e-5))
+
+    def test_fill_gaps(self):
+        """Test the linear, nearest and time gap filling against ``np.interp``"""
+
+        image_array = _test_gap_array()
+
+        for method in ['linear', 'nearest', 'time']:
+
+            filled_array = fill_gaps(image_array, x_values=_GAP_X_VALUES, method=method)
+
+            self.assertTrue(np.allclose(filled_array,
+                                        _fill_gaps_reference(image_array, _GAP_X_VALUES, method),
+                                        rtol=1e-5,
+                                        equal_nan=True))
+
+            # Rows without valid values are not changed.
+            self.assertTrue(np.array_equal(filled_array[3], image_array[3], equal_nan=True))
+
+        # The input is copied unless it is filled in place.
+        self.assertTrue(np.isnan(image_array).any())
+
+        image_copy = image_array.copy()
+
+        self.assertIs(fill_gaps(image_copy, in_place=True), image_copy)
+        self.assertTrue(np.allclose(image_copy, fill_gaps(image_array), equal_nan=True))
+
+    def test_fill_gaps_errors(self):
+        """Test the gap filling argument checks"""
+
+        image_array = _test_gap_array()
+
+        with self.assertRaises(TypeError):
+            fill_gaps(np.float64(image_array), in_place=True)
+
+        with self.assertRaises(TypeError):
+            fill_gaps(image_array[:, ::2], in_place=True)
+
+        with self.assertRaises(ValueError):
+            fill_gaps(image_array, x_values=_GAP_X_VALUES[:-1], method='time')
+
+        with self.assertRaises(ValueError):
+            fill_gaps(image_array, method='time')
+
+        with self.assertRaises(NameError):
+            fill_gaps(image_array, method='cubic')
+
+    def test_fill_gaps_gtiff(self):
+        """Test that block-streamed gap filling matches filling the whole stack"""
+
+        for method in ['linear', 'time']:
+
+            filled_array, reference_array = _test_fill_gaps_raster(landsat_gtiff, method=method)
+
+            self.assertTrue(np.array_equal(filled_array, reference_array))
+
+    def test_block_vector_index_gtiff(self):
+        """Test the block classes, masks, mask cache and pickling of a vector block index"""
+
+        block_index, block_masks, polygon_mask, reused_masks, unpickled_index, unpickled_mask = \
+            _test_block_vector_index(landsat_gtiff)
+
+        block_classes = set()
+
+        for (i, j), block_mask in block_masks.items():
+
+            reference_mask = polygon_mask[i:i+block_mask.shape[0], j:j+block_mask.shape[1]]
+
+            if reference_mask.all():
+                reference_class = vector_tools.BLOCK_INSIDE
+            elif reference_mask.any():
+                reference_class = vector_tools.BLOCK_PARTIAL
+            else:
+                reference_class = vector_tools.BLOCK_OUTSIDE
+
+            block_classes.add(reference_class)
+
+            self.assertEqual(block_index.block_class(i, j), reference_class)
+            self.assertTrue(np.array_equal(block_mask, reference_mask))
+
+        self.assertEqual(block_classes, set([vector_tools.BLOCK_OUTSIDE,
+                                             vector_tools.BLOCK_PARTIAL,
+                                             vector_tools.BLOCK_INSIDE]))
+
+        # (0, 0) was used most recently, so (0, 32) was dropped from the cache.
+        self.assertEqual(reused_masks, [True, True, False])
+
+        self.assertEqual(unpickled_index.block_classes, block_index.block_classes)
+        self.assertTrue(np.array_equal(unpickled_mask, polygon_mask[:32, :32]))
+
+    def test_xy_offsets_array(self):
+        """Test that the array coordinate offsets match the offsets of each coordinate"""
+
+        for round_offset in [False, True]:
+
+            x, y, x_array, y_array, x_offsets, y_offsets, xy_offsets = _test_xy_offsets(round_offset=round_offset)
+
+            self.assertTrue(np.array_equal(x_array, x))
+            self.assertTrue(np.array_equal(y_array, y))
+            self.assertTrue(np.array_equal(x_offsets, xy_offsets[:, 0]))
+            self.assertTrue(np.array_equal(y_offsets, xy_offsets[:, 1]))
+
+        # Points outside of the image
+        for x, y in [(-1045., 0.), (5045., 0.), (0., 545.), (0., -2545.)]:
+
+            with self.assertRaises(ValueError):
+                vector_tools.get_xy_offsets_array(image_list=_XY_IMAGE_LIST, x=[0., x], y=[0., y])
+
+            with self.assertRaises(ValueError):
+                vector_tools.get_xy_offsets(image_list=_XY_IMAGE_LIST, x=x, y=y, check_position=True)
+
+    def test_error_matrix_counts(self):
+        """Test the error matrix counts and statistics"""
+
+        emat, predicted, observed = _test_error_matrix()
+
+        self.assertTrue(np.array_equal(emat.e_matrix, metrics.confusion_matrix(observed, predicted).T))
+        self.assertTrue(np.allclose(emat.kappa_score, metrics.cohen_kappa_score(observed, predicted)))
+        self.assertTrue(np.allclose(emat.f_scores, metrics.f1_score(observed, predicted, average=None)))
+
+    def test_object_accuracy_disjoint(self):
+        """Test object accuracy without overlapping objects"""
+
+        oa = _test_object_accuracy_disjoint()
+
+        self.assertEqual(oa.ids, [])
+        self.assertEqual(oa.over, [])
+        self.assertTrue(np.array_equal(oa.error_array, np.zeros((6, 10, 10), dtype='float32')))
+
+    def test_sample_store_round_trip(self):
+        """Test that the sample store keeps ids and coordinates exact"""
+
+        samples, stored_samples, headers, stored_headers = _test_sample_store()
+
+        self.assertEqual(stored_headers, headers)
+        self.assertTrue(np.array_equal(stored_samples, samples))
+
+    def test_band_statistics_gtiff(self):
+        """Test the write-time band statistics"""
+
+        band_stats, image_array = _test_band_statistics(landsat_gtiff)
+
+        self.assertTrue(np.allclose([band_stats.minimum, band_stats.maximum, band_stats.mean, band_stats.std],
+                                    [image_array.min(), image_array.max(), image_array.mean(), image_array.std()]))
+        self.assertTrue(np.array_equal(band_stats.histogram, np.histogram(image_array, bins=16, range=(0, 256))[0]))
+
+    def test_plr(self):
+        """Test probabilistic label relaxation against the per-pixel reference"""
+
+        for window_size, iterations in [(3, 1), (5, 2)]:
+
+            plr_array, reference_array = _test_plr(window_size=window_size, iterations=iterations)
+
+            self.assertTrue(np.allclose(plr_array, reference_array, rtol=1e-4, atol=1e-6))
+
+    def test_import_budget(self):
+        """Test that ``import mpglue`` loads no heavy modules and stays within the memory budget"""
+
+        __, peak_memory, heavy_modules = _test_import_budget()
+
+        self.assertEqual(heavy_modules, [])
+        self.assertLess(peak_memory, 500.)
+
+    def test_lazy_imports(self):
+        """Test that each public name imports on its own"""
+
+        from mpglue import _LAZY_IMPORTS
+
+        for name in _LAZY_IMPORTS:
+
+            returncode, err = _test_lazy_import(name)
+
+            self.assertEqual(returncode, 0, msg='mpglue.{} failed to import:\n{}'.format(name, err))
+
 
 if __name__ == '__main__':
     unittest.main()
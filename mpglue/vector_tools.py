@@ -20,12 +20,18 @@ import copy
 import fnmatch
 import atexit
 import tarfile
+from collections import OrderedDict
 
 from .paths import get_main_path
 from .errors import TransformError, logger
-from .helpers import PickleIt
+from .helpers import PickleIt, LazyModule
 
-raster_tools = sys.modules['mpglue.raster_tools']
+# ``raster_tools`` imports this module, so it is
+#   usually already (partially) imported.
+try:
+    raster_tools = sys.modules['mpglue.raster_tools']
+except KeyError:
+    from . import raster_tools
 
 MAIN_PATH = get_main_path()
 
@@ -44,26 +50,10 @@ except ImportError:
     logger.error('NumPy must be installed')
     raise ImportError
 
-# Pandas
-try:
-    import pandas as pd
-    pandas_installed = True
-except:
-    pandas_installed = False
-
-# PySal
-try:
-    import pysal
-    pysal_installed = True
-except:
-    pysal_installed = False
-
-# Rtree
-try:
-    import rtree
-    rtree_installed = True
-except:
-    rtree_installed = False
+# Pandas, PySal, and Rtree are imported on first use.
+pd = LazyModule('pandas', error_message='Pandas must be installed')
+pysal = LazyModule('pysal')
+rtree = LazyModule('rtree')
 
 # Pickle
 try:
@@ -903,12 +893,12 @@ def dataframe2dbf(df, dbf_file, my_specs=None):
         None, writes to ``dbf_file``.
     """
 
-    if not pandas_installed:
+    if not pd.is_available():
 
         logger.warning('Pandas must be installed to convert dataframes to shapefiles.')
         return
 
-    if not pysal_installed:
+    if not pysal.is_available():
 
         logger.warning('PySAL must be installed to convert dataframes to shapefiles.')
         return
@@ -1044,12 +1034,12 @@ def shp2dataframe(input_shp):
         Pandas dataframe
     """
 
-    if not pandas_installed:
+    if not pd.is_available():
 
         logger.warning('Pandas must be installed to convert shapefiles to dataframes.')
         return
 
-    if not pysal_installed:
+    if not pysal.is_available():
 
         logger.warning('PySAL must be installed to convert shapefiles to dataframes.')
         return
@@ -1178,74 +1168,119 @@ class TransformGeometry(object):
         self.geometry.Transform(self.coord_transform)
 
 
-class Transform(object):
+def _spatial_reference(projection, srs_name):
 
     """
-    Transforms a x, y coordinate pair
+    Creates a spatial reference
 
     Args:
-        x (float): The source x coordinate.
-        y (float): The source y coordinate.
+        projection (int or str): The projection code. Format can be EPSG, CS, or proj4.
+        srs_name (str): The name of the projection (e.g., 'source'), used in error messages.
+
+    Returns:
+        ``osr.SpatialReference`` instance
+    """
+
+    srs = osr.SpatialReference()
+
+    try:
+
+        if isinstance(projection, int):
+            srs.ImportFromEPSG(projection)
+        elif isinstance(projection, str):
+
+            if projection.startswith('PROJCS') or projection.startswith('GEOGCS'):
+                srs.ImportFromWkt(projection)
+            elif projection.startswith('+proj'):
+                srs.ImportFromProj4(projection)
+            else:
+
+                logger.error('  The {} code could not be read.'.format(srs_name))
+                raise ValueError
+
+    except:
+
+        logger.error(gdal.GetLastErrorMsg())
+        logger.error('  The {} code could not be read.'.format(srs_name))
+        raise ValueError
+
+    return srs
+
+
+def transform_points(x, y, source_projection, target_projection):
+
+    """
+    Transforms arrays of x, y coordinates with one coordinate transformation call
+
+    Args:
+        x (1d array-like): The source x coordinates.
+        y (1d array-like): The source y coordinates.
         source_projection (int or str): The source projection code. Format can be EPSG, CS, or proj4.
         target_projection (int or str): The target projection code. Format can be EPSG, CS, or proj4.
 
     Examples:
-        >>> from mpglue.vector_tools import Transform
+        >>> from mpglue.vector_tools import transform_points
         >>>
-        >>> ptr = Transform(740000.0, 2260000.0, 102033, 4326)
-        >>> print(ptr.x, ptr.y)
-        >>> print(ptr.x_transform, ptr.y_transform)
+        >>> x_transform, y_transform = transform_points(x_array, y_array, 102033, 4326)
+
+    Returns:
+        The transformed x and y coordinates, as 1d arrays.
     """
 
-    def __init__(self, x, y, source_projection, target_projection):
+    x = np.asarray(x, dtype='float64').ravel()
+    y = np.asarray(y, dtype='float64').ravel()
 
-        self.x = x
-        self.y = y
+    if x.shape[0] != y.shape[0]:
 
-        source_srs = osr.SpatialReference()
-        target_srs = osr.SpatialReference()
+        logger.error('  The x and y coordinates must be the same length.')
+        raise ValueError
 
-        try:
+    if x.shape[0] == 0:
+        return x, y
 
-            if isinstance(source_projection, int):
-                source_srs.ImportFromEPSG(source_projection)
-            elif isinstance(source_projection, str):
+    source_srs = _spatial_reference(source_projection, 'source')
+    target_srs = _spatial_reference(target_projection, 'target')
 
-                if source_projection.startswith('PROJCS') or source_projection.startswith('GEOGCS'):
-                    source_srs.ImportFromWkt(source_projection)
-                elif source_projection.startswith('+proj'):
-                    source_srs.ImportFromProj4(source_projection)
-                else:
+    try:
+        coord_trans = osr.CoordinateTransformation(source_srs, target_srs)
+    except:
 
-                    logger.error('  The source code could not be read.')
-                    raise ValueError
+        logger.error(gdal.GetLastErrorMsg())
+        logger.error('  The coordinates could not be transformed.')
+        raise TransformError
 
-        except:
+    # (x, y, z) for each point
+    xyz = np.array(coord_trans.TransformPoints(list(zip(x.tolist(), y.tolist()))), dtype='float64')
 
-            logger.error(gdal.GetLastErrorMsg())
-            logger.error('  The source code could not be read.')
-            raise ValueError
+    return xyz[:, 0], xyz[:, 1]
 
-        try:
 
-            if isinstance(target_projection, int):
-                target_srs.ImportFromEPSG(target_projection)
-            elif isinstance(target_projection, str):
+class Transform(object):
 
-                if target_projection.startswith('PROJCS') or target_projection.startswith('GEOGCS'):
-                    target_srs.ImportFromWkt(target_projection)
-                elif target_projection.startswith('+proj'):
-                    target_srs.ImportFromProj4(target_projection)
-                else:
+    """
+    Transforms a x, y coordinate pair
 
-                    logger.error('  The target code could not be read.')
-                    raise ValueError
+    Args:
+        x (float): The source x coordinate.
+        y (float): The source y coordinate.
+        source_projection (int or str): The source projection code. Format can be EPSG, CS, or proj4.
+        target_projection (int or str): The target projection code. Format can be EPSG, CS, or proj4.
 
-        except:
+    Examples:
+        >>> from mpglue.vector_tools import Transform
+        >>>
+        >>> ptr = Transform(740000.0, 2260000.0, 102033, 4326)
+        >>> print(ptr.x, ptr.y)
+        >>> print(ptr.x_transform, ptr.y_transform)
+    """
 
-            logger.error(gdal.GetLastErrorMsg())
-            logger.error('  The target code could not be read.')
-            raise ValueError
+    def __init__(self, x, y, source_projection, target_projection):
+
+        self.x = x
+        self.y = y
+
+        source_srs = _spatial_reference(source_projection, 'source')
+        target_srs = _spatial_reference(target_projection, 'target')
 
         try:
             coord_trans = osr.CoordinateTransformation(source_srs, target_srs)
@@ -1422,7 +1457,7 @@ class RTreeManager(object):
             do_not_pickle (Optional[bool])
         """
 
-        if not rtree_installed:
+        if not rtree.is_available():
 
             logger.warning('Rtree and libspatialindex must be installed for spatial indexing')
             return
@@ -1441,7 +1476,7 @@ class RTreeManager(object):
                 with tarfile.open(os.path.join(self.utm_shp_path, 'utm_shp.tar.gz'), mode='r') as tar:
                     tar.extractall(path=self.utm_shp_path)
 
-        if rtree_installed:
+        if rtree.is_available():
             self.rtree_index = rtree.index.Index(interleaved=False)
         else:
             self.rtree_index = dict()
@@ -1461,7 +1496,7 @@ class RTreeManager(object):
                 en = bdy_geometry.GetEnvelope()
 
 
-                if rtree_installed:
+                if rtree.is_available():
                     self.rtree_index.insert(f, (en[0], en[1], en[2], en[3]))
                 else:
                     self.rtree_index[f] = (en[0], en[1], en[2], en[3])
@@ -1616,7 +1651,7 @@ class RTreeManager(object):
                             right=image_envelope['right'],
                             bottom=image_envelope['bottom'])
 
-        if rtree_installed:
+        if rtree.is_available():
             index_iter = self.rtree_index.intersection(envelope)
         else:
             index_iter = range(0, len(self.field_dict))
@@ -1882,6 +1917,256 @@ def intersects_boundary(meta_dict, boundary_file):
     # return False
 
 
+# Block classes of ``BlockVectorIndex``
+BLOCK_OUTSIDE = 0
+BLOCK_PARTIAL = 1
+BLOCK_INSIDE = 2
+
+
+def _block_geometry(left, top, right, bottom):
+
+    """Creates a polygon geometry from a block envelope"""
+
+    return ogr.CreateGeometryFromWkt('POLYGON (({l:f} {t:f}, {r:f} {t:f}, {r:f} {b:f}, {l:f} {b:f}, {l:f} {t:f}))'.format(l=left,
+                                                                                                                        t=top,
+                                                                                                                        r=right,
+                                                                                                                        b=bottom))
+
+
+class BlockVectorIndex(object):
+
+    """
+    Classifies the blocks of an image grid as inside, outside, or partially covered by a vector
+
+    The vector is opened once, before any block is processed. The envelope of each feature is
+    mapped onto the block grid, which serves as the spatial index of block envelopes, so blocks
+    that no feature envelope reaches are outside without any geometry test. The other blocks are
+    tested with the ``Contains`` and ``Intersects`` predicates against the features that reach
+    them. Only partial blocks need a mask, and those masks are rasterized once and cached.
+
+    Args:
+        vector_file (str): The vector file.
+        image_info (object): The image information object. The object should have (rows, cols, left,
+            top, cellY, cellX, projection).
+        block_rows (int): The block row chunk size.
+        block_cols (int): The block column chunk size.
+        cache_size (Optional[int]): The maximum number of block masks to cache. The least recently
+            used mask is dropped first. Default is 64.
+
+    Attributes:
+        block_classes (dict): The class of each block, keyed by the block (row, column) offset. Blocks
+            not in the dictionary are outside.
+
+    Examples:
+        >>> from mpglue import vector_tools
+        >>>
+        >>> with raster_tools.ropen('/image.tif') as i_info:
+        >>>     block_index = vector_tools.BlockVectorIndex('/boundary.shp', i_info, 1024, 1024)
+        >>>
+        >>> if block_index.block_class(0, 1024) == vector_tools.BLOCK_PARTIAL:
+        >>>     mask = block_index.get_mask(0, 1024, 1024, 1024)
+    """
+
+    def __init__(self, vector_file, image_info, block_rows, block_cols, cache_size=64):
+
+        self.vector_file = vector_file
+        self.rows = image_info.rows
+        self.cols = image_info.cols
+        self.left = image_info.left
+        self.top = image_info.top
+
+        # ``cellY`` is the pixel width and ``cellX`` the (negative) pixel height.
+        self.cell_x = image_info.cellY
+        self.cell_y = abs(image_info.cellX)
+
+        self.projection = image_info.projection
+        self.block_rows = block_rows
+        self.block_cols = block_cols
+        self.cache_size = cache_size
+
+        self.block_classes = dict()
+
+        self._v_info = None
+        self._mask_cache = OrderedDict()
+
+        self._classify_blocks()
+
+    def __getstate__(self):
+
+        # Open vectors and cached masks
+        #   are not sent to worker processes.
+        state = self.__dict__.copy()
+
+        state['_v_info'] = None
+        state['_mask_cache'] = OrderedDict()
+
+        return state
+
+    def _block_envelope(self, i, j, n_rows, n_cols):
+
+        """Gets the (left, top, right, bottom) envelope of a block"""
+
+        block_left = self.left + (j * self.cell_x)
+        block_top = self.top - (i * self.cell_y)
+
+        return block_left, block_top, block_left + (n_cols * self.cell_x), block_top - (n_rows * self.cell_y)
+
+    def _classify_blocks(self):
+
+        """Classifies each block of the grid"""
+
+        n_block_rows = int(np.ceil(self.rows / float(self.block_rows)))
+        n_block_cols = int(np.ceil(self.cols / float(self.block_cols)))
+
+        block_height = self.block_rows * self.cell_y
+        block_width = self.block_cols * self.cell_x
+
+        # The features that reach each block
+        block_features = dict()
+        geometries = list()
+
+        with vopen(self.vector_file) as v_info:
+
+            for feature in v_info.lyr:
+
+                geometry = feature.GetGeometryRef()
+
+                if geometry is None:
+                    continue
+
+                geometries.append(geometry.Clone())
+
+                # (min x, max x, min y, max y)
+                envelope = geometry.GetEnvelope()
+
+                bi_start = max(int(np.floor((self.top - envelope[3]) / block_height)), 0)
+                bi_end = min(int(np.floor((self.top - envelope[2]) / block_height)), n_block_rows-1)
+                bj_start = max(int(np.floor((envelope[0] - self.left) / block_width)), 0)
+                bj_end = min(int(np.floor((envelope[1] - self.left) / block_width)), n_block_cols-1)
+
+                for bi in range(bi_start, bi_end+1):
+
+                    for bj in range(bj_start, bj_end+1):
+
+                        block_key = (bi * self.block_rows, bj * self.block_cols)
+
+                        if block_key in block_features:
+                            block_features[block_key].append(len(geometries)-1)
+                        else:
+                            block_features[block_key] = [len(geometries)-1]
+
+        v_info = None
+
+        for block_key, feature_indices in viewitems(block_features):
+
+            i, j = block_key
+
+            block_geometry = _block_geometry(*self._block_envelope(i,
+                                                                   j,
+                                                                   min(self.block_rows, self.rows-i),
+                                                                   min(self.block_cols, self.cols-j)))
+
+            block_class = BLOCK_OUTSIDE
+
+            for feature_index in feature_indices:
+
+                if geometries[feature_index].Contains(block_geometry):
+
+                    block_class = BLOCK_INSIDE
+                    break
+
+                elif geometries[feature_index].Intersects(block_geometry):
+                    block_class = BLOCK_PARTIAL
+
+            if block_class != BLOCK_OUTSIDE:
+                self.block_classes[block_key] = block_class
+
+    def block_class(self, i, j):
+
+        """
+        Gets the class of a block
+
+        Args:
+            i (int): The starting row position of the block.
+            j (int): The starting column position of the block.
+
+        Returns:
+            ``BLOCK_OUTSIDE``, ``BLOCK_PARTIAL``, or ``BLOCK_INSIDE``
+        """
+
+        return self.block_classes.get((i, j), BLOCK_OUTSIDE)
+
+    def get_mask(self, i, j, n_rows, n_cols):
+
+        """
+        Gets the mask of a block, where 1 is covered by the vector
+
+        Args:
+            i (int): The starting row position of the block.
+            j (int): The starting column position of the block.
+            n_rows (int): The number of block rows.
+            n_cols (int): The number of block columns.
+
+        Returns:
+            The block mask, as a 2d uint8 array.
+        """
+
+        block_class = self.block_class(i, j)
+
+        if block_class == BLOCK_OUTSIDE:
+            return np.zeros((n_rows, n_cols), dtype='uint8')
+        elif block_class == BLOCK_INSIDE:
+            return np.ones((n_rows, n_cols), dtype='uint8')
+
+        block_key = (i, j, n_rows, n_cols)
+
+        if block_key in self._mask_cache:
+
+            # Move the mask to the most recently used end.
+            block_mask = self._mask_cache.pop(block_key)
+            self._mask_cache[block_key] = block_mask
+
+            return block_mask
+
+        if self._v_info is None:
+            self._v_info = vopen(self.vector_file)
+
+        block_left, block_top, block_right, block_bottom = self._block_envelope(i, j, n_rows, n_cols)
+
+        # Create a raster to rasterize into.
+        target_ds = gdal.GetDriverByName('MEM').Create('', n_cols, n_rows, 1, gdal.GDT_Byte)
+
+        target_ds.SetGeoTransform([block_left, self.cell_x, 0.0, block_top, 0.0, -self.cell_y])
+        target_ds.SetProjection(self.projection)
+
+        # Only rasterize the features at the block.
+        self._v_info.lyr.SetSpatialFilterRect(block_left, block_bottom, block_right, block_top)
+
+        gdal.RasterizeLayer(target_ds, [1], self._v_info.lyr, burn_values=[1])
+
+        self._v_info.lyr.SetSpatialFilter(None)
+
+        block_mask = np.uint8(target_ds.GetRasterBand(1).ReadAsArray())
+
+        target_ds = None
+
+        self._mask_cache[block_key] = block_mask
+
+        if len(self._mask_cache) > self.cache_size:
+            self._mask_cache.popitem(last=False)
+
+        return block_mask
+
+    def close(self):
+
+        if self._v_info is not None:
+
+            self._v_info.close()
+            self._v_info = None
+
+        self._mask_cache = OrderedDict()
+
+
 def _get_xy_offsets(x,
                     left,
                     right,
@@ -1935,6 +2220,112 @@ def _get_xy_offsets(x,
     return x_offset, y_offset
 
 
+def _get_xy_offsets_array(x, y, left, top, cell_size_x, cell_size_y, round_offset):
+
+    """Computes the column and row offsets of coordinate arrays from the image origin"""
+
+    x_offsets = np.abs(x - left) / abs(cell_size_x)
+    y_offsets = np.abs(y - top) / abs(cell_size_y)
+
+    if round_offset:
+        return np.int64(np.round(x_offsets)), np.int64(np.round(y_offsets))
+    else:
+        return np.int64(x_offsets), np.int64(y_offsets)
+
+
+def get_xy_offsets_array(image_info=None,
+                         image_list=None,
+                         x=None,
+                         y=None,
+                         projection=None,
+                         round_offset=False,
+                         check_position=True):
+
+    """
+    Gets the offsets of arrays of coordinates
+
+    The array counterpart of ``get_xy_offsets``. The offsets of all coordinates are computed at once, and
+    coordinates in another projection are transformed with one ``transform_points`` call.
+
+    Args:
+        image_info (object): Object of ``mpglue.ropen``.
+        image_list (Optional[list]): [left, top, right, bottom, cellx, celly]. Default is [].
+        x (Optional[1d array-like]): The x coordinates. Default is None.
+        y (Optional[1d array-like]): The y coordinates. Default is None.
+        projection (Optional[int or str]): The projection of ``x`` and ``y``, if different from
+            the image. Format can be EPSG, CS, or proj4. Default is None.
+        round_offset (Optional[bool]): Whether to round offsets. Default is False.
+        check_position (Optional[bool]): Whether to check if `x` and `y` are within the extent bounds.
+            Default is True.
+
+    Examples:
+        >>> from mpglue import vector_tools
+        >>>
+        >>> x, y, x_offsets, y_offsets = vector_tools.get_xy_offsets_array(image_info=i_info, x=x_array, y=y_array)
+
+    Returns:
+        X coordinates, Y coordinates, X coordinate offsets, Y coordinate offsets, as 1d arrays
+    """
+
+    if (x is None) or (y is None):
+
+        logger.error('The x and y coordinates must be given.')
+        raise ValueError
+
+    x = np.asarray(x, dtype='float64').ravel()
+    y = np.asarray(y, dtype='float64').ravel()
+
+    if x.shape[0] != y.shape[0]:
+
+        logger.error('The x and y coordinates must be the same length.')
+        raise ValueError
+
+    if image_list:
+
+        left = image_list[0]
+        top = image_list[1]
+        right = image_list[2]
+        bottom = image_list[3]
+        cell_x = image_list[4]
+        cell_y = image_list[5]
+
+    else:
+
+        left = image_info.left
+        top = image_info.top
+        right = image_info.right
+        bottom = image_info.bottom
+        cell_x = image_info.cellX
+        cell_y = image_info.cellY
+
+    if projection is not None:
+
+        if image_list:
+
+            logger.error('A projection can only be transformed with an image information object.')
+            raise ValueError
+
+        x, y = transform_points(x, y, projection, image_info.projection)
+
+    if check_position:
+
+        if np.any((x < left) | (x > right)):
+            raise ValueError('The x is out of the image extent.')
+
+        if np.any((y > top) | (y < bottom)):
+            raise ValueError('The y is out of the image extent.')
+
+    x_offsets, y_offsets = _get_xy_offsets_array(x,
+                                                 y,
+                                                 left,
+                                                 top,
+                                                 cell_x,
+                                                 cell_y,
+                                                 round_offset)
+
+    return x, y, x_offsets, y_offsets
+
+
 def get_xy_offsets(image_info=None,
                    image_list=None,
                    x=None,
@@ -2248,7 +2639,7 @@ def list_field_names(in_shapefile, be_quiet=False, epsg=None):
         List of field names
     """
 
-    if not pandas_installed:
+    if not pd.is_available():
 
         logger.warning('Pandas must be installed to load field names.')
         return
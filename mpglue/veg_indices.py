@@ -27,7 +27,7 @@ except:
 
 from . import utils
 from .errors import logger
-from .helpers import _iteration_parameters
+from .helpers import _iteration_parameters, overwrite_file, LazyModule
 
 # Numpy    
 try:
@@ -57,11 +57,8 @@ try:
 except ImportError:
     raise ImportError('GDAL must be installed')
 
-# Scikit-image
-try:
-    from skimage.exposure import rescale_intensity
-except ImportError:
-    raise ImportError('Scikit-image must be installed')
+# Scikit-image, imported on first use
+exposure = LazyModule('skimage.exposure', error_message='Scikit-image must be installed')
 
 try:
     import deprecation
@@ -71,6 +68,53 @@ except ImportError:
 old_settings = np.seterr(all='ignore')
 
 
+def _get_out_type(storage, no_data):
+
+    """
+    Gets the ``VegIndicesEquations`` output type of a storage type
+
+    Args:
+        storage (str): The output storage type. Choices are ['float32', 'byte', 'uint16'].
+        no_data (int): The output 'no data' value.
+
+    Returns:
+        The output type, as an int.
+    """
+
+    if storage == 'float32':
+        out_type = 1
+    elif storage == 'byte':
+
+        if (no_data < 0) or (no_data > 255):
+
+            raise ValueError("""
+
+            The 'no data' value cannot be less than 0 or
+            greater than 255 with Byte storage.
+
+            """)
+
+        out_type = 2
+
+    elif storage == 'uint16':
+
+        if no_data < 0:
+
+            raise ValueError("""
+
+            The 'no data' value cannot be less than 0
+            with UInt16 storage.
+
+            """)
+
+        out_type = 3
+
+    else:
+        raise NameError('{} is not a supported storage option.'.format(storage))
+
+    return out_type
+
+
 class SensorInfo(object):
 
     """
@@ -270,23 +314,23 @@ class VegIndicesEquations(SensorInfo):
 
             if in_range:
 
-                array2rescale_ = np.uint8(rescale_intensity(array2rescale,
-                                                            in_range=in_range,
-                                                            out_range=(0, 254)))
+                array2rescale_ = np.uint8(exposure.rescale_intensity(array2rescale,
+                                                                     in_range=in_range,
+                                                                     out_range=(0, 254)))
 
             else:
-                array2rescale_ = np.uint8(rescale_intensity(array2rescale, out_range=(0, 254)))
+                array2rescale_ = np.uint8(exposure.rescale_intensity(array2rescale, out_range=(0, 254)))
 
         elif self.out_type == 3:
 
             if in_range:
 
-                array2rescale_ = np.uint16(rescale_intensity(array2rescale,
-                                                             in_range=in_range,
-                                                             out_range=(0, 10000)))
+                array2rescale_ = np.uint16(exposure.rescale_intensity(array2rescale,
+                                                                      in_range=in_range,
+                                                                      out_range=(0, 10000)))
 
             else:
-                array2rescale_ = np.uint16(rescale_intensity(array2rescale, out_range=(0, 10000)))
+                array2rescale_ = np.uint16(exposure.rescale_intensity(array2rescale, out_range=(0, 10000)))
 
         return np.where(array2rescale == self.no_data, self.no_data, array2rescale_)
 
@@ -333,7 +377,7 @@ class VegIndicesEquations(SensorInfo):
 
             vi_functions = {'ARVI': self.ARVI,
                             'CBI': self.CBI,
-                            'CIre': self.CIre,
+                            'CIRE': self.CIre,
                             'EVI': self.EVI,
                             'EVI2': self.EVI2,
                             'IPVI': self.IPVI,
@@ -365,7 +409,7 @@ class VegIndicesEquations(SensorInfo):
             vi_function = vi_functions[self.index2compute.upper()]
 
             if kwargs:
-                return vi_function(kwargs)
+                return vi_function(**kwargs)
             else:
                 return vi_function()
 
@@ -1421,36 +1465,7 @@ class VegIndices(BandHandler):
 
         print_progress = True
 
-        if self.storage == 'float32':
-            self.out_type = 1
-        elif self.storage == 'byte':
-
-            if (self.no_data < 0) or (self.no_data > 255):
-
-                raise ValueError("""
-
-                The 'no data' value cannot be less than 0 or
-                greater than 255 with Byte storage.
-
-                """)
-
-            self.out_type = 2
-
-        elif self.storage == 'uint16':
-
-            if self.no_data < 0:
-
-                raise ValueError("""
-
-                The 'no data' value cannot be less than 0
-                with UInt16 storage.
-
-                """)
-
-            self.out_type = 3
-
-        else:
-            raise NameError('{} is not a supported storage option.'.format(self.storage))
+        self.out_type = _get_out_type(self.storage, self.no_data)
 
         d_name, f_name = os.path.split(self.output_image)
         __, f_ext = os.path.splitext(f_name)
@@ -1635,50 +1650,444 @@ class VegIndices(BandHandler):
         o_info = None
 
 
-def _compute_as_list(img, out_img, sensor, k, storage, no_data, chunk_size,
-                     overwrite, overviews, veg_indice_list=[]):
+def _compute_block_indices(block_array,
+                           index_list,
+                           index_positions,
+                           out_type=1,
+                           scale_factor=1.,
+                           **kwargs):
 
-    if (len(veg_indice_list) == 1) and (veg_indice_list[0].lower() == 'all'):
+    """
+    Computes several vegetation indices from one block of bands
 
-        si = SensorInfo()
+    Indices that use the same bands share one band stack and ``VegIndicesEquations`` instance.
 
-        si.list_indice_options(sensor)
+    Args:
+        block_array (3d array): The block bands, in ``MultiVegIndices.wavelengths`` order.
+        index_list (str list): The indices to compute.
+        index_positions (dict): The positions of each index's bands in ``block_array``.
+        out_type (Optional[int]): See ``VegIndicesEquations.compute``. Default is 1.
+        scale_factor (Optional[float]): See ``VegIndicesEquations.compute``. Default is 1.
+        kwargs (Optional[dict]): Keyword arguments passed to ``VegIndicesEquations``.
 
-        veg_indice_list = si.sensor_indices
+    Returns:
+        A list of index arrays, in ``index_list`` order, and the (min, max) NDVI of the block. The VCI
+            depends on the NDVI range of the full image, so its array is None. The NDVI range is None
+            if the VCI is not requested or if the block has no valid pixels.
+    """
 
-    d_name, f_name = os.path.split(out_img)
-    f_base, f_ext = os.path.splitext(f_name)
+    index_equations = dict()
+    index_arrays = list()
 
-    name_list = []
+    ndvi_range = None
 
-    for input_indice in veg_indice_list:
+    for input_indice in index_list:
 
-        out_img_indice = '{}/{}_{}{}'.format(d_name, f_base, input_indice.lower(), f_ext)
+        band_key = index_positions[input_indice]
 
-        name_list.append(out_img_indice)
+        if band_key not in index_equations:
+            index_equations[band_key] = VegIndicesEquations(block_array[list(band_key)], **kwargs)
 
-        vio = VegIndices(img, input_indice, sensor)
+        vie = index_equations[band_key]
 
-        vio.run(out_img_indice, k=k, storage=storage, no_data=no_data, chunk_size=chunk_size, overwrite=overwrite)
+        if input_indice == 'VCI':
 
-    out_stack = '{}/{}_STACK.vrt'.format(d_name, f_base)
+            red = vie.image_array[0]
+            nir = vie.image_array[1]
 
-    # Stack all the indices.
-    composite(d_name, out_stack, stack=True, image_list=name_list, build_overviews=overviews, no_data=no_data)
+            valid = (red != vie.in_no_data) & (nir != vie.in_no_data)
 
-    # Save a list of vegetation indice names.
-    index_order = '{}/{}_STACK_order.txt'.format(d_name, f_base)
+            ndvi = vie.main_index(red[valid], nir[valid])
+            ndvi = ndvi[np.isfinite(ndvi)]
+
+            if ndvi.shape[0] > 0:
+                ndvi_range = (float(ndvi.min()), float(ndvi.max()))
+
+            index_arrays.append(None)
+
+        else:
+
+            index_arrays.append(vie.compute(input_indice,
+                                            out_type=out_type,
+                                            scale_factor=scale_factor))
+
+    return index_arrays, ndvi_range
+
+
+class MultiVegIndices(BandHandler):
+
+    """
+    Computes a list of vegetation indices, reading the bands of each block once
+
+    Args:
+        input_image (str)
+        index_list (str list): The vegetation indices to compute, or ['all'] to compute
+            every index available for ``sensor``.
+        sensor (str)
+        mask_band (Optional[int])
+
+    Examples:
+        >>> from mpglue.veg_indices import MultiVegIndices
+        >>>
+        >>> vio = MultiVegIndices('/some_image.tif', ['NDVI', 'EVI', 'NBR'], 'Landsat')
+        >>>
+        >>> # Write one band per index.
+        >>> vio.run('/some_image_indices.tif', n_jobs=4)
+        >>>
+        >>> # Write one file per index (/some_image_indices_ndvi.tif, etc.).
+        >>> vio.run('/some_image_indices.tif', separate_files=True)
+    """
+
+    def __init__(self, input_image, index_list, sensor, mask_band=None):
+
+        self.mask_band = mask_band
+
+        # Get the sensor band order.
+        BandHandler.__init__(self, sensor)
+
+        self.get_band_order()
+
+        if isinstance(index_list, str):
+            index_list = [index_list]
+
+        if (len(index_list) == 1) and (index_list[0].lower() == 'all'):
+
+            self.list_indice_options(sensor)
+
+            index_list = self.sensor_indices
+
+        self.index_list = [input_indice.upper() for input_indice in index_list]
+
+        # The bands needed by all of the
+        #   indices, in the order first needed.
+        self.wavelengths = list()
+
+        for input_indice in self.index_list:
+
+            if (input_indice not in self.wavelength_lists) or \
+                    not set(self.wavelength_lists[input_indice]).issubset(self.band_order):
+
+                raise NameError('{} cannot be computed for {}.'.format(input_indice, self.sensor))
+
+            for wavelength in self.wavelength_lists[input_indice]:
+
+                if wavelength not in self.wavelengths:
+                    self.wavelengths.append(wavelength)
+
+        self.band_positions = self.get_band_positions(self.wavelengths)
+
+        # The position of each index
+        #   band in ``self.wavelengths``.
+        self.index_positions = dict()
+
+        for input_indice in self.index_list:
+
+            self.index_positions[input_indice] = tuple([self.wavelengths.index(wavelength)
+                                                        for wavelength in self.wavelength_lists[input_indice]])
+
+        # Open the image.
+        self.meta_info = raster_tools.ropen(input_image)
+
+        self.rows, self.cols = self.meta_info.rows, self.meta_info.cols
+
+    def run(self, output_image, storage='float32',
+            no_data=0, in_no_data=0, chunk_size=1024, k=0,
+            be_quiet=False, overwrite=False, overviews=False,
+            scale_factor=1., separate_files=False, n_jobs=1):
+
+        """
+        Args:
+            output_image (str)
+            storage (Optional[str])
+            no_data (Optional[int])
+            in_no_data (Optional[int])
+            chunk_size (Optional[int])
+            k (Optional[int])
+            be_quiet (Optional[bool])
+            overwrite (Optional[bool])
+            overviews (Optional[bool])
+            scale_factor (Optional[float])
+            separate_files (Optional[bool]): Whether to write each index to its own file, named as
+                ``output_image`` with the lowercase index name appended. Default is False, or write one band
+                per index, in ``index_list`` order, to ``output_image``.
+            n_jobs (Optional[int]): The number of blocks to process in parallel threads. Default is 1.
+
+        Returns:
+            A list of the output images.
+        """
+
+        out_type = _get_out_type(storage, no_data)
 
+        output_image = os.path.abspath(output_image)
+
+        d_name, f_name = os.path.split(output_image)
+        f_base, f_ext = os.path.splitext(f_name)
+
+        if not os.path.isdir(d_name):
+            os.makedirs(d_name)
+
+        if separate_files:
+
+            output_images = [os.path.join(d_name, '{}_{}{}'.format(f_base, input_indice.lower(), f_ext))
+                             for input_indice in self.index_list]
+
+        else:
+            output_images = [output_image]
+
+        if overwrite:
+
+            for out_image in output_images:
+
+                if os.path.isfile(out_image):
+                    overwrite_file(out_image)
+
+        existing_images = [out_image for out_image in output_images if os.path.isfile(out_image)]
+
+        if existing_images:
+
+            logger.info('\n{} already exists ...'.format(existing_images[0]))
+
+            self.meta_info.close()
+            self.meta_info = None
+
+            return output_images
+
+        o_info = self.meta_info.copy()
+
+        o_info.storage = storage
+
+        if separate_files:
+            o_info.bands = 1
+        else:
+            o_info.bands = len(self.index_list)
+
+        out_rsts = [raster_tools.create_raster(out_image, o_info, compress='none') for out_image in output_images]
+
+        if chunk_size == -1:
+            block_rows, block_cols = self.rows, self.cols
+        else:
+
+            block_rows, block_cols = raster_tools.block_dimensions(self.rows, self.cols,
+                                                                   row_block_size=chunk_size,
+                                                                   col_block_size=chunk_size)
+
+        block_list = list()
+
+        for i in range(0, self.rows, block_rows):
+
+            n_rows = raster_tools.n_rows_cols(i, block_rows, self.rows)
+
+            for j in range(0, self.cols, block_cols):
+
+                n_cols = raster_tools.n_rows_cols(j, block_cols, self.cols)
+
+                block_list.append((i, j, n_rows, n_cols))
+
+        equation_kwargs = dict(chunk_size=chunk_size,
+                               no_data=no_data,
+                               in_no_data=in_no_data)
+
+        def _read_mask(block_info, bi, bj, block_n_rows, block_n_cols):
+
+            if isinstance(self.mask_band, int):
+
+                return block_info.read(bands2open=self.mask_band,
+                                       i=bi,
+                                       j=bj,
+                                       rows=block_n_rows,
+                                       cols=block_n_cols,
+                                       d_type='byte')
+
+            else:
+                return None
+
+        def _calc_block(block_infos, block):
+
+            bi, bj, block_n_rows, block_n_cols = block
+
+            block_info = block_infos['image']
+
+            # Read every band needed by the indices once.
+            block_array = block_info.read(bands2open=self.band_positions,
+                                          i=bi,
+                                          j=bj,
+                                          sort_bands2open=False,
+                                          rows=block_n_rows,
+                                          cols=block_n_cols,
+                                          d_type='float32')
+
+            mask_array = _read_mask(block_info, bi, bj, block_n_rows, block_n_cols)
+
+            return block, _compute_block_indices(block_array,
+                                                 self.index_list,
+                                                 self.index_positions,
+                                                 out_type=out_type,
+                                                 scale_factor=scale_factor,
+                                                 mask_array=mask_array,
+                                                 **equation_kwargs)
+
+        def _write_index(index_position, index_array, i, j):
+
+            if separate_files:
+                out_rsts[index_position].write_array(index_array, i=i, j=j, band=1)
+            else:
+                out_rsts[0].write_array(index_array, i=i, j=j, band=index_position+1)
+
+        if not be_quiet:
+
+            logger.info('\n{} ...\n'.format(', '.join(self.index_list)))
+
+            ctr, pbar = _iteration_parameters(self.rows, self.cols, block_rows, block_cols)
+
+        ndvi_ranges = list()
+
+        for block, (index_arrays, ndvi_range) in raster_tools.imap_blocks(dict(image=self.meta_info.file_name),
+                                                                          _calc_block,
+                                                                          block_list,
+                                                                          n_jobs=n_jobs):
+
+            i, j = block[:2]
+
+            for index_position, index_array in enumerate(index_arrays):
+
+                if isinstance(index_array, np.ndarray):
+                    _write_index(index_position, index_array, i, j)
+
+            if ndvi_range:
+                ndvi_ranges.append(ndvi_range)
+
+            if not be_quiet:
+
+                pbar.update(ctr)
+                ctr += 1
+
+        if not be_quiet:
+            pbar.finish()
+
+        if 'VCI' in self.index_list:
+
+            if not be_quiet:
+                logger.info('\nComputing VCI ...')
+
+            if ndvi_ranges:
+
+                min_ndvi = min([ndvi_range[0] for ndvi_range in ndvi_ranges])
+                max_ndvi = max([ndvi_range[1] for ndvi_range in ndvi_ranges])
+
+            else:
+                min_ndvi, max_ndvi = -1., 1.
+
+            vci_position = self.index_list.index('VCI')
+            vci_bands = self.get_band_positions(self.wavelength_lists['VCI'])
+
+            # The VCI is scaled by the NDVI range of the full
+            #   image, so only its two bands are read again.
+            for bi, bj, block_n_rows, block_n_cols in block_list:
+
+                image_stack = self.meta_info.read(bands2open=vci_bands,
+                                                  i=bi,
+                                                  j=bj,
+                                                  sort_bands2open=False,
+                                                  rows=block_n_rows,
+                                                  cols=block_n_cols,
+                                                  d_type='float32')
+
+                vie = VegIndicesEquations(image_stack,
+                                          mask_array=_read_mask(self.meta_info, bi, bj, block_n_rows, block_n_cols),
+                                          **equation_kwargs)
+
+                vci_array = vie.compute('VCI',
+                                        out_type=out_type,
+                                        min_ndvi=min_ndvi,
+                                        max_ndvi=max_ndvi)
+
+                _write_index(vci_position, vci_array, bi, bj)
+
+        for out_rst in out_rsts:
+            out_rst.close_all()
+
+        out_rsts = None
+
+        for out_image in output_images:
+
+            if k > 0:
+
+                print('')
+
+                f_base_out, f_ext_out = os.path.splitext(out_image)
+
+                comResamp = 'gdalwarp -tr {:f} {:f} -r near {} {}_resamp{}'.format(k, k,
+                                                                                   out_image,
+                                                                                   f_base_out,
+                                                                                   f_ext_out)
+
+                subprocess.call(comResamp, shell=True)
+
+            if overviews:
+
+                logger.info('\nComputing overviews ...\n')
+
+                with raster_tools.ropen(out_image) as v_info:
+                    v_info.build_overviews()
+
+        self.meta_info.close()
+        o_info.close()
+
+        self.meta_info = None
+        o_info = None
+
+        return output_images
+
+
+def _compute_as_list(img, out_img, sensor, k, storage, no_data, chunk_size,
+                     overwrite, overviews, veg_indice_list=None, in_no_data=0,
+                     be_quiet=False, mask_band=None, scale_factor=1.,
+                     separate_files=True, n_jobs=1):
+
+    if not veg_indice_list:
+        veg_indice_list = ['all']
+
+    vio = MultiVegIndices(img, veg_indice_list, sensor, mask_band=mask_band)
+
+    # Overviews are built for the stack.
+    name_list = vio.run(out_img, k=k, storage=storage, no_data=no_data, in_no_data=in_no_data,
+                        chunk_size=chunk_size, be_quiet=be_quiet, overwrite=overwrite,
+                        overviews=overviews and not separate_files, scale_factor=scale_factor,
+                        separate_files=separate_files, n_jobs=n_jobs)
+
+    d_name, f_name = os.path.split(os.path.abspath(out_img))
+    f_base, f_ext = os.path.splitext(f_name)
+
+    if separate_files:
+
+        out_stack = os.path.join(d_name, '{}_STACK.vrt'.format(f_base))
+
+        # Stack all the indices.
+        out_ds = gdal.BuildVRT(out_stack, name_list, separate=True)
+        out_ds = None
+
+        if overviews:
+
+            with raster_tools.ropen(out_stack) as v_info:
+                v_info.build_overviews()
+
+        index_order = os.path.join(d_name, '{}_STACK_order.txt'.format(f_base))
+
+    else:
+        index_order = os.path.join(d_name, '{}_order.txt'.format(f_base))
+
+    # Save a list of vegetation indice names.
     with open(index_order, 'w') as tio:
 
-        for bi, vi in enumerate(veg_indice_list):
+        for bi, vi in enumerate(vio.index_list):
             tio.write('{:d}: {}\n'.format(bi+1, vi))
 
 
 def veg_indices(input_image, output_image, input_index, sensor, k=0.,
                 storage='float32', no_data=0, in_no_data=0,
                 chunk_size=-1, be_quiet=False, overwrite=False,
-                overviews=False, mask_band=None, scale_factor=1.):
+                overviews=False, mask_band=None, scale_factor=1.,
+                separate_files=True, n_jobs=1):
 
     """
     Computes vegetation indexes
@@ -1703,6 +2112,11 @@ def veg_indices(input_image, output_image, input_index, sensor, k=0.,
         overwrite (Optional[bool]): Whether to overwrite an existing ``output_image`` file. Default is False.
         overviews (Optional[bool]): Whether to build pyramid overviews for ``output_image``. Default is False.
         mask_band (Optional[int]): A mask band position to use. Default is None.
+        separate_files (Optional[bool]): Whether to write each index of a list to its own file and stack the
+            files in a VRT. Default is True. If False, the indices are written as bands of ``output_image``.
+            Either way, the bands of each block are read once for all of the indices.
+        n_jobs (Optional[int]): The number of blocks to process in parallel, with a list of indices.
+            Default is 1.
 
     Examples:
         >>> from mappy.features import veg_indices
@@ -1719,6 +2133,10 @@ def veg_indices(input_image, output_image, input_index, sensor, k=0.,
         >>>
         >>> # Compute the NDVI for Sentinel 2.
         >>> veg_indices('/some_image.tif', '/some_image_indice.tif', 'NDVI', 'Sentinel2')
+        >>>
+        >>> # Compute several indices into one multi-band image.
+        >>> veg_indices('/some_image.tif', '/some_image_indices.tif', ['NDVI', 'EVI', 'NBR'], 'Landsat', \
+        >>>             separate_files=False, n_jobs=4)
 
     Returns:
         None, writes to ``output_image``.
@@ -1833,7 +2251,9 @@ def veg_indices(input_image, output_image, input_index, sensor, k=0.,
         if input_index.lower() == 'all':
 
             _compute_as_list(input_image, output_image, sensor, k, storage, no_data,
-                             chunk_size, overwrite, overviews)
+                             chunk_size, overwrite, overviews, in_no_data=in_no_data,
+                             be_quiet=be_quiet, mask_band=mask_band, scale_factor=scale_factor,
+                             separate_files=separate_files, n_jobs=n_jobs)
 
         else:
 
@@ -1856,7 +2276,9 @@ def veg_indices(input_image, output_image, input_index, sensor, k=0.,
         else:
 
             _compute_as_list(input_image, output_image, sensor, k, storage, no_data,
-                             chunk_size, overwrite, overviews, veg_indice_list=input_index)
+                             chunk_size, overwrite, overviews, veg_indice_list=input_index,
+                             in_no_data=in_no_data, be_quiet=be_quiet, mask_band=mask_band,
+                             scale_factor=scale_factor, separate_files=separate_files, n_jobs=n_jobs)
 
 
 def _examples():
@@ -1900,6 +2322,9 @@ def _examples():
 
     # Compute all available indices for Landsat.
     veg-indices -i /some_image.tif -o /output.tif --index all --sensor Landsat
+
+    # Compute NDVI, EVI, and NBR into one 3-band image, processing 4 blocks in parallel.
+    veg-indices -i /some_image.tif -o /output.tif --index ndvi evi nbr --sensor Landsat --stack -j 4
     """)
 
 
@@ -1919,6 +2344,9 @@ def main():
     parser.add_argument('-n', '--no_data', dest='no_data', help='The output "no data" value', default=0, type=int)
     parser.add_argument('-c', '--chunk', dest='chunk', help='The chunk size', default=1024, type=int)
     parser.add_argument('-q', '--be_quiet', dest='be_quiet', help='Whether to be quiet', action='store_true')
+    parser.add_argument('--stack', dest='stack', help='Whether to write a list of indices to one multi-band image',
+                        action='store_true')
+    parser.add_argument('-j', '--n_jobs', dest='n_jobs', help='The number of parallel blocks', default=1, type=int)
     parser.add_argument('--overwrite', dest='overwrite', help='Whether to overwrite an existing file',
                         action='store_true')
     parser.add_argument('--overviews', dest='overviews', help='Whether to build pyramid overviews',
@@ -1960,7 +2388,8 @@ def main():
 
     veg_indices(args.input, args.output, args.index, args.sensor, k=args.resample, storage=args.storage,
                 no_data=args.no_data, chunk_size=args.chunk, be_quiet=args.be_quiet,
-                overwrite=args.overwrite, overviews=args.overviews)
+                overwrite=args.overwrite, overviews=args.overviews, separate_files=not args.stack,
+                n_jobs=args.n_jobs)
 
     logger.info('\nEnd data & time -- (%s)\nTotal processing time -- (%.2gs)\n' %
                 (time.asctime(time.localtime(time.time())), (time.time()-start_time)))
@@ -3,7 +3,7 @@ from distutils.core import setup
 import platform
 
 from Cython.Build import cythonize
-# from distutils.extension import Extension
+from distutils.extension import Extension
 
 try:
     from Cython.Distutils import build_ext
@@ -61,10 +61,27 @@ if platform.system() != 'Windows':
         required_packages.append(pkg)
 
 
+def get_openmp_args():
+
+    # Kernels with ``prange`` run serially without OpenMP.
+    if platform.system() == 'Linux':
+        return ['-fopenmp']
+    else:
+        return []
+
+
 def get_pyx_list():
 
-    return ['mpglue/classification/*.pyx',
-            'mpglue/stats/*.pyx']
+    openmp_args = get_openmp_args()
+
+    return [Extension('*',
+                      ['mpglue/classification/*.pyx'],
+                      extra_compile_args=openmp_args,
+                      extra_link_args=openmp_args),
+            Extension('*',
+                      ['mpglue/stats/*.pyx'],
+                      extra_compile_args=openmp_args,
+                      extra_link_args=openmp_args)]
 
 
 def get_packages():